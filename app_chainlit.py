@@ -2,11 +2,11 @@
 # app_chainlit.py
 # ====================================
 
-import io
 import os
-import pandas as pd
 import chainlit as cl
 
+from chat_async import responder, cancelar, cerrar_sesion, ConsultaCancelada
+
 # ------------------------------------
 # DEBUG BÁSICO DE ENTORNO (Render)
 # ------------------------------------
@@ -24,6 +24,12 @@ except Exception as e:
     print("❌ ERROR importando orquestador:", e)
     procesar_pregunta_router = None
 
+try:
+    from sql_stock import precalentar_stock
+    precalentar_stock()
+except Exception as e:
+    print("⚠️ No se pudo precalentar el esquema de stock:", e)
+
 
 # ------------------------------------
 # MENSAJE INICIAL (EVITA PANTALLA NEGRA)
@@ -35,33 +41,11 @@ async def start():
     ).send()
 
 
-# ------------------------------------
-# NORMALIZADOR DE SALIDA (NO TOCA TU LÓGICA)
-# ------------------------------------
-def _normalizar_salida(res):
-    """
-    Soporta retornos comunes sin tocar tu lógica:
-    - (respuesta, df)
-    - {"respuesta": "...", "df": df}
-    - "respuesta"
-    """
-    if isinstance(res, (tuple, list)) and len(res) >= 2:
-        return res[0], res[1]
-
-    if isinstance(res, dict):
-        return (
-            res.get("respuesta")
-            or res.get("respuesta_texto")
-            or "",
-            res.get("df"),
-        )
-
-    return str(res or ""), None
-
-
 # ------------------------------------
 # HANDLER PRINCIPAL
 # ------------------------------------
+# Orquestador, formato y Excel corren en el pool de chat_async: el loop
+# queda libre para los demás chats mientras una consulta tarda.
 @cl.on_message
 async def main(message: cl.Message):
     pregunta = (message.content or "").strip()
@@ -75,40 +59,60 @@ async def main(message: cl.Message):
         ).send()
         return
 
+    archivo_temporal = None
     try:
-        res = procesar_pregunta_router(pregunta)
-        respuesta, df = _normalizar_salida(res)
+        out = await responder(pregunta, cl.user_session.get("id"), procesar_pregunta_router)
 
         elements = []
 
         # --------------------------------
         # TABLA + EXCEL DESCARGABLE
         # --------------------------------
-        if isinstance(df, pd.DataFrame) and not df.empty:
+        if out["tabla"] is not None:
+            # Formato LATAM solo para mostrar; el Excel lleva los números crudos
             elements.append(
                 cl.Dataframe(
-                    data=df,
+                    data=out["tabla"],
                     display="inline",
                     name="Resultado",
                 )
             )
 
-            buf = io.BytesIO()
-            df.to_excel(buf, index=False)
-            elements.append(
-                cl.File(
-                    name="resultado.xlsx",
-                    content=buf.getvalue(),
-                    display="inline",
-                )
-            )
+            # Excel en bloques: el resultado completo si la consulta lo
+            # ofrece (cursor del servidor), si no lo que se muestra
+            exp = out["export"]
+            if exp["datos"] is not None:
+                elements.append(cl.File(name=exp["nombre"], content=exp["datos"], display="inline"))
+            else:
+                elements.append(cl.File(name=exp["nombre"], path=exp["ruta"], display="inline"))
+                archivo_temporal = exp["ruta"]
 
         await cl.Message(
-            content=respuesta or "(sin texto)",
+            content=out["respuesta"] or "(sin texto)",
             elements=elements,
         ).send()
 
+    except ConsultaCancelada:
+        pass
+
     except Exception as e:
         await cl.Message(
             content=f"❌ Error: {type(e).__name__}: {e}"
         ).send()
+
+    finally:
+        if archivo_temporal and os.path.exists(archivo_temporal):
+            os.remove(archivo_temporal)
+
+
+# ------------------------------------
+# STOP / DESCONEXIÓN: CANCELAR LO PENDIENTE
+# ------------------------------------
+@cl.on_stop
+def on_stop():
+    cancelar(cl.user_session.get("id"))
+
+
+@cl.on_chat_end
+def on_chat_end():
+    cerrar_sesion(cl.user_session.get("id"))
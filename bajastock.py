@@ -5,21 +5,19 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+
+from sql_core import get_db_connection, invalidar_tablas, _stock_tipado_activo
+from sql_stock_escritura import aplicar_lineas_stock, TABLAS_STOCK
 
 # =========================
-# CONEXIÓN A POSTGRESQL (SUPABASE)
+# CONEXIÓN A POSTGRESQL (SUPABASE) - desde el pool de sql_core
 # =========================
 def get_connection():
-    return psycopg2.connect(
-        host=st.secrets["DB_HOST"],
-        port=st.secrets["DB_PORT"],
-        dbname=st.secrets["DB_NAME"],
-        user=st.secrets["DB_USER"],
-        password=st.secrets["DB_PASSWORD"],
-        sslmode="require"
-    )
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    return conn
 
 
 # =========================
@@ -152,29 +150,52 @@ def crear_tablas_historial():
 # =========================
 # STOCK (TABLA: stock) - BÚSQUEDA Y DETALLE
 # =========================
+# Con sql_stock_tipado "stock" es una vista: se busca en stock_lotes con las
+# mismas expresiones que sus índices (codigo btree, LOWER(articulo) trigram).
+# La vista ya guarda los textos sin espacios, no hace falta TRIM.
+_SQL_BUSCAR_ITEMS_LOTES = """
+    SELECT
+        familia AS "FAMILIA",
+        codigo AS "CODIGO",
+        articulo AS "ARTICULO",
+        deposito AS "DEPOSITO",
+        lote AS "LOTE",
+        vencimiento AS "VENCIMIENTO",
+        stock AS "STOCK"
+    FROM stock_lotes
+    WHERE
+        codigo = %s
+        OR LOWER(articulo) LIKE LOWER(%s)
+    LIMIT %s
+"""
+
+_SQL_BUSCAR_ITEMS = """
+    SELECT
+        "FAMILIA",
+        "CODIGO",
+        "ARTICULO",
+        "DEPOSITO",
+        "LOTE",
+        "VENCIMIENTO",
+        "STOCK"
+    FROM stock
+    WHERE
+        TRIM("CODIGO") = %s
+        OR LOWER(TRIM("ARTICULO")) LIKE LOWER(%s)
+    LIMIT %s
+"""
+
+
 def buscar_items_stock(busqueda: str, limite_filas: int = 500):
     b = _norm_str(busqueda)
     if not b:
         return []
 
+    sql = _SQL_BUSCAR_ITEMS_LOTES if _stock_tipado_activo() else _SQL_BUSCAR_ITEMS
     conn = get_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    cur.execute("""
-        SELECT
-            "FAMILIA",
-            "CODIGO",
-            "ARTICULO",
-            "DEPOSITO",
-            "LOTE",
-            "VENCIMIENTO",
-            "STOCK"
-        FROM stock
-        WHERE
-            TRIM("CODIGO") = %s
-            OR LOWER(TRIM("ARTICULO")) LIKE LOWER(%s)
-        LIMIT %s
-    """, (b, f"%{b}%", limite_filas))
+    cur.execute(sql, (b, f"%{b}%", limite_filas))
 
     filas = cur.fetchall()
     cur.close()
@@ -207,24 +228,46 @@ def buscar_items_stock(busqueda: str, limite_filas: int = 500):
     return items[:20]
 
 
+# FEFO resuelto en la base: vencimiento_date ya parseada e índice
+# idx_stock_lotes_codigo_fefo (codigo, vencimiento_date, lote)
+_SQL_LOTES_ITEM_FEFO = """
+    SELECT
+        id,
+        familia AS "FAMILIA",
+        codigo AS "CODIGO",
+        articulo AS "ARTICULO",
+        deposito AS "DEPOSITO",
+        lote AS "LOTE",
+        vencimiento AS "VENCIMIENTO",
+        fertichat_fmt_stock(stock) AS "STOCK"
+    FROM stock_lotes
+    WHERE codigo = %s AND articulo = %s
+    ORDER BY vencimiento_date ASC NULLS LAST, lote ASC
+"""
+
+
 def obtener_lotes_item(codigo: str, articulo: str):
+    tipado = _stock_tipado_activo()
     conn = get_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    cur.execute("""
-        SELECT
-            "FAMILIA",
-            "CODIGO",
-            "ARTICULO",
-            "DEPOSITO",
-            "LOTE",
-            "VENCIMIENTO",
-            "STOCK"
-        FROM stock
-        WHERE
-            TRIM("CODIGO") = %s
-            AND TRIM("ARTICULO") = %s
-    """, (_norm_str(codigo), _norm_str(articulo)))
+    if tipado:
+        cur.execute(_SQL_LOTES_ITEM_FEFO, (_norm_str(codigo), _norm_str(articulo)))
+    else:
+        cur.execute("""
+            SELECT
+                "FAMILIA",
+                "CODIGO",
+                "ARTICULO",
+                "DEPOSITO",
+                "LOTE",
+                "VENCIMIENTO",
+                "STOCK"
+            FROM stock
+            WHERE
+                TRIM("CODIGO") = %s
+                AND TRIM("ARTICULO") = %s
+        """, (_norm_str(codigo), _norm_str(articulo)))
 
     filas = cur.fetchall()
     cur.close()
@@ -233,6 +276,7 @@ def obtener_lotes_item(codigo: str, articulo: str):
     out = []
     for r in filas:
         out.append({
+            "id": r.get("id"),
             "FAMILIA": _norm_str(r.get("FAMILIA")),
             "CODIGO": _norm_str(r.get("CODIGO")),
             "ARTICULO": _norm_str(r.get("ARTICULO")),
@@ -243,14 +287,71 @@ def obtener_lotes_item(codigo: str, articulo: str):
             "STOCK_NUM": _to_float(r.get("STOCK")),
         })
 
-    # FEFO: primero vencimiento más cercano, luego lote
-    out.sort(key=lambda x: (_parse_fecha_for_sort(x.get("VENCIMIENTO")), x.get("LOTE", "")))
+    # FEFO: primero vencimiento más cercano, luego lote (con stock_lotes ya viene ordenado)
+    if not tipado:
+        out.sort(key=lambda x: (_parse_fecha_for_sort(x.get("VENCIMIENTO")), x.get("LOTE", "")))
     return out
 
 
 # =========================
 # HISTORIAL (INSERT + SELECT)
 # =========================
+_COLS_HIST_BAJAS = (
+    "usuario", "fecha", "hora", "codigo_interno", "articulo", "cantidad", "motivo",
+    "deposito", "lote", "vencimiento",
+    "stock_antes_lote", "stock_despues_lote",
+    "stock_total_articulo", "stock_total_deposito", "stock_casa_central",
+)
+
+_COLS_HIST_MOVIMIENTOS = (
+    "usuario", "fecha", "hora",
+    "codigo", "articulo", "cantidad",
+    "deposito_origen", "deposito_destino",
+    "lote", "vencimiento",
+    "stock_origen_antes", "stock_origen_despues",
+    "stock_destino_antes", "stock_destino_despues",
+)
+
+
+def _insertar_historial(cur, tabla: str, columnas: tuple, filas: list) -> None:
+    """Un solo INSERT ... VALUES (...), (...) para todas las filas."""
+    if not filas:
+        return
+    execute_values(
+        cur,
+        f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES %s",
+        [tuple(f.get(c) for c in columnas) for f in filas],
+        page_size=500,
+    )
+
+
+def _fila_historial_baja(usuario, ahora, codigo_interno, articulo, cantidad, deposito=None, lote=None,
+                         vencimiento=None, stock_antes_lote=None, stock_despues_lote=None,
+                         stock_total_articulo=None, stock_total_deposito=None, stock_casa_central=None) -> dict:
+    return {
+        "usuario": usuario, "fecha": ahora.date(), "hora": ahora.time(),
+        "codigo_interno": str(codigo_interno), "articulo": str(articulo),
+        "cantidad": float(cantidad), "motivo": "Baja",
+        "deposito": deposito, "lote": lote, "vencimiento": vencimiento,
+        "stock_antes_lote": stock_antes_lote, "stock_despues_lote": stock_despues_lote,
+        "stock_total_articulo": stock_total_articulo, "stock_total_deposito": stock_total_deposito,
+        "stock_casa_central": stock_casa_central,
+    }
+
+
+def _fila_historial_movimiento(usuario, ahora, codigo, articulo, cantidad, deposito_origen, deposito_destino,
+                               lote, vencimiento, stock_origen_antes, stock_origen_despues,
+                               stock_destino_antes, stock_destino_despues) -> dict:
+    return {
+        "usuario": usuario, "fecha": ahora.date(), "hora": ahora.time(),
+        "codigo": str(codigo), "articulo": str(articulo), "cantidad": float(cantidad),
+        "deposito_origen": str(deposito_origen), "deposito_destino": str(deposito_destino),
+        "lote": str(lote), "vencimiento": str(vencimiento),
+        "stock_origen_antes": float(stock_origen_antes), "stock_origen_despues": float(stock_origen_despues),
+        "stock_destino_antes": float(stock_destino_antes), "stock_destino_despues": float(stock_destino_despues),
+    }
+
+
 def registrar_baja(
     usuario,
     codigo_interno,
@@ -266,31 +367,17 @@ def registrar_baja(
     stock_casa_central=None
 ):
     conn = get_connection()
-    cur = conn.cursor()
-    ahora = datetime.now()
-
-    cur.execute("""
-        INSERT INTO historial_bajas (
-            usuario, fecha, hora, codigo_interno, articulo, cantidad, motivo,
-            deposito, lote, vencimiento,
-            stock_antes_lote, stock_despues_lote,
-            stock_total_articulo, stock_total_deposito, stock_casa_central
-        )
-        VALUES (%s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s,
-                %s, %s,
-                %s, %s, %s)
-    """, (
-        usuario, ahora.date(), ahora.time(),
-        str(codigo_interno), str(articulo), float(cantidad), "Baja",
-        deposito, lote, vencimiento,
-        stock_antes_lote, stock_despues_lote,
-        stock_total_articulo, stock_total_deposito, stock_casa_central
-    ))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            _insertar_historial(cur, "historial_bajas", _COLS_HIST_BAJAS, [_fila_historial_baja(
+                usuario, datetime.now(), codigo_interno, articulo, cantidad, deposito, lote, vencimiento,
+                stock_antes_lote, stock_despues_lote,
+                stock_total_articulo, stock_total_deposito, stock_casa_central,
+            )])
+        conn.commit()
+    finally:
+        conn.close()
+    invalidar_tablas("historial_bajas")
 
 
 def obtener_historial_bajas(limite=50):
@@ -322,36 +409,17 @@ def registrar_movimiento(
     stock_destino_despues: float
 ):
     conn = get_connection()
-    cur = conn.cursor()
-    ahora = datetime.now()
-
-    cur.execute("""
-        INSERT INTO historial_movimientos (
-            usuario, fecha, hora,
-            codigo, articulo, cantidad,
-            deposito_origen, deposito_destino,
-            lote, vencimiento,
-            stock_origen_antes, stock_origen_despues,
-            stock_destino_antes, stock_destino_despues
-        )
-        VALUES (%s, %s, %s,
-                %s, %s, %s,
-                %s, %s,
-                %s, %s,
-                %s, %s,
-                %s, %s)
-    """, (
-        usuario, ahora.date(), ahora.time(),
-        str(codigo), str(articulo), float(cantidad),
-        str(deposito_origen), str(deposito_destino),
-        str(lote), str(vencimiento),
-        float(stock_origen_antes), float(stock_origen_despues),
-        float(stock_destino_antes), float(stock_destino_despues)
-    ))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            _insertar_historial(cur, "historial_movimientos", _COLS_HIST_MOVIMIENTOS, [_fila_historial_movimiento(
+                usuario, datetime.now(), codigo, articulo, cantidad, deposito_origen, deposito_destino,
+                lote, vencimiento, stock_origen_antes, stock_origen_despues,
+                stock_destino_antes, stock_destino_despues,
+            )])
+        conn.commit()
+    finally:
+        conn.close()
+    invalidar_tablas("historial_movimientos")
 
 
 def obtener_historial_movimientos(limite=50):
@@ -369,107 +437,73 @@ def obtener_historial_movimientos(limite=50):
 
 
 # =========================
-# BAJA: ACTUALIZAR STOCK (TABLA stock)
+# LEDGER DE STOCK: STOCK + HISTORIAL EN UNA TRANSACCIÓN
 # =========================
-def aplicar_baja_en_lote(
-    usuario: str,
-    codigo: str,
-    articulo: str,
-    deposito: str,
-    lote: str,
-    vencimiento: str,
-    cantidad: float
-):
-    codigo = _norm_str(codigo)
-    articulo = _norm_str(articulo)
-    deposito = _norm_str(deposito)
-    lote = _norm_str(lote)
-    vencimiento = _norm_str(vencimiento)
-
-    conn = get_connection()
-    try:
-        conn.autocommit = False
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
+# aplicar_bajas / aplicar_movimientos: todas las líneas de la operación,
+# sus totales y sus filas de historial en una sola conexión y un solo
+# commit. Si algo falla no queda stock movido sin historial (ni al revés).
+#   1 SELECT fertichat_aplicar_stock (todas las líneas)
+#   1 SELECT de totales (todos los artículos)
+#   1 INSERT multi-fila de historial
+
+def _totales_por_deposito(cur, claves: list) -> dict:
+    """
+    Stock por depósito de cada artículo, dentro de la transacción en curso.
+    claves: [(codigo, articulo)] -> {codigo: {deposito: stock}}
+    Con stock_totales (sql_stock_tipado) es una lectura por PK; si no,
+    se suman los lotes.
+    """
+    codigos = sorted({c for c, _ in claves})
+    if _stock_tipado_activo():
         cur.execute("""
-            SELECT "STOCK"
+            SELECT codigo AS "CODIGO", '' AS "ARTICULO", deposito AS "DEPOSITO", stock AS "STOCK"
+            FROM stock_totales
+            WHERE codigo = ANY(%s)
+        """, (codigos,))
+    else:
+        cur.execute("""
+            SELECT TRIM("CODIGO") AS "CODIGO", TRIM("ARTICULO") AS "ARTICULO", "DEPOSITO", "STOCK"
             FROM stock
-            WHERE
-                TRIM("CODIGO") = %s
-                AND TRIM("ARTICULO") = %s
-                AND TRIM("DEPOSITO") = %s
-                AND COALESCE(TRIM("LOTE"), '') = %s
-                AND COALESCE(TRIM("VENCIMIENTO"), '') = %s
-            FOR UPDATE
-        """, (codigo, articulo, deposito, lote, vencimiento))
-
-        row = cur.fetchone()
-        if not row:
-            raise ValueError("No se encontró el lote seleccionado en la tabla stock.")
+            WHERE TRIM("CODIGO") = ANY(%s)
+        """, (codigos,))
 
-        stock_antes = _to_float(row.get("STOCK"))
-        if cantidad <= 0:
-            raise ValueError("La cantidad debe ser mayor a 0.")
-        if cantidad > stock_antes + 1e-9:
-            raise ValueError(f"No hay stock suficiente en ese lote. Stock lote: {stock_antes}")
+    pares = set(claves)
+    out = {c: {} for c in codigos}
+    for r in cur.fetchall():
+        codigo = _norm_str(r.get("CODIGO"))
+        if r.get("ARTICULO") and (codigo, _norm_str(r.get("ARTICULO"))) not in pares:
+            continue
+        dep = _norm_str(r.get("DEPOSITO"))
+        out[codigo][dep] = out[codigo].get(dep, 0.0) + _to_float(r.get("STOCK"))
+    return out
 
-        stock_despues = stock_antes - float(cantidad)
 
-        cur.execute("""
-            UPDATE stock
-            SET "STOCK" = %s
-            WHERE
-                TRIM("CODIGO") = %s
-                AND TRIM("ARTICULO") = %s
-                AND TRIM("DEPOSITO") = %s
-                AND COALESCE(TRIM("LOTE"), '') = %s
-                AND COALESCE(TRIM("VENCIMIENTO"), '') = %s
-        """, (_fmt_num(stock_despues), codigo, articulo, deposito, lote, vencimiento))
+def _totales_por_linea(totales: dict, deltas: list) -> list:
+    """
+    Totales después de cada línea, a partir de los totales finales:
+    se recorre de atrás para adelante deshaciendo el delta de cada línea.
+    deltas: [[(codigo, deposito, delta), ...] por línea]
+    """
+    estado = {c: dict(d) for c, d in totales.items()}
+    out = [None] * len(deltas)
+    for i in range(len(deltas) - 1, -1, -1):
+        out[i] = {c: dict(d) for c, d in estado.items() if c in {x[0] for x in deltas[i]}}
+        for codigo, deposito, delta in deltas[i]:
+            dep = estado.setdefault(codigo, {})
+            dep[deposito] = dep.get(deposito, 0.0) - delta
+    return out
 
-        # Totales post-baja
-        cur.execute("""
-            SELECT "DEPOSITO", "STOCK"
-            FROM stock
-            WHERE TRIM("CODIGO") = %s AND TRIM("ARTICULO") = %s
-        """, (codigo, articulo))
-        rows_all = cur.fetchall()
-
-        filas_norm = []
-        for r in rows_all:
-            filas_norm.append({
-                "DEPOSITO": _norm_str(r.get("DEPOSITO")),
-                "STOCK_NUM": _to_float(r.get("STOCK"))
-            })
-
-        total_articulo = sum(r["STOCK_NUM"] for r in filas_norm)
-        total_deposito = sum(r["STOCK_NUM"] for r in filas_norm if r["DEPOSITO"] == deposito)
-        total_casa_central = sum(r["STOCK_NUM"] for r in filas_norm if "casa central" in r["DEPOSITO"].lower())
-
-        # Historial baja
-        registrar_baja(
-            usuario=usuario,
-            codigo_interno=codigo,
-            articulo=articulo,
-            cantidad=float(cantidad),
-            deposito=deposito,
-            lote=lote,
-            vencimiento=vencimiento,
-            stock_antes_lote=float(stock_antes),
-            stock_despues_lote=float(stock_despues),
-            stock_total_articulo=float(total_articulo),
-            stock_total_deposito=float(total_deposito),
-            stock_casa_central=float(total_casa_central)
-        )
 
+def _ejecutar_ledger(ops, historial: tuple) -> list:
+    """Corre ops(conn) -> (resultados, filas_historial) y commitea todo junto."""
+    tabla, columnas = historial
+    conn = get_connection()
+    try:
+        conn.autocommit = False
+        resultados, filas = ops(conn)
+        with conn.cursor() as cur:
+            _insertar_historial(cur, tabla, columnas, filas)
         conn.commit()
-        return {
-            "stock_antes_lote": stock_antes,
-            "stock_despues_lote": stock_despues,
-            "total_articulo": total_articulo,
-            "total_deposito": total_deposito,
-            "total_casa_central": total_casa_central
-        }
-
     except Exception:
         try:
             conn.rollback()
@@ -482,6 +516,144 @@ def aplicar_baja_en_lote(
         except Exception:
             pass
 
+    invalidar_tablas(*TABLAS_STOCK, tabla)
+    return resultados
+
+
+def aplicar_bajas(usuario: str, lineas: list) -> list:
+    """
+    Baja de varios lotes en una transacción.
+    lineas: [{codigo, articulo, deposito, lote, vencimiento, cantidad}]
+    Devuelve por línea el mismo dict que aplicar_baja_en_lote.
+    """
+    lineas = [{
+        "codigo": _norm_str(l.get("codigo")),
+        "articulo": _norm_str(l.get("articulo")),
+        "deposito": _norm_str(l.get("deposito")),
+        "lote": _norm_str(l.get("lote")),
+        "vencimiento": _norm_str(l.get("vencimiento")),
+        "cantidad": float(l.get("cantidad") or 0),
+    } for l in lineas]
+    if not lineas:
+        return []
+    if any(l["cantidad"] <= 0 for l in lineas):
+        raise ValueError("La cantidad debe ser mayor a 0.")
+
+    def ops(conn):
+        res_stock = aplicar_lineas_stock(
+            [{**l, "delta": -l["cantidad"]} for l in lineas], estricto=True, conn=conn
+        )
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            totales = _totales_por_deposito(cur, [(l["codigo"], l["articulo"]) for l in lineas])
+        por_linea = _totales_por_linea(
+            totales, [[(l["codigo"], l["deposito"], -l["cantidad"])] for l in lineas]
+        )
+
+        ahora = datetime.now()
+        resultados, filas = [], []
+        for l, res, tot in zip(lineas, res_stock, por_linea):
+            deps = tot.get(l["codigo"], {})
+            r = {
+                "stock_antes_lote": res["stock_antes"],
+                "stock_despues_lote": res["stock_despues"],
+                "total_articulo": sum(deps.values()),
+                "total_deposito": deps.get(l["deposito"], 0.0),
+                "total_casa_central": sum(v for d, v in deps.items() if "casa central" in d.lower()),
+            }
+            resultados.append(r)
+            filas.append(_fila_historial_baja(
+                usuario, ahora, l["codigo"], l["articulo"], l["cantidad"],
+                l["deposito"], l["lote"], l["vencimiento"],
+                float(r["stock_antes_lote"]), float(r["stock_despues_lote"]),
+                float(r["total_articulo"]), float(r["total_deposito"]), float(r["total_casa_central"]),
+            ))
+        return resultados, filas
+
+    return _ejecutar_ledger(ops, ("historial_bajas", _COLS_HIST_BAJAS))
+
+
+def aplicar_movimientos(usuario: str, lineas: list) -> list:
+    """
+    Movimiento de varios lotes entre depósitos en una transacción.
+    lineas: [{codigo, articulo, familia, deposito_origen, deposito_destino,
+              lote, vencimiento, cantidad}]
+    Devuelve por línea el mismo dict que aplicar_movimiento_en_lote.
+    """
+    lineas = [{
+        "codigo": _norm_str(l.get("codigo")),
+        "articulo": _norm_str(l.get("articulo")),
+        "familia": _norm_str(l.get("familia")),
+        "deposito_origen": _norm_str(l.get("deposito_origen")),
+        "deposito_destino": _norm_str(l.get("deposito_destino")),
+        "lote": _norm_str(l.get("lote")),
+        "vencimiento": _norm_str(l.get("vencimiento")),
+        "cantidad": float(l.get("cantidad") or 0),
+    } for l in lineas]
+    if not lineas:
+        return []
+    if any(l["cantidad"] <= 0 for l in lineas):
+        raise ValueError("La cantidad debe ser mayor a 0.")
+
+    def ops(conn):
+        # origen (-) y destino (+) de cada línea; crea el lote destino si no existe
+        stock_lineas = []
+        for l in lineas:
+            base = {k: l[k] for k in ("codigo", "articulo", "familia", "lote", "vencimiento")}
+            stock_lineas.append({**base, "deposito": l["deposito_origen"], "delta": -l["cantidad"]})
+            stock_lineas.append({**base, "deposito": l["deposito_destino"], "delta": l["cantidad"]})
+        res_stock = aplicar_lineas_stock(stock_lineas, estricto=True, conn=conn)
+
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            totales = _totales_por_deposito(cur, [(l["codigo"], l["articulo"]) for l in lineas])
+        por_linea = _totales_por_linea(totales, [
+            [(l["codigo"], l["deposito_origen"], -l["cantidad"]),
+             (l["codigo"], l["deposito_destino"], l["cantidad"])]
+            for l in lineas
+        ])
+
+        ahora = datetime.now()
+        resultados, filas = [], []
+        for i, (l, tot) in enumerate(zip(lineas, por_linea)):
+            res_o, res_d = res_stock[2 * i], res_stock[2 * i + 1]
+            deps = tot.get(l["codigo"], {})
+            r = {
+                "stock_origen_antes": res_o["stock_antes"],
+                "stock_origen_despues": res_o["stock_despues"],
+                "stock_destino_antes": res_d["stock_antes"],
+                "stock_destino_despues": res_d["stock_despues"],
+                "total_articulo": sum(deps.values()),
+                "total_deposito_origen": deps.get(l["deposito_origen"], 0.0),
+                "total_deposito_destino": deps.get(l["deposito_destino"], 0.0),
+            }
+            resultados.append(r)
+            filas.append(_fila_historial_movimiento(
+                usuario, ahora, l["codigo"], l["articulo"], l["cantidad"],
+                l["deposito_origen"], l["deposito_destino"], l["lote"], l["vencimiento"],
+                r["stock_origen_antes"], r["stock_origen_despues"],
+                r["stock_destino_antes"], r["stock_destino_despues"],
+            ))
+        return resultados, filas
+
+    return _ejecutar_ledger(ops, ("historial_movimientos", _COLS_HIST_MOVIMIENTOS))
+
+
+# =========================
+# BAJA: ACTUALIZAR STOCK (TABLA stock)
+# =========================
+def aplicar_baja_en_lote(
+    usuario: str,
+    codigo: str,
+    articulo: str,
+    deposito: str,
+    lote: str,
+    vencimiento: str,
+    cantidad: float
+):
+    return aplicar_bajas(usuario, [{
+        "codigo": codigo, "articulo": articulo, "deposito": deposito,
+        "lote": lote, "vencimiento": vencimiento, "cantidad": cantidad,
+    }])[0]
+
 
 # =========================
 # MOVIMIENTO: RESTAR ORIGEN + SUMAR DESTINO
@@ -497,132 +669,11 @@ def aplicar_movimiento_en_lote(
     vencimiento: str,
     cantidad: float
 ):
-    codigo = _norm_str(codigo)
-    articulo = _norm_str(articulo)
-    familia = _norm_str(familia)
-    deposito_origen = _norm_str(deposito_origen)
-    deposito_destino = _norm_str(deposito_destino)
-    lote = _norm_str(lote)
-    vencimiento = _norm_str(vencimiento)
-
-    if cantidad <= 0:
-        raise ValueError("La cantidad debe ser mayor a 0.")
-
-    conn = get_connection()
-    try:
-        conn.autocommit = False
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Lock origen
-        cur.execute("""
-            SELECT "STOCK"
-            FROM stock
-            WHERE
-                TRIM("CODIGO") = %s
-                AND TRIM("ARTICULO") = %s
-                AND TRIM("DEPOSITO") = %s
-                AND COALESCE(TRIM("LOTE"), '') = %s
-                AND COALESCE(TRIM("VENCIMIENTO"), '') = %s
-            FOR UPDATE
-        """, (codigo, articulo, deposito_origen, lote, vencimiento))
-
-        row_o = cur.fetchone()
-        if not row_o:
-            raise ValueError("No se encontró el lote en el depósito ORIGEN.")
-
-        stock_origen_antes = _to_float(row_o.get("STOCK"))
-        if cantidad > stock_origen_antes + 1e-9:
-            raise ValueError(f"No hay stock suficiente en ORIGEN. Stock: {stock_origen_antes}")
-
-        stock_origen_despues = stock_origen_antes - float(cantidad)
-
-        # Update origen
-        cur.execute("""
-            UPDATE stock
-            SET "STOCK" = %s
-            WHERE
-                TRIM("CODIGO") = %s
-                AND TRIM("ARTICULO") = %s
-                AND TRIM("DEPOSITO") = %s
-                AND COALESCE(TRIM("LOTE"), '') = %s
-                AND COALESCE(TRIM("VENCIMIENTO"), '') = %s
-        """, (_fmt_num(stock_origen_despues), codigo, articulo, deposito_origen, lote, vencimiento))
-
-        # Lock / crear destino
-        cur.execute("""
-            SELECT "STOCK"
-            FROM stock
-            WHERE
-                TRIM("CODIGO") = %s
-                AND TRIM("ARTICULO") = %s
-                AND TRIM("DEPOSITO") = %s
-                AND COALESCE(TRIM("LOTE"), '') = %s
-                AND COALESCE(TRIM("VENCIMIENTO"), '') = %s
-            FOR UPDATE
-        """, (codigo, articulo, deposito_destino, lote, vencimiento))
-
-        row_d = cur.fetchone()
-        stock_destino_antes = 0.0
-
-        if row_d:
-            stock_destino_antes = _to_float(row_d.get("STOCK"))
-            stock_destino_despues = stock_destino_antes + float(cantidad)
-
-            cur.execute("""
-                UPDATE stock
-                SET "STOCK" = %s
-                WHERE
-                    TRIM("CODIGO") = %s
-                    AND TRIM("ARTICULO") = %s
-                    AND TRIM("DEPOSITO") = %s
-                    AND COALESCE(TRIM("LOTE"), '') = %s
-                    AND COALESCE(TRIM("VENCIMIENTO"), '') = %s
-            """, (_fmt_num(stock_destino_despues), codigo, articulo, deposito_destino, lote, vencimiento))
-        else:
-            stock_destino_despues = float(cantidad)
-            cur.execute("""
-                INSERT INTO stock ("FAMILIA","CODIGO","ARTICULO","DEPOSITO","LOTE","VENCIMIENTO","STOCK")
-                VALUES (%s,%s,%s,%s,%s,%s,%s)
-            """, (
-                familia, codigo, articulo, deposito_destino, lote, vencimiento, _fmt_num(stock_destino_despues)
-            ))
-
-        conn.commit()
-
-    except Exception:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        raise
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
-
-    # Historial movimiento (afuera de la transacción de stock para no mezclar commits)
-    registrar_movimiento(
-        usuario=usuario,
-        codigo=codigo,
-        articulo=articulo,
-        cantidad=float(cantidad),
-        deposito_origen=deposito_origen,
-        deposito_destino=deposito_destino,
-        lote=lote,
-        vencimiento=vencimiento,
-        stock_origen_antes=float(stock_origen_antes),
-        stock_origen_despues=float(stock_origen_despues),
-        stock_destino_antes=float(stock_destino_antes),
-        stock_destino_despues=float(stock_destino_despues)
-    )
-
-    return {
-        "stock_origen_antes": stock_origen_antes,
-        "stock_origen_despues": stock_origen_despues,
-        "stock_destino_antes": stock_destino_antes,
-        "stock_destino_despues": stock_destino_despues
-    }
+    return aplicar_movimientos(usuario, [{
+        "codigo": codigo, "articulo": articulo, "familia": familia,
+        "deposito_origen": deposito_origen, "deposito_destino": deposito_destino,
+        "lote": lote, "vencimiento": vencimiento, "cantidad": cantidad,
+    }])[0]
 
 
 # =========================
@@ -0,0 +1,126 @@
+# =========================
+# BENCHMARK - Chats simultáneos (chat_async)
+# =========================
+"""
+N chats preguntan a la vez contra un orquestador simulado que bloquea
+(time.sleep como psycopg2/OpenAI) y devuelve una tabla de compras.
+
+- bloqueante: el handler async llama al router directo (como antes)
+- chat_async: router, formato y Excel en el pool acotado
+
+Mide el tiempo total, la latencia por chat y el atraso máximo del event
+loop (un latido cada 10 ms: si el loop está bloqueado, el latido llega tarde).
+
+    python benchmark_chat.py               # 16 chats, 300 ms por consulta
+    python benchmark_chat.py 50 500
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import chat_async
+from chat_async import responder, normalizar_salida
+from utils_format import ResultadoConsulta
+
+
+def router_simulado(latencia_ms: int, filas: int = 2000):
+    def _router(pregunta: str):
+        time.sleep(latencia_ms / 1000)
+        rnd = np.random.default_rng(len(pregunta))
+        df = pd.DataFrame({
+            "Proveedor": rnd.choice(["ROCHE", "BIODIAGNOSTICO", "ABBOTT"], filas),
+            "Articulo": [f"art {i % 50}" for i in range(filas)],
+            "Moneda": rnd.choice(["$", "U$S"], filas),
+            "Total": rnd.uniform(10, 100000, filas).round(2),
+        })
+        return f"🛒 {pregunta}", ResultadoConsulta(df)
+    return _router
+
+
+async def _latido(atrasos: list, parar: asyncio.Event):
+    while not parar.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        atrasos.append(time.perf_counter() - t0 - 0.01)
+
+
+async def _chat_bloqueante(router, pregunta: str):
+    # lo que hacía app_chainlit.main: todo sobre el loop
+    respuesta, df = normalizar_salida(router(pregunta))
+    df.formateado
+    chat_async.exportar_bloques(df, formato="xlsx", nombre="resultado")
+
+
+async def _chat_async(router, pregunta: str, sesion: str):
+    await responder(pregunta, sesion, router)
+
+
+async def correr(modo: str, n_chats: int, router) -> dict:
+    atrasos = []
+    parar = asyncio.Event()
+    latido = asyncio.create_task(_latido(atrasos, parar))
+    await asyncio.sleep(0.05)
+
+    latencias = []
+    t0 = time.perf_counter()
+
+    async def _uno(i: int):
+        # latencia desde que todos preguntan (no desde que al chat le toca el loop)
+        pregunta = f"compras proveedor {i} 2025"
+        if modo == "bloqueante":
+            await _chat_bloqueante(router, pregunta)
+        else:
+            await _chat_async(router, pregunta, f"sesion_{i}")
+        latencias.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*[_uno(i) for i in range(n_chats)])
+    total = time.perf_counter() - t0
+
+    parar.set()
+    await latido
+    return {
+        "total": total,
+        "p50": statistics.median(latencias),
+        "max": max(latencias),
+        "atraso_loop": max(atrasos) if atrasos else 0.0,
+    }
+
+
+async def misma_sesion(router, n: int) -> float:
+    """n preguntas de la MISMA sesión: con CHAT_MAX_POR_SESION=1 se atienden de a una."""
+    t0 = time.perf_counter()
+    await asyncio.gather(*[responder(f"pregunta {i}", "sesion_unica", router) for i in range(n)])
+    return time.perf_counter() - t0
+
+
+def main():
+    n_chats = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    latencia_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    router = router_simulado(latencia_ms)
+
+    print("=" * 70)
+    print(f"⏱️  BENCHMARK CHAT ({n_chats} chats simultáneos, consulta de {latencia_ms} ms, "
+          f"CHAT_WORKERS={chat_async.CHAT_WORKERS})")
+    print("=" * 70)
+
+    res = {}
+    for modo in ("bloqueante", "chat_async"):
+        r = asyncio.run(correr(modo, n_chats, router))
+        res[modo] = r
+        print(f"{modo:>11}: total {r['total']:7.2f} s | latencia p50 {r['p50']:6.2f} s "
+              f"max {r['max']:6.2f} s | loop bloqueado hasta {r['atraso_loop'] * 1000:8.1f} ms")
+
+    t_sesion = asyncio.run(misma_sesion(router, 3))
+    print(f"3 preguntas en la misma sesión: {t_sesion:.2f} s (de a una por sesión)")
+    print("=" * 70)
+    print(f"🚀 Speedup: {res['bloqueante']['total'] / res['chat_async']['total']:,.1f}x")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
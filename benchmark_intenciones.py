@@ -0,0 +1,71 @@
+# =========================
+# BENCHMARK - Detección de intenciones
+# =========================
+"""
+Micro-benchmark de intent_detector.detectar_intencion.
+Mide latencia por pregunta (µs) y throughput (preguntas/seg) sobre las
+preguntas de tests.py más un set de preguntas reales de uso frecuente.
+
+    python benchmark_intenciones.py            # 2000 vueltas por pregunta
+    python benchmark_intenciones.py 500
+"""
+
+import sys
+import time
+
+from intent_detector import detectar_intencion
+from tests import TESTS
+
+PREGUNTAS_EXTRA = [
+    "compras roche noviembre 2025",
+    "comparar roche 2023 2024",
+    "comparar gastos familias junio julio 2025",
+    "cuando vino ultimo vitek",
+    "stock lote AB-1234",
+    "lotes por vencer 30 dias",
+    "top proveedores 2025 en dolares",
+    "cuanto compramos en 2024",
+    "total proveedor enero 2025 febrero 2025",
+    "hola che me podes ayudar",
+]
+
+
+def medir(preguntas, vueltas: int):
+    """Devuelve [(pregunta, µs por llamada)] y el total de segundos."""
+    resultados = []
+    total = 0.0
+    for pregunta in preguntas:
+        detectar_intencion(pregunta)  # calentar (lru_cache de patrones)
+        t0 = time.perf_counter()
+        for _ in range(vueltas):
+            detectar_intencion(pregunta)
+        dt = time.perf_counter() - t0
+        total += dt
+        resultados.append((pregunta, dt / vueltas * 1_000_000))
+    return resultados, total
+
+
+def main():
+    vueltas = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    preguntas = [p for p, _ in TESTS] + PREGUNTAS_EXTRA
+
+    print("=" * 70)
+    print(f"⏱️  BENCHMARK DETECCIÓN DE INTENCIONES ({len(preguntas)} preguntas x {vueltas})")
+    print("=" * 70)
+
+    resultados, total = medir(preguntas, vueltas)
+
+    for pregunta, us in sorted(resultados, key=lambda x: -x[1]):
+        print(f"{us:9.1f} µs  {pregunta}")
+
+    llamadas = len(preguntas) * vueltas
+    lat = sorted(us for _, us in resultados)
+    print("=" * 70)
+    print(f"📊 Media: {total / llamadas * 1_000_000:.1f} µs | "
+          f"p50: {lat[len(lat) // 2]:.1f} µs | máx: {lat[-1]:.1f} µs")
+    print(f"🚀 Throughput: {llamadas / total:,.0f} preguntas/seg")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# =========================
+# BENCHMARK - Motor de kardex
+# =========================
+"""
+Compara el kardex fila por fila (iterrows) con el motor vectorizado de
+kardex.py sobre movimientos sintéticos (los mismos generadores de
+tests_kardex.py).
+
+    python benchmark_kardex.py                # 20.000 movimientos, 200 artículos
+    python benchmark_kardex.py 100000 1000
+"""
+
+import sys
+import time
+
+from kardex import _kardex_referencia_iterrows, calcular_kardex_por_articulo, resumen_por_articulo
+from tests_kardex import generar_movimientos
+
+
+def medir(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def _referencia_por_articulo(df):
+    return [_kardex_referencia_iterrows(sub) for _, sub in df.groupby("articulo_id", sort=False)]
+
+
+def main():
+    n_movs = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    n_articulos = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    df = generar_movimientos(n_articulos, n_movs)
+
+    print("=" * 70)
+    print(f"⏱️  BENCHMARK KARDEX ({n_movs:,} movimientos, {n_articulos} artículos)")
+    print("=" * 70)
+
+    _, t_ref = medir(_referencia_por_articulo, df)
+    df_k, t_vec = medir(calcular_kardex_por_articulo, df)
+    resumen, t_res = medir(resumen_por_articulo, df_k)
+
+    print(f"{t_ref * 1000:10.1f} ms  iterrows por artículo")
+    print(f"{t_vec * 1000:10.1f} ms  vectorizado (una pasada)")
+    print(f"{t_res * 1000:10.1f} ms  resumen por artículo ({len(resumen)} filas)")
+    print("=" * 70)
+    print(f"🚀 Speedup: {t_ref / t_vec:,.1f}x | {n_movs / t_vec:,.0f} movimientos/seg")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
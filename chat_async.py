@@ -0,0 +1,195 @@
+# =========================
+# CHAT_ASYNC.PY - PIPELINE ASÍNCRONO DEL CHAT (CHAINLIT)
+# =========================
+"""
+Corre el orquestador (psycopg2 + OpenAI, todo sincrónico) fuera del
+event loop para que una pregunta lenta no congele los demás chats:
+
+- interpretación + SQL, formato de la tabla y export a Excel van a un
+  ThreadPoolExecutor acotado (CHAT_WORKERS); las tareas que esperan
+  turno esperan en el loop (cancelables), no en la cola del pool
+- cada sesión tiene un cupo de preguntas simultáneas (CHAT_MAX_POR_SESION);
+  las que sobran esperan a que termine la anterior
+- cancelar(sesion) (usuario se desconecta / aprieta stop): cancela las
+  tareas de la sesión y corta el export en el próximo bloque. Una
+  consulta SQL o llamada a OpenAI que ya arrancó termina en su hilo
+  (psycopg2 no se puede interrumpir desde afuera) y su cupo del pool
+  se libera recién entonces.
+
+Medición con N chats simultáneos:  python benchmark_chat.py
+"""
+
+import asyncio
+import contextvars
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set
+
+import pandas as pd
+
+from sql_core import _pool_setting
+from exportar import exportar_bloques
+from utils_format import ResultadoConsulta, como_resultado
+
+CHAT_WORKERS = _pool_setting("CHAT_WORKERS", 8)
+CHAT_MAX_POR_SESION = _pool_setting("CHAT_MAX_POR_SESION", 1)
+
+_EJECUTOR = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="fc_chat")
+
+# Un semáforo por event loop (asyncio.Semaphore queda atado al loop que lo usa)
+_CUPOS_POOL: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class ConsultaCancelada(Exception):
+    """La sesión se canceló mientras se exportaba el resultado."""
+
+
+class _Sesion:
+    def __init__(self):
+        self.cupo = asyncio.Semaphore(CHAT_MAX_POR_SESION)
+        self.tareas: Set[asyncio.Task] = set()
+        # Un token por llamada a responder(): una pregunta nueva no
+        # "des-cancela" a las anteriores que siguen exportando en su hilo
+        self.tokens: Set[threading.Event] = set()
+
+
+_SESIONES: Dict[str, _Sesion] = {}
+
+
+def _sesion(sesion_id: str) -> _Sesion:
+    ses = _SESIONES.get(sesion_id)
+    if ses is None:
+        ses = _SESIONES[sesion_id] = _Sesion()
+    return ses
+
+
+# =====================================================================
+# POOL ACOTADO
+# =====================================================================
+
+def _liberar(loop: asyncio.AbstractEventLoop, cupo: asyncio.Semaphore):
+    try:
+        loop.call_soon_threadsafe(cupo.release)
+    except RuntimeError:
+        pass  # el loop ya cerró
+
+
+async def en_hilo(fn: Callable, *args, **kwargs):
+    """
+    fn(*args, **kwargs) en el pool del chat, con los contextvars del
+    llamador (captura de SQL, etc.). El cupo se devuelve cuando el hilo
+    termina de verdad, aunque la tarea que esperaba se haya cancelado.
+    """
+    loop = asyncio.get_running_loop()
+    cupo = _CUPOS_POOL.get(loop)
+    if cupo is None:
+        cupo = _CUPOS_POOL[loop] = asyncio.Semaphore(CHAT_WORKERS)
+
+    await cupo.acquire()
+    try:
+        ctx = contextvars.copy_context()
+        futuro = _EJECUTOR.submit(ctx.run, fn, *args, **kwargs)
+    except BaseException:
+        cupo.release()
+        raise
+    futuro.add_done_callback(lambda _f: _liberar(loop, cupo))
+    return await asyncio.wrap_future(futuro)
+
+
+# =====================================================================
+# PIPELINE
+# =====================================================================
+
+def normalizar_salida(res):
+    """
+    Soporta retornos comunes del orquestador:
+    - (respuesta, df)
+    - {"respuesta": "...", "df": df}
+    - "respuesta"
+    """
+    if isinstance(res, (tuple, list)) and len(res) >= 2:
+        return res[0], res[1]
+
+    if isinstance(res, dict):
+        return (
+            res.get("respuesta")
+            or res.get("respuesta_texto")
+            or "",
+            res.get("df"),
+        )
+
+    return str(res or ""), None
+
+
+def _preparar_resultado(resultado: ResultadoConsulta, formato: str, cancelada: threading.Event) -> dict:
+    """Tabla formateada + export (en el hilo). El export se corta si se cancela la pregunta."""
+    def _progreso(_filas: int):
+        if cancelada.is_set():
+            raise ConsultaCancelada()
+
+    tabla = resultado.formateado
+    if cancelada.is_set():
+        raise ConsultaCancelada()
+    export = exportar_bloques(
+        resultado.bloques() if resultado.bloques else resultado,
+        formato=formato,
+        nombre="resultado",
+        progreso=_progreso,
+    )
+    return {"tabla": tabla, "export": export}
+
+
+async def responder(
+    pregunta: str,
+    sesion_id: str,
+    router: Callable,
+    formato_export: str = "xlsx",
+) -> dict:
+    """
+    Corre router(pregunta) y prepara tabla + export sin bloquear el loop.
+    Devuelve {"respuesta", "resultado" (ResultadoConsulta o None),
+              "tabla" (DataFrame formateado o None), "export" (dict de exportar o None)}.
+    """
+    ses = _sesion(sesion_id)
+    tarea = asyncio.current_task()
+    cancelada = threading.Event()
+    ses.tareas.add(tarea)
+    ses.tokens.add(cancelada)
+    try:
+        async with ses.cupo:
+            respuesta, df = normalizar_salida(await en_hilo(router, pregunta))
+
+            out = {"respuesta": respuesta, "resultado": None, "tabla": None, "export": None}
+            if isinstance(df, (pd.DataFrame, ResultadoConsulta)):
+                resultado = como_resultado(df)
+                out["resultado"] = resultado
+                if not resultado.empty:
+                    out.update(await en_hilo(_preparar_resultado, resultado, formato_export, cancelada))
+            return out
+    finally:
+        ses.tareas.discard(tarea)
+        ses.tokens.discard(cancelada)
+
+
+def cancelar(sesion_id: str) -> int:
+    """Cancela lo que esté corriendo para la sesión. Devuelve cuántas tareas se cancelaron."""
+    ses = _SESIONES.get(sesion_id)
+    if ses is None:
+        return 0
+    for token in list(ses.tokens):
+        token.set()
+    n = 0
+    for tarea in list(ses.tareas):
+        if not tarea.done():
+            tarea.cancel()
+            n += 1
+    return n
+
+
+def cerrar_sesion(sesion_id: str) -> None:
+    """Fin del chat: cancela y olvida la sesión."""
+    cancelar(sesion_id)
+    _SESIONES.pop(sesion_id, None)
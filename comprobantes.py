@@ -3,12 +3,17 @@
 # Archivo: comprobantes.py
 # =====================================================================
 
+import re
+import time
+import threading
+
 import streamlit as st
 import pandas as pd
 from datetime import date, datetime
 from typing import Optional, Dict, Any, List
 
 from supabase_client import supabase
+from sql_stock_escritura import aplicar_lineas_stock
 
 # =====================================================================
 # CONFIG
@@ -87,17 +92,20 @@ def _cache_stock() -> pd.DataFrame:
     return _fetch_all_table("stock")
 
 
-def _articulos_preparados() -> pd.DataFrame:
-    """
-    Devuelve df con columnas: _id, _codigo_int, _desc, _familia
-    usando los nombres reales que existan en Supabase.
-    """
-    df = _cache_articulos()
-    if df.empty:
-        return df
+def _texto_filtro(texto: str) -> str:
+    """Texto de búsqueda apto para un filtro or=(...) de PostgREST."""
+    return re.sub(r'[,()*%"\\]', " ", str(texto or "")).strip()
 
-    cols = list(df.columns)
 
+# =====================================================================
+# ARTÍCULOS: BÚSQUEDA EN EL SERVIDOR
+# =====================================================================
+# En vez de traer toda la tabla (hasta 50k filas) para filtrar acá, cada
+# búsqueda pide solo las 4 columnas que usa el selector y hasta 50 filas.
+# Los nombres reales de columnas (con espacios / acentos) se descubren una
+# vez con una fila de muestra.
+
+def _mapa_columnas_articulos(cols: List[str]) -> Dict[str, Optional[str]]:
     def pick_col(prefer: List[str]) -> Optional[str]:
         for c in prefer:
             if c in cols:
@@ -110,32 +118,202 @@ def _articulos_preparados() -> pd.DataFrame:
     col_cod_int = pick_col(["Código Int.", "Codigo Int.", "Código Int", "Codigo Int", "codigo_int", "CODIGO_INT", "codigo interno", "CODIGO"])
 
     # Si no encuentra, igual intenta seguir con lo que haya
-    if col_id is None:
+    if col_id is None and cols:
         # fallback: primer columna
         col_id = cols[0]
 
+    return {"_id": col_id, "_desc": col_desc, "_familia": col_fam, "_codigo_int": col_cod_int}
+
+
+def _articulos_a_df(df: pd.DataFrame, mapa: Dict[str, Optional[str]]) -> pd.DataFrame:
+    """Renombra a _id, _codigo_int, _desc, _familia (texto, sin nulos)."""
     out = pd.DataFrame()
-    out["_id"] = df[col_id].astype(str)
+    if df.empty:
+        return pd.DataFrame(columns=["_id", "_desc", "_familia", "_codigo_int"])
+    out["_id"] = df[mapa["_id"]].astype(str)
+    for k in ["_desc", "_familia", "_codigo_int"]:
+        out[k] = df[mapa[k]].fillna("").astype(str) if mapa[k] else ""
+    return out
 
-    out["_desc"] = df[col_desc].astype(str) if col_desc else ""
-    out["_familia"] = df[col_fam].astype(str) if col_fam else ""
-    out["_codigo_int"] = df[col_cod_int].astype(str) if col_cod_int else ""
 
-    # limpieza
-    out["_desc"] = out["_desc"].fillna("").astype(str)
-    out["_familia"] = out["_familia"].fillna("").astype(str)
-    out["_codigo_int"] = out["_codigo_int"].fillna("").astype(str)
+@st.cache_data(ttl=3600)
+def _columnas_articulos() -> List[str]:
+    resp = supabase.table("articulos").select("*").limit(1).execute()
+    filas = resp.data or []
+    return list(filas[0].keys()) if filas else []
 
-    return out
+
+def _q(col: str) -> str:
+    """Columna entre comillas para PostgREST (nombres con espacios / puntos)."""
+    return '"' + col.replace('"', '') + '"'
 
 
-def _stock_preparado() -> pd.DataFrame:
+@st.cache_data(ttl=300)
+def _buscar_articulos(texto: str = "", limite: int = 50, articulo_id: str = "") -> pd.DataFrame:
+    """
+    Búsqueda en articulos por código interno o descripción (ilike) con
+    proyección a las columnas del selector. Con articulo_id trae solo ese.
+    """
+    mapa = _mapa_columnas_articulos(_columnas_articulos())
+    if not mapa["_id"]:
+        return _articulos_a_df(pd.DataFrame(), mapa)
+
+    cols = [c for c in dict.fromkeys(mapa.values()) if c]
+    q = supabase.table("articulos").select(",".join(_q(c) for c in cols))
+
+    if articulo_id:
+        q = q.eq(_q(mapa["_id"]), articulo_id)
+    else:
+        t = _texto_filtro(texto)
+        busca_en = [c for c in (mapa["_codigo_int"], mapa["_desc"]) if c]
+        if t and busca_en:
+            q = q.or_(",".join(f"{_q(c)}.ilike.*{t}*" for c in busca_en))
+
+    resp = q.limit(int(limite)).execute()
+    return _articulos_a_df(pd.DataFrame(resp.data or []), mapa)
+
+
+def _articulos_preparados() -> pd.DataFrame:
     """
-    stock: columnas esperadas (según tu tabla): FAMILIA, CODIGO, ARTICULO, DEPOSITO, LOTE, VENCIMIENTO, STOCK
+    Devuelve df con columnas: _id, _codigo_int, _desc, _familia
+    usando los nombres reales que existan en Supabase (tabla completa;
+    solo como respaldo si la búsqueda en el servidor falla).
     """
-    df = _cache_stock()
+    df = _cache_articulos()
     if df.empty:
         return df
+    return _articulos_a_df(df, _mapa_columnas_articulos(list(df.columns)))
+
+
+# =====================================================================
+# STOCK: BÚSQUEDA PAGINADA + COPIA POR DEPÓSITO CON SYNC INCREMENTAL
+# =====================================================================
+# La vista stock (sql_stock_tipado) expone id y updated_at. Las búsquedas
+# filtran en el servidor (depósito / familia / código / texto), piden solo
+# las columnas necesarias y paginan por id (keyset: id > último visto, sin
+# OFFSET). Cada depósito se carga una vez y después solo se piden las filas
+# con updated_at posterior a la última vista; cada STOCK_RESYNC_SEG se
+# recarga entero (filas borradas).
+
+COLS_STOCK = ["id", "FAMILIA", "CODIGO", "ARTICULO", "DEPOSITO", "LOTE", "VENCIMIENTO", "STOCK", "updated_at"]
+
+_STOCK_PAGINA = 1000
+_STOCK_DELTA_SEG = 10         # como mucho un pedido de cambios cada 10 s por depósito
+_STOCK_RESYNC_SEG = 1800
+_STOCK_DELTA_MARGEN = pd.Timedelta(seconds=60)  # transacciones que commitean tarde
+
+_STOCK_MEM: Dict[str, Dict[str, Any]] = {}
+_STOCK_MEM_LOCK = threading.Lock()
+
+
+def buscar_stock(
+    deposito: Optional[str] = None,
+    familia: Optional[str] = None,
+    codigo: Optional[str] = None,
+    texto: str = "",
+    columnas: Optional[List[str]] = None,
+    limite: Optional[int] = None,
+    cambiado_desde: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Stock filtrado en el servidor, paginado por id.
+    texto busca en CODIGO / ARTICULO (ilike); cambiado_desde filtra por
+    updated_at. columnas siempre incluye id (lo usa la paginación).
+    """
+    cols = list(dict.fromkeys(["id"] + list(columnas or COLS_STOCK)))
+    t = _texto_filtro(texto)
+
+    filas: List[Dict[str, Any]] = []
+    ultimo = None
+    while True:
+        pagina = _STOCK_PAGINA if limite is None else min(_STOCK_PAGINA, int(limite) - len(filas))
+        if pagina <= 0:
+            break
+
+        q = supabase.table("stock").select(",".join(cols))
+        if deposito:
+            q = q.eq("DEPOSITO", deposito)
+        if familia:
+            q = q.eq("FAMILIA", familia)
+        if codigo:
+            q = q.eq("CODIGO", codigo)
+        if t:
+            q = q.or_(f"CODIGO.ilike.*{t}*,ARTICULO.ilike.*{t}*")
+        if cambiado_desde:
+            q = q.gt("updated_at", cambiado_desde)
+        if ultimo is not None:
+            q = q.gt("id", ultimo)
+
+        batch = q.order("id").limit(pagina).execute().data or []
+        filas.extend(batch)
+        if len(batch) < pagina:
+            break
+        ultimo = batch[-1]["id"]
+
+    return pd.DataFrame(filas, columns=cols)
+
+
+def _max_updated(df: pd.DataFrame) -> Optional[pd.Timestamp]:
+    if df.empty or "updated_at" not in df.columns:
+        return None
+    ts = pd.to_datetime(df["updated_at"], errors="coerce", utc=True).max()
+    return None if pd.isna(ts) else ts
+
+
+def _stock_deposito(deposito: str) -> pd.DataFrame:
+    """Copia en memoria del stock de un depósito, parcheada con los cambios."""
+    ahora = time.monotonic()
+    with _STOCK_MEM_LOCK:
+        e = _STOCK_MEM.get(deposito)
+
+    if e is not None and ahora - e["ts_delta"] < _STOCK_DELTA_SEG:
+        return e["df"]
+
+    if e is None or ahora - e["ts_full"] > _STOCK_RESYNC_SEG:
+        df = buscar_stock(deposito=deposito)
+        e = {"df": df, "hasta": _max_updated(df), "ts_full": ahora, "ts_delta": ahora}
+    else:
+        desde = (e["hasta"] - _STOCK_DELTA_MARGEN).isoformat() if e["hasta"] is not None else None
+        delta = buscar_stock(deposito=deposito, cambiado_desde=desde)
+        df = e["df"]
+        if not delta.empty:
+            df = pd.concat([df[~df["id"].isin(delta["id"])], delta], ignore_index=True)
+            df = df.sort_values("id", kind="stable").reset_index(drop=True)
+            hasta = _max_updated(delta)
+            if e["hasta"] is not None and (hasta is None or hasta < e["hasta"]):
+                hasta = e["hasta"]
+            e = dict(e, hasta=hasta)
+        e = dict(e, df=df, ts_delta=ahora)
+
+    with _STOCK_MEM_LOCK:
+        _STOCK_MEM[deposito] = e
+    return e["df"]
+
+
+def _marcar_stock_cambiado() -> None:
+    """Después de escribir: la próxima lectura de cada depósito pide los cambios."""
+    with _STOCK_MEM_LOCK:
+        for e in _STOCK_MEM.values():
+            e["ts_delta"] = float("-inf")
+
+
+def _stock_preparado(deposito: str) -> pd.DataFrame:
+    """
+    stock del depósito: columnas esperadas (según tu tabla): FAMILIA, CODIGO, ARTICULO, DEPOSITO, LOTE, VENCIMIENTO, STOCK
+    (+ id si la vista lo expone)
+    """
+    try:
+        df = _stock_deposito(deposito)
+    except Exception as e:
+        # tabla stock sin id / updated_at (antes de sql_stock_tipado): tabla completa
+        print(f"⚠️ Stock paginado no disponible, leo la tabla completa: {e}")
+        df = _cache_stock()
+        if not df.empty and "DEPOSITO" in df.columns:
+            df = df[df["DEPOSITO"].astype(str) == str(deposito)]
+
+    if df.empty:
+        return df
+    df = df.copy()
 
     # aseguramos columnas (por si vinieran en minúsculas)
     ren = {}
@@ -156,156 +334,28 @@ def _stock_preparado() -> pd.DataFrame:
     return df
 
 
-def _upsert_stock_row(
-    deposito: str,
-    familia: str,
-    codigo: str,
-    articulo: str,
-    lote: str,
-    vencimiento: str,
-    delta_stock: float,
-) -> None:
+def _aplicar_lineas_stock(lineas: List[Dict[str, Any]], estricto: bool = False) -> List[Dict[str, Any]]:
     """
-    Inserta o actualiza en stock sumando delta_stock (puede ser + o -).
-    Detecta nombres reales de columnas en Supabase (mayúsculas/acentos) para evitar APIError.
+    Aplica todas las líneas del comprobante sobre stock en una sola
+    transacción (fertichat_aplicar_stock, ver sql_stock_escritura).
+    Cada línea: deposito, familia, codigo, articulo, lote, vencimiento, delta.
+    Devuelve stock_antes / stock_despues por línea.
     """
-
-    def _norm(s: str) -> str:
-        if s is None:
-            return ""
-        s = str(s).strip().lower()
-        # quitar acentos básico
-        s = (s.replace("á", "a").replace("é", "e").replace("í", "i")
-               .replace("ó", "o").replace("ú", "u").replace("ñ", "n"))
-        # dejar solo alfanum
-        out = []
-        for ch in s:
-            if ch.isalnum():
-                out.append(ch)
-        return "".join(out)
-
-    # -------------------------
-    # Resolver mapeo de columnas reales (una vez por sesión)
-    # -------------------------
-    if "_stock_colmap" not in st.session_state:
-        keys: List[str] = []
-        try:
-            sample = supabase.table("stock").select("*").limit(1).execute().data or []
-            if sample:
-                keys = list(sample[0].keys())
-        except Exception:
-            keys = []
-
-        nk = {_norm(k): k for k in keys}
-
-        def resolve(logical: str, candidates: List[str]) -> str:
-            # match exacto
-            for c in candidates:
-                if c in keys:
-                    return c
-            # match normalizado
-            for c in candidates:
-                nc = _norm(c)
-                if nc in nk:
-                    return nk[nc]
-            # fallback: probar logical tal cual
-            return logical
-
-        st.session_state["_stock_colmap"] = {
-            "FAMILIA": resolve("FAMILIA", ["FAMILIA", "familia", "Familia"]),
-            "CODIGO": resolve("CODIGO", ["CODIGO", "codigo", "Código", "Codigo"]),
-            "ARTICULO": resolve("ARTICULO", ["ARTICULO", "articulo", "Artículo", "Articulo"]),
-            "DEPOSITO": resolve("DEPOSITO", ["DEPOSITO", "deposito", "Depósito", "Deposito"]),
-            "LOTE": resolve("LOTE", ["LOTE", "lote", "Lote"]),
-            "VENCIMIENTO": resolve("VENCIMIENTO", ["VENCIMIENTO", "vencimiento", "Vencimiento"]),
-            "STOCK": resolve("STOCK", ["STOCK", "stock", "Stock"]),
-        }
-
-    colmap = st.session_state["_stock_colmap"]
-
-    cFAM = colmap["FAMILIA"]
-    cCOD = colmap["CODIGO"]
-    cART = colmap["ARTICULO"]
-    cDEP = colmap["DEPOSITO"]
-    cLOT = colmap["LOTE"]
-    cVEN = colmap["VENCIMIENTO"]
-    cSTK = colmap["STOCK"]
-
-    lote_val = (lote or "").strip()
-    venc_val = (vencimiento or "").strip()
-
-    # -------------------------
-    # Buscar fila existente (si existe)
-    # -------------------------
     try:
-        q = (
-            supabase.table("stock")
-            .select("*")
-            .eq(cDEP, deposito)
-            .eq(cCOD, codigo)
-            .eq(cLOT, lote_val)
-            .eq(cVEN, venc_val)
-        )
-        resp = q.execute()
-        rows = resp.data or []
+        resultado = aplicar_lineas_stock(lineas, estricto=estricto)
+    except ValueError:
+        raise
     except Exception as e:
         raise Exception(
-            "Error consultando 'stock' en Supabase. "
-            "Probable: nombres de columnas distintos o RLS bloqueando SELECT. "
+            "Error aplicando el comprobante sobre 'stock'. "
+            "No se modificó ninguna línea. "
             f"Detalle: {e}"
         ) from e
 
-    # -------------------------
-    # Update o Insert
-    # -------------------------
-    if rows:
-        try:
-            current = _safe_float(rows[0].get(cSTK, "0"))
-            new_val = current + float(delta_stock)
-            if new_val < 0:
-                new_val = 0.0
-
-            supabase.table("stock").update(
-                {
-                    cFAM: familia,
-                    cART: articulo,
-                    cSTK: new_val,
-                }
-            ).eq(cDEP, deposito).eq(cCOD, codigo).eq(cLOT, lote_val).eq(cVEN, venc_val).execute()
-
-        except Exception as e:
-            raise Exception(
-                "Error actualizando 'stock' en Supabase. "
-                "Probable: RLS bloqueando UPDATE o tipos/columnas no coinciden. "
-                f"Detalle: {e}"
-            ) from e
-
-    else:
-        # si delta es negativo y no existe fila, no insertamos
-        if float(delta_stock) <= 0:
-            return
-
-        try:
-            supabase.table("stock").insert(
-                {
-                    cFAM: familia,
-                    cCOD: codigo,
-                    cART: articulo,
-                    cDEP: deposito,
-                    cLOT: lote_val,
-                    cVEN: venc_val,
-                    cSTK: float(delta_stock),
-                }
-            ).execute()
-        except Exception as e:
-            raise Exception(
-                "Error insertando en 'stock' en Supabase. "
-                "Probable: RLS bloqueando INSERT o columnas NOT NULL faltantes. "
-                f"Detalle: {e}"
-            ) from e
-
-    # refresca cache
+    # refresca copias una vez por comprobante (sql_core ya se invalidó)
     _cache_stock.clear()
+    _marcar_stock_cambiado()
+    return resultado
 
 
 # =====================================================================
@@ -466,37 +516,45 @@ def _fetch_historial_items(comprobante_id: int) -> pd.DataFrame:
 # UI: COMPONENTE FILTRO ARTÍCULOS (DESDE TABLA ARTICULOS)
 # =====================================================================
 
-def _selector_articulo_articulos(row_idx: int, df_art: pd.DataFrame) -> Optional[Dict[str, str]]:
+def _selector_articulo_articulos(row_idx: int) -> Optional[Dict[str, str]]:
     """
-    Selector por Id desde 'articulos' con búsqueda por código interno o descripción.
+    Selector por Id desde 'articulos' con búsqueda por código interno o descripción
+    (filtrada en el servidor, ver _buscar_articulos).
     Devuelve dict: {id, codigo_int, desc, familia} o None.
     """
-    if df_art.empty:
-        st.warning("No hay artículos en Supabase (tabla articulos vacía).")
-        return None
-
     buscar = st.text_input(
         "Buscar (código interno o descripción)",
         key=f"alta_buscar_{row_idx}",
         placeholder="Ej: 12345 o 'tubo'...",
     ).strip().lower()
 
-    tmp = df_art.copy()
-    if buscar:
-        tmp = tmp[
-            tmp["_codigo_int"].str.lower().str.contains(buscar, na=False)
-            | tmp["_desc"].str.lower().str.contains(buscar, na=False)
-        ].head(50)
-    else:
+    current_id = st.session_state.get(f"alta_art_id_{row_idx}", "")
+
+    try:
+        tmp = _buscar_articulos(buscar, 50)
+        cur_row = _buscar_articulos(articulo_id=str(current_id)) if current_id else tmp.iloc[0:0]
+        if tmp.empty and not buscar:
+            st.warning("No hay artículos en Supabase (tabla articulos vacía).")
+            return None
+    except Exception as e:
+        # respaldo: tabla completa filtrada acá, como antes
+        print(f"⚠️ Búsqueda de artículos en el servidor falló, uso la tabla completa: {e}")
+        df_art = _articulos_preparados()
+        if df_art.empty:
+            st.warning("No hay artículos en Supabase (tabla articulos vacía).")
+            return None
+        tmp = df_art
+        if buscar:
+            tmp = tmp[
+                tmp["_codigo_int"].str.lower().str.contains(buscar, na=False)
+                | tmp["_desc"].str.lower().str.contains(buscar, na=False)
+            ]
         tmp = tmp.head(50)
+        cur_row = df_art[df_art["_id"] == str(current_id)] if current_id else df_art.iloc[0:0]
 
     # Siempre incluir el seleccionado actual si existe, para no romper el selectbox
-    current_id = st.session_state.get(f"alta_art_id_{row_idx}", "")
-    if current_id:
-        if not (tmp["_id"] == str(current_id)).any():
-            cur_row = df_art[df_art["_id"] == str(current_id)]
-            if not cur_row.empty:
-                tmp = pd.concat([cur_row, tmp], ignore_index=True)
+    if current_id and not (tmp["_id"] == str(current_id)).any() and not cur_row.empty:
+        tmp = pd.concat([cur_row, tmp], ignore_index=True)
 
     options = tmp["_id"].astype(str).tolist()
     if not options:
@@ -520,7 +578,7 @@ def _selector_articulo_articulos(row_idx: int, df_art: pd.DataFrame) -> Optional
         key=f"alta_art_id_{row_idx}",
     )
 
-    row = df_art[df_art["_id"] == str(sel)]
+    row = tmp[tmp["_id"] == str(sel)]
     if row.empty:
         return None
 
@@ -546,8 +604,6 @@ def mostrar_comprobante_alta_stock():
         key="alta_deposito_destino",
     )
 
-    df_art = _articulos_preparados()
-
     if "alta_items_count" not in st.session_state:
         st.session_state.alta_items_count = 1
 
@@ -576,7 +632,7 @@ def mostrar_comprobante_alta_stock():
                         st.session_state.alta_items_count -= 1
                         st.rerun()
 
-            art = _selector_articulo_articulos(i, df_art)
+            art = _selector_articulo_articulos(i)
 
             usa_lote = st.checkbox(
                 "Este artículo usa Lote y Vencimiento",
@@ -657,7 +713,7 @@ def mostrar_comprobante_alta_stock():
             st.error("No se puede confirmar:\n- " + "\n- ".join(errores))
             return
 
-        ok = 0
+        lineas: List[Dict[str, Any]] = []
         hist_items: List[Dict[str, Any]] = []
 
         for it in items_to_process:
@@ -675,14 +731,16 @@ def mostrar_comprobante_alta_stock():
             lote = it["lote"] if it["usa_lote"] else ""
             venc = it["venc"] if it["usa_lote"] else ""
 
-            _upsert_stock_row(
-                deposito=deposito_destino,
-                familia=fam,
-                codigo=codigo,
-                articulo=desc,
-                lote=lote,
-                vencimiento=venc,
-                delta_stock=float(it["cantidad"]),
+            lineas.append(
+                {
+                    "deposito": deposito_destino,
+                    "familia": fam,
+                    "codigo": codigo,
+                    "articulo": desc,
+                    "lote": lote,
+                    "vencimiento": venc,
+                    "delta": float(it["cantidad"]),
+                }
             )
 
             hist_items.append(
@@ -697,7 +755,14 @@ def mostrar_comprobante_alta_stock():
                 }
             )
 
-            ok += 1
+        # todas las líneas en una transacción: o entra el comprobante entero o nada
+        try:
+            _aplicar_lineas_stock(lineas)
+        except Exception as e:
+            st.error(f"No se pudo aplicar el alta. {e}")
+            return
+
+        ok = len(lineas)
 
         # -------------------------
         # HISTORIAL + MENSAJE FINAL
@@ -754,8 +819,7 @@ def mostrar_comprobante_baja_stock():
         key="baja_motivo",
     )
 
-    df_stock = _stock_preparado()
-    df_dep = df_stock[df_stock["DEPOSITO"] == deposito_origen].copy()
+    df_dep = _stock_preparado(deposito_origen)
 
     if df_dep.empty:
         st.info("No hay stock para ese depósito.")
@@ -862,17 +926,26 @@ def mostrar_comprobante_baja_stock():
             st.error("No podés bajar más que el stock disponible.")
             return
 
-        delta = -float(cant)
-
-        _upsert_stock_row(
-            deposito=deposito_origen,
-            familia=str(chosen.get("FAMILIA", "") or ""),
-            codigo=str(chosen.get("CODIGO", "") or ""),
-            articulo=str(chosen.get("ARTICULO", "") or ""),
-            lote=str(chosen.get("LOTE", "") or ""),
-            vencimiento=str(chosen.get("VENCIMIENTO", "") or ""),
-            delta_stock=delta,
-        )
+        # estricto: si otro usuario bajó el lote mientras tanto, no queda negativo
+        try:
+            _aplicar_lineas_stock(
+                [
+                    {
+                        "id": chosen.get("id"),
+                        "deposito": deposito_origen,
+                        "familia": str(chosen.get("FAMILIA", "") or ""),
+                        "codigo": str(chosen.get("CODIGO", "") or ""),
+                        "articulo": str(chosen.get("ARTICULO", "") or ""),
+                        "lote": str(chosen.get("LOTE", "") or ""),
+                        "vencimiento": str(chosen.get("VENCIMIENTO", "") or ""),
+                        "delta": -float(cant),
+                    }
+                ],
+                estricto=True,
+            )
+        except Exception as e:
+            st.error(f"No se pudo aplicar la baja. {e}")
+            return
 
         # Historial BAJA (no rompe si falla)
         try:
@@ -930,8 +1003,7 @@ def mostrar_comprobante_movimiento():
         st.warning("El depósito destino debe ser distinto al origen.")
         return
 
-    df_stock = _stock_preparado()
-    df_dep = df_stock[df_stock["DEPOSITO"] == deposito_origen].copy()
+    df_dep = _stock_preparado(deposito_origen)
 
     if df_dep.empty:
         st.info("No hay stock para el depósito origen.")
@@ -1038,25 +1110,26 @@ def mostrar_comprobante_movimiento():
             st.error("No podés mover más que el stock disponible.")
             return
 
-        _upsert_stock_row(
-            deposito=deposito_origen,
-            familia=str(chosen.get("FAMILIA", "") or ""),
-            codigo=str(chosen.get("CODIGO", "") or ""),
-            articulo=str(chosen.get("ARTICULO", "") or ""),
-            lote=str(chosen.get("LOTE", "") or ""),
-            vencimiento=str(chosen.get("VENCIMIENTO", "") or ""),
-            delta_stock=-float(cant),
-        )
+        linea = {
+            "familia": str(chosen.get("FAMILIA", "") or ""),
+            "codigo": str(chosen.get("CODIGO", "") or ""),
+            "articulo": str(chosen.get("ARTICULO", "") or ""),
+            "lote": str(chosen.get("LOTE", "") or ""),
+            "vencimiento": str(chosen.get("VENCIMIENTO", "") or ""),
+        }
 
-        _upsert_stock_row(
-            deposito=deposito_destino,
-            familia=str(chosen.get("FAMILIA", "") or ""),
-            codigo=str(chosen.get("CODIGO", "") or ""),
-            articulo=str(chosen.get("ARTICULO", "") or ""),
-            lote=str(chosen.get("LOTE", "") or ""),
-            vencimiento=str(chosen.get("VENCIMIENTO", "") or ""),
-            delta_stock=float(cant),
-        )
+        # origen y destino en la misma transacción
+        try:
+            _aplicar_lineas_stock(
+                [
+                    {**linea, "id": chosen.get("id"), "deposito": deposito_origen, "delta": -float(cant)},
+                    {**linea, "deposito": deposito_destino, "delta": float(cant)},
+                ],
+                estricto=True,
+            )
+        except Exception as e:
+            st.error(f"No se pudo aplicar el movimiento. {e}")
+            return
 
         # Historial MOV (no rompe si falla)
         try:
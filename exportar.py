@@ -0,0 +1,279 @@
+# =========================
+# EXPORTAR.PY - EXPORTACIÓN EN BLOQUES (XLSX / CSV / PARQUET)
+# =========================
+"""
+Exportación de resultados sin armar el archivo en memoria.
+
+Los bloques (DataFrames) salen de un cursor del servidor
+(ejecutar_consulta_stream, iter_compras_anio, iter_valuacion...) y se
+escriben de a uno en un archivo temporal:
+
+- xlsx:    openpyxl write-only (utils_format.escribir_xlsx)
+- csv:     separador ';' y coma decimal (abre bien en Excel en español)
+- parquet: pyarrow.ParquetWriter, un row group por bloque (requiere pyarrow)
+
+Al terminar se decide por tamaño: hasta EXPORT_INLINE_MAX_MB el archivo
+se lee y se borra (descarga directa, st.download_button / cl.File con
+content); más grande queda en disco y se devuelve la ruta.
+
+    res = exportar_consulta(sql, params, formato="csv", progreso=print)
+    res["datos"] or res["ruta"]
+
+Ejecutar:  python exportar.py compras 2025 compras_2025.xlsx   (o .csv / .parquet)
+"""
+
+import os
+import sys
+import tempfile
+from typing import Callable, Iterable, Optional, Union
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from sql_core import ejecutar_consulta_stream, _pool_setting, _str_setting
+from utils_format import escribir_xlsx, ResultadoConsulta
+
+EXPORT_INLINE_MAX_MB = _pool_setting("EXPORT_INLINE_MAX_MB", 20)
+EXPORT_DIR = _str_setting("EXPORT_DIR", "") or tempfile.gettempdir()
+
+FORMATOS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# =====================================================================
+# ESCRITORES POR FORMATO
+# =====================================================================
+
+def _escribir_csv(bloques: Iterable[pd.DataFrame], ruta: str, progreso=None) -> int:
+    total = 0
+    encabezado = True
+    with open(ruta, "w", encoding="utf-8-sig", newline="") as f:
+        for bloque in bloques:
+            bloque.to_csv(f, index=False, header=encabezado, sep=";", decimal=",")
+            encabezado = False
+            total += len(bloque)
+            if progreso:
+                progreso(total)
+    return total
+
+
+# Bloques que se esperan antes de abrir el ParquetWriter si alguna columna
+# vino toda NULL (Arrow la tipa `null` y los bloques siguientes no entran)
+_PARQUET_BLOQUES_ESPERA = 8
+
+
+def _sin_tipo(esquema) -> bool:
+    return any(pa.types.is_null(f.type) for f in esquema)
+
+
+def _unificar(tablas: list):
+    esquemas = [t.schema for t in tablas]
+    try:
+        return pa.unify_schemas(esquemas, promote_options="permissive")
+    except TypeError:
+        # pyarrow < 14: solo promueve null -> tipo
+        return pa.unify_schemas(esquemas)
+
+
+def _esquema_parquet(tablas: list):
+    """Esquema común de los bloques leídos; lo que sigue sin tipo (todo NULL) va como texto."""
+    esquema = _unificar(tablas)
+    campos = [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in esquema]
+    return pa.schema(campos, metadata=esquema.metadata)
+
+
+def _tabla_bloque(bloque: pd.DataFrame):
+    """Tabla Arrow del bloque; una columna toda NULL queda `null` (sin tipo) aunque pandas la traiga como float."""
+    tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+    n = tabla.num_rows
+    for i, col in enumerate(tabla.columns):
+        if n and col.null_count == n and not pa.types.is_null(col.type):
+            tabla = tabla.set_column(i, pa.field(tabla.schema.field(i).name, pa.null()), pa.nulls(n))
+    return tabla
+
+
+def _tabla_con_esquema(bloque: pd.DataFrame, esquema):
+    try:
+        return pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # columna que se fijó como texto (venía toda NULL) y ahora trae otro tipo
+        bloque = bloque.copy()
+        for f in esquema:
+            if (pa.types.is_string(f.type) or pa.types.is_large_string(f.type)) and f.name in bloque.columns:
+                col = bloque[f.name]
+                bloque[f.name] = col.astype(str).astype(object).where(col.notna(), None)
+        return pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False)
+
+
+def _escribir_parquet(bloques: Iterable[pd.DataFrame], ruta: str, progreso=None) -> int:
+    if pq is None:
+        raise ImportError("pyarrow no instalado: usá formato='xlsx' o 'csv'")
+
+    total = 0
+    writer = None
+    espera = []  # tablas leídas antes de fijar el esquema
+
+    def _abrir():
+        esquema = _esquema_parquet(espera)
+        w = pq.ParquetWriter(ruta, esquema, compression="zstd")
+        for t in espera:
+            w.write_table(t.cast(esquema))
+        espera.clear()
+        return w
+
+    try:
+        for bloque in bloques:
+            if writer is None:
+                espera.append(_tabla_bloque(bloque))
+                if not _sin_tipo(_unificar(espera)) or len(espera) >= _PARQUET_BLOQUES_ESPERA:
+                    writer = _abrir()
+            else:
+                writer.write_table(_tabla_con_esquema(bloque, writer.schema))
+            total += len(bloque)
+            if progreso:
+                progreso(total)
+        if writer is None and espera:
+            writer = _abrir()
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        pq.write_table(pa.table({}), ruta)
+    return total
+
+
+_ESCRITORES = {
+    "xlsx": escribir_xlsx,
+    "csv": _escribir_csv,
+    "parquet": _escribir_parquet,
+}
+
+
+# =====================================================================
+# API
+# =====================================================================
+
+def _como_bloques(datos) -> Iterable[pd.DataFrame]:
+    if isinstance(datos, ResultadoConsulta):
+        return [datos.df]
+    if isinstance(datos, pd.DataFrame):
+        return [datos]
+    return datos
+
+
+def exportar_bloques(
+    datos: Union[pd.DataFrame, ResultadoConsulta, Iterable[pd.DataFrame]],
+    formato: str = "xlsx",
+    nombre: str = "resultado",
+    ruta: Optional[str] = None,
+    progreso: Optional[Callable[[int], None]] = None,
+    inline_max_mb: Optional[int] = None,
+) -> dict:
+    """
+    Escribe `datos` (DataFrame, ResultadoConsulta o bloques) en `formato`.
+
+    Con `ruta` escribe ahí y no devuelve los bytes. Sin `ruta` escribe en
+    un temporal de EXPORT_DIR y, si no pasa de inline_max_mb
+    (EXPORT_INLINE_MAX_MB), lo lee y lo borra.
+
+    Devuelve {"formato", "nombre", "mime", "filas", "bytes",
+              "datos" (bytes o None), "ruta" (str o None)}.
+    Los errores de la consulta se propagan y el temporal se borra.
+    """
+    formato = (formato or "xlsx").lower()
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato '{formato}' no soportado (xlsx, csv, parquet)")
+
+    archivo = f"{nombre}.{formato}"
+    temporal = ruta is None
+    if temporal:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        fd, ruta = tempfile.mkstemp(prefix=f"{nombre}_", suffix=f".{formato}", dir=EXPORT_DIR)
+        os.close(fd)
+
+    try:
+        filas = _ESCRITORES[formato](_como_bloques(datos), ruta, progreso)
+    except BaseException:
+        if temporal and os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+
+    tam = os.path.getsize(ruta)
+    out = {
+        "formato": formato,
+        "nombre": archivo,
+        "mime": FORMATOS[formato],
+        "filas": filas,
+        "bytes": tam,
+        "datos": None,
+        "ruta": ruta,
+    }
+
+    limite = EXPORT_INLINE_MAX_MB if inline_max_mb is None else inline_max_mb
+    if temporal and tam <= limite * 1024 * 1024:
+        with open(ruta, "rb") as f:
+            out["datos"] = f.read()
+        os.remove(ruta)
+        out["ruta"] = None
+
+    print(f"📤 Export {archivo}: {filas} filas, {tam / 1024 / 1024:.1f} MB"
+          f"{' (en disco: ' + out['ruta'] + ')' if out['ruta'] else ''}")
+    return out
+
+
+def exportar_consulta(
+    query: str,
+    params: tuple = None,
+    formato: str = "xlsx",
+    nombre: str = "resultado",
+    ruta: Optional[str] = None,
+    progreso: Optional[Callable[[int], None]] = None,
+    itersize: int = None,
+) -> dict:
+    """exportar_bloques directo desde un cursor del servidor (sin LIMIT, sin caché)."""
+    bloques = ejecutar_consulta_stream(query, params, itersize=itersize)
+    return exportar_bloques(bloques, formato=formato, nombre=nombre, ruta=ruta, progreso=progreso)
+
+
+def progreso_streamlit(total_estimado: Optional[int] = None, texto: str = "Exportando"):
+    """Callback de progreso para exportar_*: barra si se conoce el total, si no un texto."""
+    import streamlit as st
+
+    if total_estimado:
+        barra = st.progress(0.0, text=texto)
+
+        def _cb(filas: int):
+            barra.progress(min(1.0, filas / total_estimado), text=f"{texto}: {filas:,} filas")
+    else:
+        caja = st.empty()
+
+        def _cb(filas: int):
+            caja.caption(f"{texto}: {filas:,} filas")
+
+    return _cb
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "compras":
+        from sql_compras import iter_compras_anio
+
+        anio = int(sys.argv[2])
+        destino = sys.argv[3] if len(sys.argv) > 3 else f"compras_{anio}.xlsx"
+        fmt = os.path.splitext(destino)[1].lstrip(".") or "xlsx"
+        res = exportar_bloques(
+            iter_compras_anio(anio), formato=fmt, ruta=destino,
+            progreso=lambda n: print(f"  ... {n} filas"),
+        )
+        print(f"✅ {res['filas']} filas en {destino}")
+    else:
+        print("Uso: python exportar.py compras 2025 compras_2025.xlsx")
@@ -9,7 +9,7 @@ from datetime import datetime
 
 # Importar conexión a DB (Supabase / Postgres)
 # (No cambiar: se asume que ya existe en tu proyecto)
-from sql_core import get_db_connection
+from sql_core import get_db_connection, conexion_db
 
 
 # =====================================================================
@@ -53,44 +53,23 @@ def _ensure_table_familias() -> None:
 
 
 def _read_df(sql: str, params: tuple = ()) -> pd.DataFrame:
-    conn = None
     try:
-        conn = get_db_connection()
-        df = pd.read_sql_query(sql, conn, params=params)
-        return df
+        with conexion_db() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
     except Exception as e:
         st.error(f"Error leyendo DB: {e}")
         return pd.DataFrame()
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
 
 
 def _exec(sql: str, params: tuple = ()) -> bool:
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute(sql, params)
-        conn.commit()
+        with conexion_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
         return True
     except Exception as e:
-        try:
-            if conn:
-                conn.rollback()
-        except Exception:
-            pass
         st.error(f"Error ejecutando SQL: {e}")
         return False
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
 
 
 # =====================================================================
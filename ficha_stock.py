@@ -9,6 +9,7 @@ from datetime import datetime, date
 from typing import List, Dict, Any, Optional
 
 from supabase_client import supabase
+from kardex import calcular_kardex_promedio_movil, kardex_articulo
 
 
 # =====================================================================
@@ -104,86 +105,8 @@ def _fetch_movimientos(
         return []
 
 
-def _calcular_kardex_promedio_movil(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Calcula:
-    - qty_in / qty_out
-    - costo_promedio móvil
-    - costo_unit_aplicado en BAJAS (usa costo_promedio previo)
-    - valor_mov (positivo entradas / negativo salidas)
-    - saldo_qty / saldo_valor
-    """
-    if df.empty:
-        return df
-
-    df = df.copy()
-
-    # Normaliza fecha
-    if "fecha_hora" in df.columns:
-        df["fecha_hora_dt"] = df["fecha_hora"].apply(_to_datetime_safe)
-    else:
-        df["fecha_hora_dt"] = None
-
-    # qty_base
-    if "qty_base" not in df.columns:
-        df["qty_base"] = 0
-    df["qty_base"] = df["qty_base"].apply(_safe_float)
-
-    # Entradas / salidas
-    df["qty_in"] = df["qty_base"].apply(lambda x: x if x > 0 else 0)
-    df["qty_out"] = df["qty_base"].apply(lambda x: abs(x) if x < 0 else 0)
-
-    # Precio entrada
-    if "precio_unit_aplicado" not in df.columns:
-        df["precio_unit_aplicado"] = 0
-    df["precio_unit_aplicado"] = df["precio_unit_aplicado"].apply(_safe_float)
-
-    saldo_qty = 0.0
-    saldo_valor = 0.0
-    costo_prom = 0.0
-
-    costo_unit_baja: List[float] = []
-    valor_mov: List[float] = []
-    saldo_qty_list: List[float] = []
-    saldo_valor_list: List[float] = []
-    costo_prom_list: List[float] = []
-
-    for _, r in df.iterrows():
-        qty = _safe_float(r.get("qty_base", 0))
-        precio_in = _safe_float(r.get("precio_unit_aplicado", 0))
-        costo_previo = costo_prom
-
-        if qty > 0:
-            v = qty * precio_in
-            saldo_qty += qty
-            saldo_valor += v
-        elif qty < 0:
-            q_out = abs(qty)
-            v = -1 * q_out * costo_previo
-            saldo_qty -= q_out
-            saldo_valor += v
-        else:
-            v = 0.0
-
-        if saldo_qty > 0:
-            costo_prom = saldo_valor / saldo_qty
-        else:
-            costo_prom = 0.0
-            saldo_valor = 0.0
-
-        costo_unit_baja.append(costo_previo if qty < 0 else 0.0)
-        valor_mov.append(v)
-        saldo_qty_list.append(saldo_qty)
-        saldo_valor_list.append(saldo_valor)
-        costo_prom_list.append(costo_prom)
-
-    df["costo_unit_aplicado"] = costo_unit_baja
-    df["valor_mov"] = valor_mov
-    df["saldo_qty"] = saldo_qty_list
-    df["saldo_valor"] = saldo_valor_list
-    df["costo_promedio"] = costo_prom_list
-
-    return df
+# Motor compartido con los snapshots de kardex.py
+_calcular_kardex_promedio_movil = calcular_kardex_promedio_movil
 
 
 # =====================================================================
@@ -292,19 +215,31 @@ def mostrar_ficha_stock():
     # -------------------------
     # Datos: movimientos
     # -------------------------
-    movs = _fetch_movimientos(articulo_id, fecha_desde, fecha_hasta)
-
-    if not movs:
+    info = None
+    try:
+        df_k, info = kardex_articulo(articulo_id, fecha_desde, fecha_hasta)
+    except Exception as e:
+        print(f"⚠️ Kardex con snapshots no disponible, reproduzco desde Supabase: {e}")
+        df_k = None
+
+    if df_k is None:
+        movs = _fetch_movimientos(articulo_id, fecha_desde, fecha_hasta)
+        df = pd.DataFrame(movs)
+        if "fecha_hora" in df.columns:
+            df["fecha_hora_dt"] = df["fecha_hora"].apply(_to_datetime_safe)
+            df = df.sort_values(by=["fecha_hora_dt", "id"], ascending=[True, True], na_position="last")
+        df_k = _calcular_kardex_promedio_movil(df)
+
+    if df_k.empty:
         st.warning("No hay movimientos para este artículo en el rango seleccionado.")
         return
 
-    df = pd.DataFrame(movs)
-
-    if "fecha_hora" in df.columns:
-        df["fecha_hora_dt"] = df["fecha_hora"].apply(_to_datetime_safe)
-        df = df.sort_values(by=["fecha_hora_dt", "id"], ascending=[True, True], na_position="last")
-
-    df_k = _calcular_kardex_promedio_movil(df)
+    if info:
+        ini = info["saldo_inicial"]
+        texto = f"Saldo inicial: **{_fmt_num(ini['saldo_qty'], 2)}** • $ {_fmt_num(ini['saldo_valor'], 2)}"
+        if info["desde_snapshot"] is not None:
+            texto += f" • desde snapshot al {_to_datetime_safe(info['desde_snapshot']):%d/%m/%Y %H:%M}"
+        st.caption(texto)
 
     # -------------------------
     # Resumen
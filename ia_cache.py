@@ -0,0 +1,223 @@
+# =========================
+# IA_CACHE.PY - CACHÉ DE INTERPRETACIONES
+# =========================
+"""
+Memo de interpretar_pregunta / _interpretar_con_openai.
+
+Clave: espacio ("interpretar" / "openai") + pregunta normalizada +
+bucket de fecha (día: "este mes", "hoy" cambian con la fecha) + versión
+del catálogo de proveedores/artículos (si cambia la lista de Supabase
+cambia el match de entidades).
+
+- LRU acotada por cantidad de entradas
+- negativos: "no_entendido" también se guarda, con TTL corto
+- memoria siempre; opcionalmente persistida en SQLite (sobrevive reinicios
+  y se comparte entre workers del mismo host)
+
+Los valores se guardan como JSON: cada get() devuelve una copia nueva
+(los llamadores mutan los parámetros, ej. normalizar_parametros).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+TIPO_NEGATIVO = "no_entendido"
+
+
+def clave_pregunta(pregunta: str) -> str:
+    """
+    Normalización de la clave: minúsculas + espacios colapsados.
+    No se usa limpiar_consulta: los fast-paths del intérprete leen el
+    texto original (ej. "de", "todas"), así que dos preguntas que solo
+    difieren en palabras de ruido pueden interpretarse distinto.
+    """
+    return " ".join(str(pregunta or "").lower().split())
+
+
+def bucket_fecha(ahora: Optional[datetime] = None) -> str:
+    return (ahora or datetime.now()).strftime("%Y-%m-%d")
+
+
+def es_negativo(valor: Dict[str, Any]) -> bool:
+    return isinstance(valor, dict) and valor.get("tipo") == TIPO_NEGATIVO
+
+
+class CacheInterpretaciones:
+
+    def __init__(self, max_items: int = 2000, ttl: int = 24 * 60 * 60,
+                 ttl_negativo: int = 10 * 60, ruta: str = None):
+        self.max_items = max(1, int(max_items))
+        self.ttl = int(ttl)
+        self.ttl_negativo = int(ttl_negativo)
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "hits_negativos": 0, "guardadas": 0}
+        if ruta:
+            self._init_sqlite()
+
+    # -----------------------------------------------------------------
+    # SQLITE (OPCIONAL)
+    # -----------------------------------------------------------------
+    def _conn(self):
+        return sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+
+    def _init_sqlite(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+        db = self._conn()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS interpretaciones (
+                    clave TEXT PRIMARY KEY,
+                    valor TEXT NOT NULL,
+                    negativo INTEGER NOT NULL,
+                    creado REAL NOT NULL,
+                    usado REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS ix_interp_usado ON interpretaciones (usado)")
+        finally:
+            db.close()
+
+    def _leer_sqlite(self, clave: str):
+        db = self._conn()
+        try:
+            row = db.execute(
+                "SELECT valor, negativo, creado FROM interpretaciones WHERE clave = ?", (clave,)
+            ).fetchone()
+            if row is not None:
+                db.execute("UPDATE interpretaciones SET usado = ? WHERE clave = ?", (time.time(), clave))
+            return row
+        finally:
+            db.close()
+
+    def _escribir_sqlite(self, clave: str, valor: str, negativo: bool, creado: float) -> None:
+        db = self._conn()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT OR REPLACE INTO interpretaciones (clave, valor, negativo, creado, usado) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (clave, valor, int(negativo), creado, creado),
+            )
+            db.execute("""
+                DELETE FROM interpretaciones WHERE clave IN (
+                    SELECT clave FROM interpretaciones
+                    ORDER BY usado DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_items,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    # -----------------------------------------------------------------
+    # API
+    # -----------------------------------------------------------------
+    @staticmethod
+    def clave(espacio: str, pregunta: str, catalogo: str = "", fecha: str = None) -> str:
+        base = "\x00".join([espacio, clave_pregunta(pregunta), fecha or bucket_fecha(), catalogo or ""])
+        return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+    def _vigente(self, negativo: bool, creado: float) -> bool:
+        ttl = self.ttl_negativo if negativo else self.ttl
+        return (time.time() - creado) < ttl
+
+    def get(self, clave: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            e = self._entradas.get(clave)
+            if e is not None:
+                self._entradas.move_to_end(clave)
+
+        if e is None and self.ruta:
+            try:
+                e = self._leer_sqlite(clave)
+            except Exception as ex:
+                print(f"⚠️ Caché intérprete: error leyendo ({ex})")
+                e = None
+            if e is not None:
+                self._guardar_memoria(clave, e)
+
+        if e is None or not self._vigente(bool(e[1]), e[2]):
+            with self._lock:
+                self._stats["misses"] += 1
+                if e is not None:
+                    self._entradas.pop(clave, None)
+            return None
+
+        valor, negativo, _ = e
+        with self._lock:
+            self._stats["hits"] += 1
+            if negativo:
+                self._stats["hits_negativos"] += 1
+        return json.loads(valor)
+
+    def _guardar_memoria(self, clave: str, e: tuple) -> None:
+        with self._lock:
+            self._entradas[clave] = e
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_items:
+                self._entradas.popitem(last=False)
+
+    def put(self, clave: str, valor: Dict[str, Any]) -> None:
+        try:
+            serial = json.dumps(valor, ensure_ascii=False, default=str)
+        except Exception:
+            return
+        negativo = es_negativo(valor)
+        creado = time.time()
+        self._guardar_memoria(clave, (serial, negativo, creado))
+        with self._lock:
+            self._stats["guardadas"] += 1
+        if self.ruta:
+            try:
+                self._escribir_sqlite(clave, serial, negativo, creado)
+            except Exception as ex:
+                print(f"⚠️ Caché intérprete: error guardando ({ex})")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+        if self.ruta:
+            db = self._conn()
+            try:
+                db.execute("DELETE FROM interpretaciones")
+            finally:
+                db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["entradas"] = len(self._entradas)
+        total = out["hits"] + out["misses"]
+        out.update({
+            "hit_rate": round(out["hits"] / total, 3) if total else 0.0,
+            "max_items": self.max_items,
+            "backend": "sqlite" if self.ruta else "memoria",
+        })
+        return out
+
+
+def crear_cache_interpretaciones(backend: str = "memoria", max_items: int = 2000,
+                                 ttl_negativo: int = 600, ruta: str = None) -> Optional[CacheInterpretaciones]:
+    """backend: 'memoria' | 'sqlite' | 'off'. Devuelve None si está apagada."""
+    backend = (backend or "memoria").strip().lower()
+    if backend in ("off", "no", "0", "none", ""):
+        return None
+    if backend == "sqlite":
+        ruta = ruta or os.path.join(os.path.expanduser("~"), ".fertichat", "cache_interpretaciones.sqlite")
+        try:
+            return CacheInterpretaciones(max_items, ttl_negativo=ttl_negativo, ruta=ruta)
+        except Exception as e:
+            print(f"⚠️ Caché intérprete SQLite no disponible ({e}), uso memoria")
+    return CacheInterpretaciones(max_items, ttl_negativo=ttl_negativo)
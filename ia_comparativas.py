@@ -9,6 +9,8 @@ from typing import Dict, List, Tuple, Optional
 
 import streamlit as st
 
+from ia_indice import IndiceEntidades, indice_entidades
+
 MESES = {
     "enero": "01",
     "febrero": "02",
@@ -153,38 +155,14 @@ def _cargar_listas_supabase() -> Dict[str, List[str]]:
     articulos = sorted(list(set([a for a in articulos if a])))
     return {"proveedores": proveedores, "articulos": articulos}
 
-def _get_indices() -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+def _get_indices() -> Tuple[IndiceEntidades, IndiceEntidades]:
     listas = _cargar_listas_supabase()
-    prov = [(p, _key(p)) for p in (listas.get("proveedores") or []) if p]
-    art = [(a, _key(a)) for a in (listas.get("articulos") or []) if a]
+    prov = indice_entidades(listas.get("proveedores") or [])
+    art = indice_entidades(listas.get("articulos") or [])
     return prov, art
 
-def _match_best(texto: str, index: List[Tuple[str, str]], max_items: int = 1) -> List[str]:
-    toks = _tokens(texto)
-    if not toks or not index:
-        return []
-
-    # 1) substring + score (robusto)
-    candidatos = []
-    for orig, norm in index:
-        for tk in toks:
-            if tk and tk in norm:
-                score = (len(tk) * 1000) - len(norm)
-                candidatos.append((score, orig))
-
-    if not candidatos:
-        return []
-
-    candidatos.sort(key=lambda x: (-x[0], x[1]))
-    out = []
-    seen = set()
-    for _, orig in candidatos:
-        if orig not in seen:
-            seen.add(orig)
-            out.append(orig)
-        if len(out) >= max_items:
-            break
-    return out
+def _match_best(texto: str, index: IndiceEntidades, max_items: int = 1) -> List[str]:
+    return index.match_best(_tokens(texto), max_items=max_items, exacto=False)
 
 # =====================================================================
 # RESOLVER ALIASES DE PROVEEDOR
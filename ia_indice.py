@@ -0,0 +1,162 @@
+# =========================
+# IA_INDICE.PY - ÍNDICE DE ENTIDADES (PROVEEDORES / ARTÍCULOS)
+# =========================
+"""
+Índice inmutable para los _match_best de los intérpretes (ia_compras,
+ia_comparativas, ia_interpretador, ia_stock).
+
+- match exacto: hash clave -> posición
+- substring: índice invertido de trigramas; se intersectan las listas de
+  los trigramas del token y se verifica `tk in norm` solo en esos candidatos
+- ranking: mismo score de siempre, len(tk) * 1000 - len(norm),
+  desempate alfabético
+
+Se arma una vez por contenido de la lista (cuando se refresca la caché de
+Supabase) y lo comparten todos los intérpretes.
+"""
+
+import re
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+NGRAMA = 3
+_MAX_INDICES = 8
+
+
+def _strip_accents(s: str) -> str:
+    if not s:
+        return ""
+    return "".join(
+        c for c in unicodedata.normalize("NFD", s)
+        if unicodedata.category(c) != "Mn"
+    )
+
+
+def clave_entidad(s: str) -> str:
+    """Misma normalización que _key() de los intérpretes."""
+    s = _strip_accents((s or "").lower().strip())
+    return re.sub(r"[^a-z0-9]+", "", s)
+
+
+def _ngramas(s: str, n: int = NGRAMA) -> set:
+    return {s[i:i + n] for i in range(len(s) - n + 1)}
+
+
+class IndiceEntidades:
+    """
+    Iterable de (orig, norm) -> compatible con el código que recorre el
+    índice a mano (alias de proveedores en ia_comparativas).
+    """
+
+    __slots__ = ("_items", "_exactos", "_ngramas", "version")
+
+    def __init__(self, items: Iterable[Tuple[str, str]]):
+        self._items: Tuple[Tuple[str, str], ...] = tuple(items)
+        # Huella del contenido: cambia solo si cambia la lista
+        self.version = hashlib.sha1(
+            "\n".join(orig for orig, _ in self._items).encode("utf-8")
+        ).hexdigest()[:12]
+
+        exactos = {}
+        ngramas = defaultdict(set)
+        for pos, (_, norm) in enumerate(self._items):
+            exactos.setdefault(norm, pos)
+            for g in _ngramas(norm):
+                ngramas[g].add(pos)
+
+        self._exactos = exactos
+        self._ngramas = {g: frozenset(p) for g, p in ngramas.items()}
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def exacto(self, toks: Iterable[str]) -> Optional[str]:
+        """Primer elemento (en orden de lista) cuya clave es igual a algún token."""
+        posiciones = [self._exactos[t] for t in set(toks) if t in self._exactos]
+        if not posiciones:
+            return None
+        return self._items[min(posiciones)][0]
+
+    def contienen(self, tk: str) -> List[int]:
+        """Posiciones cuyo norm contiene tk."""
+        if not tk:
+            return []
+        if len(tk) < NGRAMA:
+            return [pos for pos, (_, norm) in enumerate(self._items) if tk in norm]
+
+        # Intersección empezando por el trigrama más raro
+        listas = []
+        for g in _ngramas(tk):
+            p = self._ngramas.get(g)
+            if not p:
+                return []
+            listas.append(p)
+        listas.sort(key=len)
+
+        cand = set(listas[0])
+        for p in listas[1:]:
+            cand &= p
+            if not cand:
+                return []
+        return [pos for pos in cand if tk in self._items[pos][1]]
+
+    def match_best(self, toks: List[str], max_items: int = 1, exacto: bool = True) -> List[str]:
+        if not toks or not self._items:
+            return []
+
+        if exacto:
+            hit = self.exacto(toks)
+            if hit is not None:
+                return [hit]
+
+        mejor = {}
+        for tk in toks:
+            for pos in self.contienen(tk):
+                orig, norm = self._items[pos]
+                score = (len(tk) * 1000) - len(norm)
+                if orig not in mejor or score > mejor[orig]:
+                    mejor[orig] = score
+
+        if not mejor:
+            return []
+
+        ranking = sorted(mejor.items(), key=lambda x: (-x[1], x[0]))
+        return [orig for orig, _ in ranking[:max(1, max_items)]]
+
+
+# =====================================================================
+# ÍNDICES COMPARTIDOS (UNO POR CONTENIDO DE LISTA)
+# =====================================================================
+
+_INDICES: "OrderedDict[tuple, IndiceEntidades]" = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def indice_entidades(nombres: Iterable[str]) -> IndiceEntidades:
+    """
+    Índice para una lista de nombres. Si la lista no cambió (misma caché de
+    Supabase) devuelve el mismo objeto, sin reconstruir.
+    """
+    clave = tuple(n for n in (nombres or []) if n)
+    with _LOCK:
+        idx = _INDICES.get(clave)
+        if idx is not None:
+            _INDICES.move_to_end(clave)
+            return idx
+
+    idx = IndiceEntidades((n, clave_entidad(n)) for n in clave)
+
+    with _LOCK:
+        _INDICES[clave] = idx
+        while len(_INDICES) > _MAX_INDICES:
+            _INDICES.popitem(last=False)
+    return idx
@@ -13,6 +13,9 @@ import streamlit as st
 from openai import OpenAI
 from config import OPENAI_MODEL
 
+from ia_indice import IndiceEntidades, indice_entidades
+from ia_cache import crear_cache_interpretaciones
+
 # =====================================================================
 # CONFIGURACIÓN OPENAI (opcional)
 # =====================================================================
@@ -22,6 +25,22 @@ client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 # Si querés "sacar OpenAI" para datos: dejalo False (recomendado).
 USAR_OPENAI_PARA_DATOS = False
 
+# =====================================================================
+# CACHÉ DE INTERPRETACIONES (memoria | sqlite | off)
+# =====================================================================
+def _setting(key: str, default):
+    try:
+        return st.secrets.get(key, os.getenv(key, default))
+    except Exception:
+        return os.getenv(key, default)
+
+_CACHE_INTERP = crear_cache_interpretaciones(
+    backend=str(_setting("IA_CACHE_BACKEND", "memoria")),
+    max_items=int(_setting("IA_CACHE_MAX_ITEMS", 2000)),
+    ttl_negativo=int(_setting("IA_CACHE_TTL_NEG", 600)),
+    ruta=str(_setting("IA_CACHE_PATH", "")) or None,
+)
+
 # =====================================================================
 # REGLAS FIJAS
 # =====================================================================
@@ -385,43 +404,18 @@ def _cargar_listas_supabase() -> Dict[str, List[str]]:
 
     return {"proveedores": proveedores, "articulos": articulos}
 
-def _get_indices() -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+def _get_indices() -> Tuple[IndiceEntidades, IndiceEntidades]:
     listas = _cargar_listas_supabase()
-    prov = [(p, _key(p)) for p in (listas.get("proveedores") or []) if p]
-    art = [(a, _key(a)) for a in (listas.get("articulos") or []) if a]
+    prov = indice_entidades(listas.get("proveedores") or [])
+    art = indice_entidades(listas.get("articulos") or [])
     return prov, art
 
-def _match_best(texto: str, index: List[Tuple[str, str]], max_items: int = 1) -> List[str]:
-    toks = _tokens(texto)
-    if not toks or not index:
-        return []
+def _version_catalogo() -> str:
+    prov, art = _get_indices()
+    return f"{prov.version}:{art.version}"
 
-    toks_set = set(toks)
-    for orig, norm in index:
-        if norm in toks_set:
-            return [orig]
-
-    candidatos: List[Tuple[int, str]] = []
-    for orig, norm in index:
-        for tk in toks:
-            if tk and tk in norm:
-                score = (len(tk) * 1000) - len(norm)
-                candidatos.append((score, orig))
-
-    if not candidatos:
-        return []
-
-    candidatos.sort(key=lambda x: (-x[0], x[1]))
-    out: List[str] = []
-    seen = set()
-    for _, orig in candidatos:
-        if orig not in seen:
-            seen.add(orig)
-            out.append(orig)
-        if len(out) >= max_items:
-            break
-
-    return out
+def _match_best(texto: str, index: IndiceEntidades, max_items: int = 1) -> List[str]:
+    return index.match_best(_tokens(texto), max_items=max_items)
 
 # =====================================================================
 # PARSEO DE PARÁMETROS: Mes a Meses
@@ -504,6 +498,20 @@ def _interpretar_con_openai(pregunta: str) -> Optional[Dict]:
     if not (client and USAR_OPENAI_PARA_DATOS):
         return None
 
+    # El prompt solo depende de la fecha: no hace falta versión de catálogo
+    clave = _CACHE_INTERP.clave("openai", pregunta) if _CACHE_INTERP else None
+    if clave:
+        out = _CACHE_INTERP.get(clave)
+        if out is not None:
+            print(f"\n[INTÉRPRETE] ⚡ OpenAI desde caché: {out.get('tipo')}")
+            return out
+
+    out = _llamar_openai(pregunta)
+    if clave and out.get("debug") != "openai error":
+        _CACHE_INTERP.put(clave, out)
+    return out
+
+def _llamar_openai(pregunta: str) -> Dict:
     try:
         response = client.chat.completions.create(
             model=OPENAI_MODEL,
@@ -640,7 +648,36 @@ def interpretar_pregunta(pregunta: str) -> Dict[str, Any]:
     Interpretador canónico (Agentic AI):
     - Detecta intención y extrae parámetros sin inventar.
     - NO ejecuta SQL, solo devuelve {tipo, parametros}.
+    - Memo por (pregunta normalizada, día, versión de catálogo), ver ia_cache.
     """
+    if _CACHE_INTERP is None or not pregunta or not str(pregunta).strip():
+        return _interpretar_pregunta(pregunta)
+
+    clave = _CACHE_INTERP.clave("interpretar", str(pregunta), _version_catalogo())
+    out = _CACHE_INTERP.get(clave)
+    if out is not None:
+        print(f"\n[INTÉRPRETE] ⚡ CACHÉ {out.get('tipo')}")
+        try:
+            st.session_state["DBG_INT_LAST"] = {
+                "pregunta": str(pregunta).strip(),
+                "tipo": out.get("tipo"),
+                "parametros": out.get("parametros", {}),
+                "debug": out.get("debug", ""),
+            }
+        except Exception:
+            pass
+        return out
+
+    out = _interpretar_pregunta(pregunta)
+    if isinstance(out, dict) and out.get("debug") != "openai error":
+        _CACHE_INTERP.put(clave, out)
+    return out
+
+def get_cache_interpretaciones_stats() -> dict:
+    """hits / misses / hit_rate / entradas de la caché del intérprete."""
+    return _CACHE_INTERP.stats() if _CACHE_INTERP else {"backend": "off"}
+
+def _interpretar_pregunta(pregunta: str) -> Dict[str, Any]:
     if not pregunta or not str(pregunta).strip():
         return {"tipo": "no_entendido", "parametros": {}, "debug": "pregunta vacía"}
 
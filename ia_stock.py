@@ -9,6 +9,8 @@ from typing import Dict, List, Tuple
 
 import streamlit as st
 
+from ia_indice import IndiceEntidades, indice_entidades
+
 MAX_ARTICULOS = 5
 
 # =====================================================================
@@ -64,41 +66,12 @@ def _cargar_listas_supabase() -> Dict[str, List[str]]:
     articulos = sorted(list(set([a for a in articulos if a])))
     return {"articulos": articulos}
 
-def _get_art_index() -> List[Tuple[str, str]]:
+def _get_art_index() -> IndiceEntidades:
     listas = _cargar_listas_supabase()
-    return [(a, _key(a)) for a in (listas.get("articulos") or []) if a]
-
-def _match_best(texto: str, index: List[Tuple[str, str]], max_items: int = 1) -> List[str]:
-    toks = _tokens(texto)
-    if not toks or not index:
-        return []
-
-    toks_set = set(toks)
-    for orig, norm in index:
-        if norm in toks_set:
-            return [orig]
-
-    candidatos: List[Tuple[int, str]] = []
-    for orig, norm in index:
-        for tk in toks:
-            if tk and tk in norm:
-                score = (len(tk) * 1000) - len(norm)
-                candidatos.append((score, orig))
+    return indice_entidades(listas.get("articulos") or [])
 
-    if not candidatos:
-        return []
-
-    candidatos.sort(key=lambda x: (-x[0], x[1]))
-    out: List[str] = []
-    seen = set()
-    for _, orig in candidatos:
-        if orig not in seen:
-            seen.add(orig)
-            out.append(orig)
-        if len(out) >= max_items:
-            break
-
-    return out
+def _match_best(texto: str, index: IndiceEntidades, max_items: int = 1) -> List[str]:
+    return index.match_best(_tokens(texto), max_items=max_items)
 
 # =====================================================================
 # INTÉRPRETE STOCK
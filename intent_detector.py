@@ -6,7 +6,8 @@
 
 import re
 import unicodedata
-from typing import Dict, List, Tuple, Optional
+from functools import cached_property, lru_cache
+from typing import Callable, Dict, Iterable, List, Tuple, Optional, Pattern
 from datetime import datetime, timedelta
 
 
@@ -77,42 +78,110 @@ PALABRAS_STOCK = [
 ]
 
 
+# =====================================================================
+# REGEX Y TABLAS PRECOMPILADAS
+# =====================================================================
+# Todo lo que antes se armaba/compilaba en cada llamada se arma una vez
+# al importar. Las búsquedas "alguna de estas frases está en el texto"
+# se compilan a una sola alternancia (mismo resultado que any(p in texto)).
+
+def _alternativas(frases: Iterable[str]) -> Pattern:
+    return re.compile("|".join(re.escape(f) for f in frases))
+
+
+_MESES_MAP = {
+    'enero': 1, 'ene': 1,
+    'febrero': 2, 'feb': 2,
+    'marzo': 3, 'mar': 3,
+    'abril': 4, 'abr': 4,
+    'mayo': 5, 'may': 5,
+    'junio': 6, 'jun': 6,
+    'julio': 7, 'jul': 7,
+    'agosto': 8, 'ago': 8,
+    'septiembre': 9, 'sep': 9, 'sept': 9, 'set': 9,
+    'octubre': 10, 'oct': 10,
+    'noviembre': 11, 'nov': 11,
+    'diciembre': 12, 'dic': 12
+}
+
+# Para meses como palabra completa (acepta "setiembre")
+_MESES_MAP_PALABRA = dict(_MESES_MAP, setiembre=9)
+
+_MESES_NOMBRES = frozenset({
+    'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+    'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
+})
+_PERIODOS_RELATIVOS = frozenset({'este', 'esta', 'mes', 'pasado', 'pasada', 'hoy', 'ayer', 'semana'})
+
+_RE_ANIO = re.compile(r'\b(20\d{2})\b')
+_RE_ANIO_FULL = re.compile(r'20\d{2}')
+_RE_MES_KEY_FULL = re.compile(r'20\d{2}-(0[1-9]|1[0-2])')
+_RE_BORDES = re.compile(r'^[^\w]+|[^\w]+$')
+_RE_SPLIT_Y = re.compile(r'\s*,\s*|\s+y\s+')
+_RE_SPLIT_LISTA = re.compile(r'\s*,\s*|\s+y\s+|\s+e\s+|\s*&\s*')
+
+_RE_MES_CON_ANIO = {
+    mes: re.compile(rf'{mes}\s*(?:de\s*)?(20\d{{2}})') for mes in _MESES_MAP
+}
+_RE_MES_PALABRA = re.compile(
+    r'\b(' + '|'.join(re.escape(m) for m in sorted(_MESES_MAP_PALABRA, key=len, reverse=True)) + r')\b'
+)
+
+_RE_FAMILIAS_TAIL = re.compile(r'(secciones|seccion|familias|familia)\s+(.+)$')
+_RE_SPLIT_MES_KEY = re.compile(r'\b(20\d{2}-(0[1-9]|1[0-2]))\b')
+_RE_SPLIT_MESES = re.compile("(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)")
+_RE_SPLIT_TOKENS = re.compile(r'[\s,]+')
+
+_EXCLUIR_PROVEEDOR = frozenset(PALABRAS_EXCLUIR_PROVEEDOR)
+_KW_COMPARACION = _alternativas(PALABRAS_COMPARACION)
+_KW_STOCK = _alternativas(PALABRAS_STOCK)
+_KW_DOLARES = _alternativas(['dolares', 'dolar', 'usd', 'u$s'])
+_KW_PESOS = _alternativas(['pesos', '$'])
+
+
+@lru_cache(maxsize=32)
+def _patron_valores_multiples(tipo: str) -> Pattern:
+    return re.compile(
+        rf'{tipo}(?:es|s)?\s+([a-z0-9,\s\.\-]+?)(?:\s+(?:enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre|este|mes|pasado|del|de|en|20\d{{2}}|comparar|gastos|compras|detalle|factura|vs)|$)'
+    )
+
+
+def _como_set(palabras) -> frozenset:
+    if isinstance(palabras, frozenset):
+        return palabras
+    return frozenset(palabras)
+
+
 # =====================================================================
 # HELPERS DE EXTRACCIÓN
 # =====================================================================
+# Cada helper público recibe el texto crudo (como siempre); la versión
+# *_norm recibe el texto ya normalizado y es la que usa el motor.
 
 def _es_token_mes_o_periodo(tok: str) -> bool:
     """Detecta si un token es un mes o período temporal"""
     t = normalizar_texto(tok or "")
 
-    meses = {
-        'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
-        'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
-    }
-    if t in meses:
+    if t in _MESES_NOMBRES:
         return True
 
-    if t in {'este', 'esta', 'mes', 'pasado', 'pasada', 'hoy', 'ayer', 'semana'}:
+    if t in _PERIODOS_RELATIVOS:
         return True
 
-    if re.fullmatch(r'20\d{2}-(0[1-9]|1[0-2])', t):
+    if _RE_MES_KEY_FULL.fullmatch(t):
         return True
 
-    if re.fullmatch(r'20\d{2}', t):
+    if _RE_ANIO_FULL.fullmatch(t):
         return True
 
     return False
 
 
-def extraer_valores_multiples(texto: str, tipo: str) -> List[str]:
-    """Extrae valores múltiples (proveedor/articulo/familia) del texto"""
-    texto_norm = normalizar_texto(texto)
-
-    patron = rf'{tipo}(?:es|s)?\s+([a-z0-9,\s\.\-]+?)(?:\s+(?:enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre|este|mes|pasado|del|de|en|20\d{{2}}|comparar|gastos|compras|detalle|factura|vs)|$)'
-    match = re.search(patron, texto_norm)
+def _valores_multiples_norm(texto_norm: str, tipo: str) -> List[str]:
+    match = _patron_valores_multiples(tipo).search(texto_norm)
     if match:
         valores_str = match.group(1).strip()
-        valores = re.split(r'\s*,\s*|\s+y\s+', valores_str)
+        valores = _RE_SPLIT_Y.split(valores_str)
         valores = [v.strip() for v in valores if v.strip() and len(v.strip()) > 1]
         valores = [v for v in valores if not _es_token_mes_o_periodo(v)]
         return valores
@@ -120,60 +189,40 @@ def extraer_valores_multiples(texto: str, tipo: str) -> List[str]:
     return []
 
 
-def _extraer_patron_libre(texto: str, excluir_palabras: List[str] = None) -> str:
-    """Extrae patrón libre eliminando palabras clave"""
-    if excluir_palabras is None:
-        excluir_palabras = PALABRAS_EXCLUIR_PROVEEDOR
-
-    txt = normalizar_texto(texto)
-    txt = txt.replace("última", "ultima")
-
-    tokens = txt.split()
-    resto = []
+def extraer_valores_multiples(texto: str, tipo: str) -> List[str]:
+    """Extrae valores múltiples (proveedor/articulo/familia) del texto"""
+    return _valores_multiples_norm(normalizar_texto(texto), tipo)
 
-    for t in tokens:
-        if t not in excluir_palabras and not re.fullmatch(r'20\d{2}', t):
-            resto.append(t)
 
+def _patron_libre_norm(texto_norm: str, excluir: frozenset) -> str:
+    resto = [
+        t for t in texto_norm.split()
+        if t not in excluir and not _RE_ANIO_FULL.fullmatch(t)
+    ]
     patron = ' '.join(resto).strip()
-    patron = re.sub(r'^[^\w]+|[^\w]+$', '', patron)
+    return _RE_BORDES.sub('', patron)
 
-    return patron
+
+def _extraer_patron_libre(texto: str, excluir_palabras: List[str] = None) -> str:
+    """Extrae patrón libre eliminando palabras clave"""
+    excluir = _EXCLUIR_PROVEEDOR if excluir_palabras is None else _como_set(excluir_palabras)
+    return _patron_libre_norm(normalizar_texto(texto), excluir)
 
 
 def extraer_anios(texto: str) -> List[int]:
     """Extrae años del texto"""
-    anios = re.findall(r'\b(20\d{2})\b', texto)
-    return sorted(set(int(a) for a in anios))
-
-
-def _extraer_mes_key(texto: str) -> Optional[str]:
-    """Extrae mes_key en formato YYYY-MM"""
-    texto_norm = normalizar_texto(texto)
+    return sorted(set(int(a) for a in _RE_ANIO.findall(texto)))
 
-    meses_map = {
-        'enero': 1, 'ene': 1,
-        'febrero': 2, 'feb': 2,
-        'marzo': 3, 'mar': 3,
-        'abril': 4, 'abr': 4,
-        'mayo': 5, 'may': 5,
-        'junio': 6, 'jun': 6,
-        'julio': 7, 'jul': 7,
-        'agosto': 8, 'ago': 8,
-        'septiembre': 9, 'sep': 9, 'sept': 9, 'set': 9,
-        'octubre': 10, 'oct': 10,
-        'noviembre': 11, 'nov': 11,
-        'diciembre': 12, 'dic': 12
-    }
 
+def _mes_key_norm(texto_norm: str) -> Optional[str]:
     anio = None
     mes = None
 
-    match_anio = re.search(r'\b(20\d{2})\b', texto_norm)
+    match_anio = _RE_ANIO.search(texto_norm)
     if match_anio:
         anio = int(match_anio.group(1))
 
-    for mes_nombre, mes_num in meses_map.items():
+    for mes_nombre, mes_num in _MESES_MAP.items():
         if mes_nombre in texto_norm:
             mes = mes_num
             break
@@ -186,78 +235,61 @@ def _extraer_mes_key(texto: str) -> Optional[str]:
     return None
 
 
-def extraer_meses_para_comparacion(texto: str) -> List[Tuple[int, int, str]]:
-    """
-    Extrae meses con su año para comparaciones.
-    Retorna lista de tuplas (año, mes_numero, mes_key)
-    """
-    texto_norm = normalizar_texto(texto)
-    hoy = datetime.now()
-
-    meses_map = {
-        'enero': 1, 'ene': 1,
-        'febrero': 2, 'feb': 2,
-        'marzo': 3, 'mar': 3,
-        'abril': 4, 'abr': 4,
-        'mayo': 5, 'may': 5,
-        'junio': 6, 'jun': 6,
-        'julio': 7, 'jul': 7,
-        'agosto': 8, 'ago': 8,
-        'septiembre': 9, 'sep': 9, 'sept': 9, 'set': 9,
-        'octubre': 10, 'oct': 10,
-        'noviembre': 11, 'nov': 11,
-        'diciembre': 12, 'dic': 12
-    }
+def _extraer_mes_key(texto: str) -> Optional[str]:
+    """Extrae mes_key en formato YYYY-MM"""
+    return _mes_key_norm(normalizar_texto(texto))
 
-    # Extraer el año global del texto (si existe)
+
+def _meses_comparacion_norm(texto_norm: str) -> List[Tuple[int, int, str]]:
     anio_global = None
-    match_anio = re.search(r'\b(20\d{2})\b', texto_norm)
+    match_anio = _RE_ANIO.search(texto_norm)
     if match_anio:
         anio_global = int(match_anio.group(1))
 
     resultados = []
     meses_encontrados = set()
 
-    for mes_nombre, mes_num in meses_map.items():
-        if mes_nombre in texto_norm:
-            if mes_num not in meses_encontrados:
-                meses_encontrados.add(mes_num)
-
-                patron_con_anio = rf'{mes_nombre}\s*(?:de\s*)?(20\d{{2}})'
-                match_especifico = re.search(patron_con_anio, texto_norm)
+    for mes_nombre, mes_num in _MESES_MAP.items():
+        if mes_num in meses_encontrados or mes_nombre not in texto_norm:
+            continue
+        meses_encontrados.add(mes_num)
 
-                if match_especifico:
-                    anio = int(match_especifico.group(1))
-                elif anio_global:
-                    anio = anio_global
-                else:
-                    anio = hoy.year
+        match_especifico = _RE_MES_CON_ANIO[mes_nombre].search(texto_norm)
+        if match_especifico:
+            anio = int(match_especifico.group(1))
+        elif anio_global:
+            anio = anio_global
+        else:
+            anio = datetime.now().year
 
-                mes_key = f"{anio}-{mes_num:02d}"
-                resultados.append((anio, mes_num, mes_key))
+        resultados.append((anio, mes_num, f"{anio}-{mes_num:02d}"))
 
     resultados.sort(key=lambda x: (x[0], x[1]))
-
     return resultados
 
 
+def extraer_meses_para_comparacion(texto: str) -> List[Tuple[int, int, str]]:
+    """
+    Extrae meses con su año para comparaciones.
+    Retorna lista de tuplas (año, mes_numero, mes_key)
+    """
+    return _meses_comparacion_norm(normalizar_texto(texto))
+
+
 def _extraer_lista_familias(texto: str) -> List[str]:
     """Extrae lista de familias (1-6 chars, ej: G, FB, ID)"""
-    raw = str(texto).strip()
-    txt = normalizar_texto(raw)
+    txt = normalizar_texto(str(texto).strip())
 
-    m = re.search(r'(secciones|seccion|familias|familia)\s+(.+)$', txt)
+    m = _RE_FAMILIAS_TAIL.search(txt)
     if not m:
         return []
 
     tail = m.group(2)
-    tail = re.split(r'\b(20\d{2}-(0[1-9]|1[0-2]))\b', tail)[0]
-    meses_nombres = "(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)"
-    tail = re.split(meses_nombres, tail)[0]
+    tail = _RE_SPLIT_MES_KEY.split(tail)[0]
+    tail = _RE_SPLIT_MESES.split(tail)[0]
 
-    tokens = re.split(r'[\s,]+', tail)
     out = []
-    for t in tokens:
+    for t in _RE_SPLIT_TOKENS.split(tail):
         t = t.strip()
         if not t or _es_token_mes_o_periodo(t):
             continue
@@ -266,13 +298,7 @@ def _extraer_lista_familias(texto: str) -> List[str]:
         if 1 <= len(t) <= 6:
             out.append(t.upper())
 
-    seen = set()
-    res = []
-    for x in out:
-        if x not in seen:
-            seen.add(x)
-            res.append(x)
-    return res
+    return list(dict.fromkeys(out))
 
 
 # =====================================================================
@@ -281,12 +307,12 @@ def _extraer_lista_familias(texto: str) -> List[str]:
 
 def _es_comparacion(texto_norm: str) -> bool:
     """Detecta si el texto pide una comparación"""
-    return any(p in texto_norm for p in PALABRAS_COMPARACION)
+    return _KW_COMPARACION.search(texto_norm) is not None
 
 
 def _extraer_proveedor_limpio(texto: str) -> str:
     """Extrae el proveedor limpiando todas las palabras innecesarias"""
-    return _extraer_patron_libre(texto, PALABRAS_EXCLUIR_PROVEEDOR)
+    return _extraer_patron_libre(texto, _EXCLUIR_PROVEEDOR)
 
 
 def _extraer_mes_keys_multiples(texto: str) -> List[str]:
@@ -300,72 +326,44 @@ def _split_lista_libre(valores_str: str) -> List[str]:
     if not valores_str:
         return []
     s = normalizar_texto(valores_str)
-    partes = re.split(r'\s*,\s*|\s+y\s+|\s+e\s+|\s*&\s*', s)
     out = []
-    for p in partes:
+    for p in _RE_SPLIT_LISTA.split(s):
         p = p.strip(" .;:|/\\-").strip()
         if not p:
             continue
         if _es_token_mes_o_periodo(p):
             continue
-        if p in PALABRAS_EXCLUIR_PROVEEDOR:
+        if p in _EXCLUIR_PROVEEDOR:
             continue
         if len(p) <= 1:
             continue
         out.append(p)
-    seen = set()
-    res = []
-    for x in out:
-        if x not in seen:
-            seen.add(x)
-            res.append(x)
-    return res
+    return list(dict.fromkeys(out))
 
 
 def _extraer_proveedores_multiples_libre(texto: str) -> List[str]:
     """Extrae proveedores aunque el usuario NO escriba 'proveedor'."""
-    patron_raw = _extraer_patron_libre(texto, PALABRAS_EXCLUIR_PROVEEDOR)
+    patron_raw = _extraer_patron_libre(texto, _EXCLUIR_PROVEEDOR)
     if not patron_raw:
         return []
     return _split_lista_libre(patron_raw)
 
 
-def _extraer_meses_numeros_en_orden(texto: str) -> List[int]:
-    """Extrae meses (números) respetando el orden de aparición en el texto."""
-    texto_norm = normalizar_texto(texto)
-
-    meses_map = {
-        'enero': 1, 'ene': 1,
-        'febrero': 2, 'feb': 2,
-        'marzo': 3, 'mar': 3,
-        'abril': 4, 'abr': 4,
-        'mayo': 5, 'may': 5,
-        'junio': 6, 'jun': 6,
-        'julio': 7, 'jul': 7,
-        'agosto': 8, 'ago': 8,
-        'septiembre': 9, 'sep': 9, 'sept': 9, 'set': 9, 'setiembre': 9,
-        'octubre': 10, 'oct': 10,
-        'noviembre': 11, 'nov': 11,
-        'diciembre': 12, 'dic': 12
-    }
-
-    ocurrencias: List[Tuple[int, int]] = []
-    for alias, num in meses_map.items():
-        for m in re.finditer(rf'\b{re.escape(alias)}\b', texto_norm):
-            ocurrencias.append((m.start(), num))
-
-    ocurrencias.sort(key=lambda x: x[0])
-
+def _meses_numeros_norm(texto_norm: str) -> List[int]:
+    # Una sola pasada: los alias van con \b, así que cada palabra matchea a lo sumo uno
     meses = []
-    seen = set()
-    for _, num in ocurrencias:
-        if num not in seen:
-            seen.add(num)
+    for m in _RE_MES_PALABRA.finditer(texto_norm):
+        num = _MESES_MAP_PALABRA[m.group(1)]
+        if num not in meses:
             meses.append(num)
-
     return meses
 
 
+def _extraer_meses_numeros_en_orden(texto: str) -> List[int]:
+    """Extrae meses (números) respetando el orden de aparición en el texto."""
+    return _meses_numeros_norm(normalizar_texto(texto))
+
+
 def _generar_periodos_mes_keys(anios: List[int], meses_nums: List[int], anio_default: int) -> List[str]:
     """Genera lista de 'YYYY-MM' combinando meses y años."""
     if not meses_nums:
@@ -376,41 +374,110 @@ def _generar_periodos_mes_keys(anios: List[int], meses_nums: List[int], anio_def
 
     anios = sorted(set(int(a) for a in anios))
 
-    out: List[str] = []
-    for a in anios:
-        for m in meses_nums:
-            out.append(f"{a}-{int(m):02d}")
+    out = [f"{a}-{int(m):02d}" for a in anios for m in meses_nums]
+    return list(dict.fromkeys(out))
 
-    seen = set()
-    res = []
-    for x in out:
-        if x not in seen:
-            seen.add(x)
-            res.append(x)
-    return res
+
+# =====================================================================
+# RASGOS DE LA PREGUNTA (SE CALCULAN UNA VEZ)
+# =====================================================================
+
+class RasgosPregunta:
+    """
+    Pregunta normalizada una sola vez. Los rasgos caros (años, meses,
+    proveedor limpio, ...) se calculan la primera vez que una regla los
+    pide y quedan cacheados para el resto de las reglas.
+    """
+
+    def __init__(self, texto: str):
+        self.texto = "" if texto is None else str(texto)
+        self.norm = normalizar_texto(texto)
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        return self.norm.split()
+
+    @cached_property
+    def anios(self) -> List[int]:
+        # Igual que extraer_anios(texto): sobre el texto crudo
+        return extraer_anios(self.texto)
+
+    @cached_property
+    def anios_norm(self) -> List[int]:
+        return sorted({int(y) for y in _RE_ANIO.findall(self.norm)})
+
+    @cached_property
+    def mes_key(self) -> Optional[str]:
+        return _mes_key_norm(self.norm)
+
+    @cached_property
+    def meses_nums(self) -> List[int]:
+        return _meses_numeros_norm(self.norm)
+
+    @cached_property
+    def meses_comparacion(self) -> List[Tuple[int, int, str]]:
+        return _meses_comparacion_norm(self.norm)
+
+    @cached_property
+    def prov_limpio(self) -> str:
+        return _patron_libre_norm(self.norm, _EXCLUIR_PROVEEDOR)
+
+    @cached_property
+    def proveedores_libre(self) -> List[str]:
+        return _split_lista_libre(self.prov_limpio) if self.prov_limpio else []
+
+    @cached_property
+    def es_comparacion(self) -> bool:
+        return _es_comparacion(self.norm)
+
+    @cached_property
+    def moneda(self) -> Optional[str]:
+        if _KW_DOLARES.search(self.norm):
+            return 'U$S'
+        if _KW_PESOS.search(self.norm):
+            return '$'
+        return None
+
+    def patron_libre(self, excluir: frozenset) -> str:
+        return _patron_libre_norm(self.norm, excluir)
+
+    def valores_multiples(self, tipo: str) -> List[str]:
+        return _valores_multiples_norm(self.norm, tipo)
 
 
 # =====================================================================
 # DETECTOR DE INTENCIÓN DE STOCK
 # =====================================================================
 
+_FAMILIAS_CONOCIDAS = ['id', 'fb', 'g', 'hm', 'ur', 'bc', 'ch', 'mi', 'se', 'co']
+
+_KW_POR_VENCER = _alternativas(['por vencer', 'proximo a vencer', 'proximos a vencer', 'vence pronto', 'vencen pronto'])
+_KW_VENCIDOS = _alternativas(['vencido', 'vencidos', 'ya vencio', 'ya vencieron'])
+_KW_STOCK_BAJO = _alternativas(['stock bajo', 'poco stock', 'bajo stock', 'quedan pocos', 'se acaba', 'reponer', 'agotando'])
+_KW_STOCK_FAMILIA = _alternativas(['familia', 'familias', 'seccion', 'secciones', 'por familia', 'por seccion'])
+_KW_STOCK_DEPOSITO = _alternativas(['deposito', 'depositos', 'por deposito', 'ubicacion', 'almacen'])
+_KW_STOCK_ARTICULO = _alternativas(['stock', 'cuanto hay', 'cuantos hay', 'tenemos', 'disponible', 'hay'])
+_KW_STOCK_TOTAL = _alternativas(['stock total', 'todo el stock', 'resumen stock', 'stock general', 'inventario total'])
+_EXCLUIR_STOCK_ARTICULO = frozenset([
+    'stock', 'cuanto', 'cuantos', 'hay', 'de', 'del', 'tenemos', 'disponible',
+    'el', 'la', 'los', 'las', 'que', 'en', 'total', 'resumen'
+])
+_RE_DIAS = re.compile(r'(\d+)\s*dias?')
+_RE_LOTE = re.compile(r'lote\s+([A-Za-z0-9\-]+)')
+
+
 def _es_consulta_stock(texto_norm: str) -> bool:
     """Detecta si el texto es una consulta de stock"""
-    for palabra in PALABRAS_STOCK:
-        if palabra in texto_norm:
-            return True
-    return False
+    return _KW_STOCK.search(texto_norm) is not None
 
 
-def _detectar_intencion_stock(texto: str) -> Dict:
-    """Detecta la intención específica para consultas de stock"""
-    texto_lower = normalizar_texto(texto)
-    familias_conocidas = ['id', 'fb', 'g', 'hm', 'ur', 'bc', 'ch', 'mi', 'se', 'co']
+def _intencion_stock(r: RasgosPregunta) -> Dict:
+    texto_lower = r.norm
 
     # LOTES POR VENCER
-    if any(k in texto_lower for k in ['por vencer', 'proximo a vencer', 'proximos a vencer', 'vence pronto', 'vencen pronto']):
+    if _KW_POR_VENCER.search(texto_lower):
         dias = 90
-        match_dias = re.search(r'(\d+)\s*dias?', texto_lower)
+        match_dias = _RE_DIAS.search(texto_lower)
         if match_dias:
             dias = int(match_dias.group(1))
         return {
@@ -420,7 +487,7 @@ def _detectar_intencion_stock(texto: str) -> Dict:
         }
 
     # LOTES VENCIDOS
-    if any(k in texto_lower for k in ['vencido', 'vencidos', 'ya vencio', 'ya vencieron']):
+    if _KW_VENCIDOS.search(texto_lower):
         return {
             'tipo': 'stock_lotes_vencidos',
             'parametros': {},
@@ -428,7 +495,7 @@ def _detectar_intencion_stock(texto: str) -> Dict:
         }
 
     # STOCK BAJO
-    if any(k in texto_lower for k in ['stock bajo', 'poco stock', 'bajo stock', 'quedan pocos', 'se acaba', 'reponer', 'agotando']):
+    if _KW_STOCK_BAJO.search(texto_lower):
         return {
             'tipo': 'stock_bajo',
             'parametros': {},
@@ -436,7 +503,7 @@ def _detectar_intencion_stock(texto: str) -> Dict:
         }
 
     # BUSCAR LOTE ESPECÍFICO
-    match_lote = re.search(r'lote\s+([A-Za-z0-9\-]+)', texto_lower)
+    match_lote = _RE_LOTE.search(texto_lower)
     if match_lote:
         lote = match_lote.group(1).upper()
         return {
@@ -446,9 +513,9 @@ def _detectar_intencion_stock(texto: str) -> Dict:
         }
 
     # STOCK POR FAMILIA / SECCIÓN
-    if any(k in texto_lower for k in ['familia', 'familias', 'seccion', 'secciones', 'por familia', 'por seccion']):
-        for fam in familias_conocidas:
-            if fam in texto_lower.split():
+    if _KW_STOCK_FAMILIA.search(texto_lower):
+        for fam in _FAMILIAS_CONOCIDAS:
+            if fam in r.tokens:
                 return {
                     'tipo': 'stock_familia',
                     'parametros': {'familia': fam.upper()},
@@ -461,7 +528,7 @@ def _detectar_intencion_stock(texto: str) -> Dict:
         }
 
     # STOCK POR DEPÓSITO
-    if any(k in texto_lower for k in ['deposito', 'depositos', 'por deposito', 'ubicacion', 'almacen']):
+    if _KW_STOCK_DEPOSITO.search(texto_lower):
         return {
             'tipo': 'stock_por_deposito',
             'parametros': {},
@@ -469,13 +536,8 @@ def _detectar_intencion_stock(texto: str) -> Dict:
         }
 
     # STOCK DE ARTÍCULO ESPECÍFICO
-    if any(k in texto_lower for k in ['stock', 'cuanto hay', 'cuantos hay', 'tenemos', 'disponible', 'hay']):
-        palabras_excluir = ['stock', 'cuanto', 'cuantos', 'hay', 'de', 'del', 'tenemos', 'disponible',
-                           'el', 'la', 'los', 'las', 'que', 'en', 'total', 'resumen']
-        tokens = texto_lower.split()
-        articulo_tokens = [t for t in tokens if t not in palabras_excluir]
-        articulo = ' '.join(articulo_tokens).strip()
-
+    if _KW_STOCK_ARTICULO.search(texto_lower):
+        articulo = ' '.join(t for t in r.tokens if t not in _EXCLUIR_STOCK_ARTICULO).strip()
         if articulo and len(articulo) > 1:
             return {
                 'tipo': 'stock_articulo',
@@ -484,7 +546,7 @@ def _detectar_intencion_stock(texto: str) -> Dict:
             }
 
     # STOCK TOTAL
-    if any(k in texto_lower for k in ['stock total', 'todo el stock', 'resumen stock', 'stock general', 'inventario total']):
+    if _KW_STOCK_TOTAL.search(texto_lower):
         return {
             'tipo': 'stock_total',
             'parametros': {},
@@ -492,7 +554,7 @@ def _detectar_intencion_stock(texto: str) -> Dict:
         }
 
     # BÚSQUEDA GENERAL DE STOCK
-    articulo = _extraer_patron_libre(texto, PALABRAS_EXCLUIR_PROVEEDOR)
+    articulo = r.prov_limpio
     if articulo:
         return {
             'tipo': 'stock_articulo',
@@ -507,456 +569,525 @@ def _detectar_intencion_stock(texto: str) -> Dict:
     }
 
 
-# =====================================================================
-# DETECTOR DE INTENCIÓN PRINCIPAL
-# =====================================================================
+def _detectar_intencion_stock(texto: str) -> Dict:
+    """Detecta la intención específica para consultas de stock"""
+    return _intencion_stock(RasgosPregunta(texto))
 
-def detectar_intencion(texto: str) -> Dict:
-    """
-    Detecta intención con ORDEN DE PRIORIDAD claro
-    Retorna: {'tipo': 'xxx', 'parametros': {...}, 'debug': 'info'}
-    """
 
-    texto_norm = normalizar_texto(texto).replace("última", "ultima")
-    intencion = {'tipo': 'consulta_general', 'parametros': {}, 'debug': ''}
+# =====================================================================
+# REGLAS DEL DETECTOR PRINCIPAL (EN ORDEN DE PRIORIDAD)
+# =====================================================================
+# Cada regla recibe los rasgos y devuelve la intención o None (sigue la
+# siguiente). El orden de _REGLAS es el orden de prioridad de siempre.
+
+def _intencion(tipo: str, debug: str, **parametros) -> Dict:
+    return {'tipo': tipo, 'parametros': parametros, 'debug': debug}
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD -1: CUANDO VINO / ULTIMA COMPRA DE [ARTICULO]
+# Funciona en CUALQUIER módulo (Compras IA o Stock IA)
+#
+# DOS CASOS:
+# 1. CON "ultimo/ultima": "cuando vino ultimo vitek" → ultima_factura_articulo (1 registro)
+# 2. SIN "ultimo/ultima": "cuando vino vitek" → cuando_vino_articulo (todas las facturas)
+# ---------------------------------------------------------------------
+_KW_ULTIMO = _alternativas(['ultimo', 'ultima', 'ultim'])
+_KW_PATRON_ULTIMA = _alternativas([
+    'ultima vez que vino', 'ultima vez que llego', 'ultima vez que compramos',
+    'cuando fue la ultima', 'cuando fue el ultimo',
+    'ultima compra de', 'ultimo pedido de', 'ultima factura de'
+])
+_KW_PATRON_CUANDO_VINO = _alternativas([
+    'cuando vino', 'cuando llego', 'cuando entro', 'cuando compramos',
+    'en que fecha vino', 'en que fecha llego', 'en que fecha se compro',
+    'en que fecha compramos', 'que fecha vino', 'que fecha llego'
+])
+_RE_ULTIMO_ART = re.compile(r'\b(ultima?o?)\s+([a-z0-9]{2,})')
+_PALABRAS_NO_ARTICULO = frozenset([
+    'factura', 'compra', 'vez', 'pedido', 'mes', 'ano', 'semana', 'dia',
+    'stock', 'lote', 'vencimiento', 'deposito', 'precio', 'costo'
+])
+_EXCLUIR_ARTICULO_ULTIMA = frozenset([
+    'cuando', 'vino', 'llego', 'entro', 'compramos', 'compro', 'se',
+    'ultima', 'ultimo', 'vez', 'que', 'fecha', 'en', 'fue', 'la', 'el',
+    'de', 'del', 'los', 'las', 'un', 'una', 'me', 'podes', 'podrias',
+    'decir', 'decime', 'mostrar', 'mostrame', 'dame', 'pasame',
+    'factura', 'pedido', 'compra', 'cual', 'cuales'
+])
+_EXCLUIR_ARTICULO_CUANDO = _EXCLUIR_ARTICULO_ULTIMA - {'ultima', 'ultimo'}
+
+
+def _regla_cuando_vino_articulo(r: RasgosPregunta) -> Optional[Dict]:
+    texto_norm = r.norm
+    tiene_ultimo = _KW_ULTIMO.search(texto_norm) is not None
+    tiene_patron_cuando_vino = _KW_PATRON_CUANDO_VINO.search(texto_norm) is not None
 
-    # =====================================================================
-    # ✅ PRIORIDAD -1: CUANDO VINO / ULTIMA COMPRA DE [ARTICULO]
-    # Funciona en CUALQUIER módulo (Compras IA o Stock IA)
-    # 
-    # DOS CASOS:
-    # 1. CON "ultimo/ultima": "cuando vino ultimo vitek" → ultima_factura_articulo (1 registro)
-    # 2. SIN "ultimo/ultima": "cuando vino vitek" → cuando_vino_articulo (todas las facturas)
-    # =====================================================================
-    
-    # Detectar si tiene "ultimo/ultima"
-    tiene_ultimo = any(x in texto_norm for x in ['ultimo', 'ultima', 'ultim'])
-    
-    # Patrones que indican pregunta de última compra/factura (CON ultimo)
-    patrones_ultima_compra = [
-        'ultima vez que vino', 'ultima vez que llego', 'ultima vez que compramos',
-        'cuando fue la ultima', 'cuando fue el ultimo',
-        'ultima compra de', 'ultimo pedido de', 'ultima factura de'
-    ]
-    
-    # Patrones que indican "cuando vino" (puede ser con o sin ultimo)
-    patrones_cuando_vino = [
-        'cuando vino', 'cuando llego', 'cuando entro', 'cuando compramos',
-        'en que fecha vino', 'en que fecha llego', 'en que fecha se compro',
-        'en que fecha compramos', 'que fecha vino', 'que fecha llego'
-    ]
-    
-    tiene_patron_ultima = any(p in texto_norm for p in patrones_ultima_compra)
-    tiene_patron_cuando_vino = any(p in texto_norm for p in patrones_cuando_vino)
-    
-    # Detectar "ultimo/ultima [articulo]" directo (ej: "ultimo vitek", "ultima glucosa")
-    match_ultimo_art = re.search(r'\b(ultima?o?)\s+([a-z0-9]{2,})', texto_norm)
-    articulo_directo = None
-    
-    if match_ultimo_art:
-        posible_art = match_ultimo_art.group(2)
-        # Excluir palabras que NO son artículos
-        palabras_no_articulo = [
-            'factura', 'compra', 'vez', 'pedido', 'mes', 'ano', 'semana', 'dia',
-            'stock', 'lote', 'vencimiento', 'deposito', 'precio', 'costo'
-        ]
-        if posible_art not in palabras_no_articulo and len(posible_art) >= 2:
-            articulo_directo = posible_art
-    
     # CASO 1: Con "ultimo" → ultima_factura_articulo (1 registro)
-    if tiene_ultimo and (tiene_patron_ultima or tiene_patron_cuando_vino or articulo_directo):
-        palabras_excluir_articulo = [
-            'cuando', 'vino', 'llego', 'entro', 'compramos', 'compro', 'se',
-            'ultima', 'ultimo', 'vez', 'que', 'fecha', 'en', 'fue', 'la', 'el',
-            'de', 'del', 'los', 'las', 'un', 'una', 'me', 'podes', 'podrias',
-            'decir', 'decime', 'mostrar', 'mostrame', 'dame', 'pasame',
-            'factura', 'pedido', 'compra', 'cual', 'cuales'
-        ]
-        
-        if articulo_directo:
-            articulo = articulo_directo
-        else:
-            articulo = _extraer_patron_libre(texto, palabras_excluir_articulo)
+    if tiene_ultimo:
+        tiene_patron_ultima = _KW_PATRON_ULTIMA.search(texto_norm) is not None
+
+        # "ultimo/ultima [articulo]" directo (ej: "ultimo vitek", "ultima glucosa")
+        articulo_directo = None
+        match_ultimo_art = _RE_ULTIMO_ART.search(texto_norm)
+        if match_ultimo_art:
+            posible_art = match_ultimo_art.group(2)
+            if posible_art not in _PALABRAS_NO_ARTICULO and len(posible_art) >= 2:
+                articulo_directo = posible_art
+
+        if tiene_patron_ultima or tiene_patron_cuando_vino or articulo_directo:
+            articulo = articulo_directo or r.patron_libre(_EXCLUIR_ARTICULO_ULTIMA)
+            if articulo and len(articulo) >= 2:
+                return _intencion(
+                    'ultima_factura_articulo',
+                    f'Match: ÚLTIMA compra/factura de "{articulo}"',
+                    articulo=articulo,
+                )
 
-        if articulo and len(articulo) >= 2:
-            intencion['tipo'] = 'ultima_factura_articulo'
-            intencion['parametros']['articulo'] = articulo
-            intencion['debug'] = f'Match: ÚLTIMA compra/factura de "{articulo}"'
-            return intencion
-    
     # CASO 2: Sin "ultimo" pero con "cuando vino" → cuando_vino_articulo (todas las facturas)
     if tiene_patron_cuando_vino and not tiene_ultimo:
-        palabras_excluir_articulo = [
-            'cuando', 'vino', 'llego', 'entro', 'compramos', 'compro', 'se',
-            'vez', 'que', 'fecha', 'en', 'fue', 'la', 'el',
-            'de', 'del', 'los', 'las', 'un', 'una', 'me', 'podes', 'podrias',
-            'decir', 'decime', 'mostrar', 'mostrame', 'dame', 'pasame',
-            'factura', 'pedido', 'compra', 'cual', 'cuales'
-        ]
-        
-        articulo = _extraer_patron_libre(texto, palabras_excluir_articulo)
-
+        articulo = r.patron_libre(_EXCLUIR_ARTICULO_CUANDO)
         if articulo and len(articulo) >= 2:
-            intencion['tipo'] = 'cuando_vino_articulo'
-            intencion['parametros']['articulo'] = articulo
-            intencion['debug'] = f'Match: TODAS las facturas de "{articulo}"'
-            return intencion
+            return _intencion(
+                'cuando_vino_articulo',
+                f'Match: TODAS las facturas de "{articulo}"',
+                articulo=articulo,
+            )
 
-    # =====================================================================
-    # PRIORIDAD 0: CONSULTAS DE STOCK
-    # =====================================================================
-    if _es_consulta_stock(texto_norm):
-        return _detectar_intencion_stock(texto)
-
-    # =====================================================================
-    # PRIORIDAD 0.5: TOP PROVEEDORES
-    # =====================================================================
-    palabras_top = ['top', 'ranking', 'mayores', 'principales', 'mayor gasto', 'mas compramos', 'mas gastamos']
-    tiene_top = any(p in texto_norm for p in palabras_top)
-    tiene_proveedores = 'proveedor' in texto_norm or 'proveedores' in texto_norm
-
-    if tiene_top and tiene_proveedores:
-        anios = extraer_anios(texto)
-        mes_key = _extraer_mes_key(texto)
-
-        moneda = None
-        if any(m in texto_norm for m in ['dolares', 'dolar', 'usd', 'u$s']):
-            moneda = 'U$S'
-        elif any(m in texto_norm for m in ['pesos', '$']):
-            moneda = '$'
-
-        params = {}
-        if moneda:
-            params["moneda"] = moneda
-        if mes_key:
-            params["mes"] = mes_key
-        elif anios:
-            params["anio"] = anios[0]
+    return None
 
-        return {
-            "tipo": "top_10_proveedores",
-            "parametros": params,
-            "debug": f"Match: top proveedores"
-        }
 
-    # =====================================================================
-    # PRIORIDAD 1: LISTAR VALORES
-    # =====================================================================
-    if 'listar' in texto_norm and any(x in texto_norm for x in ['proveedores', 'familias', 'articulos', 'proveedor', 'familia', 'articulo']):
-        intencion['tipo'] = 'listar_valores'
-        intencion['debug'] = 'Match: listar valores'
-        return intencion
+# ---------------------------------------------------------------------
+# PRIORIDAD 0: CONSULTAS DE STOCK
+# ---------------------------------------------------------------------
+def _regla_stock(r: RasgosPregunta) -> Optional[Dict]:
+    if _es_consulta_stock(r.norm):
+        return _intencion_stock(r)
+    return None
 
-    # =====================================================================
-    # PRIORIDAD 2: FACTURA POR NÚMERO
-    # =====================================================================
-    nro_match = re.search(r'(?:factura|nro|numero|n°|#)\s*[:\s]*([A-Za-z]?\s*\d{5,8})', texto_norm)
-    if not nro_match:
-        nro_match = re.search(r'\b([A-Za-z]\s*\d{7,8})\b', texto_norm)
-    if not nro_match:
-        nro_match = re.search(r'\b(\d{5,8})\b', texto_norm)
-
-    nro = nro_match.group(1).replace(' ', '').upper() if nro_match else ""
-
-    if nro and ('factura' in texto_norm) and any(x in texto_norm for x in ['detalle', 'ver', 'mostrar', 'numero', 'nro']):
-        intencion['tipo'] = 'detalle_factura_numero'
-        intencion['parametros']['nro_factura'] = nro
-        intencion['debug'] = f'Match: factura número {nro}'
-        return intencion
 
-    # =====================================================================
-    # PRIORIDAD 3: FACTURA COMPLETA DE ARTÍCULO
-    # =====================================================================
-    if ('factura completa' in texto_norm) or (('ultima' in texto_norm) and ('factura' in texto_norm) and ('completa' in texto_norm or 'toda' in texto_norm)):
-        intencion['tipo'] = 'factura_completa_articulo'
-        intencion['debug'] = 'Match: factura completa artículo'
-        return intencion
+# ---------------------------------------------------------------------
+# PRIORIDAD 0.5: TOP PROVEEDORES
+# ---------------------------------------------------------------------
+_KW_TOP = _alternativas(['top', 'ranking', 'mayores', 'principales', 'mayor gasto', 'mas compramos', 'mas gastamos'])
 
-    # =====================================================================
-    # ✅ PRIORIDAD 3.5: CUANDO VINO (ARTÍCULO) - MEJORADO
-    # =====================================================================
-    tiene_cuando_vino = any(x in texto_norm for x in ['cuando vino', 'cuando llego', 'cuando entro', 'ultima vez que vino', 'ultima vez que llego'])
-
-    if tiene_cuando_vino:
-        # Extraer el artículo
-        articulo = _extraer_patron_libre(
-            texto,
-            ['cuando', 'vino', 'llego', 'entro', 'ultima', 'ultimo', 'vez', 'que',
-             'de', 'del', 'la', 'el', 'los', 'las', 'un', 'una', 'me', 'podes', 'decir']
-        )
 
-        if articulo and len(articulo) > 1:
-            intencion['tipo'] = 'cuando_vino_articulo'
-            intencion['parametros']['articulo'] = articulo
-            intencion['debug'] = f'Match: cuando vino {articulo}'
-            return intencion
+def _regla_top_proveedores(r: RasgosPregunta) -> Optional[Dict]:
+    if not (_KW_TOP.search(r.norm) and 'proveedor' in r.norm):
+        return None
 
-    # =====================================================================
-    # PRIORIDAD 4: ÚLTIMA FACTURA
-    # =====================================================================
-    tiene_ultimo = any(x in texto_norm for x in ['ultima', 'ultimo', 'ultim'])
-    tiene_factura = 'factura' in texto_norm
-
-    if (tiene_ultimo and tiene_factura) or (tiene_ultimo and len(texto_norm.split()) >= 2):
-        if not any(x in texto_norm for x in ['completa', 'toda', 'todas', 'entera']):
-            if not _es_comparacion(texto_norm):
-                intencion['tipo'] = 'ultima_factura_articulo'
-                intencion['debug'] = 'Match: última factura'
-                return intencion
+    params = {}
+    if r.moneda:
+        params["moneda"] = r.moneda
+    if r.mes_key:
+        params["mes"] = r.mes_key
+    elif r.anios:
+        params["anio"] = r.anios[0]
 
-    # =====================================================================
-    # PRIORIDAD 5: TODAS LAS FACTURAS DE ARTÍCULO
-    # =====================================================================
-    if any(x in texto_norm for x in ['facturas', 'en que factura', 'listar facturas']):
-        if 'ultima' not in texto_norm and not _es_comparacion(texto_norm):
-            intencion['tipo'] = 'facturas_articulo'
-            intencion['debug'] = 'Match: todas las facturas de artículo'
-            return intencion
+    return {
+        "tipo": "top_10_proveedores",
+        "parametros": params,
+        "debug": "Match: top proveedores"
+    }
 
-    # =====================================================================
-    # PRIORIDAD 6: GASTOS SECCIONES / FAMILIAS
-    # =====================================================================
-    tiene_gastos = any(k in texto_norm for k in ['gastos', 'gasto', 'gastado', 'gastamos', 'importes', 'importe', 'cuanto gasto', 'cuanto fue'])
-    tiene_familia = any(k in texto_norm for k in ['familia', 'familias', 'seccion', 'secciones'])
 
-    if tiene_gastos and tiene_familia and not _es_comparacion(texto_norm):
-        intencion['tipo'] = 'gastos_secciones'
-        intencion['debug'] = 'Match: gastos por familias/secciones'
-        return intencion
+# ---------------------------------------------------------------------
+# PRIORIDAD 1: LISTAR VALORES
+# ---------------------------------------------------------------------
+_KW_LISTABLES = _alternativas(['proveedores', 'familias', 'articulos', 'proveedor', 'familia', 'articulo'])
+
+
+def _regla_listar_valores(r: RasgosPregunta) -> Optional[Dict]:
+    if 'listar' in r.norm and _KW_LISTABLES.search(r.norm):
+        return _intencion('listar_valores', 'Match: listar valores')
+    return None
 
-    # =====================================================================
-    # PRIORIDAD 7: COMPARACIONES
-    # =====================================================================
-    if _es_comparacion(texto_norm):
-        hoy = datetime.now()
-
-        anios = extraer_anios(texto)
-        meses_nums = _extraer_meses_numeros_en_orden(texto)
-        meses_simple = extraer_meses_para_comparacion(texto)
-
-        proveedores = []
-        if 'proveedor' in texto_norm or 'proveedores' in texto_norm:
-            proveedores = extraer_valores_multiples(texto, 'proveedor')
-
-        if not proveedores:
-            proveedores = _extraer_proveedores_multiples_libre(texto)
-
-        if not proveedores:
-            prov_limpio = _extraer_proveedor_limpio(texto)
-            proveedores = [prov_limpio] if prov_limpio else []
-
-        es_familia = any(x in texto_norm for x in ['familia', 'familias', 'seccion', 'secciones'])
-        tiene_gastos_comp = any(x in texto_norm for x in ['gastos', 'gasto', 'gastado', 'importe', 'importes'])
-
-        moneda = None
-        if any(m in texto_norm for m in ['dolares', 'dolar', 'usd', 'u$s']):
-            moneda = 'U$S'
-        elif any(m in texto_norm for m in ['pesos', '$']):
-            moneda = '$'
-
-        # MESES + 2+ AÑOS
-        if meses_nums and len(anios) >= 2:
-            periodos = _generar_periodos_mes_keys(anios, meses_nums, hoy.year)
-
-            if len(periodos) >= 2:
-                intencion['parametros']['meses'] = periodos
-                if moneda:
-                    intencion['parametros']['moneda'] = moneda
-
-                if es_familia or tiene_gastos_comp:
-                    intencion['tipo'] = 'comparar_familia_meses'
-                    intencion['debug'] = f"Match: comparar familia por períodos {periodos}"
-                    return intencion
-
-                if proveedores:
-                    intencion['parametros']['proveedores'] = proveedores
-                intencion['tipo'] = 'comparar_proveedor_meses'
-                intencion['debug'] = f"Match: comparar proveedor(es) {proveedores} por períodos {periodos}"
-                return intencion
 
-        # COMPARACIÓN POR AÑOS (sin meses)
-        if len(anios) >= 2 and not meses_nums:
-            intencion['parametros']['anios'] = anios
+# ---------------------------------------------------------------------
+# PRIORIDAD 2: FACTURA POR NÚMERO
+# ---------------------------------------------------------------------
+_RE_NRO_FACTURA = (
+    re.compile(r'(?:factura|nro|numero|n°|#)\s*[:\s]*([A-Za-z]?\s*\d{5,8})'),
+    re.compile(r'\b([A-Za-z]\s*\d{7,8})\b'),
+    re.compile(r'\b(\d{5,8})\b'),
+)
+_KW_VER_FACTURA = _alternativas(['detalle', 'ver', 'mostrar', 'numero', 'nro'])
+
+
+def _regla_factura_numero(r: RasgosPregunta) -> Optional[Dict]:
+    texto_norm = r.norm
+    if 'factura' not in texto_norm or not _KW_VER_FACTURA.search(texto_norm):
+        return None
+
+    for patron in _RE_NRO_FACTURA:
+        nro_match = patron.search(texto_norm)
+        if nro_match:
+            nro = nro_match.group(1).replace(' ', '').upper()
+            if nro:
+                return _intencion('detalle_factura_numero', f'Match: factura número {nro}', nro_factura=nro)
+            return None
+    return None
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 3: FACTURA COMPLETA DE ARTÍCULO
+# ---------------------------------------------------------------------
+def _regla_factura_completa(r: RasgosPregunta) -> Optional[Dict]:
+    t = r.norm
+    if ('factura completa' in t) or (('ultima' in t) and ('factura' in t) and ('completa' in t or 'toda' in t)):
+        return _intencion('factura_completa_articulo', 'Match: factura completa artículo')
+    return None
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 3.5: CUANDO VINO (ARTÍCULO) - MEJORADO
+# ---------------------------------------------------------------------
+_KW_CUANDO_VINO = _alternativas(['cuando vino', 'cuando llego', 'cuando entro', 'ultima vez que vino', 'ultima vez que llego'])
+_EXCLUIR_CUANDO_VINO = frozenset([
+    'cuando', 'vino', 'llego', 'entro', 'ultima', 'ultimo', 'vez', 'que',
+    'de', 'del', 'la', 'el', 'los', 'las', 'un', 'una', 'me', 'podes', 'decir'
+])
+
+
+def _regla_cuando_vino(r: RasgosPregunta) -> Optional[Dict]:
+    if not _KW_CUANDO_VINO.search(r.norm):
+        return None
+    articulo = r.patron_libre(_EXCLUIR_CUANDO_VINO)
+    if articulo and len(articulo) > 1:
+        return _intencion('cuando_vino_articulo', f'Match: cuando vino {articulo}', articulo=articulo)
+    return None
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 4: ÚLTIMA FACTURA
+# ---------------------------------------------------------------------
+_KW_COMPLETA = _alternativas(['completa', 'toda', 'todas', 'entera'])
+
+
+def _regla_ultima_factura(r: RasgosPregunta) -> Optional[Dict]:
+    t = r.norm
+    if not _KW_ULTIMO.search(t):
+        return None
+    if 'factura' not in t and len(r.tokens) < 2:
+        return None
+    if _KW_COMPLETA.search(t) or r.es_comparacion:
+        return None
+    return _intencion('ultima_factura_articulo', 'Match: última factura')
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 5: TODAS LAS FACTURAS DE ARTÍCULO
+# ---------------------------------------------------------------------
+_KW_FACTURAS = _alternativas(['facturas', 'en que factura', 'listar facturas'])
+
+
+def _regla_facturas_articulo(r: RasgosPregunta) -> Optional[Dict]:
+    if _KW_FACTURAS.search(r.norm) and 'ultima' not in r.norm and not r.es_comparacion:
+        return _intencion('facturas_articulo', 'Match: todas las facturas de artículo')
+    return None
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 6: GASTOS SECCIONES / FAMILIAS
+# ---------------------------------------------------------------------
+_KW_GASTOS = _alternativas(['gastos', 'gasto', 'gastado', 'gastamos', 'importes', 'importe', 'cuanto gasto', 'cuanto fue'])
+_KW_FAMILIA = _alternativas(['familia', 'familias', 'seccion', 'secciones'])
+
+
+def _regla_gastos_secciones(r: RasgosPregunta) -> Optional[Dict]:
+    if _KW_GASTOS.search(r.norm) and _KW_FAMILIA.search(r.norm) and not r.es_comparacion:
+        return _intencion('gastos_secciones', 'Match: gastos por familias/secciones')
+    return None
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 7: COMPARACIONES
+# ---------------------------------------------------------------------
+_KW_GASTOS_COMP = _alternativas(['gastos', 'gasto', 'gastado', 'importe', 'importes'])
+
+
+def _regla_comparaciones(r: RasgosPregunta) -> Optional[Dict]:
+    if not r.es_comparacion:
+        return None
+
+    texto_norm = r.norm
+    intencion = {'tipo': 'consulta_general', 'parametros': {}, 'debug': ''}
+
+    anios = r.anios
+    meses_nums = r.meses_nums
+    meses_simple = r.meses_comparacion
+
+    proveedores = []
+    if 'proveedor' in texto_norm:
+        proveedores = r.valores_multiples('proveedor')
+
+    if not proveedores:
+        proveedores = list(r.proveedores_libre)
 
+    if not proveedores:
+        proveedores = [r.prov_limpio] if r.prov_limpio else []
+
+    es_familia = _KW_FAMILIA.search(texto_norm) is not None
+    tiene_gastos_comp = _KW_GASTOS_COMP.search(texto_norm) is not None
+    moneda = r.moneda
+
+    # MESES + 2+ AÑOS
+    if meses_nums and len(anios) >= 2:
+        periodos = _generar_periodos_mes_keys(anios, meses_nums, datetime.now().year)
+        if len(periodos) >= 2:
+            intencion['parametros']['meses'] = periodos
             if moneda:
                 intencion['parametros']['moneda'] = moneda
 
             if es_familia or tiene_gastos_comp:
-                intencion['tipo'] = 'comparar_familia_anios'
-                intencion['debug'] = f'Match: comparar familia años {anios}'
+                intencion['tipo'] = 'comparar_familia_meses'
+                intencion['debug'] = f"Match: comparar familia por períodos {periodos}"
                 return intencion
 
             if proveedores:
                 intencion['parametros']['proveedores'] = proveedores
-                intencion['tipo'] = 'comparar_proveedor_anios'
-                intencion['debug'] = f'Match: comparar proveedor(es) {proveedores} años {anios}'
-                return intencion
+            intencion['tipo'] = 'comparar_proveedor_meses'
+            intencion['debug'] = f"Match: comparar proveedor(es) {proveedores} por períodos {periodos}"
+            return intencion
 
-            articulo = _extraer_proveedor_limpio(texto)
-            if articulo:
-                intencion['parametros']['articulo_like'] = articulo
-                intencion['tipo'] = 'comparar_articulo_anios'
-                intencion['debug'] = f'Match: comparar artículo {articulo} años {anios}'
-                return intencion
+    # COMPARACIÓN POR AÑOS (sin meses)
+    if len(anios) >= 2 and not meses_nums:
+        intencion['parametros']['anios'] = anios
 
-        # COMPARACIÓN POR MESES
-        if len(meses_simple) >= 2:
-            intencion['parametros']['meses'] = [m[2] for m in meses_simple]
+        if moneda:
+            intencion['parametros']['moneda'] = moneda
 
-            if moneda:
-                intencion['parametros']['moneda'] = moneda
+        if es_familia or tiene_gastos_comp:
+            intencion['tipo'] = 'comparar_familia_anios'
+            intencion['debug'] = f'Match: comparar familia años {anios}'
+            return intencion
 
-            if proveedores:
-                intencion['parametros']['proveedores'] = proveedores
-                intencion['tipo'] = 'comparar_proveedor_meses'
-                intencion['debug'] = f"Match: comparar proveedor(es) {proveedores} meses {[m[2] for m in meses_simple]}"
-                return intencion
+        if proveedores:
+            intencion['parametros']['proveedores'] = proveedores
+            intencion['tipo'] = 'comparar_proveedor_anios'
+            intencion['debug'] = f'Match: comparar proveedor(es) {proveedores} años {anios}'
+            return intencion
 
-            if es_familia or tiene_gastos_comp:
-                intencion['tipo'] = 'comparar_familia_meses'
-                intencion['debug'] = f"Match: comparar familia meses {[m[2] for m in meses_simple]}"
-                return intencion
+        articulo = r.prov_limpio
+        if articulo:
+            intencion['parametros']['articulo_like'] = articulo
+            intencion['tipo'] = 'comparar_articulo_anios'
+            intencion['debug'] = f'Match: comparar artículo {articulo} años {anios}'
+            return intencion
 
-            intencion['tipo'] = 'comparar_proveedor_meses'
+    # COMPARACIÓN POR MESES
+    if len(meses_simple) >= 2:
+        meses_keys = [m[2] for m in meses_simple]
+        intencion['parametros']['meses'] = meses_keys
+
+        if moneda:
+            intencion['parametros']['moneda'] = moneda
+
+        if proveedores:
             intencion['parametros']['proveedores'] = proveedores
-            intencion['debug'] = f"Match: comparar (default) meses {[m[2] for m in meses_simple]}"
+            intencion['tipo'] = 'comparar_proveedor_meses'
+            intencion['debug'] = f"Match: comparar proveedor(es) {proveedores} meses {meses_keys}"
             return intencion
 
-        intencion['tipo'] = 'consulta_general'
-        intencion['debug'] = 'Comparación detectada pero sin parámetros suficientes → IA'
+        if es_familia or tiene_gastos_comp:
+            intencion['tipo'] = 'comparar_familia_meses'
+            intencion['debug'] = f"Match: comparar familia meses {meses_keys}"
+            return intencion
+
+        intencion['tipo'] = 'comparar_proveedor_meses'
+        intencion['parametros']['proveedores'] = proveedores
+        intencion['debug'] = f"Match: comparar (default) meses {meses_keys}"
         return intencion
 
-    # =====================================================================
-    # PRIORIDAD 8: COMPRAS POR MES
-    # =====================================================================
+    # Los parámetros ya cargados (ej. años) viajan igual a la IA
+    intencion['tipo'] = 'consulta_general'
+    intencion['debug'] = 'Comparación detectada pero sin parámetros suficientes → IA'
+    return intencion
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 8: COMPRAS POR MES
+# ---------------------------------------------------------------------
+_KW_LISTAR_COMPRAS = _alternativas(['listar', 'detalle', 'ver', 'mostrar', 'excel'])
+
+
+def _regla_compras_por_mes(r: RasgosPregunta) -> Optional[Dict]:
+    t = r.norm
     if (
-        ('compras' in texto_norm or 'compra' in texto_norm)
-        and ('por mes' in texto_norm or 'del mes' in texto_norm)
-        and any(x in texto_norm for x in ['listar', 'detalle', 'ver', 'mostrar', 'excel'])
+        'compra' in t
+        and ('por mes' in t or 'del mes' in t)
+        and _KW_LISTAR_COMPRAS.search(t)
     ):
-        intencion['tipo'] = 'compras_por_mes'
-        intencion['debug'] = 'Match: compras por mes'
-        return intencion
+        return _intencion('compras_por_mes', 'Match: compras por mes')
+    return None
 
-    # =====================================================================
-    # ✅ PRIORIDAD 8.5: COMPRAS POR AÑO COMPLETO
-    # =====================================================================
-    if 'compra' in texto_norm or 'compramos' in texto_norm:
-        es_comparacion_check = _es_comparacion(texto_norm)
-        tiene_proveedor_explicito = 'proveedor' in texto_norm
-        tiene_articulo_explicito = 'articulo' in texto_norm
-        tiene_familia_explicita = 'familia' in texto_norm or 'seccion' in texto_norm
-
-        patron_compras_anio = re.search(r'compras?\s+(?:del\s+)?(?:año\s+)?(?:en\s+)?(20\d{2})\b', texto_norm)
-        patron_mostrar_compras = re.search(r'(?:mostrar?|mostrame|ver|dame|listado|todas?\s+las?)\s+(?:las?\s+)?compras?\s+(?:del?\s+)?(?:año\s+)?(?:en\s+)?(20\d{2})\b', texto_norm)
-        patron_total_anio = re.search(r'(?:cuanto|total|resumen)\s+(?:compramos|compras?|gastamos)?\s+(?:en\s+)?(20\d{2})\b', texto_norm)
-
-        if (patron_compras_anio or patron_mostrar_compras or patron_total_anio) and not es_comparacion_check:
-            if patron_compras_anio:
-                anio = int(patron_compras_anio.group(1))
-            elif patron_mostrar_compras:
-                anio = int(patron_mostrar_compras.group(1))
-            else:
-                anio = int(patron_total_anio.group(1))
-
-            prov_limpio = _extraer_proveedor_limpio(texto)
-
-            if not tiene_proveedor_explicito and not tiene_articulo_explicito and not tiene_familia_explicita:
-                if not prov_limpio or len(prov_limpio) <= 2:
-                    intencion['tipo'] = 'compras_anio'
-                    intencion['parametros']['anio'] = anio
-                    intencion['debug'] = f'Match: compras año {anio} (sin filtros)'
-                    return intencion
-
-    # =====================================================================
-    # PRIORIDAD 9: DETALLE COMPRAS PROVEEDOR / ARTÍCULO + MES O AÑO
-    # =====================================================================
-    if ('compra' in texto_norm or 'compras' in texto_norm or 'compre' in texto_norm):
-        if not _es_comparacion(texto_norm):
-            mes_key = _extraer_mes_key(texto)
-            prov = _extraer_proveedor_limpio(texto)
-            articulos = extraer_valores_multiples(texto, 'articulo')
-
-            if (not articulos) and prov:
-                prov_norm = (prov or "").strip().lower()
-                if prov_norm in {"vitek"}:
-                    articulos = [prov]
-                    prov = None
-
-            # ARTÍCULO + MES
-            if mes_key and articulos:
-                intencion['tipo'] = 'detalle_compras_articulo_mes'
-                intencion['parametros']['mes_key'] = mes_key
-                intencion['parametros']['articulo_like'] = articulos[0]
-                intencion['debug'] = f"Match: detalle compras artículo {articulos[0]} en {mes_key}"
-                return intencion
 
-            # PROVEEDOR + MES
-            if mes_key and prov:
-                intencion['tipo'] = 'detalle_compras_proveedor_mes'
-                intencion['parametros']['mes_key'] = mes_key
-                intencion['parametros']['proveedor_like'] = prov
-                intencion['debug'] = f"Match: detalle compras {prov} en {mes_key}"
-                return intencion
+# ---------------------------------------------------------------------
+# PRIORIDAD 8.5: COMPRAS POR AÑO COMPLETO
+# ---------------------------------------------------------------------
+_RE_COMPRAS_ANIO = re.compile(r'compras?\s+(?:del\s+)?(?:año\s+)?(?:en\s+)?(20\d{2})\b')
+_RE_MOSTRAR_COMPRAS = re.compile(r'(?:mostrar?|mostrame|ver|dame|listado|todas?\s+las?)\s+(?:las?\s+)?compras?\s+(?:del?\s+)?(?:año\s+)?(?:en\s+)?(20\d{2})\b')
+_RE_TOTAL_ANIO = re.compile(r'(?:cuanto|total|resumen)\s+(?:compramos|compras?|gastamos)?\s+(?:en\s+)?(20\d{2})\b')
+
+
+def _regla_compras_anio(r: RasgosPregunta) -> Optional[Dict]:
+    t = r.norm
+    if 'compra' not in t or r.es_comparacion:
+        return None
+    if 'proveedor' in t or 'articulo' in t or 'familia' in t or 'seccion' in t:
+        return None
+
+    for patron in (_RE_COMPRAS_ANIO, _RE_MOSTRAR_COMPRAS, _RE_TOTAL_ANIO):
+        m = patron.search(t)
+        if m:
+            anio = int(m.group(1))
+            if not r.prov_limpio or len(r.prov_limpio) <= 2:
+                return _intencion('compras_anio', f'Match: compras año {anio} (sin filtros)', anio=anio)
+            return None
+    return None
 
-            anios = sorted({int(y) for y in re.findall(r"\b(20\d{2})\b", texto_norm)})
 
-            # ARTÍCULO + 2+ AÑOS → COMPARACIÓN
-            if len(anios) >= 2 and articulos:
-                intencion['tipo'] = 'comparar_articulo_anios'
-                intencion['parametros']['anios'] = anios
-                intencion['parametros']['articulo_like'] = articulos[0]
-                intencion['debug'] = f"Match: comparar artículo {articulos[0]} en años {anios}"
-                return intencion
+# ---------------------------------------------------------------------
+# PRIORIDAD 9: DETALLE COMPRAS PROVEEDOR / ARTÍCULO + MES O AÑO
+# ---------------------------------------------------------------------
+_ARTICULOS_COMO_PROVEEDOR = frozenset({"vitek"})
 
-            # ARTÍCULO + 1 AÑO
-            if anios and articulos:
-                intencion['tipo'] = 'detalle_compras_articulo_anio'
-                intencion['parametros']['anio'] = anios[0]
-                intencion['parametros']['articulo_like'] = articulos[0]
-                intencion['debug'] = f"Match: detalle compras artículo {articulos[0]} en año {anios[0]}"
-                return intencion
 
-            # PROVEEDOR + AÑO
-            if anios and prov:
-                intencion['tipo'] = 'detalle_compras_proveedor_anio'
-                intencion['parametros']['anio'] = anios[0]
-                intencion['parametros']['proveedor_like'] = prov
-                intencion['debug'] = f"Match: detalle compras {prov} en año {anios[0]}"
-                return intencion
+def _regla_detalle_compras(r: RasgosPregunta) -> Optional[Dict]:
+    t = r.norm
+    if not ('compra' in t or 'compre' in t) or r.es_comparacion:
+        return None
 
-    # =====================================================================
-    # PRIORIDAD 10: TOTAL COMPRAS PROVEEDOR + MONEDA + 2+ PERÍODOS
-    # =====================================================================
-    if any(k in texto_norm for k in ["proveedor", "proveedores", "por proveedor"]) and any(k in texto_norm for k in ["total", "ranking", "mayor", "gasto", "gastado", "se gasto", "cuanto"]):
-        periodos = _extraer_mes_keys_multiples(texto)
-        if len(periodos) >= 2:
-            intencion['tipo'] = 'total_proveedor_moneda_periodos'
-            intencion['parametros']['periodos'] = periodos
-            intencion['debug'] = f'Match: total proveedor múltiples períodos {periodos}'
-            return intencion
+    mes_key = r.mes_key
+    prov = r.prov_limpio
+    articulos = r.valores_multiples('articulo')
 
-    # =====================================================================
-    # PRIORIDAD 11: DETALLE GENERAL
-    # =====================================================================
-    if 'detalle' in texto_norm or 'que vino' in texto_norm or 'listado' in texto_norm:
-        intencion['tipo'] = 'detalle'
-        intencion['debug'] = 'Match: detalle general'
-        return intencion
+    if (not articulos) and prov:
+        if prov.strip().lower() in _ARTICULOS_COMO_PROVEEDOR:
+            articulos = [prov]
+            prov = None
 
-    # =====================================================================
-    # PRIORIDAD 12: COMPRAS GENERAL
-    # =====================================================================
-    if 'compras' in texto_norm or 'compra' in texto_norm:
-        intencion['tipo'] = 'consulta_general'
-        intencion['debug'] = 'Match: compras general'
-        return intencion
+    # ARTÍCULO + MES
+    if mes_key and articulos:
+        return _intencion(
+            'detalle_compras_articulo_mes',
+            f"Match: detalle compras artículo {articulos[0]} en {mes_key}",
+            mes_key=mes_key, articulo_like=articulos[0],
+        )
+
+    # PROVEEDOR + MES
+    if mes_key and prov:
+        return _intencion(
+            'detalle_compras_proveedor_mes',
+            f"Match: detalle compras {prov} en {mes_key}",
+            mes_key=mes_key, proveedor_like=prov,
+        )
+
+    anios = r.anios_norm
+
+    # ARTÍCULO + 2+ AÑOS → COMPARACIÓN
+    if len(anios) >= 2 and articulos:
+        return _intencion(
+            'comparar_articulo_anios',
+            f"Match: comparar artículo {articulos[0]} en años {anios}",
+            anios=anios, articulo_like=articulos[0],
+        )
+
+    # ARTÍCULO + 1 AÑO
+    if anios and articulos:
+        return _intencion(
+            'detalle_compras_articulo_anio',
+            f"Match: detalle compras artículo {articulos[0]} en año {anios[0]}",
+            anio=anios[0], articulo_like=articulos[0],
+        )
+
+    # PROVEEDOR + AÑO
+    if anios and prov:
+        return _intencion(
+            'detalle_compras_proveedor_anio',
+            f"Match: detalle compras {prov} en año {anios[0]}",
+            anio=anios[0], proveedor_like=prov,
+        )
+
+    return None
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 10: TOTAL COMPRAS PROVEEDOR + MONEDA + 2+ PERÍODOS
+# ---------------------------------------------------------------------
+_KW_TOTALIZAR = _alternativas(["total", "ranking", "mayor", "gasto", "gastado", "se gasto", "cuanto"])
+
+
+def _regla_total_proveedor_periodos(r: RasgosPregunta) -> Optional[Dict]:
+    if 'proveedor' not in r.norm or not _KW_TOTALIZAR.search(r.norm):
+        return None
+    periodos = [m[2] for m in r.meses_comparacion]
+    if len(periodos) >= 2:
+        return _intencion(
+            'total_proveedor_moneda_periodos',
+            f'Match: total proveedor múltiples períodos {periodos}',
+            periodos=periodos,
+        )
+    return None
+
+
+# ---------------------------------------------------------------------
+# PRIORIDAD 11: DETALLE GENERAL
+# PRIORIDAD 12: COMPRAS GENERAL
+# ---------------------------------------------------------------------
+_KW_DETALLE = _alternativas(['detalle', 'que vino', 'listado'])
+
+
+def _regla_detalle_general(r: RasgosPregunta) -> Optional[Dict]:
+    if _KW_DETALLE.search(r.norm):
+        return _intencion('detalle', 'Match: detalle general')
+    return None
+
+
+def _regla_compras_general(r: RasgosPregunta) -> Optional[Dict]:
+    if 'compra' in r.norm:
+        return _intencion('consulta_general', 'Match: compras general')
+    return None
+
+
+_REGLAS: Tuple[Callable[[RasgosPregunta], Optional[Dict]], ...] = (
+    _regla_cuando_vino_articulo,        # -1
+    _regla_stock,                       # 0
+    _regla_top_proveedores,             # 0.5
+    _regla_listar_valores,              # 1
+    _regla_factura_numero,              # 2
+    _regla_factura_completa,            # 3
+    _regla_cuando_vino,                 # 3.5
+    _regla_ultima_factura,              # 4
+    _regla_facturas_articulo,           # 5
+    _regla_gastos_secciones,            # 6
+    _regla_comparaciones,               # 7
+    _regla_compras_por_mes,             # 8
+    _regla_compras_anio,                # 8.5
+    _regla_detalle_compras,             # 9
+    _regla_total_proveedor_periodos,    # 10
+    _regla_detalle_general,             # 11
+    _regla_compras_general,             # 12
+)
+
+
+# =====================================================================
+# DETECTOR DE INTENCIÓN PRINCIPAL
+# =====================================================================
+
+def detectar_intencion(texto: str) -> Dict:
+    """
+    Detecta intención con ORDEN DE PRIORIDAD claro (ver _REGLAS).
+    Retorna: {'tipo': 'xxx', 'parametros': {...}, 'debug': 'info'}
+    """
+    rasgos = RasgosPregunta(texto)
+    for regla in _REGLAS:
+        intencion = regla(rasgos)
+        if intencion is not None:
+            return intencion
 
-    # =====================================================================
     # FALLBACK: CONSULTA GENERAL
-    # =====================================================================
-    intencion['debug'] = 'No match específico, consulta general'
-    return intencion
+    return _intencion('consulta_general', 'No match específico, consulta general')
 
 
 # =====================================================================
@@ -971,31 +1102,15 @@ def construir_where_clause(texto: str) -> Tuple[str, tuple]:
 
     condiciones.append("(\"Tipo Comprobante\" = 'Compra Contado' OR \"Tipo Comprobante\" LIKE 'Compra%%')")
 
-    if 'proveedor' in texto_norm:
-        proveedores = extraer_valores_multiples(texto, 'proveedor')
-        if proveedores:
-            parts = []
-            for prov in proveedores:
-                parts.append("LOWER(\"Cliente / Proveedor\") LIKE %s")
-                params.append(f"%{prov.lower()}%")
-            condiciones.append(f"({' OR '.join(parts)})")
-
-    if 'articulo' in texto_norm:
-        articulos = extraer_valores_multiples(texto, 'articulo')
-        if articulos:
-            parts = []
-            for art in articulos:
-                parts.append("LOWER(\"Articulo\") LIKE %s")
-                params.append(f"%{art.lower()}%")
-            condiciones.append(f"({' OR '.join(parts)})")
-
-    if 'familia' in texto_norm:
-        familias = extraer_valores_multiples(texto, 'familia')
-        if familias:
+    for tipo, columna in (("proveedor", "Cliente / Proveedor"), ("articulo", "Articulo"), ("familia", "Familia")):
+        if tipo not in texto_norm:
+            continue
+        valores = _valores_multiples_norm(texto_norm, tipo)
+        if valores:
             parts = []
-            for fam in familias:
-                parts.append("LOWER(\"Familia\") LIKE %s")
-                params.append(f"%{fam.lower()}%")
+            for v in valores:
+                parts.append(f"LOWER(\"{columna}\") LIKE %s")
+                params.append(f"%{v.lower()}%")
             condiciones.append(f"({' OR '.join(parts)})")
 
     where_clause = " AND ".join(condiciones) if condiciones else "1=1"
@@ -0,0 +1,678 @@
+# =========================
+# KARDEX.PY - COSTO PROMEDIO MÓVIL + SNAPSHOTS POR ARTÍCULO
+# =========================
+"""
+Kardex de movimientos_stock con snapshots periódicos por artículo.
+
+Un snapshot guarda el estado del promedio móvil (saldo_qty, saldo_valor,
+costo_promedio) después de un movimiento dado (fecha_hora, id). Para armar
+la ficha de un rango con fecha desde se arranca del snapshot más cercano
+anterior al rango y se reproduce solo la cola: consultar un mes de un
+reactivo con años de movimientos cuesta lo mismo que uno nuevo. Sin rango
+la ficha muestra la historia completa.
+
+- cada KARDEX_SNAPSHOT_CADA movimientos reproducidos se guarda un
+  snapshot nuevo (al armar una ficha)
+- tabla, trigger e índice los crea `python kardex.py` (la ficha no
+  corre DDL; sin la tabla funciona sin snapshots)
+- un trigger en movimientos_stock borra los snapshots de ese artículo
+  posteriores a una fila insertada / modificada / borrada (movimientos
+  cargados con fecha vieja no dejan snapshots incorrectos)
+- las filas sin fecha_hora no entran en snapshots (van siempre al final)
+
+Valuación de todo el inventario a una fecha (iter_valuacion): recorre
+movimientos_stock con un cursor del servidor ordenado por artículo y
+arrastra entre bloques solo el estado del artículo en curso.
+
+Ejecutar:  python kardex.py                                  -> crea tabla y trigger
+           python kardex.py valuacion 2025-06-30 valuacion.xlsx   (o .csv / .parquet)
+"""
+
+import sys
+from datetime import datetime, date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from psycopg2.extras import RealDictCursor
+
+from sql_core import get_db_connection, ejecutar_consulta_stream, _pool_setting
+from exportar import exportar_bloques
+
+SNAPSHOT_CADA = _pool_setting("KARDEX_SNAPSHOT_CADA", 500)
+
+COLUMNAS_MOVIMIENTOS = (
+    "id", "articulo_id", "fecha_hora", "tipo_mov",
+    "deposito_id", "deposito_origen_id", "deposito_destino_id",
+    "qty_base", "unidad_mov", "factor_conversion",
+    "lote", "vencimiento",
+    "ref_tipo", "ref_nro", "proveedor", "proveedor_id", "usuario", "observacion",
+    "precio_unit_aplicado", "moneda",
+)
+
+
+# =====================================================================
+# MOTOR: COSTO PROMEDIO MÓVIL
+# =====================================================================
+
+def _to_datetime_safe(x) -> Optional[pd.Timestamp]:
+    if x is None or x == "":
+        return None
+    try:
+        return pd.to_datetime(x)
+    except Exception:
+        return None
+
+
+def _safe_float(x) -> float:
+    try:
+        if x is None or x == "":
+            return 0.0
+        return float(x)
+    except Exception:
+        return 0.0
+
+
+def estado_inicial(saldo_qty: float = 0.0, saldo_valor: float = 0.0, costo_promedio: float = 0.0) -> Dict[str, float]:
+    return {
+        "saldo_qty": float(saldo_qty or 0.0),
+        "saldo_valor": float(saldo_valor or 0.0),
+        "costo_promedio": float(costo_promedio or 0.0),
+    }
+
+
+def _serie_float(s: pd.Series) -> pd.Series:
+    """_safe_float vectorizado: mismos resultados, una sola pasada."""
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(float)
+    out = pd.to_numeric(s, errors="coerce").astype(float)
+    # None / "" / texto que to_numeric no entiende: celda por celda (son pocas)
+    nulos = out.isna()
+    if nulos.any():
+        out[nulos] = s[nulos].map(_safe_float)
+    return out
+
+
+def _fechas_dt(s: pd.Series) -> pd.Series:
+    try:
+        return pd.to_datetime(s, errors="coerce")
+    except Exception:
+        # zonas horarias mezcladas: celda por celda como la versión original
+        return s.apply(_to_datetime_safe)
+
+
+def _recorrer(qty: List[float], precio: List[float], inicio: List[bool], iniciales: List[Dict[str, float]]):
+    """
+    Bucle del promedio móvil sobre listas de floats (sin pandas por fila).
+    `inicio[i]` marca la primera fila de cada artículo; ahí se toma el
+    siguiente estado de `iniciales`.
+    """
+    n = len(qty)
+    costo_unit_baja = [0.0] * n
+    valor_mov = [0.0] * n
+    saldo_qty_l = [0.0] * n
+    saldo_valor_l = [0.0] * n
+    costo_prom_l = [0.0] * n
+
+    saldo_qty = saldo_valor = costo_prom = 0.0
+    k = 0
+    for i in range(n):
+        if inicio[i]:
+            ini = iniciales[k]
+            k += 1
+            saldo_qty = ini["saldo_qty"]
+            saldo_valor = ini["saldo_valor"]
+            costo_prom = ini["costo_promedio"]
+
+        q = qty[i]
+        costo_previo = costo_prom
+        if q > 0:
+            v = q * precio[i]
+            saldo_qty += q
+            saldo_valor += v
+        elif q < 0:
+            q_out = abs(q)
+            v = -1 * q_out * costo_previo
+            saldo_qty -= q_out
+            saldo_valor += v
+            costo_unit_baja[i] = costo_previo
+        else:
+            v = 0.0
+
+        if saldo_qty > 0:
+            costo_prom = saldo_valor / saldo_qty
+        else:
+            costo_prom = 0.0
+            saldo_valor = 0.0
+
+        valor_mov[i] = v
+        saldo_qty_l[i] = saldo_qty
+        saldo_valor_l[i] = saldo_valor
+        costo_prom_l[i] = costo_prom
+
+    return costo_unit_baja, valor_mov, saldo_qty_l, saldo_valor_l, costo_prom_l
+
+
+def calcular_kardex_por_articulo(
+    df: pd.DataFrame,
+    iniciales: Dict[Any, Dict[str, float]] = None,
+    clave: Optional[str] = "articulo_id",
+) -> pd.DataFrame:
+    """
+    Kardex de promedio móvil para muchos artículos en una pasada.
+
+    `df` tiene que venir en orden de kardex dentro de cada artículo
+    (fecha_hora, id); los artículos se agrupan con un sort estable, así que
+    ese orden se respeta. `iniciales` = {articulo: estado} (ej. snapshots);
+    los que no están arrancan de cero. Con clave=None todo el df es un
+    solo artículo.
+
+    Mismas columnas y mismos valores que la versión fila por fila.
+    """
+    if df.empty:
+        return df
+
+    df = df.copy()
+    if clave is not None and clave in df.columns:
+        df = df.sort_values(by=clave, kind="stable")
+        grupos = df[clave]
+        inicio = (grupos != grupos.shift()).to_numpy().copy()
+        inicio[0] = True
+        claves_grupo = grupos[inicio].tolist()
+    else:
+        inicio = [True] + [False] * (len(df) - 1)
+        claves_grupo = [None]
+
+    iniciales = iniciales or {}
+    estados = [estado_inicial(**iniciales[c]) if c in iniciales else estado_inicial() for c in claves_grupo]
+
+    if "fecha_hora" in df.columns:
+        df["fecha_hora_dt"] = _fechas_dt(df["fecha_hora"])
+    else:
+        df["fecha_hora_dt"] = None
+
+    if "qty_base" not in df.columns:
+        df["qty_base"] = 0
+    df["qty_base"] = _serie_float(df["qty_base"])
+    df["qty_in"] = df["qty_base"].where(df["qty_base"] > 0, 0.0)
+    df["qty_out"] = (-df["qty_base"]).where(df["qty_base"] < 0, 0.0)
+
+    if "precio_unit_aplicado" not in df.columns:
+        df["precio_unit_aplicado"] = 0
+    df["precio_unit_aplicado"] = _serie_float(df["precio_unit_aplicado"])
+
+    (
+        df["costo_unit_aplicado"], df["valor_mov"],
+        df["saldo_qty"], df["saldo_valor"], df["costo_promedio"],
+    ) = _recorrer(
+        df["qty_base"].tolist(),
+        df["precio_unit_aplicado"].tolist(),
+        list(inicio),
+        estados,
+    )
+    return df
+
+
+def calcular_kardex_promedio_movil(df: pd.DataFrame, inicial: Dict[str, float] = None) -> pd.DataFrame:
+    """
+    Calcula, para un artículo:
+    - qty_in / qty_out
+    - costo_promedio móvil
+    - costo_unit_aplicado en BAJAS (usa costo_promedio previo)
+    - valor_mov (positivo entradas / negativo salidas)
+    - saldo_qty / saldo_valor
+
+    `inicial`: estado (saldo_qty, saldo_valor, costo_promedio) antes de la
+    primera fila, ej. un snapshot. Sin él arranca de cero.
+    """
+    return calcular_kardex_por_articulo(df, {None: inicial} if inicial else None, clave=None)
+
+
+def resumen_por_articulo(df_k: pd.DataFrame, clave: str = "articulo_id") -> pd.DataFrame:
+    """Estado final (saldo_qty, saldo_valor, costo_promedio, movimientos) por artículo."""
+    if df_k is None or df_k.empty:
+        return pd.DataFrame(columns=[clave, "saldo_qty", "saldo_valor", "costo_promedio", "movimientos"])
+    g = df_k.groupby(clave, sort=False)
+    out = g[["saldo_qty", "saldo_valor", "costo_promedio"]].last()
+    out["movimientos"] = g.size()
+    return out.reset_index()
+
+
+def estado_final(df_k: pd.DataFrame, inicial: Dict[str, float] = None) -> Dict[str, float]:
+    """Estado después de la última fila de un kardex ya calculado."""
+    if df_k is None or df_k.empty:
+        return dict(inicial or estado_inicial())
+    u = df_k.iloc[-1]
+    return estado_inicial(u["saldo_qty"], u["saldo_valor"], u["costo_promedio"])
+
+
+def _kardex_referencia_iterrows(df: pd.DataFrame, inicial: Dict[str, float] = None) -> pd.DataFrame:
+    """
+    Versión original fila por fila (iterrows). Queda como referencia para
+    los tests de equivalencia y el benchmark; no se usa en la app.
+
+    Calcula:
+    - qty_in / qty_out
+    - costo_promedio móvil
+    - costo_unit_aplicado en BAJAS (usa costo_promedio previo)
+    - valor_mov (positivo entradas / negativo salidas)
+    - saldo_qty / saldo_valor
+
+    `inicial`: estado (saldo_qty, saldo_valor, costo_promedio) antes de la
+    primera fila, ej. un snapshot. Sin él arranca de cero.
+    """
+    if df.empty:
+        return df
+
+    df = df.copy()
+
+    # Normaliza fecha
+    if "fecha_hora" in df.columns:
+        df["fecha_hora_dt"] = df["fecha_hora"].apply(_to_datetime_safe)
+    else:
+        df["fecha_hora_dt"] = None
+
+    # qty_base
+    if "qty_base" not in df.columns:
+        df["qty_base"] = 0
+    df["qty_base"] = df["qty_base"].apply(_safe_float)
+
+    # Entradas / salidas
+    df["qty_in"] = df["qty_base"].apply(lambda x: x if x > 0 else 0)
+    df["qty_out"] = df["qty_base"].apply(lambda x: abs(x) if x < 0 else 0)
+
+    # Precio entrada
+    if "precio_unit_aplicado" not in df.columns:
+        df["precio_unit_aplicado"] = 0
+    df["precio_unit_aplicado"] = df["precio_unit_aplicado"].apply(_safe_float)
+
+    ini = inicial or estado_inicial()
+    saldo_qty = float(ini["saldo_qty"])
+    saldo_valor = float(ini["saldo_valor"])
+    costo_prom = float(ini["costo_promedio"])
+
+    costo_unit_baja: List[float] = []
+    valor_mov: List[float] = []
+    saldo_qty_list: List[float] = []
+    saldo_valor_list: List[float] = []
+    costo_prom_list: List[float] = []
+
+    for _, r in df.iterrows():
+        qty = _safe_float(r.get("qty_base", 0))
+        precio_in = _safe_float(r.get("precio_unit_aplicado", 0))
+        costo_previo = costo_prom
+
+        if qty > 0:
+            v = qty * precio_in
+            saldo_qty += qty
+            saldo_valor += v
+        elif qty < 0:
+            q_out = abs(qty)
+            v = -1 * q_out * costo_previo
+            saldo_qty -= q_out
+            saldo_valor += v
+        else:
+            v = 0.0
+
+        if saldo_qty > 0:
+            costo_prom = saldo_valor / saldo_qty
+        else:
+            costo_prom = 0.0
+            saldo_valor = 0.0
+
+        costo_unit_baja.append(costo_previo if qty < 0 else 0.0)
+        valor_mov.append(v)
+        saldo_qty_list.append(saldo_qty)
+        saldo_valor_list.append(saldo_valor)
+        costo_prom_list.append(costo_prom)
+
+    df["costo_unit_aplicado"] = costo_unit_baja
+    df["valor_mov"] = valor_mov
+    df["saldo_qty"] = saldo_qty_list
+    df["saldo_valor"] = saldo_valor_list
+    df["costo_promedio"] = costo_prom_list
+
+    return df
+
+
+# =====================================================================
+# SNAPSHOTS (DDL)
+# =====================================================================
+
+SQL_TABLA_SNAPSHOTS = """
+    CREATE TABLE IF NOT EXISTS kardex_snapshots (
+        articulo_id TEXT NOT NULL,
+        hasta_fecha_hora TIMESTAMPTZ NOT NULL,
+        hasta_mov_id TEXT NOT NULL,
+        movimientos INT NOT NULL,
+        saldo_qty NUMERIC NOT NULL,
+        saldo_valor NUMERIC NOT NULL,
+        costo_promedio NUMERIC NOT NULL,
+        creado_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (articulo_id, hasta_fecha_hora, hasta_mov_id)
+    )
+"""
+
+SQL_FN_INVALIDAR = """
+    CREATE OR REPLACE FUNCTION kardex_snapshots_invalidar()
+    RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM kardex_snapshots
+            WHERE articulo_id = OLD.articulo_id::text AND hasta_fecha_hora >= OLD.fecha_hora;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            DELETE FROM kardex_snapshots
+            WHERE articulo_id = NEW.articulo_id::text AND hasta_fecha_hora >= NEW.fecha_hora;
+        END IF;
+        RETURN NULL;
+    END;
+    $$
+"""
+
+SQL_TRIGGER_INVALIDAR = """
+    DROP TRIGGER IF EXISTS trg_kardex_snapshots_invalidar ON movimientos_stock;
+    CREATE TRIGGER trg_kardex_snapshots_invalidar
+        AFTER INSERT OR UPDATE OR DELETE ON movimientos_stock
+        FOR EACH ROW EXECUTE FUNCTION kardex_snapshots_invalidar()
+"""
+
+SQL_INDICE_MOVIMIENTOS = """
+    CREATE INDEX IF NOT EXISTS idx_movimientos_stock_articulo_fecha
+        ON movimientos_stock (articulo_id, fecha_hora, id)
+"""
+
+
+def asegurar_kardex_snapshots() -> None:
+    """Crea tabla, trigger e índice (idempotente)."""
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_TABLA_SNAPSHOTS)
+            cur.execute(SQL_FN_INVALIDAR)
+            cur.execute(SQL_TRIGGER_INVALIDAR)
+            cur.execute(SQL_INDICE_MOVIMIENTOS)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+_SNAPSHOTS_OK = {"instalados": False}
+
+
+def _snapshots_instalados(cur) -> bool:
+    """kardex_snapshots existe. La crea `python kardex.py`, no la ficha (sin DDL al leer)."""
+    if not _SNAPSHOTS_OK["instalados"]:
+        cur.execute("SELECT to_regclass('public.kardex_snapshots') IS NOT NULL AS ok")
+        _SNAPSHOTS_OK["instalados"] = bool(cur.fetchone()["ok"])
+    return _SNAPSHOTS_OK["instalados"]
+
+
+# =====================================================================
+# SNAPSHOTS (LECTURA / ESCRITURA)
+# =====================================================================
+
+def _snapshot_previo(cur, articulo_id: Any, antes_de: Optional[datetime]) -> Optional[dict]:
+    """Último snapshot con hasta_fecha_hora < antes_de (o el último, si antes_de es None)."""
+    sql = """
+        SELECT hasta_fecha_hora, hasta_mov_id, movimientos, saldo_qty, saldo_valor, costo_promedio
+        FROM kardex_snapshots
+        WHERE articulo_id = %s
+    """
+    params: list = [str(articulo_id)]
+    if antes_de is not None:
+        sql += " AND hasta_fecha_hora < %s"
+        params.append(antes_de)
+    sql += " ORDER BY hasta_fecha_hora DESC, hasta_mov_id DESC LIMIT 1"
+    cur.execute(sql, params)
+    return cur.fetchone()
+
+
+def _movimientos_cola(cur, articulo_id: Any, snapshot: Optional[dict],
+                     desde: Optional[datetime], hasta: Optional[datetime]) -> List[dict]:
+    """
+    Movimientos posteriores al snapshot, en orden de kardex (fecha_hora, id).
+    `_previo` marca las filas anteriores a `desde` (solo suman al saldo inicial).
+    (fecha_hora, id) > (...) usa el índice (articulo_id, fecha_hora, id).
+    """
+    cols = ", ".join(COLUMNAS_MOVIMIENTOS)
+    previo = "(fecha_hora < %s) AS _previo" if desde is not None else "FALSE AS _previo"
+    params: list = [desde] if desde is not None else []
+
+    sql = f"SELECT {cols}, {previo} FROM movimientos_stock WHERE articulo_id = %s AND fecha_hora IS NOT NULL"
+    params.append(articulo_id)
+    if snapshot:
+        # hasta_mov_id viaja como literal sin tipo: Postgres lo castea al tipo de id
+        sql += " AND (fecha_hora, id) > (%s, %s)"
+        params += [snapshot["hasta_fecha_hora"], snapshot["hasta_mov_id"]]
+    if hasta is not None:
+        sql += " AND fecha_hora <= %s"
+        params.append(hasta)
+    else:
+        # sin tope, las filas sin fecha van al final (como en la ficha)
+        sql += f" UNION ALL SELECT {cols}, FALSE AS _previo FROM movimientos_stock WHERE articulo_id = %s AND fecha_hora IS NULL"
+        params.append(articulo_id)
+    sql += " ORDER BY fecha_hora ASC NULLS LAST, id ASC"
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+def _guardar_snapshot(cur, articulo_id: Any, df_k: pd.DataFrame, movimientos_previos: int) -> bool:
+    """Guarda el estado en la última fila con fecha_hora del kardex reproducido."""
+    con_fecha = df_k[df_k["fecha_hora"].notna()] if "fecha_hora" in df_k.columns else df_k.iloc[0:0]
+    if con_fecha.empty:
+        return False
+    u = con_fecha.iloc[-1]
+    cur.execute("""
+        INSERT INTO kardex_snapshots (
+            articulo_id, hasta_fecha_hora, hasta_mov_id, movimientos,
+            saldo_qty, saldo_valor, costo_promedio
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+    """, (
+        str(articulo_id), u["fecha_hora"], str(u["id"]), int(movimientos_previos + len(con_fecha)),
+        float(u["saldo_qty"]), float(u["saldo_valor"]), float(u["costo_promedio"]),
+    ))
+    return True
+
+
+# =====================================================================
+# API
+# =====================================================================
+
+def kardex_articulo(
+    articulo_id: Any,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Kardex del artículo para el rango.
+
+    Con fecha_desde arranca del último snapshot anterior a esa fecha y solo
+    reproduce la cola. Sin fecha_desde devuelve la historia completa desde
+    el primer movimiento (los snapshots no se usan para arrancar, así el
+    detalle y los totales de la ficha no quedan parciales).
+    Devuelve (df_kardex del rango, info) con
+    info = {saldo_inicial, desde_snapshot, reproducidos, snapshot_nuevo}.
+    """
+    desde_dt = datetime.combine(fecha_desde, datetime.min.time()) if fecha_desde else None
+    hasta_dt = datetime.combine(fecha_hasta, datetime.max.time()) if fecha_hasta else None
+
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            snapshots = _snapshots_instalados(cur)
+            snap = _snapshot_previo(cur, articulo_id, desde_dt) if snapshots and desde_dt else None
+            filas = _movimientos_cola(cur, articulo_id, snap, desde_dt, hasta_dt)
+
+            inicial = estado_inicial()
+            if snap:
+                inicial = estado_inicial(snap["saldo_qty"], snap["saldo_valor"], snap["costo_promedio"])
+
+            df = pd.DataFrame(filas, columns=list(COLUMNAS_MOVIMIENTOS) + ["_previo"])
+            previo = df.pop("_previo").fillna(False).astype(bool).to_numpy()
+            df_k = calcular_kardex_promedio_movil(df, inicial=inicial)
+
+            # Tramo anterior al rango: solo para el saldo inicial
+            if previo.any():
+                saldo_inicial = estado_final(df_k[previo], inicial)
+                df_rango = df_k[~previo]
+            else:
+                saldo_inicial = inicial
+                df_rango = df_k
+
+            snapshot_nuevo = False
+            if snapshots and len(df_k) >= SNAPSHOT_CADA:
+                previos_snap = int(snap["movimientos"]) if snap else 0
+                snapshot_nuevo = _guardar_snapshot(cur, articulo_id, df_k, previos_snap)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    info = {
+        "saldo_inicial": saldo_inicial,
+        "desde_snapshot": snap["hasta_fecha_hora"] if snap else None,
+        "reproducidos": len(df_k),
+        "snapshot_nuevo": snapshot_nuevo,
+    }
+    return df_rango.reset_index(drop=True), info
+
+
+# =====================================================================
+# VALUACIÓN DE INVENTARIO (todo el catálogo)
+# =====================================================================
+
+COLUMNAS_VALUACION = ("articulo_id", "deposito_id", "saldo_qty", "costo_promedio", "saldo_valor")
+
+# Depósito del movimiento: el propio, o origen/destino según el signo
+SQL_VALUACION = """
+    SELECT
+        articulo_id, id, fecha_hora, qty_base, precio_unit_aplicado,
+        COALESCE(
+            deposito_id,
+            CASE WHEN qty_base < 0 THEN deposito_origen_id ELSE deposito_destino_id END
+        ) AS deposito_id
+    FROM movimientos_stock
+"""
+
+
+def _valuar(res: pd.DataFrame, dep: pd.DataFrame, solo_con_stock: bool) -> pd.DataFrame:
+    """Cantidad por depósito valuada al costo promedio (único) del artículo."""
+    out = dep.rename(columns={"qty_base": "saldo_qty"}).merge(
+        res[["articulo_id", "costo_promedio"]], on="articulo_id", how="left"
+    )
+    out["saldo_valor"] = out["saldo_qty"] * out["costo_promedio"]
+    if solo_con_stock:
+        out = out[out["saldo_qty"] != 0]
+    return out[list(COLUMNAS_VALUACION)].reset_index(drop=True)
+
+
+def iter_valuacion(
+    al: Optional[date] = None,
+    itersize: int = None,
+    solo_con_stock: bool = True,
+) -> Iterator[pd.DataFrame]:
+    """
+    Valuación al cierre de `al` (o a hoy) por artículo y depósito, en bloques.
+
+    Lee movimientos_stock con ejecutar_consulta_stream ordenado por
+    (articulo_id, fecha_hora, id). Cada bloque se calcula con el motor
+    multi-artículo; el último artículo del bloque puede seguir en el
+    próximo, así que se guarda su estado (saldo, costo y cantidades por
+    depósito) y se entrega recién cuando termina. La memoria queda en un
+    bloque + un artículo, no en la tabla.
+
+    El costo promedio es por artículo (como en la ficha); cada depósito se
+    valúa a ese costo.
+    """
+    sql = SQL_VALUACION
+    params: tuple = ()
+    if al is not None:
+        sql += " WHERE fecha_hora <= %s"
+        params = (datetime.combine(al, datetime.max.time()),)
+    sql += " ORDER BY articulo_id, fecha_hora ASC NULLS LAST, id ASC"
+
+    pend_res = None  # artículo en curso: estado final hasta ahora
+    pend_dep = None  # y sus cantidades por depósito
+
+    for bloque in ejecutar_consulta_stream(sql, params, itersize=itersize):
+        if bloque.empty:
+            continue
+
+        iniciales = None
+        if pend_res is not None:
+            u = pend_res.iloc[0]
+            iniciales = {u["articulo_id"]: estado_inicial(u["saldo_qty"], u["saldo_valor"], u["costo_promedio"])}
+
+        df_k = calcular_kardex_por_articulo(bloque, iniciales=iniciales)
+        res = resumen_por_articulo(df_k)
+        dep = (
+            df_k.groupby(["articulo_id", "deposito_id"], sort=False, dropna=False)["qty_base"]
+            .sum().reset_index()
+        )
+
+        if pend_res is not None:
+            previo = pend_res["articulo_id"].iloc[0]
+            if (res["articulo_id"] == previo).any():
+                # sigue en este bloque: el estado ya viene por `iniciales`
+                dep = (
+                    pd.concat([pend_dep, dep], ignore_index=True)
+                    .groupby(["articulo_id", "deposito_id"], sort=False, dropna=False)["qty_base"]
+                    .sum().reset_index()
+                )
+            else:
+                yield _valuar(pend_res, pend_dep, solo_con_stock)
+
+        ultimo = bloque["articulo_id"].iloc[-1]
+        es_ultimo_res = res["articulo_id"] == ultimo
+        es_ultimo_dep = dep["articulo_id"] == ultimo
+        pend_res, pend_dep = res[es_ultimo_res], dep[es_ultimo_dep]
+
+        listos = _valuar(res[~es_ultimo_res], dep[~es_ultimo_dep], solo_con_stock)
+        if not listos.empty:
+            yield listos
+
+    if pend_res is not None:
+        yield _valuar(pend_res, pend_dep, solo_con_stock)
+
+
+def valuacion_inventario(al: Optional[date] = None, itersize: int = None,
+                         solo_con_stock: bool = True) -> pd.DataFrame:
+    """Valuación completa (una fila por artículo y depósito)."""
+    bloques = [b for b in iter_valuacion(al, itersize, solo_con_stock) if not b.empty]
+    if not bloques:
+        return pd.DataFrame(columns=list(COLUMNAS_VALUACION))
+    return pd.concat(bloques, ignore_index=True)
+
+
+def exportar_valuacion(ruta: str, al: Optional[date] = None, formato: str = None) -> int:
+    """
+    Escribe la valuación en Excel, CSV o Parquet bloque a bloque
+    (exportar.exportar_bloques). Devuelve la cantidad de filas escritas.
+    """
+    formato = formato or str(ruta).rsplit(".", 1)[-1].lower()
+    if formato not in ("xlsx", "csv", "parquet"):
+        formato = "xlsx"
+    return exportar_bloques(iter_valuacion(al), formato=formato, ruta=ruta)["filas"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "valuacion":
+        al = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None
+        ruta = sys.argv[3] if len(sys.argv) > 3 else "valuacion_inventario.xlsx"
+        n = exportar_valuacion(ruta, al)
+        print(f"✅ Valuación {'al ' + al.isoformat() if al else 'a hoy'}: {n} filas en {ruta}")
+    else:
+        asegurar_kardex_snapshots()
+        print("✅ kardex_snapshots: tabla, trigger e índice creados")
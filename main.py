@@ -32,6 +32,7 @@ from familias import mostrar_familias
 from comprobantes import mostrar_menu_comprobantes
 from ui_chat_chainlit import mostrar_chat_chainlit
 from sql_core import ejecutar_consulta
+from sql_stock import precalentar_stock
 
 # NUEVOS IMPORTS PARA SOPORTE DE COMPRAS
 from ia_interpretador import interpretar_pregunta
@@ -42,7 +43,7 @@ from sql_compras import (
     get_compras_multiples,
     get_compras_anio,
 )
-from utils_format import formatear_dataframe
+from utils_format import ResultadoConsulta
 from utils_openai import responder_con_openai
 
 # =========================
@@ -81,7 +82,7 @@ def ejecutar_consulta_por_tipo(tipo: str, params: dict, pregunta_original: str):
             prov_lbl = ", ".join([p.upper() for p in proveedores_raw[:3]])
             return (
                 f"🧾 Facturas de **{prov_lbl}** ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -101,7 +102,7 @@ def ejecutar_consulta_por_tipo(tipo: str, params: dict, pregunta_original: str):
 
             return (
                 f"🛒 Compras de **{proveedor.upper()}** en {anio} ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -120,7 +121,7 @@ def ejecutar_consulta_por_tipo(tipo: str, params: dict, pregunta_original: str):
 
             return (
                 f"🛒 Compras de **{proveedor.upper()}** en {mes} {anio or ''} ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -151,7 +152,7 @@ def ejecutar_consulta_por_tipo(tipo: str, params: dict, pregunta_original: str):
             filtro = f" {mes_lbl} {anio_lbl}".strip()
             return (
                 f"🛒 Compras de **{prov_lbl}**{filtro} ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -166,7 +167,7 @@ def ejecutar_consulta_por_tipo(tipo: str, params: dict, pregunta_original: str):
 
             return (
                 f"🛒 Todas las compras en {anio} ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -191,6 +192,7 @@ st.title("Inicio")
 # INICIALIZACIÓN
 # =========================
 init_db()
+precalentar_stock()
 user = get_current_user() or {}
 
 if "radio_menu" not in st.session_state:
@@ -25,8 +25,9 @@ from sql_compras import (  # Importar funciones de compras
     get_detalle_compras_proveedor_mes,
     get_compras_multiples,
     get_compras_anio,
+    iter_compras_anio,
 )
-from utils_format import formatear_dataframe
+from utils_format import ResultadoConsulta
 from utils_openai import responder_con_openai
 
 ORQUESTADOR_CARGADO = True
@@ -209,7 +210,7 @@ def _ejecutar_consulta(tipo: str, params: dict, pregunta_original: str):
             prov_lbl = ", ".join([p.upper() for p in proveedores_raw[:3]])
             return (
                 f"🧾 Facturas de **{prov_lbl}** ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -235,7 +236,7 @@ def _ejecutar_consulta(tipo: str, params: dict, pregunta_original: str):
 
             return (
                 f"🛒 Compras de **{proveedor.upper()}** en {anio} ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -261,7 +262,7 @@ def _ejecutar_consulta(tipo: str, params: dict, pregunta_original: str):
 
             return (
                 f"🛒 Compras de **{proveedor.upper()}** en {mes} {anio or ''} ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -300,7 +301,7 @@ def _ejecutar_consulta(tipo: str, params: dict, pregunta_original: str):
             filtro = f" {mes_lbl} {anio_lbl}".strip()
             return (
                 f"🛒 Compras de **{prov_lbl}**{filtro} ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df),
                 None,
             )
 
@@ -321,7 +322,7 @@ def _ejecutar_consulta(tipo: str, params: dict, pregunta_original: str):
 
             return (
                 f"🛒 Todas las compras en {anio} ({len(df)} registros):",
-                formatear_dataframe(df),
+                ResultadoConsulta(df, bloques=lambda: iter_compras_anio(anio)),
                 None,
             )
 
@@ -334,7 +335,7 @@ def _ejecutar_consulta(tipo: str, params: dict, pregunta_original: str):
         return f"❌ Error: {str(e)[:150]}", None, None
 
 
-def procesar_pregunta(pregunta: str) -> Tuple[str, Optional[pd.DataFrame]]:
+def procesar_pregunta(pregunta: str) -> Tuple[str, Optional[ResultadoConsulta]]:
     mensaje, df, sugerencia = procesar_pregunta_v2(pregunta)
 
     if sugerencia:
@@ -347,7 +348,7 @@ def procesar_pregunta(pregunta: str) -> Tuple[str, Optional[pd.DataFrame]]:
     return mensaje, df
 
 
-def procesar_pregunta_router(pregunta: str) -> Tuple[str, Optional[pd.DataFrame]]:
+def procesar_pregunta_router(pregunta: str) -> Tuple[str, Optional[ResultadoConsulta]]:
     return procesar_pregunta(pregunta)
 
 
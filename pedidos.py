@@ -12,7 +12,7 @@ import io
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode, GridUpdateMode
 
 # Importar conexión a DB
-from sql_core import ejecutar_consulta, get_db_connection
+from sql_core import ejecutar_consulta, get_db_connection, invalidar_tablas
 
 # =====================================================================
 # CONFIGURACIÓN
@@ -37,21 +37,25 @@ SECCIONES = {
 # FUNCIONES DE BASE DE DATOS
 # =====================================================================
 
-def generar_numero_pedido() -> str:
-    query = "SELECT MAX(numero_pedido) FROM pedidos"
-    df = ejecutar_consulta(query)
-
-    if df is None or df.empty or df.iloc[0, 0] is None:
+def _siguiente_numero_pedido(ultimo) -> str:
+    if ultimo is None:
         return "A00001"
-
-    ultimo = str(df.iloc[0, 0])
     try:
-        numero = int(ultimo[1:]) + 1
+        numero = int(str(ultimo)[1:]) + 1
     except:
         numero = 1
     return f"A{numero:05d}"
 
 
+def generar_numero_pedido() -> str:
+    query = "SELECT MAX(numero_pedido) FROM pedidos"
+    df = ejecutar_consulta(query)
+
+    if df is None or df.empty:
+        return "A00001"
+    return _siguiente_numero_pedido(df.iloc[0, 0])
+
+
 def crear_pedido(
     usuario: str,
     nombre_usuario: str,
@@ -66,7 +70,10 @@ def crear_pedido(
 
     try:
         cursor = conn.cursor()
-        numero_pedido = generar_numero_pedido()
+        # Número de pedido con la misma conexión (sin pedir otra al pool)
+        cursor.execute("SELECT MAX(numero_pedido) FROM pedidos")
+        row = cursor.fetchone()
+        numero_pedido = _siguiente_numero_pedido(row[0] if row else None)
 
         cursor.execute("""
             INSERT INTO pedidos (numero_pedido, usuario, nombre_usuario, seccion, observaciones)
@@ -98,6 +105,7 @@ def crear_pedido(
 
         conn.commit()
         conn.close()
+        invalidar_tablas("pedidos", "pedidos_detalle", "notificaciones")
         return True, f"✅ Pedido {numero_pedido} creado correctamente", numero_pedido
 
     except Exception as e:
@@ -150,6 +158,7 @@ def marcar_notificacion_leida(notif_id: int) -> bool:
         )
         conn.commit()
         conn.close()
+        invalidar_tablas("notificaciones")
         return True
     except:
         try:
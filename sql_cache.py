@@ -0,0 +1,369 @@
+# =========================
+# SQL CACHE - CACHÉ DE RESULTADOS PARA ejecutar_consulta
+# =========================
+"""
+Caché compartida de resultados de SELECT (DataFrame) por SQL normalizado
++ parámetros.
+
+Invalidación por versión de tabla: cada entrada guarda la versión de las
+tablas que lee (FROM/JOIN). Los caminos de escritura llaman a
+sql_core.invalidar_tablas("stock", ...) que incrementa esas versiones;
+una entrada con alguna versión vieja es un miss. El TTL queda como red de
+seguridad para escrituras que no pasan por la app (cargas externas).
+
+Backends:
+    memoria -> LRU en proceso acotada por bytes (default)
+    sqlite  -> archivo local compartido entre workers del mismo host
+"""
+
+import os
+import re
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+
+# =====================================================================
+# HELPERS
+# =====================================================================
+
+_RE_ESPACIOS = re.compile(r"\s+")
+_RE_TABLAS = re.compile(r'\b(?:FROM|JOIN)\s+((?:"?\w+"?\.)?"?\w+"?)', re.IGNORECASE)
+_RE_TABLAS_ESCRITURA = re.compile(
+    r'\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)\s+((?:"?\w+"?\.)?"?\w+"?)',
+    re.IGNORECASE,
+)
+
+
+def normalizar_tabla(nombre: str) -> str:
+    t = str(nombre or "").replace('"', "").strip().lower()
+    if t.startswith("public."):
+        t = t[len("public."):]
+    return t
+
+
+def normalizar_sql(query: str) -> str:
+    return _RE_ESPACIOS.sub(" ", str(query or "")).strip()
+
+
+def tablas_leidas(query: str) -> set:
+    return {normalizar_tabla(t) for t in _RE_TABLAS.findall(query or "")}
+
+
+def tablas_escritas(query: str) -> set:
+    return {normalizar_tabla(t) for t in _RE_TABLAS_ESCRITURA.findall(query or "")}
+
+
+def es_cacheable(query: str) -> bool:
+    q = normalizar_sql(query).upper()
+    if not (q.startswith("SELECT") or q.startswith("WITH")):
+        return False
+    if " FOR UPDATE" in q or " FOR SHARE" in q or tablas_escritas(query):
+        return False
+    return True
+
+
+def _tamanio_df(df: pd.DataFrame) -> int:
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return len(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# =====================================================================
+# BACKEND: MEMORIA (LRU POR BYTES)
+# =====================================================================
+
+class CacheMemoria:
+    """LRU en proceso. Guarda el DataFrame tal cual (la copia la hace QueryCache)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._versiones: Dict[str, int] = {}
+
+    def get(self, clave: str):
+        with self._lock:
+            e = self._entradas.get(clave)
+            if e is None:
+                return None
+            self._entradas.move_to_end(clave)
+            df, deps, creado, _ = e
+            return df, deps, creado
+
+    def set(self, clave: str, df: pd.DataFrame, deps: Dict[str, int], creado: float) -> None:
+        n = _tamanio_df(df)
+        if n > self.max_bytes:
+            return
+        with self._lock:
+            viejo = self._entradas.pop(clave, None)
+            if viejo is not None:
+                self._bytes -= viejo[3]
+            self._entradas[clave] = (df, deps, creado, n)
+            self._bytes += n
+            while self._bytes > self.max_bytes and self._entradas:
+                _, e = self._entradas.popitem(last=False)
+                self._bytes -= e[3]
+
+    def delete(self, clave: str) -> None:
+        with self._lock:
+            e = self._entradas.pop(clave, None)
+            if e is not None:
+                self._bytes -= e[3]
+
+    def versiones(self, tablas: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {t: self._versiones.get(t, 0) for t in tablas}
+
+    def bump(self, tablas: Iterable[str]) -> None:
+        with self._lock:
+            for t in tablas:
+                self._versiones[t] = self._versiones.get(t, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"backend": "memoria", "entradas": len(self._entradas),
+                    "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+# =====================================================================
+# BACKEND: SQLITE (COMPARTIDO ENTRE WORKERS)
+# =====================================================================
+
+class CacheSQLite:
+    """
+    Entradas y versiones de tabla en un archivo SQLite (WAL).
+    Una conexión por operación: sirve para threads y procesos.
+    """
+
+    def __init__(self, ruta: str, max_bytes: int):
+        self.ruta = ruta
+        self.max_bytes = int(max_bytes)
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(carpeta, exist_ok=True)
+        db = self._conn()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entradas (
+                    clave TEXT PRIMARY KEY,
+                    payload BLOB NOT NULL,
+                    deps TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    creado REAL NOT NULL,
+                    usado REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS ix_cache_usado ON cache_entradas (usado)")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS cache_versiones (
+                    tabla TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+        finally:
+            db.close()
+
+    def _conn(self):
+        return sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+
+    def get(self, clave: str):
+        db = self._conn()
+        try:
+            row = db.execute(
+                "SELECT payload, deps, creado FROM cache_entradas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE cache_entradas SET usado = ? WHERE clave = ?", (time.time(), clave))
+            return pickle.loads(row[0]), json.loads(row[1]), row[2]
+        finally:
+            db.close()
+
+    def set(self, clave: str, df: pd.DataFrame, deps: Dict[str, int], creado: float) -> None:
+        payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        db = self._conn()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT OR REPLACE INTO cache_entradas (clave, payload, deps, bytes, creado, usado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (clave, payload, json.dumps(deps), len(payload), creado, time.time()),
+            )
+            total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM cache_entradas").fetchone()[0]
+            if total > self.max_bytes:
+                # Desalojo LRU hasta quedar bajo el límite
+                for c, n in db.execute(
+                    "SELECT clave, bytes FROM cache_entradas ORDER BY usado ASC"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM cache_entradas WHERE clave = ?", (c,))
+                    total -= n
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def delete(self, clave: str) -> None:
+        db = self._conn()
+        try:
+            db.execute("DELETE FROM cache_entradas WHERE clave = ?", (clave,))
+        finally:
+            db.close()
+
+    def versiones(self, tablas: Iterable[str]) -> Dict[str, int]:
+        tablas = list(tablas)
+        if not tablas:
+            return {}
+        db = self._conn()
+        try:
+            marcas = ",".join("?" * len(tablas))
+            rows = db.execute(
+                f"SELECT tabla, version FROM cache_versiones WHERE tabla IN ({marcas})", tablas
+            ).fetchall()
+        finally:
+            db.close()
+        encontradas = dict(rows)
+        return {t: int(encontradas.get(t, 0)) for t in tablas}
+
+    def bump(self, tablas: Iterable[str]) -> None:
+        db = self._conn()
+        try:
+            for t in tablas:
+                db.execute(
+                    "INSERT INTO cache_versiones (tabla, version) VALUES (?, 1) "
+                    "ON CONFLICT(tabla) DO UPDATE SET version = version + 1",
+                    (t,),
+                )
+        finally:
+            db.close()
+
+    def clear(self) -> None:
+        db = self._conn()
+        try:
+            db.execute("DELETE FROM cache_entradas")
+        finally:
+            db.close()
+
+    def info(self) -> dict:
+        db = self._conn()
+        try:
+            n, b = db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM cache_entradas").fetchone()
+        finally:
+            db.close()
+        return {"backend": "sqlite", "ruta": self.ruta, "entradas": n,
+                "bytes": b, "max_bytes": self.max_bytes}
+
+
+# =====================================================================
+# FRONT: CLAVE + VALIDACIÓN POR VERSIONES + TTL
+# =====================================================================
+
+class QueryCache:
+
+    def __init__(self, backend, ttl: int = 300):
+        self.backend = backend
+        self.ttl = int(ttl)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def clave(query: str, params) -> str:
+        base = normalizar_sql(query) + "\x00" + repr(tuple(params) if params else ())
+        return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+    def _contar(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def snapshot(self, query: str) -> Dict[str, int]:
+        """Versiones de las tablas que lee la consulta. Tomarlo ANTES de ejecutar."""
+        return self.backend.versiones(tablas_leidas(query))
+
+    def get(self, query: str, params) -> Optional[pd.DataFrame]:
+        clave = self.clave(query, params)
+        try:
+            e = self.backend.get(clave)
+        except Exception as ex:
+            print(f"⚠️ Caché: error leyendo ({ex})")
+            e = None
+        if e is None:
+            self._contar(False)
+            return None
+
+        df, deps, creado = e
+        vigente = (time.time() - creado) < self.ttl
+        if vigente and deps:
+            vigente = self.backend.versiones(deps.keys()) == deps
+        if not vigente:
+            self.backend.delete(clave)
+            self._contar(False)
+            return None
+
+        self._contar(True)
+        return df.copy()
+
+    def put(self, query: str, params, df: pd.DataFrame, deps: Dict[str, int]) -> None:
+        try:
+            self.backend.set(self.clave(query, params), df.copy(), deps, time.time())
+        except Exception as ex:
+            print(f"⚠️ Caché: error guardando ({ex})")
+
+    def invalidar(self, tablas: Iterable[str]) -> None:
+        tablas = {normalizar_tabla(t) for t in tablas if t}
+        if tablas:
+            self.backend.bump(tablas)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        out = dict(self.backend.info())
+        out.update({
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if (hits + misses) else 0.0,
+            "ttl": self.ttl,
+        })
+        return out
+
+
+def crear_cache_consultas(backend: str = "memoria", max_mb: int = 128, ttl: int = 300,
+                          ruta: str = None) -> Optional[QueryCache]:
+    """backend: 'memoria' | 'sqlite' | 'off'. Devuelve None si está apagada."""
+    backend = (backend or "memoria").strip().lower()
+    max_bytes = int(max_mb) * 1024 * 1024
+    if backend in ("off", "no", "0", "none", ""):
+        return None
+    if backend == "sqlite":
+        ruta = ruta or os.path.join(os.path.expanduser("~"), ".fertichat", "cache_consultas.sqlite")
+        try:
+            return QueryCache(CacheSQLite(ruta, max_bytes), ttl=ttl)
+        except Exception as e:
+            print(f"⚠️ Caché SQLite no disponible ({e}), uso memoria")
+    return QueryCache(CacheMemoria(max_bytes), ttl=ttl)
@@ -9,7 +9,13 @@ from sql_core import (
     ejecutar_consulta,
     _sql_total_num_expr,
     _sql_total_num_expr_usd,
-    _sql_total_num_expr_general
+    _sql_total_num_expr_general,
+    _sql_anio_expr,
+    _sql_mes_expr,
+    _sql_moneda_expr,
+    _sql_prov_norm_expr,
+    _sql_art_norm_expr,
+    _sql_tabla_compras,
 )
 
 
@@ -92,18 +98,19 @@ def get_comparacion_proveedor_meses(*args, **kwargs) -> pd.DataFrame:
     prov_where = ""
     prov_param = []
     if proveedor_norm:
-        prov_where = 'AND LOWER(TRIM("Cliente / Proveedor")) LIKE %s'
+        prov_where = f'AND {_sql_prov_norm_expr()} LIKE %s'
         prov_param = [f"%{proveedor_norm}%"]
 
+    tabla = _sql_tabla_compras(meses=[mes1, mes2])
     sql = f"""
         SELECT
             TRIM("Cliente / Proveedor") AS Proveedor,
-            SUM(CASE WHEN TRIM("Mes") = %s THEN {total_expr} ELSE 0 END) AS "{label1_sql}",
-            SUM(CASE WHEN TRIM("Mes") = %s THEN {total_expr} ELSE 0 END) AS "{label2_sql}",
-            SUM(CASE WHEN TRIM("Mes") = %s THEN {total_expr} ELSE 0 END) -
-            SUM(CASE WHEN TRIM("Mes") = %s THEN {total_expr} ELSE 0 END) AS Diferencia
-        FROM chatbot_raw
-        WHERE TRIM("Mes") IN (%s, %s)
+            SUM(CASE WHEN {_sql_mes_expr()} = %s THEN {total_expr} ELSE 0 END) AS "{label1_sql}",
+            SUM(CASE WHEN {_sql_mes_expr()} = %s THEN {total_expr} ELSE 0 END) AS "{label2_sql}",
+            SUM(CASE WHEN {_sql_mes_expr()} = %s THEN {total_expr} ELSE 0 END) -
+            SUM(CASE WHEN {_sql_mes_expr()} = %s THEN {total_expr} ELSE 0 END) AS Diferencia
+        FROM {tabla}
+        WHERE {_sql_mes_expr()} IN (%s, %s)
           {prov_where}
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         GROUP BY TRIM("Cliente / Proveedor")
@@ -131,19 +138,20 @@ def get_comparacion_articulo_anios(anios: List[int], articulo_like: str) -> pd.D
 
     cols = []
     for y in anios:
-        cols.append(f"""SUM(CASE WHEN "Año"::int = {y} THEN {total_expr} ELSE 0 END) AS "{y}" """)
+        cols.append(f"""SUM(CASE WHEN {_sql_anio_expr()} = {y} THEN {total_expr} ELSE 0 END) AS "{y}" """)
 
     cols_sql = ",\n            ".join(cols)
     anios_sql = ", ".join(str(y) for y in anios)
 
+    tabla = _sql_tabla_compras(anios=anios)
     sql = f"""
         SELECT
             TRIM("Articulo") AS Articulo,
             {cols_sql}
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año"::int IN ({anios_sql})
-          AND LOWER(TRIM("Articulo")) LIKE %s
+          AND {_sql_anio_expr()} IN ({anios_sql})
+          AND {_sql_art_norm_expr()} LIKE %s
         GROUP BY TRIM("Articulo")
         ORDER BY TRIM("Articulo")
         LIMIT 100
@@ -165,16 +173,17 @@ def get_comparacion_proveedor_anios_like(proveedor_like: str, anios: list[int])
     a1, a2 = anios[0], anios[1]
     total_expr = _sql_total_num_expr_general()
 
+    tabla = _sql_tabla_compras(anios=[a1, a2])
     sql = f"""
         SELECT
             TRIM("Cliente / Proveedor") AS Proveedor,
-            SUM(CASE WHEN "Año"::int = %s THEN {total_expr} ELSE 0 END) AS "{a1}",
-            SUM(CASE WHEN "Año"::int = %s THEN {total_expr} ELSE 0 END) AS "{a2}",
+            SUM(CASE WHEN {_sql_anio_expr()} = %s THEN {total_expr} ELSE 0 END) AS "{a1}",
+            SUM(CASE WHEN {_sql_anio_expr()} = %s THEN {total_expr} ELSE 0 END) AS "{a2}",
             SUM({total_expr}) AS total_general
-        FROM chatbot_raw
-        WHERE LOWER(TRIM("Cliente / Proveedor")) LIKE %s
+        FROM {tabla}
+        WHERE {_sql_prov_norm_expr()} LIKE %s
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año"::int IN (%s, %s)
+          AND {_sql_anio_expr()} IN (%s, %s)
         GROUP BY TRIM("Cliente / Proveedor")
         ORDER BY total_general DESC
         LIMIT 1
@@ -205,17 +214,17 @@ def get_comparacion_proveedor_anios_monedas(anios: List[int], proveedores: List[
     prov_where = ""
     prov_params = []
     if proveedores:
-        parts = [f'LOWER(TRIM("Cliente / Proveedor")) LIKE %s' for _ in proveedores]
+        parts = [f'{_sql_prov_norm_expr()} LIKE %s' for _ in proveedores]
         prov_params = [f"%{p.lower()}%" for p in proveedores]
         prov_where = f"AND ({' OR '.join(parts)})"
 
     cols = []
     for y in anios:
         cols.append(
-            f"""SUM(CASE WHEN "Año"::int = {y} AND TRIM("Moneda") = '$' THEN {total_pesos} ELSE 0 END) AS "{y}_$" """
+            f"""SUM(CASE WHEN {_sql_anio_expr()} = {y} AND {_sql_moneda_expr()} = '$' THEN {total_pesos} ELSE 0 END) AS "{y}_$" """
         )
         cols.append(
-            f"""SUM(CASE WHEN "Año"::int = {y} AND TRIM("Moneda") IN ('U$S','U$$') THEN {total_usd} ELSE 0 END) AS "{y}_USD" """
+            f"""SUM(CASE WHEN {_sql_anio_expr()} = {y} AND {_sql_moneda_expr()} IN ('U$S','U$$') THEN {total_usd} ELSE 0 END) AS "{y}_USD" """
         )
 
     cols_sql = ",\n            ".join(cols)
@@ -223,13 +232,14 @@ def get_comparacion_proveedor_anios_monedas(anios: List[int], proveedores: List[
     order_sql = f'"{y_last}_$" DESC, "{y_last}_USD" DESC'
     anios_sql = ", ".join(str(y) for y in anios)
 
+    tabla = _sql_tabla_compras(anios=anios)
     sql = f"""
         SELECT
             TRIM("Cliente / Proveedor") AS Proveedor,
             {cols_sql}
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año"::int IN ({anios_sql})
+          AND {_sql_anio_expr()} IN ({anios_sql})
           {prov_where}
         GROUP BY TRIM("Cliente / Proveedor")
         ORDER BY {order_sql}
@@ -254,10 +264,10 @@ def get_comparacion_familia_anios_monedas(anios: List[int], familias: List[str]
     cols = []
     for y in anios:
         cols.append(
-            f"""SUM(CASE WHEN "Año"::int = {y} AND TRIM("Moneda") = '$' THEN {total_pesos} ELSE 0 END) AS "{y}_$" """
+            f"""SUM(CASE WHEN {_sql_anio_expr()} = {y} AND {_sql_moneda_expr()} = '$' THEN {total_pesos} ELSE 0 END) AS "{y}_$" """
         )
         cols.append(
-            f"""SUM(CASE WHEN "Año"::int = {y} AND TRIM("Moneda") IN ('U$S','U$$') THEN {total_usd} ELSE 0 END) AS "{y}_USD" """
+            f"""SUM(CASE WHEN {_sql_anio_expr()} = {y} AND {_sql_moneda_expr()} IN ('U$S','U$$') THEN {total_usd} ELSE 0 END) AS "{y}_USD" """
         )
 
     cols_sql = ",\n            ".join(cols)
@@ -265,13 +275,14 @@ def get_comparacion_familia_anios_monedas(anios: List[int], familias: List[str]
     order_sql = f'"{y_last}_$" DESC, "{y_last}_USD" DESC'
     anios_sql = ", ".join(str(y) for y in anios)
 
+    tabla = _sql_tabla_compras(anios=anios)
     sql = f"""
         SELECT
             TRIM(COALESCE("Familia", 'SIN FAMILIA')) AS Familia,
             {cols_sql}
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año"::int IN ({anios_sql})
+          AND {_sql_anio_expr()} IN ({anios_sql})
           {fam_where}
         GROUP BY TRIM(COALESCE("Familia", 'SIN FAMILIA'))
         ORDER BY {order_sql}
@@ -305,7 +316,7 @@ def get_comparacion_proveedores_meses_multi(
     params: List = []
     for m in meses:
         cols.append(
-            f"""SUM(CASE WHEN TRIM("Mes") = %s THEN {total_expr} ELSE 0 END) AS "{m}" """
+            f"""SUM(CASE WHEN {_sql_mes_expr()} = %s THEN {total_expr} ELSE 0 END) AS "{m}" """
         )
         params.append(m)
 
@@ -317,7 +328,7 @@ def get_comparacion_proveedores_meses_multi(
         p_norm = p.strip().lower()
         if not p_norm:
             continue
-        prov_clauses.append('LOWER(TRIM("Cliente / Proveedor")) LIKE %s')
+        prov_clauses.append(f'{_sql_prov_norm_expr()} LIKE %s')
         params.append(f"%{p_norm}%")
 
     if not prov_clauses:
@@ -329,13 +340,14 @@ def get_comparacion_proveedores_meses_multi(
     meses_placeholders = ", ".join(["%s"] * len(meses))
     params.extend(meses)
 
+    tabla = _sql_tabla_compras(meses=meses)
     sql = f"""
         SELECT
             TRIM("Cliente / Proveedor") AS Proveedor,
             {cols_sql}
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ({prov_where})
-          AND TRIM("Mes") IN ({meses_placeholders})
+          AND {_sql_mes_expr()} IN ({meses_placeholders})
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         GROUP BY TRIM("Cliente / Proveedor")
         ORDER BY Proveedor
@@ -382,7 +394,7 @@ def get_comparacion_proveedores_anios_multi(
     cols = []
     for y in anios_ok:
         cols.append(
-            f"""SUM(CASE WHEN "Año"::int = {y} THEN {total_expr} ELSE 0 END) AS "{y}" """
+            f"""SUM(CASE WHEN {_sql_anio_expr()} = {y} THEN {total_expr} ELSE 0 END) AS "{y}" """
         )
     cols_sql = ",\n            ".join(cols)
 
@@ -391,8 +403,8 @@ def get_comparacion_proveedores_anios_multi(
     if len(anios_ok) == 2:
         y1, y2 = anios_ok[0], anios_ok[1]
         diff_sql = f""",
-            (SUM(CASE WHEN "Año"::int = {y2} THEN {total_expr} ELSE 0 END) -
-             SUM(CASE WHEN "Año"::int = {y1} THEN {total_expr} ELSE 0 END)) AS Diferencia
+            (SUM(CASE WHEN {_sql_anio_expr()} = {y2} THEN {total_expr} ELSE 0 END) -
+             SUM(CASE WHEN {_sql_anio_expr()} = {y1} THEN {total_expr} ELSE 0 END)) AS Diferencia
         """
 
     anios_sql = ", ".join(str(y) for y in anios_ok)
@@ -404,7 +416,7 @@ def get_comparacion_proveedores_anios_multi(
         p_norm = p.strip().lower()
         if not p_norm:
             continue
-        prov_clauses.append('LOWER(TRIM("Cliente / Proveedor")) LIKE %s')
+        prov_clauses.append(f'{_sql_prov_norm_expr()} LIKE %s')
         params.append(f"%{p_norm}%")
 
     if not prov_clauses:
@@ -412,15 +424,16 @@ def get_comparacion_proveedores_anios_multi(
 
     prov_where = " OR ".join(prov_clauses)
 
+    tabla = _sql_tabla_compras(anios=anios_ok)
     sql = f"""
         SELECT
             TRIM("Cliente / Proveedor") AS Proveedor,
             {cols_sql}
             {diff_sql}
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ({prov_where})
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año"::int IN ({anios_sql})
+          AND {_sql_anio_expr()} IN ({anios_sql})
         GROUP BY TRIM("Cliente / Proveedor")
         ORDER BY Proveedor
         LIMIT 300
@@ -437,13 +450,14 @@ def get_gastos_todas_familias_mes(mes_key: str) -> pd.DataFrame:
     """Gastos de todas las familias en un mes."""
     total_pesos = _sql_total_num_expr()
     total_usd = _sql_total_num_expr_usd()
+    tabla = _sql_tabla_compras(meses=[mes_key])
     sql = f"""
         SELECT
             TRIM(COALESCE("Familia", 'SIN FAMILIA')) AS Familia,
-            SUM(CASE WHEN TRIM("Moneda") = '$' THEN {total_pesos} ELSE 0 END) AS Total_Pesos,
-            SUM(CASE WHEN TRIM("Moneda") IN ('U$S', 'U$$') THEN {total_usd} ELSE 0 END) AS Total_USD
-        FROM chatbot_raw
-        WHERE TRIM("Mes") = %s
+            SUM(CASE WHEN {_sql_moneda_expr()} = '$' THEN {total_pesos} ELSE 0 END) AS Total_Pesos,
+            SUM(CASE WHEN {_sql_moneda_expr()} IN ('U$S', 'U$$') THEN {total_usd} ELSE 0 END) AS Total_USD
+        FROM {tabla}
+        WHERE {_sql_mes_expr()} = %s
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         GROUP BY TRIM(COALESCE("Familia", 'SIN FAMILIA'))
         ORDER BY Total_Pesos DESC, Total_USD DESC
@@ -455,13 +469,14 @@ def get_gastos_todas_familias_anio(anio: int) -> pd.DataFrame:
     """Gastos de todas las familias en un año."""
     total_pesos = _sql_total_num_expr()
     total_usd = _sql_total_num_expr_usd()
+    tabla = _sql_tabla_compras(anios=[anio])
     sql = f"""
         SELECT
             TRIM(COALESCE("Familia", 'SIN FAMILIA')) AS Familia,
-            SUM(CASE WHEN TRIM("Moneda") = '$' THEN {total_pesos} ELSE 0 END) AS Total_Pesos,
-            SUM(CASE WHEN TRIM("Moneda") IN ('U$S', 'U$$') THEN {total_usd} ELSE 0 END) AS Total_USD
-        FROM chatbot_raw
-        WHERE "Año"::int = %s
+            SUM(CASE WHEN {_sql_moneda_expr()} = '$' THEN {total_pesos} ELSE 0 END) AS Total_Pesos,
+            SUM(CASE WHEN {_sql_moneda_expr()} IN ('U$S', 'U$$') THEN {total_usd} ELSE 0 END) AS Total_USD
+        FROM {tabla}
+        WHERE {_sql_anio_expr()} = %s
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         GROUP BY TRIM(COALESCE("Familia", 'SIN FAMILIA'))
         ORDER BY Total_Pesos DESC, Total_USD DESC
@@ -481,7 +496,7 @@ def get_gastos_secciones_detalle_completo(familias: List[str], mes_key: str) ->
             "Moneda",
             {total_expr} AS Total
         FROM chatbot_raw
-        WHERE TRIM("Mes") = %s
+        WHERE {_sql_mes_expr()} = %s
           AND UPPER(TRIM(COALESCE("Familia", ''))) IN ({fam_placeholders})
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         ORDER BY TRIM("Familia"), Total DESC
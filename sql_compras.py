@@ -9,10 +9,18 @@ import streamlit as st
 
 from sql_core import (
     ejecutar_consulta,
+    ejecutar_consulta_stream,
     _sql_total_num_expr,
     _sql_total_num_expr_usd,
     _sql_total_num_expr_general,
-    get_ultimo_mes_disponible_hasta
+    get_ultimo_mes_disponible_hasta,
+    _sql_anio_expr,
+    _sql_mes_expr,
+    _sql_moneda_expr,
+    _sql_fecha_date_expr,
+    _sql_prov_norm_expr,
+    _sql_art_norm_expr,
+    _sql_tabla_compras,
 )
 
 
@@ -20,8 +28,7 @@ from sql_core import (
 # COMPRAS POR AÑO (SIN FILTRO DE PROVEEDOR/ARTÍCULO)
 # =====================================================================
 
-def get_compras_anio(anio: int, limite: int = 5000) -> pd.DataFrame:
-    """Todas las compras de un año."""
+def _sql_compras_anio(anio: int, limite: Optional[int]) -> tuple:
     # Usar expresión simple para evitar errores de parseo
     sql = f"""
         SELECT
@@ -34,18 +41,37 @@ def get_compras_anio(anio: int, limite: int = 5000) -> pd.DataFrame:
             TRIM("Monto Neto") AS Total
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
+          AND {_sql_anio_expr()} = %s
         ORDER BY "Fecha" DESC NULLS LAST
-        LIMIT %s
     """
-    return ejecutar_consulta(sql, (anio, limite))
+    if limite is None:
+        return sql, (anio,)
+    return sql + "    LIMIT %s\n", (anio, limite)
+
+
+def get_compras_anio(anio: int, limite: Optional[int] = 5000) -> pd.DataFrame:
+    """Todas las compras de un año. limite=None: sin tope (ver iter_compras_anio)."""
+    sql, params = _sql_compras_anio(anio, limite)
+    return ejecutar_consulta(sql, params)
 
 
-def get_todas_facturas_anio(anio: int, limite: int = 5000) -> pd.DataFrame:
+def iter_compras_anio(anio: int, itersize: int = None):
+    """Compras de un año completo, en bloques (cursor del servidor, sin LIMIT)."""
+    sql, params = _sql_compras_anio(anio, None)
+    return ejecutar_consulta_stream(sql, params, itersize=itersize)
+
+
+def get_todas_facturas_anio(anio: int, limite: Optional[int] = 5000) -> pd.DataFrame:
     """Alias para get_compras_anio: Todas las facturas/compras de un año sin filtro de proveedor."""
     return get_compras_anio(anio, limite)
 
 
+def iter_compras_anios(anios: List[int], itersize: int = None):
+    """Varios años seguidos (más reciente primero), en bloques."""
+    for anio in sorted({int(a) for a in anios}, reverse=True):
+        yield from iter_compras_anio(anio, itersize=itersize)
+
+
 def get_total_compras_anio(anio: int) -> dict:
     """Total de compras de un año (resumen)."""
     total_pesos = _sql_total_num_expr()
@@ -53,13 +79,13 @@ def get_total_compras_anio(anio: int) -> dict:
     sql = f"""
         SELECT
             COUNT(*) AS registros,
-            COALESCE(SUM(CASE WHEN TRIM("Moneda") = '$' THEN {total_pesos} ELSE 0 END), 0) AS total_pesos,
-            COALESCE(SUM(CASE WHEN TRIM("Moneda") IN ('U$S', 'U$$') THEN {total_usd} ELSE 0 END), 0) AS total_usd,
+            COALESCE(SUM(CASE WHEN {_sql_moneda_expr()} = '$' THEN {total_pesos} ELSE 0 END), 0) AS total_pesos,
+            COALESCE(SUM(CASE WHEN {_sql_moneda_expr()} IN ('U$S', 'U$$') THEN {total_usd} ELSE 0 END), 0) AS total_usd,
             COUNT(DISTINCT TRIM("Cliente / Proveedor")) AS proveedores,
             COUNT(DISTINCT TRIM("Articulo")) AS articulos
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
+          AND {_sql_anio_expr()} = %s
     """
     df = ejecutar_consulta(sql, (anio,))
     if df is not None and not df.empty:
@@ -120,7 +146,7 @@ def get_compras_multiples(
         if not p:
             continue
         prov_clauses.append(
-            "LOWER(TRIM(\"Cliente / Proveedor\")) LIKE %s"
+            f"{_sql_prov_norm_expr()} LIKE %s"
         )
         params.append(f"%{p}%")
 
@@ -133,7 +159,7 @@ def get_compras_multiples(
         for m in (meses or []):
             if not m:
                 continue
-            mes_clauses.append('TRIM("Mes") = %s')
+            mes_clauses.append(f'{_sql_mes_expr()} = %s')
             params.append(m)
         if mes_clauses:
             where_parts.append("(" + " OR ".join(mes_clauses) + ")")
@@ -164,7 +190,7 @@ def get_detalle_compras_proveedor_mes(proveedor_like: str, mes_key: str, anio: O
     proveedor_like = (proveedor_like or "").strip().lower()
     
     # Construir la consulta con filtro opcional de año
-    anio_filter = f'AND "Año" = {anio}' if anio else ""
+    anio_filter = f'AND {_sql_anio_expr()} = {anio}' if anio else ""
     
     # Usar Total simple para evitar errores de parseo
     sql = f"""
@@ -177,8 +203,8 @@ def get_detalle_compras_proveedor_mes(proveedor_like: str, mes_key: str, anio: O
             "Moneda",
             TRIM("Monto Neto") AS Total
         FROM chatbot_raw 
-        WHERE LOWER(TRIM("Cliente / Proveedor")) LIKE %s
-          AND TRIM("Mes") = %s
+        WHERE {_sql_prov_norm_expr()} LIKE %s
+          AND {_sql_mes_expr()} = %s
           {anio_filter}
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         ORDER BY "Fecha" DESC NULLS LAST
@@ -200,8 +226,8 @@ def get_detalle_compras_proveedor_mes(proveedor_like: str, mes_key: str, anio: O
                     "Moneda",
                     TRIM("Monto Neto") AS Total
                 FROM chatbot_raw 
-                WHERE LOWER(TRIM("Cliente / Proveedor")) LIKE %s
-                  AND TRIM("Mes") = %s
+                WHERE {_sql_prov_norm_expr()} LIKE %s
+                  AND {_sql_mes_expr()} = %s
                   {anio_filter}
                   AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
                 ORDER BY "Fecha" DESC NULLS LAST
@@ -233,14 +259,14 @@ def get_detalle_facturas_proveedor_anio(
     if moneda:
         moneda = moneda.strip().upper()
         if moneda in ("U$S", "USD", "U$$", "US$"):
-            moneda_sql = "AND TRIM(\"Moneda\") IN ('U$S', 'U$$', 'USD', 'US$')"
+            moneda_sql = f"AND {_sql_moneda_expr()} IN ('U$S', 'U$$', 'USD', 'US$')"
         elif moneda in ("$", "UYU"):
-            moneda_sql = "AND TRIM(\"Moneda\") = '$'"
+            moneda_sql = f"AND {_sql_moneda_expr()} = '$'"
 
     prov_where = ""
     prov_params = []
     if proveedores:
-        parts = [f"LOWER(TRIM(\"Cliente / Proveedor\")) LIKE %s" for _ in proveedores]
+        parts = [f"{_sql_prov_norm_expr()} LIKE %s" for _ in proveedores]
         prov_params = [f"%{p.lower()}%" for p in proveedores]
         prov_where = f"AND ({' OR '.join(parts)})"
 
@@ -255,7 +281,7 @@ def get_detalle_facturas_proveedor_anio(
             TRIM("Monto Neto") AS Total
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" IN ({anios_sql})
+          AND {_sql_anio_expr()} IN ({anios_sql})
           {prov_where}
           {moneda_sql}
         ORDER BY "Fecha" DESC NULLS LAST
@@ -276,8 +302,8 @@ def get_total_compras_proveedor_anio(
             COALESCE(SUM(CAST(NULLIF(TRIM("Monto Neto"), '') AS NUMERIC)), 0) AS total
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND LOWER(TRIM("Cliente / Proveedor")) LIKE %s
-          AND "Año" = %s
+          AND {_sql_prov_norm_expr()} LIKE %s
+          AND {_sql_anio_expr()} = %s
     """
     df = ejecutar_consulta(sql, (f"%{proveedor_like}%", anio))
     if df is not None and not df.empty:
@@ -305,8 +331,8 @@ def get_detalle_compras_articulo_mes(articulo_like: str, mes_key: str) -> pd.Dat
             "Moneda",
             TRIM("Monto Neto") AS Total
         FROM chatbot_raw 
-        WHERE LOWER(TRIM("Articulo")) LIKE %s
-          AND TRIM("Mes") = %s
+        WHERE {_sql_art_norm_expr()} LIKE %s
+          AND {_sql_mes_expr()} = %s
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         ORDER BY "Fecha" DESC NULLS LAST
     """
@@ -317,10 +343,7 @@ def get_detalle_compras_articulo_mes(articulo_like: str, mes_key: str) -> pd.Dat
 # DETALLE COMPRAS: ARTÍCULO + AÑO
 # =====================================================================
 
-def get_detalle_compras_articulo_anio(articulo_like: str, anio: int, limite: int = 500) -> pd.DataFrame:
-    """Detalle de compras de un artículo en un año."""
-    if limite is None:
-        limite = 500
+def _sql_detalle_compras_articulo_anio(articulo_like: str, anio: int, limite: Optional[int]) -> tuple:
     sql = f"""
         SELECT
             TRIM("Cliente / Proveedor") AS Proveedor,
@@ -332,12 +355,28 @@ def get_detalle_compras_articulo_anio(articulo_like: str, anio: int, limite: int
             TRIM("Monto Neto") AS Total
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
-          AND LOWER(TRIM("Articulo")) LIKE %s
+          AND {_sql_anio_expr()} = %s
+          AND {_sql_art_norm_expr()} LIKE %s
         ORDER BY "Fecha" DESC NULLS LAST
-        LIMIT %s
     """
-    return ejecutar_consulta(sql, (anio, f"%{articulo_like.lower()}%", limite))
+    params = (anio, f"%{articulo_like.lower()}%")
+    if limite is None:
+        return sql, params
+    return sql + "    LIMIT %s\n", params + (limite,)
+
+
+def get_detalle_compras_articulo_anio(articulo_like: str, anio: int, limite: int = 500) -> pd.DataFrame:
+    """Detalle de compras de un artículo en un año."""
+    if limite is None:
+        limite = 500
+    sql, params = _sql_detalle_compras_articulo_anio(articulo_like, anio, limite)
+    return ejecutar_consulta(sql, params)
+
+
+def iter_detalle_compras_articulo_anio(articulo_like: str, anio: int, itersize: int = None):
+    """Detalle de compras de un artículo en un año, sin tope, en bloques."""
+    sql, params = _sql_detalle_compras_articulo_anio(articulo_like, anio, None)
+    return ejecutar_consulta_stream(sql, params, itersize=itersize)
 
 
 def get_total_compras_articulo_anio(articulo_like: str, anio: int) -> dict:
@@ -348,8 +387,8 @@ def get_total_compras_articulo_anio(articulo_like: str, anio: int) -> dict:
             COALESCE(SUM(CAST(NULLIF(TRIM("Monto Neto"), '') AS NUMERIC)), 0) AS total
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
-          AND LOWER(TRIM("Articulo")) LIKE %s
+          AND {_sql_anio_expr()} = %s
+          AND {_sql_art_norm_expr()} LIKE %s
     """
     df = ejecutar_consulta(sql, (anio, f"%{articulo_like.lower()}%"))
     if df is not None and not df.empty:
@@ -473,7 +512,7 @@ def get_ultima_factura_de_articulo(patron_articulo: str) -> pd.DataFrame:
             {total_expr} AS total_linea,
             "Fecha"
         FROM chatbot_raw
-        WHERE LOWER(TRIM("Articulo")) LIKE %s
+        WHERE {_sql_art_norm_expr()} LIKE %s
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         ORDER BY "Fecha" DESC NULLS LAST
         LIMIT 1
@@ -496,7 +535,7 @@ def get_ultima_factura_inteligente(patron: str) -> pd.DataFrame:
             {total_expr} AS total_linea,
             "Fecha"
         FROM chatbot_raw
-        WHERE LOWER(TRIM("Articulo")) LIKE %s
+        WHERE {_sql_art_norm_expr()} LIKE %s
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         ORDER BY "Fecha" DESC NULLS LAST
         LIMIT 1
@@ -516,7 +555,7 @@ def get_ultima_factura_inteligente(patron: str) -> pd.DataFrame:
             {total_expr} AS total_linea,
             "Fecha"
         FROM chatbot_raw
-        WHERE LOWER(TRIM("Cliente / Proveedor")) LIKE %s
+        WHERE {_sql_prov_norm_expr()} LIKE %s
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         ORDER BY "Fecha" DESC NULLS LAST
         LIMIT 1
@@ -526,10 +565,10 @@ def get_ultima_factura_inteligente(patron: str) -> pd.DataFrame:
 
 def get_ultima_factura_numero_de_articulo(patron_articulo: str) -> Optional[str]:
     """Obtiene solo el número de la última factura."""
-    sql = """
+    sql = f"""
         SELECT TRIM("Nro. Comprobante") AS nro_factura
         FROM chatbot_raw
-        WHERE LOWER(TRIM("Articulo")) LIKE %s
+        WHERE {_sql_art_norm_expr()} LIKE %s
           AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
         ORDER BY "Fecha" DESC NULLS LAST
         LIMIT 1
@@ -555,7 +594,7 @@ def get_facturas_de_articulo(patron_articulo: str, solo_ultima: bool = False) ->
             {total_expr} AS Total
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND LOWER(TRIM("Articulo")) LIKE %s
+          AND {_sql_art_norm_expr()} LIKE %s
         ORDER BY "Fecha" DESC NULLS LAST
         {limit_sql}
     """
@@ -590,26 +629,26 @@ def get_total_facturas_proveedor(
         where_parts.append("(" + " OR ".join(prov_clauses) + ")")
 
     if desde and hasta:
-        where_parts.append('"Fecha"::date BETWEEN %s AND %s')
+        where_parts.append(f'{_sql_fecha_date_expr()} BETWEEN %s AND %s')
         params.extend([desde, hasta])
 
     elif meses:
         ph = ", ".join(["%s"] * len(meses))
-        where_parts.append(f'LOWER(TRIM("Mes")) IN ({ph})')  # ✅ LOWER agregado
+        where_parts.append(f'LOWER({_sql_mes_expr()}) IN ({ph})')  # ✅ LOWER agregado
         params.extend([m.lower() for m in meses])  # ✅ .lower() agregado
 
     elif anios:
         ph = ", ".join(["%s"] * len(anios))
-        where_parts.append(f'"Año" IN ({ph})')
+        where_parts.append(f'{_sql_anio_expr()} IN ({ph})')
         params.extend(anios)
 
     query = f"""
         SELECT
-            TRIM("Moneda") AS Moneda,
+            {_sql_moneda_expr()} AS Moneda,
             COALESCE(SUM(CAST(NULLIF(TRIM("Monto Neto"), '') AS NUMERIC)), 0) AS Total
         FROM chatbot_raw
         WHERE {" AND ".join(where_parts)}
-        GROUP BY TRIM("Moneda")
+        GROUP BY {_sql_moneda_expr()}
         ORDER BY Total DESC
     """
 
@@ -674,7 +713,7 @@ def get_facturas_proveedor_detalle(proveedores, meses, anios, desde, hasta, arti
                 "Moneda"
             FROM chatbot_raw
             WHERE LOWER(TRIM(regexp_replace("Cliente / Proveedor", \'[áéíóúÁÉÍÓÚñÑ]\', \'[aeiouAEIOUñN]\', \'g\'))) LIKE %s
-              AND "Año" = %s
+              AND {_sql_anio_expr()} = %s
               AND ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
             ORDER BY "Fecha" DESC NULLS LAST
             LIMIT %s
@@ -704,22 +743,22 @@ def get_facturas_proveedor_detalle(proveedores, meses, anios, desde, hasta, arti
         where_parts.append("(" + " OR ".join(prov_clauses) + ")")
 
     if articulo and str(articulo).strip():
-        where_parts.append('LOWER(TRIM("Articulo")) LIKE %s')
+        where_parts.append(f'{_sql_art_norm_expr()} LIKE %s')
         params.append(f"%{str(articulo).lower().strip()}%")
 
     if moneda and str(moneda).strip():
         m = str(moneda).upper().strip()
         if m in ("USD", "U$S", "U$$", "US$"):
-            where_parts.append('TRIM("Moneda") IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
+            where_parts.append(f'{_sql_moneda_expr()} IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
         elif m in ("$", "UYU", "PESOS"):
-            where_parts.append('TRIM("Moneda") = \'$\'')
+            where_parts.append(f'{_sql_moneda_expr()} = \'$\'')
 
     # MODIFICACIÓN: Permitir filtros combinados de meses y años (eliminé elif y usé if para ambos)
     if meses:
         meses_ok = [m for m in (meses or []) if m]
         if meses_ok:
             ph = ", ".join(["%s"] * len(meses_ok))
-            where_parts.append(f'LOWER(TRIM("Mes")) IN ({ph})')  # ✅ LOWER agregado
+            where_parts.append(f'LOWER({_sql_mes_expr()}) IN ({ph})')  # ✅ LOWER agregado
             params.extend([m.lower() for m in meses_ok])  # ✅ .lower() agregado
 
     if anios:
@@ -729,11 +768,11 @@ def get_facturas_proveedor_detalle(proveedores, meses, anios, desde, hasta, arti
                 anios_ok.append(a)
         if anios_ok:
             ph = ", ".join(["%s"] * len(anios_ok))
-            where_parts.append(f'"Año" IN ({ph})')
+            where_parts.append(f'{_sql_anio_expr()} IN ({ph})')
             params.extend(anios_ok)
 
     if desde and hasta:
-        where_parts.append('"Fecha"::date BETWEEN %s AND %s')
+        where_parts.append(f'{_sql_fecha_date_expr()} BETWEEN %s AND %s')
         params.extend([desde, hasta])
 
     sql = f"""
@@ -762,13 +801,13 @@ def get_total_facturas_por_moneda_anio(anio: int) -> pd.DataFrame:
     total_expr = _sql_total_num_expr_general()  # Usa la expresión estándar para consistencia
     sql = f"""
         SELECT
-            TRIM("Moneda") AS Moneda,
+            {_sql_moneda_expr()} AS Moneda,
             COUNT(DISTINCT "Nro. Comprobante") AS total_facturas,
             COALESCE(SUM({total_expr}), 0) AS monto_total
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
-        GROUP BY TRIM("Moneda")
+          AND {_sql_anio_expr()} = %s
+        GROUP BY {_sql_moneda_expr()}
         ORDER BY monto_total DESC  -- Cambiado a DESC para un ordenamiento más útil
     """
     return ejecutar_consulta(sql, (anio,))
@@ -782,12 +821,12 @@ def get_total_facturas_por_moneda_todos_anios() -> pd.DataFrame:
     sql = f"""
         SELECT
             "Año" AS Anio,
-            TRIM("Moneda") AS Moneda,
+            {_sql_moneda_expr()} AS Moneda,
             COUNT(DISTINCT "Nro. Comprobante") AS total_facturas,
             COALESCE(SUM({total_expr}), 0) AS monto_total
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-        GROUP BY "Año", TRIM("Moneda")
+        GROUP BY "Año", {_sql_moneda_expr()}
         ORDER BY "Año" ASC, monto_total DESC
     """
     return ejecutar_consulta(sql, ())
@@ -798,15 +837,16 @@ def get_total_facturas_por_moneda_todos_anios() -> pd.DataFrame:
 def get_total_compras_por_moneda_todos_anios() -> pd.DataFrame:
     """Total de compras por moneda y año, mostrando todos los años disponibles."""
     total_expr = _sql_total_num_expr_general()  # Usa la expresión estándar para consistencia
+    tabla = _sql_tabla_compras()
     sql = f"""
         SELECT
-            "Año" AS Anio,
-            TRIM("Moneda") AS Moneda,
+            {_sql_anio_expr()} AS Anio,
+            {_sql_moneda_expr()} AS Moneda,
             COALESCE(SUM({total_expr}), 0) AS Total_Compras
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-        GROUP BY "Año", TRIM("Moneda")
-        ORDER BY "Año" ASC, Total_Compras DESC
+        GROUP BY {_sql_anio_expr()}, {_sql_moneda_expr()}
+        ORDER BY {_sql_anio_expr()} ASC, Total_Compras DESC
     """
     return ejecutar_consulta(sql, ())
 
@@ -816,14 +856,15 @@ def get_total_compras_por_moneda_todos_anios() -> pd.DataFrame:
 def get_total_compras_por_moneda_anio(anio: int) -> pd.DataFrame:
     """Total de compras (monto) por moneda en un año específico."""
     total_expr = _sql_total_num_expr_general()
+    tabla = _sql_tabla_compras(anios=[anio])
     sql = f"""
         SELECT
-            TRIM("Moneda") AS Moneda,
+            {_sql_moneda_expr()} AS Moneda,
             COALESCE(SUM({total_expr}), 0) AS Total_Compras
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
-        GROUP BY TRIM("Moneda")
+          AND {_sql_anio_expr()} = %s
+        GROUP BY {_sql_moneda_expr()}
         ORDER BY Total_Compras DESC
     """
     return ejecutar_consulta(sql, (anio,))
@@ -838,13 +879,13 @@ def get_dashboard_totales(anio: int) -> dict:
     total_expr = _sql_total_num_expr_general()
     sql = f"""
         SELECT
-            COALESCE(SUM(CASE WHEN TRIM("Moneda") = '$' THEN {total_expr} ELSE 0 END), 0) AS total_pesos,
-            COALESCE(SUM(CASE WHEN TRIM("Moneda") IN ('U$S', 'U$$') THEN {total_expr} ELSE 0 END), 0) AS total_usd,
+            COALESCE(SUM(CASE WHEN {_sql_moneda_expr()} = '$' THEN {total_expr} ELSE 0 END), 0) AS total_pesos,
+            COALESCE(SUM(CASE WHEN {_sql_moneda_expr()} IN ('U$S', 'U$$') THEN {total_expr} ELSE 0 END), 0) AS total_usd,
             COUNT(DISTINCT TRIM("Cliente / Proveedor")) AS proveedores,
             COUNT(DISTINCT TRIM("Nro. Comprobante")) AS facturas
         FROM chatbot_raw
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
+          AND {_sql_anio_expr()} = %s
     """
     df = ejecutar_consulta(sql, (anio,))
     if df is not None and not df.empty:
@@ -860,14 +901,15 @@ def get_dashboard_totales(anio: int) -> dict:
 def get_dashboard_compras_por_mes(anio: int) -> pd.DataFrame:
     """Datos para gráfico de barras mensual."""
     total_expr = _sql_total_num_expr_general()
+    tabla = _sql_tabla_compras(anios=[anio])
     sql = f"""
         SELECT
-            TRIM("Mes") AS Mes,
+            {_sql_mes_expr()} AS Mes,
             COALESCE(SUM({total_expr}), 0) AS Total
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
-        GROUP BY TRIM("Mes")
+          AND {_sql_anio_expr()} = %s
+        GROUP BY {_sql_mes_expr()}
         ORDER BY MIN("Fecha") ASC
     """
     return ejecutar_consulta(sql, (anio,))
@@ -876,14 +918,15 @@ def get_dashboard_compras_por_mes(anio: int) -> pd.DataFrame:
 def get_dashboard_top_proveedores(anio: int, top_n: int = 10, moneda: str = "$") -> pd.DataFrame:
     """Top proveedores por moneda."""
     total_expr = _sql_total_num_expr_general()
-    moneda_filter = f"TRIM(\"Moneda\") = '{moneda}'" if moneda == "$" else f"TRIM(\"Moneda\") IN ('U$S', 'U$$')"
+    moneda_filter = f"{_sql_moneda_expr()} = '{moneda}'" if moneda == "$" else f"{_sql_moneda_expr()} IN ('U$S', 'U$$')"
+    tabla = _sql_tabla_compras(anios=[anio])
     sql = f"""
         SELECT
             TRIM("Cliente / Proveedor") AS Proveedor,
             COALESCE(SUM({total_expr}), 0) AS Total
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
+          AND {_sql_anio_expr()} = %s
           AND {moneda_filter}
           AND TRIM("Cliente / Proveedor") <> ''
         GROUP BY TRIM("Cliente / Proveedor")
@@ -897,13 +940,14 @@ def get_dashboard_gastos_familia(anio: int) -> pd.DataFrame:
     """Datos para gráfico de torta por familia."""
     # Asumiendo que hay una columna "Familia" o similar; ajusta según tu esquema
     total_expr = _sql_total_num_expr_general()
+    tabla = _sql_tabla_compras(anios=[anio])
     sql = f"""
         SELECT
             COALESCE(TRIM("Familia"), 'Sin Clasificar') AS Familia,
             COALESCE(SUM({total_expr}), 0) AS Total
-        FROM chatbot_raw
+        FROM {tabla}
         WHERE ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-          AND "Año" = %s
+          AND {_sql_anio_expr()} = %s
         GROUP BY COALESCE(TRIM("Familia"), 'Sin Clasificar')
         ORDER BY Total DESC
     """
@@ -4,22 +4,41 @@
 
 import os
 import re
+import time
+import itertools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 import pandas as pd
-from typing import Optional, List
+from typing import Any, Callable, Dict, Iterator, Optional, List, Tuple
 import streamlit as st
 
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:
+    add_script_run_ctx = get_script_run_ctx = None
+
 try:
     import psycopg2
 except ImportError:
     psycopg2 = None
 
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from sql_pool import ConnectionPool
+from sql_cache import crear_cache_consultas, es_cacheable, tablas_escritas
+
 
 # =====================================================================
 # CONEXIÓN DB (SUPABASE / POSTGRES)
 # =====================================================================
 
-def get_db_connection():
-    """Conexión a Postgres (Supabase) usando Secrets/Env vars."""
+def _abrir_conexion_nueva():
+    """Abre una conexión física a Postgres (Supabase) usando Secrets/Env vars."""
     if psycopg2 is None:
         print("❌ psycopg2 no instalado")
         return None
@@ -51,6 +70,91 @@ def get_db_connection():
         return None
 
 
+def _pool_setting(key: str, default: int) -> int:
+    try:
+        return int(st.secrets.get(key, os.getenv(key, default)))
+    except Exception:
+        return default
+
+
+def _str_setting(key: str, default: str) -> str:
+    try:
+        return str(st.secrets.get(key, os.getenv(key, default)))
+    except Exception:
+        return os.getenv(key, default)
+
+
+_POOL = ConnectionPool(
+    _abrir_conexion_nueva,
+    minconn=_pool_setting("DB_POOL_MIN", 1),
+    maxconn=_pool_setting("DB_POOL_MAX", 10),
+)
+
+
+def get_db_pool() -> ConnectionPool:
+    """Pool de conexiones del proceso (compartido por todos los módulos)."""
+    return _POOL
+
+
+def get_db_connection():
+    """
+    Conexión a Postgres (Supabase) tomada del pool.
+    conn.close() la devuelve al pool (no cierra el socket).
+    """
+    return _POOL.getconn()
+
+
+def conexion_db():
+    """
+    Context manager sobre el pool:
+        with conexion_db() as conn:
+            ...
+    Commit al salir, rollback si hay excepción.
+    """
+    return _POOL.connection()
+
+
+def get_pool_stats() -> dict:
+    """Métricas del pool: espera al pedir conexión, edad de conexiones, etc."""
+    return _POOL.stats()
+
+
+# =====================================================================
+# CACHÉ DE CONSULTAS (ver sql_cache.py)
+# =====================================================================
+# DB_CACHE_BACKEND = memoria | sqlite | off
+# DB_CACHE_PATH solo aplica a sqlite (archivo compartido entre workers).
+
+_CACHE = crear_cache_consultas(
+    backend=_str_setting("DB_CACHE_BACKEND", "memoria"),
+    max_mb=_pool_setting("DB_CACHE_MAX_MB", 128),
+    ttl=_pool_setting("DB_CACHE_TTL", 300),
+    ruta=_str_setting("DB_CACHE_PATH", "") or None,
+)
+
+
+def get_cache_consultas():
+    """QueryCache del proceso (None si DB_CACHE_BACKEND=off)."""
+    return _CACHE
+
+
+def invalidar_tablas(*tablas: str) -> None:
+    """
+    Marca tablas como modificadas: las consultas cacheadas que las leen
+    dejan de servirse. Llamar después del commit de cada escritura.
+    """
+    if _CACHE is None:
+        return
+    try:
+        _CACHE.invalidar(tablas)
+    except Exception as e:
+        print(f"⚠️ invalidar_tablas: {e}")
+
+
+def get_cache_stats() -> dict:
+    return _CACHE.stats() if _CACHE is not None else {"backend": "off"}
+
+
 # =====================================================================
 # CONSTANTES - TABLAS Y COLUMNAS
 # =====================================================================
@@ -70,6 +174,206 @@ COL_CANT = '"Cantidad"'
 COL_MONTO = '"Monto Neto"'
 
 
+# =====================================================================
+# COLUMNAS TIPADAS EN chatbot_raw (ver sql_tipado.py)
+# =====================================================================
+# Mientras la migración no esté completa, los helpers devuelven las
+# expresiones de texto de siempre; cuando termina el backfill pasan a las
+# columnas tipadas (monto_num, anio_int, mes_key, ...).
+
+_TIPADO_TTL_SEG = 300
+_TIPADO_ESTADO = {"activo": False, "ts": None}
+
+
+def invalidar_cache_tipado() -> None:
+    _TIPADO_ESTADO["ts"] = None
+
+
+def _migracion_completa(nombre: str, estado: dict, version: int = 1) -> bool:
+    """Lee fertichat_migraciones con caché de _TIPADO_TTL_SEG en `estado`."""
+    ahora = time.monotonic()
+    ts = estado["ts"]
+    if ts is not None and ahora - ts < _TIPADO_TTL_SEG:
+        return estado["activo"]
+
+    activo = False
+    conn = get_db_connection()
+    if conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT 1 FROM fertichat_migraciones
+                    WHERE nombre = %s AND estado = 'completo' AND version >= %s
+                """, (nombre, version))
+                activo = cur.fetchone() is not None
+        except Exception:
+            # Tabla de migraciones inexistente -> modo texto
+            activo = False
+        finally:
+            conn.close()
+
+    estado["activo"] = activo
+    estado["ts"] = ahora
+    return activo
+
+
+def _columnas_tipadas_activas() -> bool:
+    return _migracion_completa("chatbot_raw_tipado", _TIPADO_ESTADO)
+
+
+# stock -> stock_lotes (ver sql_stock_tipado.py): tabla tipada con clave
+# única de lote; "stock" queda como vista de compatibilidad.
+# v2: + stock_totales (codigo, deposito) mantenida por trigger.
+STOCK_TIPADO_VERSION = 2
+_STOCK_TIPADO_ESTADO = {"activo": False, "ts": None}
+
+
+def invalidar_cache_stock_tipado() -> None:
+    _STOCK_TIPADO_ESTADO["ts"] = None
+
+
+def _stock_tipado_activo() -> bool:
+    return _migracion_completa("stock_lotes", _STOCK_TIPADO_ESTADO, STOCK_TIPADO_VERSION)
+
+
+def _sql_anio_expr() -> str:
+    return "anio_int" if _columnas_tipadas_activas() else '"Año"::int'
+
+
+def _sql_mes_expr() -> str:
+    return "mes_key" if _columnas_tipadas_activas() else 'TRIM("Mes")'
+
+
+def _sql_moneda_expr() -> str:
+    return "moneda_norm" if _columnas_tipadas_activas() else 'TRIM("Moneda")'
+
+
+def _sql_fecha_date_expr() -> str:
+    return "fecha_date" if _columnas_tipadas_activas() else '"Fecha"::date'
+
+
+def _sql_prov_norm_expr() -> str:
+    return "proveedor_norm" if _columnas_tipadas_activas() else 'LOWER(TRIM("Cliente / Proveedor"))'
+
+
+def _sql_art_norm_expr() -> str:
+    return "articulo_norm" if _columnas_tipadas_activas() else 'LOWER(TRIM("Articulo"))'
+
+
+# =====================================================================
+# ROLLUP MENSUAL DE COMPRAS (ver sql_rollup.py)
+# =====================================================================
+# Los builders de solo SUM/GROUP BY piden la tabla con _sql_tabla_compras():
+# devuelve compras_rollup_mensual si el rollup está completo y ninguno de
+# los períodos consultados tiene cambios sin refrescar; si no, chatbot_raw.
+# Los meses pendientes se cachean ROLLUP_PENDIENTES_TTL segundos: un cambio
+# puede tardar eso en mandar la consulta a chatbot_raw. El refresco lo hace
+# sql_rollup.refrescar_rollup (cron / python sql_rollup.py vigilar), nunca
+# una consulta.
+
+_ROLLUP_TTL_SEG = 60
+_ROLLUP_PENDIENTES_TTL_SEG = _pool_setting("ROLLUP_PENDIENTES_TTL", 5)
+_ROLLUP_ESTADO = {"activo": False, "watermark": None, "ts": None}
+_ROLLUP_PENDIENTES = {"meses": None, "ts": None}
+
+
+def invalidar_cache_rollup() -> None:
+    _ROLLUP_ESTADO["ts"] = None
+    _ROLLUP_PENDIENTES["ts"] = None
+
+
+def _estado_rollup() -> dict:
+    """Rollup activo + marca de agua (cacheado _ROLLUP_TTL_SEG; los pendientes no)."""
+    ahora = time.monotonic()
+    ts = _ROLLUP_ESTADO["ts"]
+    if ts is not None and ahora - ts < _ROLLUP_TTL_SEG:
+        return _ROLLUP_ESTADO
+
+    activo = False
+    watermark = None
+    conn = get_db_connection()
+    if conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT actualizado_at FROM fertichat_migraciones
+                    WHERE nombre = 'compras_rollup' AND estado = 'completo'
+                """)
+                row = cur.fetchone()
+                if row:
+                    activo = True
+                    watermark = row[0]
+        except Exception:
+            # Rollup no instalado -> siempre chatbot_raw
+            activo = False
+        finally:
+            conn.close()
+
+    _ROLLUP_ESTADO["activo"] = activo
+    _ROLLUP_ESTADO["watermark"] = watermark
+    _ROLLUP_ESTADO["ts"] = ahora
+    return _ROLLUP_ESTADO
+
+
+def _meses_pendientes():
+    """Meses con cambios sin refrescar ('' = filas sin mes). None si no se pudo leer."""
+    ahora = time.monotonic()
+    ts = _ROLLUP_PENDIENTES["ts"]
+    if ts is not None and ahora - ts < _ROLLUP_PENDIENTES_TTL_SEG:
+        return _ROLLUP_PENDIENTES["meses"]
+
+    meses = None
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT mes_key FROM compras_rollup_pendientes")
+            meses = {r[0] or "" for r in cur.fetchall()}
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+    _ROLLUP_PENDIENTES["meses"] = meses
+    _ROLLUP_PENDIENTES["ts"] = ahora
+    return meses
+
+
+def _pendientes_de(pendientes: set, anios=None, meses=None) -> set:
+    """Los meses pendientes que caen dentro de los períodos de la consulta."""
+    if meses:
+        pedidos = {str(m).strip() for m in meses}
+        return {p for p in pendientes if p in pedidos}
+    if anios:
+        prefijos = tuple(f"{int(a)}-" for a in anios)
+        return {p for p in pendientes if p == "" or p.startswith(prefijos)}
+    return set(pendientes)
+
+
+def get_rollup_watermark():
+    """Fecha/hora del último refresco del rollup (None si no está activo)."""
+    estado = _estado_rollup()
+    return estado["watermark"] if estado["activo"] else None
+
+
+def _sql_tabla_compras(anios=None, meses=None) -> str:
+    """
+    Tabla para un builder de agregados de compras.
+    anios / meses: períodos que filtra la consulta (None = todos).
+    """
+    if not _columnas_tipadas_activas():
+        return TABLE_COMPRAS
+    estado = _estado_rollup()
+    if not estado["activo"]:
+        return TABLE_COMPRAS
+
+    pendientes = _meses_pendientes()
+    if pendientes is None or _pendientes_de(pendientes, anios, meses):
+        return TABLE_COMPRAS
+    return "compras_rollup_mensual"
+
+
 # =====================================================================
 # HELPERS SQL (POSTGRES)
 # =====================================================================
@@ -85,10 +389,14 @@ def _sql_fecha_expr() -> str:
 
 
 def _sql_mes_col() -> str:
+    if _columnas_tipadas_activas():
+        return "COALESCE(mes_key, '')"
     return 'TRIM(COALESCE("Mes", \'\'))'
 
 
 def _sql_moneda_norm_expr() -> str:
+    if _columnas_tipadas_activas():
+        return "moneda_norm"
     return 'TRIM(COALESCE("Moneda", \'\'))'
 
 
@@ -98,6 +406,8 @@ def _sql_num_from_text(text_expr: str) -> str:
 
 def _sql_total_num_expr() -> str:
     """Convierte Monto Neto a número (pesos)."""
+    if _columnas_tipadas_activas():
+        return "monto_num"
     limpio = """
         REPLACE(
             REPLACE(
@@ -118,6 +428,8 @@ def _sql_total_num_expr() -> str:
 
 def _sql_total_num_expr_usd() -> str:
     """Convierte Monto Neto a número (USD)."""
+    if _columnas_tipadas_activas():
+        return "monto_num"
     limpio = """
         REPLACE(
             REPLACE(
@@ -147,6 +459,8 @@ def _sql_total_num_expr_general() -> str:
     Convierte Monto Neto a número (sirve para $ o U$S).
     Se usa en ui_buscador y sql_facturas.
     """
+    if _columnas_tipadas_activas():
+        return "monto_num"
     limpio = """
         REPLACE(
             REPLACE(
@@ -178,10 +492,49 @@ def _sql_total_num_expr_general() -> str:
 # EJECUTOR SQL
 # =====================================================================
 
-def ejecutar_consulta(query: str, params: tuple = None) -> pd.DataFrame:
+_SQL_CAPTURA = contextvars.ContextVar("sql_captura", default=None)
+
+
+@contextmanager
+def capturar_sql():
+    """
+    Dentro del bloque, ejecutar_consulta NO ejecuta: registra (query, params)
+    y devuelve un DataFrame vacío. Lo usa el advisor de índices (sql_indices).
+
+        with capturar_sql() as capturadas:
+            get_dashboard_totales(2025)
+    """
+    capturadas = []
+    token = _SQL_CAPTURA.set(capturadas)
+    try:
+        yield capturadas
+    finally:
+        _SQL_CAPTURA.reset(token)
+
+
+def ejecutar_consulta(query: str, params: tuple = None, usar_cache: bool = True) -> pd.DataFrame:
     """
     Ejecuta una consulta SQL y retorna los resultados en un DataFrame.
+    La conexión se toma del pool y se devuelve siempre (también si hay error).
+    Los SELECT pasan por la caché de consultas (usar_cache=False para saltearla);
+    las escrituras invalidan las tablas que tocan.
     """
+    capturadas = _SQL_CAPTURA.get()
+    if capturadas is not None:
+        capturadas.append((query, params if params is not None else ()))
+        return pd.DataFrame()
+
+    cacheable = usar_cache and _CACHE is not None and es_cacheable(query)
+    deps = None
+    if cacheable:
+        df_cache = _CACHE.get(query, params)
+        if df_cache is not None:
+            print(f"⚡ Caché: {len(df_cache)} filas")
+            return df_cache
+        # Versiones antes de ejecutar: si alguien escribe mientras tanto, la entrada nace vieja
+        deps = _CACHE.snapshot(query)
+
+    conn = None
     try:
         conn = get_db_connection()
         if not conn:
@@ -200,16 +553,16 @@ def ejecutar_consulta(query: str, params: tuple = None) -> pd.DataFrame:
             cur.execute(query, params)
             if cur.description is None:
                 conn.commit()
-                conn.close()
+                invalidar_tablas(*tablas_escritas(query))
                 print("✅ Consulta sin retorno ejecutada.")
                 return pd.DataFrame()
 
             cols = [d[0] for d in cur.description]
             rows = cur.fetchall()
 
-        conn.close()
-
         df = pd.DataFrame(rows, columns=cols)
+        if cacheable:
+            _CACHE.put(query, params, df, deps)
 
         if df.empty:
             print("⚠️ Consulta ejecutada, pero no devolvió resultados.")
@@ -223,6 +576,153 @@ def ejecutar_consulta(query: str, params: tuple = None) -> pd.DataFrame:
         print(f"Parámetros:\n{params}")
         return pd.DataFrame()
 
+    finally:
+        if conn:
+            conn.close()
+
+
+# =====================================================================
+# STREAMING (CURSOR DEL LADO DEL SERVIDOR)
+# =====================================================================
+# Para resultados grandes (años completos, exportaciones): las filas se
+# traen de a `itersize` con un cursor con nombre, así la memoria queda
+# acotada al tamaño del bloque y no hace falta LIMIT.
+
+_STREAM_ITERSIZE = _pool_setting("DB_STREAM_ITERSIZE", 5000)
+_STREAM_SEQ = itertools.count(1)
+
+
+def ejecutar_consulta_stream(query: str, params: tuple = None, itersize: int = None,
+                             formato: str = "pandas") -> Iterator:
+    """
+    Variante de ejecutar_consulta que va entregando bloques:
+    - formato="pandas": DataFrames de hasta `itersize` filas
+    - formato="arrow":  pyarrow.RecordBatch (requiere pyarrow)
+    Solo lectura y sin caché. La conexión vuelve al pool al terminar de
+    iterar o si el consumidor corta antes (break / close()).
+    A diferencia de ejecutar_consulta, los errores se propagan: un export
+    cortado a la mitad no tiene que parecer completo.
+    """
+    if formato == "arrow" and pa is None:
+        raise ImportError("pyarrow no instalado: usá formato='pandas'")
+
+    capturadas = _SQL_CAPTURA.get()
+    if capturadas is not None:
+        capturadas.append((query, params if params is not None else ()))
+        return
+
+    itersize = max(1, int(itersize or _STREAM_ITERSIZE))
+    if params is None:
+        params = ()
+
+    conn = get_db_connection()
+    if not conn:
+        print("❌ No se pudo establecer conexión con la base de datos.")
+        return
+
+    print("\n🛠 SQL ejecutado (stream):")
+    print(query)
+    print("🛠 Parámetros usados:")
+    print(params)
+
+    total = 0
+    cur = None
+    try:
+        cur = conn.cursor(name=f"fc_stream_{os.getpid()}_{next(_STREAM_SEQ)}")
+        cur.itersize = itersize
+        cur.execute(query, params)
+
+        cols = None
+        while True:
+            rows = cur.fetchmany(itersize)
+            if cols is None:
+                cols = [d[0] for d in (cur.description or [])]
+            if not rows:
+                break
+            total += len(rows)
+            df = pd.DataFrame(rows, columns=cols)
+            if formato == "arrow":
+                yield pa.RecordBatch.from_pandas(df, preserve_index=False)
+            else:
+                yield df
+
+        print(f"✅ Stream terminado: {total} filas.")
+
+    except Exception as e:
+        print(f"❌ Error en stream SQL: {e}")
+        print(f"SQL fallido:\n{query}")
+        print(f"Parámetros:\n{params}")
+        raise
+
+    finally:
+        try:
+            if cur is not None:
+                cur.close()
+            conn.rollback()
+        except Exception:
+            pass
+        conn.close()
+
+
+# =====================================================================
+# CONSULTAS EN PARALELO (FAN-OUT)
+# =====================================================================
+# Para pantallas que arman varios datasets independientes (dashboard):
+# cada tarea corre en su hilo con su propia conexión del pool y se
+# entrega apenas termina, así se puede ir dibujando y la espera total es
+# la de la consulta más lenta, no la suma. Cada consulta sigue pasando
+# por la caché de ejecutar_consulta, que es por SQL + parámetros.
+
+_PARALELO_WORKERS = _pool_setting("DB_PARALELO_WORKERS", 6)
+_EJECUTOR_PARALELO: Optional[ThreadPoolExecutor] = None
+_EJECUTOR_LOCK = threading.Lock()
+
+
+def _ejecutor_paralelo() -> ThreadPoolExecutor:
+    global _EJECUTOR_PARALELO
+    with _EJECUTOR_LOCK:
+        if _EJECUTOR_PARALELO is None:
+            _EJECUTOR_PARALELO = ThreadPoolExecutor(
+                max_workers=max(1, _PARALELO_WORKERS), thread_name_prefix="fc_sql"
+            )
+        return _EJECUTOR_PARALELO
+
+
+def _correr_tarea(fn: Callable[[], Any], ctx_st) -> Any:
+    # st.session_state / st.cache_* dentro de la tarea ven la sesión que la lanzó
+    if ctx_st is not None and add_script_run_ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx_st)
+    return fn()
+
+
+def ejecutar_en_paralelo(tareas: Dict[str, Callable[[], Any]]) -> Iterator[Tuple[str, Any, Optional[Exception]]]:
+    """
+    Corre las tareas (nombre -> función sin argumentos) en paralelo, hasta
+    DB_PARALELO_WORKERS a la vez, y va entregando (nombre, resultado, error)
+    en el orden en que terminan. Un error en una tarea no corta las demás.
+
+        for nombre, datos, error in ejecutar_en_paralelo({
+            "totales": lambda: get_dashboard_totales(2025),
+            "meses": lambda: get_dashboard_compras_por_mes(2025),
+        }):
+            ...
+    """
+    ctx_st = get_script_run_ctx(suppress_warning=True) if get_script_run_ctx is not None else None
+    ejecutor = _ejecutor_paralelo()
+
+    futuros = {}
+    for nombre, fn in tareas.items():
+        ctx = contextvars.copy_context()
+        futuros[ejecutor.submit(ctx.run, _correr_tarea, fn, ctx_st)] = nombre
+
+    for futuro in as_completed(futuros):
+        nombre = futuros[futuro]
+        try:
+            yield nombre, futuro.result(), None
+        except Exception as e:
+            print(f"❌ Error en tarea '{nombre}': {e}")
+            yield nombre, None, e
+
 
 # =====================================================================
 # LISTAS / LOOKUPS
@@ -419,13 +919,14 @@ def get_ultimo_mes_disponible_hasta(mes_key: str) -> Optional[str]:
     Busca el último mes disponible en la tabla chatbot_raw hasta el mes indicado.
     """
     try:
-        sql = """
-            SELECT DISTINCT TRIM("Mes") AS mes
+        mes_expr = _sql_mes_expr()
+        sql = f"""
+            SELECT DISTINCT {mes_expr} AS mes
             FROM chatbot_raw
-            WHERE TRIM("Mes") IS NOT NULL 
-              AND TRIM("Mes") <> ''
-              AND TRIM("Mes") <= %s
-            ORDER BY TRIM("Mes") DESC
+            WHERE {mes_expr} IS NOT NULL 
+              AND {mes_expr} <> ''
+              AND {mes_expr} <= %s
+            ORDER BY {mes_expr} DESC
             LIMIT 1
         """
         df = ejecutar_consulta(sql, (mes_key,))
@@ -9,6 +9,13 @@ from typing import List, Optional, Any
 from sql_core import (
     ejecutar_consulta,
     _sql_total_num_expr_general,
+    _sql_anio_expr,
+    _sql_mes_expr,
+    _sql_moneda_expr,
+    _sql_fecha_date_expr,
+    _sql_prov_norm_expr,
+    _sql_art_norm_expr,
+    _columnas_tipadas_activas,
 )
 
 
@@ -66,7 +73,10 @@ def _sql_monto_neto_num_expr() -> str:
     """
     Normaliza "Monto Neto" a NUMERIC, manejando paréntesis como negativos, puntos y comas.
     Maneja formatos: 1.234,56 (Europeo: . mil, , decimal) o 1,234.56 (Americano: , mil, . decimal).
+    Con la migración de sql_tipado completa usa la columna monto_num.
     """
+    if _columnas_tipadas_activas():
+        return "monto_num"
     return """
         (
           CASE
@@ -147,7 +157,7 @@ def get_total_factura_por_numero(nro_factura: str) -> dict:
         SELECT 
             COALESCE(SUM({total_expr}), 0) AS total_factura,
             COUNT(*) AS lineas,
-            TRIM("Moneda") AS Moneda
+            {_sql_moneda_expr()} AS Moneda
         FROM chatbot_raw
         WHERE TRIM("Nro. Comprobante") = %s
           AND (
@@ -155,7 +165,7 @@ def get_total_factura_por_numero(nro_factura: str) -> dict:
             OR "Tipo Comprobante" ILIKE 'Compra%%'
             OR "Tipo Comprobante" ILIKE 'Factura%%'
           )
-        GROUP BY TRIM("Moneda")
+        GROUP BY {_sql_moneda_expr()}
     """
 
     variantes = _factura_variantes(nro_factura)
@@ -217,48 +227,48 @@ def get_facturas_proveedor(
     prov_clauses: List[str] = []
     for p in [str(x).strip() for x in proveedores if str(x).strip()]:
         p_clean = p.lower().strip()
-        prov_clauses.append('LOWER(TRIM("Cliente / Proveedor")) LIKE %s')
+        prov_clauses.append(f'{_sql_prov_norm_expr()} LIKE %s')
         params.append(f"%{p_clean}%")
     if prov_clauses:
         where_parts.append("(" + " OR ".join(prov_clauses) + ")")
 
     # Artículo (opcional)
     if articulo and str(articulo).strip():
-        where_parts.append('LOWER(TRIM("Articulo")) LIKE %s')
+        where_parts.append(f'{_sql_art_norm_expr()} LIKE %s')
         params.append(f"%{str(articulo).lower().strip()}%")
 
     # Moneda (opcional)
     if moneda and str(moneda).strip():
         m = str(moneda).strip().upper()
         if m in ("USD", "U$S", "U$$", "US$"):
-            where_parts.append('TRIM("Moneda") IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
+            where_parts.append(f'{_sql_moneda_expr()} IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
         elif m in ("$", "PESOS", "UYU", "URU"):
-            where_parts.append('TRIM("Moneda") = \'$\'')
+            where_parts.append(f'{_sql_moneda_expr()} = \'$\'')
         else:
-            where_parts.append('UPPER(TRIM("Moneda")) LIKE %s')
+            where_parts.append(f'UPPER({_sql_moneda_expr()}) LIKE %s')
             params.append(f"%{m}%")
 
     # Tiempo (rango > meses > años)
     if desde and hasta:
-        where_parts.append('"Fecha"::date BETWEEN %s AND %s')
+        where_parts.append(f'{_sql_fecha_date_expr()} BETWEEN %s AND %s')
         params.extend([desde, hasta])
     else:
         if meses:
             meses_ok = [m for m in (meses or []) if m]
             if meses_ok:
                 ph = ", ".join(["%s"] * len(meses_ok))
-                where_parts.append(f'TRIM("Mes") IN ({ph})')
+                where_parts.append(f'{_sql_mes_expr()} IN ({ph})')
                 params.extend(meses_ok)
 
         if (not meses) and anios:
             anios_ok = [int(a) for a in (anios or []) if a]
             if anios_ok:
                 if len(anios_ok) == 1:
-                    where_parts.append('"Año" = %s')
+                    where_parts.append(f'{_sql_anio_expr()} = %s')
                     params.append(str(anios_ok[0]))  # CAMBIO: convertir a string
                 else:
                     ph = ", ".join(["%s"] * len(anios_ok))
-                    where_parts.append(f'"Año" IN ({ph})')
+                    where_parts.append(f'{_sql_anio_expr()} IN ({ph})')
                     params.extend([str(a) for a in anios_ok])  # CAMBIO: convertir a string
 
     # Seguridad: si por algún motivo no hay filtros, no traigas todo
@@ -269,7 +279,7 @@ def get_facturas_proveedor(
 
     query = f"""
         SELECT
-          ROW_NUMBER() OVER (ORDER BY "Fecha"::date, "Nro. Comprobante") AS nro,
+          ROW_NUMBER() OVER (ORDER BY {_sql_fecha_date_expr()}, "Nro. Comprobante") AS nro,
           TRIM("Cliente / Proveedor") AS proveedor,
           "Año",
           "Mes",
@@ -339,44 +349,44 @@ def get_total_facturas_proveedor(
     prov_clauses: List[str] = []
     for p in [str(x).strip() for x in proveedores if str(x).strip()]:
         p_lower = p.lower().strip()
-        prov_clauses.append('LOWER(TRIM("Cliente / Proveedor")) LIKE %s')
+        prov_clauses.append(f'{_sql_prov_norm_expr()} LIKE %s')
         params.append(f"%{p_lower}%")
     if prov_clauses:
         where_parts.append("(" + " OR ".join(prov_clauses) + ")")
 
     # Artículo
     if articulo and str(articulo).strip():
-        where_parts.append('LOWER(TRIM("Articulo")) LIKE %s')
+        where_parts.append(f'{_sql_art_norm_expr()} LIKE %s')
         params.append(f"%{str(articulo).lower().strip()}%")
 
     # Moneda
     if moneda and str(moneda).strip():
         m = str(moneda).strip().upper()
         if m in ("USD", "U$S", "U$$", "US$"):
-            where_parts.append('TRIM("Moneda") IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
+            where_parts.append(f'{_sql_moneda_expr()} IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
         elif m in ("$", "PESOS", "UYU", "URU"):
-            where_parts.append('TRIM("Moneda") = \'$\'')
+            where_parts.append(f'{_sql_moneda_expr()} = \'$\'')
 
     # Tiempo: rango > meses > años
     if desde and hasta:
-        where_parts.append('"Fecha"::date BETWEEN %s AND %s')
+        where_parts.append(f'{_sql_fecha_date_expr()} BETWEEN %s AND %s')
         params.extend([desde, hasta])
     else:
         if meses:
             meses_ok = [m for m in (meses or []) if m]
             if meses_ok:
                 ph = ", ".join(["%s"] * len(meses_ok))
-                where_parts.append(f'TRIM("Mes") IN ({ph})')
+                where_parts.append(f'{_sql_mes_expr()} IN ({ph})')
                 params.extend(meses_ok)
         if (not meses) and anios:
             anios_ok = [int(a) for a in (anios or []) if a]
             if anios_ok:
                 if len(anios_ok) == 1:
-                    where_parts.append('"Año" = %s')
+                    where_parts.append(f'{_sql_anio_expr()} = %s')
                     params.append(str(anios_ok[0]))  # CAMBIO: convertir a string
                 else:
                     ph = ", ".join(["%s"] * len(anios_ok))
-                    where_parts.append(f'"Año" IN ({ph})')
+                    where_parts.append(f'{_sql_anio_expr()} IN ({ph})')
                     params.extend([str(a) for a in anios_ok])  # CAMBIO: convertir a string
 
     if not where_parts:
@@ -388,8 +398,8 @@ def get_total_facturas_proveedor(
         SELECT
             COUNT(*) AS registros,
             COUNT(DISTINCT TRIM("Nro. Comprobante")) AS facturas,
-            COALESCE(SUM(CASE WHEN TRIM("Moneda") = '$' THEN {monto_expr} ELSE 0 END), 0) AS total_pesos,
-            COALESCE(SUM(CASE WHEN TRIM("Moneda") IN ('U$S', 'U$$', 'USD', 'US$') THEN {monto_expr} ELSE 0 END), 0) AS total_usd
+            COALESCE(SUM(CASE WHEN {_sql_moneda_expr()} = '$' THEN {monto_expr} ELSE 0 END), 0) AS total_pesos,
+            COALESCE(SUM(CASE WHEN {_sql_moneda_expr()} IN ('U$S', 'U$$', 'USD', 'US$') THEN {monto_expr} ELSE 0 END), 0) AS total_usd
         FROM chatbot_raw
         WHERE {" AND ".join(where_parts)}
     """
@@ -423,7 +433,7 @@ def get_ultima_factura_articulo(patron_articulo: str) -> pd.DataFrame:
             {total_expr} AS Total,
             "Fecha"
         FROM chatbot_raw
-        WHERE LOWER(TRIM("Articulo")) LIKE %s
+        WHERE {_sql_art_norm_expr()} LIKE %s
           AND (
             "Tipo Comprobante" = 'Compra Contado'
             OR "Tipo Comprobante" ILIKE 'Compra%%'
@@ -447,7 +457,7 @@ def get_ultima_factura_proveedor(patron_proveedor: str) -> pd.DataFrame:
             {total_expr} AS Total,
             "Fecha"
         FROM chatbot_raw
-        WHERE LOWER(TRIM("Cliente / Proveedor")) LIKE %s
+        WHERE {_sql_prov_norm_expr()} LIKE %s
           AND (
             "Tipo Comprobante" = 'Compra Contado'
             OR "Tipo Comprobante" ILIKE 'Compra%%'
@@ -492,7 +502,7 @@ def get_facturas_articulo(
             OR "Tipo Comprobante" ILIKE 'Compra%%'
             OR "Tipo Comprobante" ILIKE 'Factura%%'
         )
-          AND LOWER(TRIM("Articulo")) LIKE %s
+          AND {_sql_art_norm_expr()} LIKE %s
         ORDER BY "Fecha" DESC NULLS LAST
         {limit_sql}
     """
@@ -522,26 +532,26 @@ def get_resumen_facturas_por_proveedor(
     if moneda and str(moneda).strip():
         m = str(moneda).strip().upper()
         if m in ("USD", "U$S", "U$$", "US$"):
-            where_parts.append('TRIM("Moneda") IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
+            where_parts.append(f'{_sql_moneda_expr()} IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
         elif m in ("$", "PESOS", "UYU", "URU"):
-            where_parts.append('TRIM("Moneda") = \'$\'')
+            where_parts.append(f'{_sql_moneda_expr()} = \'$\'')
 
     if meses:
         meses_ok = [m for m in (meses or []) if m]
         if meses_ok:
             ph = ", ".join(["%s"] * len(meses_ok))
-            where_parts.append(f'TRIM("Mes") IN ({ph})')
+            where_parts.append(f'{_sql_mes_expr()} IN ({ph})')
             params.extend(meses_ok)
 
     if (not meses) and anios:
         anios_ok = [int(a) for a in (anios or []) if a]
         if anios_ok:
             if len(anios_ok) == 1:
-                where_parts.append('"Año" = %s')
+                where_parts.append(f'{_sql_anio_expr()} = %s')
                 params.append(str(anios_ok[0]))  # CAMBIO: convertir a string
             else:
                 ph = ", ".join(["%s"] * len(anios_ok))
-                where_parts.append(f'"Año" IN ({ph})')
+                where_parts.append(f'{_sql_anio_expr()} IN ({ph})')
                 params.extend([str(a) for a in anios_ok])  # CAMBIO: convertir a string
 
     monto_expr = _sql_monto_neto_num_expr()
@@ -591,31 +601,31 @@ def get_facturas_por_rango_monto(
     if proveedores:
         prov_clauses = []
         for p in proveedores:
-            prov_clauses.append('LOWER(TRIM("Cliente / Proveedor")) LIKE %s')
+            prov_clauses.append(f'{_sql_prov_norm_expr()} LIKE %s')
             params.append(f"%{str(p).lower().strip()}%")
         where_parts.append("(" + " OR ".join(prov_clauses) + ")")
 
     if moneda:
         m = str(moneda).strip().upper()
         if m in ("USD", "U$S", "U$$", "US$"):
-            where_parts.append('TRIM("Moneda") IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
+            where_parts.append(f'{_sql_moneda_expr()} IN (\'U$S\', \'U$$\', \'USD\', \'US$\')')
         elif m in ("$", "PESOS", "UYU", "URU"):
-            where_parts.append('TRIM("Moneda") = \'$\'')
+            where_parts.append(f'{_sql_moneda_expr()} = \'$\'')
 
     if meses:
         ph = ", ".join(["%s"] * len(meses))
-        where_parts.append(f'TRIM("Mes") IN ({ph})')
+        where_parts.append(f'{_sql_mes_expr()} IN ({ph})')
         params.extend(meses)
 
     if (not meses) and anios:
         anios_ok = [int(a) for a in (anios or []) if a]
         if anios_ok:
             if len(anios_ok) == 1:
-                where_parts.append('"Año" = %s')
+                where_parts.append(f'{_sql_anio_expr()} = %s')
                 params.append(str(anios_ok[0]))  # CAMBIO: convertir a string
             else:
                 ph = ", ".join(["%s"] * len(anios_ok))
-                where_parts.append(f'"Año" IN ({ph})')
+                where_parts.append(f'{_sql_anio_expr()} IN ({ph})')
                 params.extend([str(a) for a in anios_ok])  # CAMBIO: convertir a string
 
     monto_expr = _sql_monto_neto_num_expr()
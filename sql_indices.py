@@ -0,0 +1,276 @@
+# =========================
+# SQL ÍNDICES - PACK DE ÍNDICES + ADVISOR (EXPLAIN)
+# =========================
+"""
+Índices para los filtros calientes de chatbot_raw y stock:
+
+- pg_trgm GIN para los LIKE '%texto%' (proveedor, artículo, lote)
+- btree de expresión para mes / año / tipo de comprobante
+- compuesto para la clave de lote de stock (bajastock)
+
+Si la migración de sql_tipado está completa se indexan las columnas
+tipadas (proveedor_norm, mes_key, ...); si no, las mismas expresiones de
+texto que arman los query builders.
+
+Ejecutar:
+    python sql_indices.py            -> crea los índices que falten (y rehace los INVALID)
+    python sql_indices.py advisor    -> EXPLAIN de los query builders registrados
+"""
+
+import sys
+import json
+
+from sql_core import get_db_connection, capturar_sql, _columnas_tipadas_activas, _stock_tipado_activo
+
+
+# =====================================================================
+# REGISTRO DE ÍNDICES
+# =====================================================================
+
+# (nombre, tabla, definición)  -> CREATE INDEX CONCURRENTLY IF NOT EXISTS nombre ON tabla definición
+INDICES_CHATBOT_TEXTO = [
+    ("idx_chatbot_raw_prov_trgm", "chatbot_raw",
+     'USING GIN (LOWER(TRIM("Cliente / Proveedor")) gin_trgm_ops)'),
+    ("idx_chatbot_raw_art_trgm", "chatbot_raw",
+     'USING GIN (LOWER(TRIM("Articulo")) gin_trgm_ops)'),
+    ("idx_chatbot_raw_mes", "chatbot_raw", '(TRIM("Mes"))'),
+    ("idx_chatbot_raw_anio", "chatbot_raw", '((("Año")::int))'),
+]
+
+INDICES_CHATBOT_TIPADO = [
+    ("idx_chatbot_raw_proveedor_norm_trgm", "chatbot_raw", "USING GIN (proveedor_norm gin_trgm_ops)"),
+    ("idx_chatbot_raw_articulo_norm_trgm", "chatbot_raw", "USING GIN (articulo_norm gin_trgm_ops)"),
+    ("idx_chatbot_raw_mes_key", "chatbot_raw", "(mes_key)"),
+    ("idx_chatbot_raw_anio_int", "chatbot_raw", "(anio_int)"),
+    ("idx_chatbot_raw_fecha_date", "chatbot_raw", "(fecha_date)"),
+]
+
+INDICES_CHATBOT_COMUNES = [
+    # "Tipo Comprobante" LIKE 'Compra%' (prefijo) -> btree con text_pattern_ops
+    ("idx_chatbot_raw_tipo_comp", "chatbot_raw", '("Tipo Comprobante" text_pattern_ops)'),
+    ("idx_chatbot_raw_nro_comp", "chatbot_raw", '(TRIM("Nro. Comprobante"))'),
+]
+
+INDICES_STOCK = [
+    ("idx_stock_codigo", "stock", '(TRIM("CODIGO"))'),
+    ("idx_stock_articulo_trgm", "stock", 'USING GIN (LOWER(TRIM("ARTICULO")) gin_trgm_ops)'),
+    ("idx_stock_lote_trgm", "stock", 'USING GIN (LOWER(TRIM("LOTE")) gin_trgm_ops)'),
+    # Clave de lote tal cual la filtran aplicar_baja_en_lote / aplicar_movimiento_en_lote
+    ("idx_stock_lote_key", "stock",
+     '(TRIM("CODIGO"), TRIM("ARTICULO"), TRIM("DEPOSITO"), '
+     'COALESCE(TRIM("LOTE"), \'\'), COALESCE(TRIM("VENCIMIENTO"), \'\'))'),
+]
+
+
+# Después de sql_stock_tipado "stock" es una vista: se indexa stock_lotes
+# (la clave de lote ya la cubre ux_stock_lotes_clave)
+INDICES_STOCK_LOTES = [
+    ("idx_stock_lotes_articulo_trgm", "stock_lotes", "USING GIN (LOWER(articulo) gin_trgm_ops)"),
+    ("idx_stock_lotes_lote_trgm", "stock_lotes", "USING GIN (LOWER(lote) gin_trgm_ops)"),
+    # FEFO: próximos vencimientos con stock y lotes de un artículo por vencimiento
+    ("idx_stock_lotes_fefo", "stock_lotes", "(vencimiento_date, codigo, lote) WHERE stock > 0"),
+    ("idx_stock_lotes_codigo_fefo", "stock_lotes", "(codigo, vencimiento_date, lote)"),
+]
+
+
+def indices_registrados() -> list:
+    chatbot = INDICES_CHATBOT_TIPADO if _columnas_tipadas_activas() else INDICES_CHATBOT_TEXTO
+    stock = INDICES_STOCK_LOTES if _stock_tipado_activo() else INDICES_STOCK
+    return chatbot + INDICES_CHATBOT_COMUNES + stock
+
+
+def _indices_invalidos(cur, nombres: list) -> list:
+    """Índices que quedaron INVALID (un CREATE INDEX CONCURRENTLY que falló a mitad)."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+    """, (list(nombres),))
+    return [r[0] for r in cur.fetchall()]
+
+
+def crear_indices() -> list:
+    """
+    Crea (idempotente) la extensión pg_trgm y los índices registrados.
+    CONCURRENTLY para no bloquear escrituras -> requiere autocommit.
+    Un índice INVALID (quedó de un intento fallido) se borra y se vuelve a
+    crear: IF NOT EXISTS solo no lo arregla.
+    Devuelve la lista de índices con error (nombre, detalle).
+    """
+    errores = []
+    registrados = indices_registrados()
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            invalidos = set(_indices_invalidos(cur, [n for n, _, _ in registrados]))
+            for nombre, tabla, definicion in registrados:
+                try:
+                    if nombre in invalidos:
+                        print(f"🔧 {nombre} quedó INVALID: se reconstruye")
+                        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}")
+                    cur.execute(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {tabla} {definicion}"
+                    )
+                except Exception as e:
+                    print(f"⚠️ No se pudo crear {nombre}: {e}")
+                    errores.append((nombre, str(e)))
+
+            # uno que falló recién en este CREATE también queda INVALID
+            for nombre in _indices_invalidos(cur, [n for n, _, _ in registrados]):
+                if nombre not in {e[0] for e in errores}:
+                    errores.append((nombre, "índice INVALID"))
+    finally:
+        conn.close()
+    return errores
+
+
+_INDICES_OK = {"hecho": False}
+
+
+def asegurar_indices() -> None:
+    """
+    Igual que crear_indices, una sola vez por proceso y sin levantar
+    excepciones. Para CLI / migraciones, no para la UI (CONCURRENTLY puede
+    tardar minutos). Si algún índice falla se reintenta en la próxima llamada.
+    """
+    if _INDICES_OK["hecho"]:
+        return
+    try:
+        errores = crear_indices()
+        _INDICES_OK["hecho"] = not errores
+    except Exception as e:
+        print(f"⚠️ asegurar_indices: {e}")
+
+
+# =====================================================================
+# ADVISOR: EXPLAIN SOBRE LOS QUERY BUILDERS REGISTRADOS
+# =====================================================================
+
+def _builders_registrados() -> list:
+    """(nombre, callable) -> cada callable ejecuta uno o más query builders."""
+    import sql_compras
+    import sql_comparativas
+    import sql_facturas
+
+    return [
+        ("compras.detalle_proveedor_mes",
+         lambda: sql_compras.get_detalle_compras_proveedor_mes("roche", "2025-06")),
+        ("compras.detalle_articulo_anio",
+         lambda: sql_compras.get_detalle_compras_articulo_anio("vitek", 2025)),
+        ("compras.total_anio",
+         lambda: sql_compras.get_total_compras_anio(2025)),
+        ("compras.dashboard_totales",
+         lambda: sql_compras.get_dashboard_totales(2025)),
+        ("compras.dashboard_top_proveedores",
+         lambda: sql_compras.get_dashboard_top_proveedores(2025)),
+        ("compras.detalle_factura",
+         lambda: sql_compras.get_detalle_factura_por_numero("A00275015")),
+        ("comparativas.proveedor_meses",
+         lambda: sql_comparativas.get_comparacion_proveedor_meses("roche", "2025-06", "2025-07")),
+        ("comparativas.proveedor_anios_monedas",
+         lambda: sql_comparativas.get_comparacion_proveedor_anios_monedas([2024, 2025], ["roche"])),
+        ("comparativas.familias_mes",
+         lambda: sql_comparativas.get_gastos_todas_familias_mes("2025-06")),
+        ("facturas.proveedor",
+         lambda: sql_facturas.get_facturas_proveedor(["roche"], anios=[2025])),
+    ]
+
+
+# Consultas de bajastock (no pasan por ejecutar_consulta): mismo SQL que usa el módulo
+_CONSULTAS_STOCK = [
+    ("bajastock.buscar_items_stock", """
+        SELECT "CODIGO" FROM stock
+        WHERE TRIM("CODIGO") = %s OR LOWER(TRIM("ARTICULO")) LIKE LOWER(%s)
+        LIMIT %s
+    """, ("8057800190", "%ana profile%", 500)),
+    ("bajastock.lote_key", """
+        SELECT "STOCK" FROM stock
+        WHERE TRIM("CODIGO") = %s AND TRIM("ARTICULO") = %s AND TRIM("DEPOSITO") = %s
+          AND COALESCE(TRIM("LOTE"), '') = %s AND COALESCE(TRIM("VENCIMIENTO"), '') = %s
+    """, ("8057800190", "ANA PROFILE", "Casa Central", "L1", "31/12/2026")),
+]
+
+# Las mismas consultas de bajastock con stock_lotes (sql_stock_tipado)
+_CONSULTAS_STOCK_LOTES = [
+    ("bajastock.buscar_items_stock", """
+        SELECT codigo FROM stock_lotes
+        WHERE codigo = %s OR LOWER(articulo) LIKE LOWER(%s)
+        LIMIT %s
+    """, ("8057800190", "%ana profile%", 500)),
+    ("bajastock.obtener_lotes_item", """
+        SELECT id FROM stock_lotes
+        WHERE codigo = %s AND articulo = %s
+        ORDER BY vencimiento_date ASC NULLS LAST, lote ASC
+    """, ("8057800190", "ANA PROFILE")),
+]
+
+
+def _seq_scans(plan: dict) -> list:
+    out = []
+    if plan.get("Node Type") == "Seq Scan":
+        out.append(plan.get("Relation Name", "?"))
+    for sub in plan.get("Plans", []) or []:
+        out.extend(_seq_scans(sub))
+    return out
+
+
+def advisor() -> list:
+    """
+    Corre EXPLAIN (sin ANALYZE) sobre cada consulta registrada.
+    Devuelve [{consulta, seq_scans, costo}] y lo imprime.
+    """
+    consultas = []
+    for nombre, fn in _builders_registrados():
+        with capturar_sql() as capturadas:
+            try:
+                fn()
+            except Exception as e:
+                print(f"⚠️ {nombre}: no se pudo armar la consulta ({e})")
+        for i, (sql, params) in enumerate(capturadas):
+            etiqueta = nombre if len(capturadas) == 1 else f"{nombre}#{i + 1}"
+            consultas.append((etiqueta, sql, params))
+    consultas.extend(_CONSULTAS_STOCK_LOTES if _stock_tipado_activo() else _CONSULTAS_STOCK)
+
+    reporte = []
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            for etiqueta, sql, params in consultas:
+                try:
+                    cur.execute("EXPLAIN (FORMAT JSON) " + sql.strip().rstrip(";"), params)
+                    raw = cur.fetchone()[0]
+                    plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+                    reporte.append({
+                        "consulta": etiqueta,
+                        "seq_scans": _seq_scans(plan),
+                        "costo": plan.get("Total Cost"),
+                    })
+                except Exception as e:
+                    conn.rollback()
+                    reporte.append({"consulta": etiqueta, "seq_scans": None, "costo": None, "error": str(e)})
+    finally:
+        conn.close()
+
+    for r in reporte:
+        if r.get("error"):
+            print(f"❌ {r['consulta']}: {r['error']}")
+        elif r["seq_scans"]:
+            print(f"⚠️ {r['consulta']}: Seq Scan en {', '.join(r['seq_scans'])} (costo {r['costo']})")
+        else:
+            print(f"✅ {r['consulta']}: usa índices (costo {r['costo']})")
+    return reporte
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "advisor":
+        advisor()
+    else:
+        errores = crear_indices()
+        print("🎉 Índices OK" if not errores else f"⚠️ {len(errores)} índice(s) con error")
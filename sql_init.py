@@ -10,6 +10,8 @@ from .sql_core import (
     # Conexión
     get_db_connection,
     ejecutar_consulta,
+    ejecutar_consulta_stream,
+    ejecutar_en_paralelo,
     
     # Constantes
     TABLE_COMPRAS,
@@ -53,6 +55,8 @@ from .sql_core import (
 from .sql_compras import (
     # Compras por año
     get_compras_anio,
+    iter_compras_anio,
+    iter_compras_anios,
     get_total_compras_anio,
     
     # Detalle compras: Proveedor
@@ -64,6 +68,7 @@ from .sql_compras import (
     # Detalle compras: Artículo
     get_detalle_compras_articulo_mes,
     get_detalle_compras_articulo_anio,
+    iter_detalle_compras_articulo_anio,
     get_total_compras_articulo_anio,
     
     # Facturas
@@ -139,6 +144,10 @@ from .sql_stock import (
     get_lotes_vencidos,
     get_stock_bajo,
     get_alertas_vencimiento_multiple,
+
+    # Esquema de stock (caché + vista)
+    precalentar_stock,
+    invalidar_cache_esquema_stock,
 )
 
 
@@ -149,6 +158,8 @@ __all__ = [
     # Core
     'get_db_connection',
     'ejecutar_consulta',
+    'ejecutar_consulta_stream',
+    'ejecutar_en_paralelo',
     'TABLE_COMPRAS',
     'COL_TIPO_COMP',
     'COL_NRO_COMP',
@@ -178,6 +189,8 @@ __all__ = [
     
     # Compras
     'get_compras_anio',
+    'iter_compras_anio',
+    'iter_compras_anios',
     'get_total_compras_anio',
     'get_detalle_compras_proveedor_mes',
     'get_detalle_compras_proveedor_anio',
@@ -185,6 +198,7 @@ __all__ = [
     'get_detalle_compras_proveedor_anios',
     'get_detalle_compras_articulo_mes',
     'get_detalle_compras_articulo_anio',
+    'iter_detalle_compras_articulo_anio',
     'get_total_compras_articulo_anio',
     'get_detalle_factura_por_numero',
     'get_total_factura_por_numero',
@@ -230,4 +244,6 @@ __all__ = [
     'get_lotes_vencidos',
     'get_stock_bajo',
     'get_alertas_vencimiento_multiple',
+    'precalentar_stock',
+    'invalidar_cache_esquema_stock',
 ]
@@ -0,0 +1,314 @@
+# =========================
+# SQL POOL - POOL DE CONEXIONES POSTGRES (SUPABASE)
+# =========================
+"""
+Pool de conexiones único por proceso, thread-safe.
+
+- minconn / maxconn configurables
+- health check al prestar (ping si la conexión estuvo ociosa)
+- reciclado de conexiones ociosas o demasiado viejas
+- API de context manager:  with pool.connection() as conn: ...
+- métricas: espera al pedir conexión y edad de las conexiones
+
+Las conexiones prestadas son un proxy: conn.close() NO cierra el socket,
+la devuelve al pool (así el código existente que hace conn.close() sigue igual).
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+try:
+    import psycopg2
+    from psycopg2 import extensions as _pg_ext
+except ImportError:
+    psycopg2 = None
+    _pg_ext = None
+
+
+# =====================================================================
+# PROXY DE CONEXIÓN PRESTADA
+# =====================================================================
+
+class PooledConnection:
+    """Envuelve una conexión psycopg2; close() la devuelve al pool."""
+
+    __slots__ = ("_pool", "_conn", "_entry")
+
+    def __init__(self, pool: "ConnectionPool", entry: dict):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", entry["conn"])
+        object.__setattr__(self, "_entry", entry)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, "_conn")
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        # conn.autocommit = False, etc. van a la conexión real
+        setattr(self._conn, name, value)
+
+    @property
+    def raw(self):
+        return self._conn
+
+    @property
+    def closed(self) -> int:
+        conn = self._conn
+        return 1 if conn is None else conn.closed
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        entry = self._entry
+        object.__setattr__(self, "_conn", None)
+        object.__setattr__(self, "_entry", None)
+        self._pool._release(entry)
+
+    def __del__(self):
+        # Red de seguridad: si alguien no llamó close(), devolver igual al pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# =====================================================================
+# POOL
+# =====================================================================
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect_fn: Callable,
+        minconn: int = 1,
+        maxconn: int = 10,
+        max_idle: float = 300.0,
+        max_lifetime: float = 1800.0,
+        ping_after: float = 30.0,
+        timeout: float = 15.0,
+    ):
+        self._connect_fn = connect_fn
+        self.minconn = max(0, int(minconn))
+        self.maxconn = max(1, int(maxconn))
+        self.max_idle = float(max_idle)
+        self.max_lifetime = float(max_lifetime)
+        self.ping_after = float(ping_after)
+        self.timeout = float(timeout)
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []          # entries libres (LIFO)
+        self._size = 0           # conexiones abiertas (libres + prestadas)
+        self._last_recycle = time.monotonic()
+
+        self._stats = {
+            "checkouts": 0,
+            "creadas": 0,
+            "descartadas": 0,
+            "timeouts": 0,
+            "espera_total_ms": 0.0,
+            "espera_max_ms": 0.0,
+            "edad_max_s": 0.0,
+        }
+
+    # -----------------------------
+    # Apertura / descarte
+    # -----------------------------
+    def _open(self) -> Optional[dict]:
+        conn = self._connect_fn()
+        if conn is None:
+            return None
+        ahora = time.monotonic()
+        with self._cond:
+            self._stats["creadas"] += 1
+        return {"conn": conn, "created": ahora, "last_used": ahora}
+
+    def _discard(self, entry: dict) -> None:
+        try:
+            entry["conn"].close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["descartadas"] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, entry: dict, ahora: float) -> bool:
+        conn = entry["conn"]
+        if conn.closed:
+            return False
+        if ahora - entry["created"] > self.max_lifetime:
+            return False
+        if ahora - entry["last_used"] > self.max_idle:
+            return False
+        if ahora - entry["last_used"] > self.ping_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    # -----------------------------
+    # Préstamo / devolución
+    # -----------------------------
+    def getconn(self) -> Optional[PooledConnection]:
+        t0 = time.monotonic()
+        deadline = t0 + self.timeout
+
+        if t0 - self._last_recycle > 60:
+            self._last_recycle = t0
+            self.recycle_idle()
+
+        while True:
+            entry = None
+            crear = False
+            with self._cond:
+                while not self._idle and self._size >= self.maxconn:
+                    restante = deadline - time.monotonic()
+                    if restante <= 0:
+                        self._stats["timeouts"] += 1
+                        print(f"❌ Pool DB agotado ({self.maxconn} conexiones en uso)")
+                        return None
+                    self._cond.wait(restante)
+
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._size += 1
+                    crear = True
+
+            if crear:
+                try:
+                    entry = self._open()
+                except Exception as e:
+                    print(f"❌ Error abriendo conexión del pool: {e}")
+                    entry = None
+                if entry is None:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    return None
+            elif not self._is_healthy(entry, time.monotonic()):
+                self._discard(entry)
+                continue
+
+            ahora = time.monotonic()
+            espera_ms = (ahora - t0) * 1000.0
+            edad_s = ahora - entry["created"]
+            with self._cond:
+                st_ = self._stats
+                st_["checkouts"] += 1
+                st_["espera_total_ms"] += espera_ms
+                st_["espera_max_ms"] = max(st_["espera_max_ms"], espera_ms)
+                st_["edad_max_s"] = max(st_["edad_max_s"], edad_s)
+            return PooledConnection(self, entry)
+
+    def _release(self, entry: dict) -> None:
+        conn = entry["conn"]
+        try:
+            if conn.closed:
+                self._discard(entry)
+                return
+            status = conn.get_transaction_status()
+            if status == _pg_ext.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(entry)
+                return
+            if status != _pg_ext.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except Exception:
+            self._discard(entry)
+            return
+
+        entry["last_used"] = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        with pool.connection() as conn:
+            ...
+        Commit al salir sin error, rollback si hubo excepción. Siempre devuelve la conexión.
+        """
+        conn = self.getconn()
+        if conn is None:
+            raise RuntimeError("No se pudo obtener conexión del pool.")
+        try:
+            yield conn
+            if not conn.closed and not conn.autocommit:
+                conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    # -----------------------------
+    # Mantenimiento
+    # -----------------------------
+    def recycle_idle(self) -> int:
+        """Cierra conexiones ociosas/viejas por encima de minconn. Devuelve cuántas cerró."""
+        ahora = time.monotonic()
+        a_cerrar = []
+        with self._cond:
+            keep = []
+            for entry in self._idle:
+                vencida = (
+                    ahora - entry["last_used"] > self.max_idle
+                    or ahora - entry["created"] > self.max_lifetime
+                )
+                if vencida and (self._size - len(a_cerrar)) > self.minconn:
+                    a_cerrar.append(entry)
+                else:
+                    keep.append(entry)
+            self._idle = keep
+        for entry in a_cerrar:
+            self._discard(entry)
+        return len(a_cerrar)
+
+    def warmup(self) -> None:
+        """Abre conexiones hasta minconn."""
+        while True:
+            with self._cond:
+                if self._size >= self.minconn:
+                    return
+                self._size += 1
+            entry = None
+            try:
+                entry = self._open()
+            except Exception as e:
+                print(f"❌ Error precalentando pool: {e}")
+            if entry is None:
+                with self._cond:
+                    self._size -= 1
+                return
+            self._release(entry)
+
+    def closeall(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self) -> dict:
+        ahora = time.monotonic()
+        with self._cond:
+            out = dict(self._stats)
+            out["abiertas"] = self._size
+            out["libres"] = len(self._idle)
+            out["en_uso"] = self._size - len(self._idle)
+            out["edad_libres_s"] = [round(ahora - e["created"], 1) for e in self._idle]
+        n = out["checkouts"] or 1
+        out["espera_prom_ms"] = round(out["espera_total_ms"] / n, 2)
+        return out
@@ -0,0 +1,257 @@
+# =========================
+# SQL ROLLUP - AGREGADO MENSUAL DE COMPRAS
+# =========================
+"""
+compras_rollup_mensual: chatbot_raw (solo compras) pre-agregado por
+(mes_key, anio_int, tipo, proveedor, familia, artículo, moneda) con
+SUM(monto_num) y COUNT(*).
+
+Usa los mismos nombres de columna que chatbot_raw tipado (monto_num,
+mes_key, anio_int, proveedor_norm, ...), así los query builders que solo
+hacen SUM/GROUP BY sobre esas columnas (dashboard, comparativas, totales
+por moneda) leen del rollup cambiando únicamente el FROM
+(sql_core._sql_tabla_compras). monto_num en el rollup ya es la suma del grupo.
+
+Refresco incremental:
+- triggers de sentencia en chatbot_raw anotan los meses tocados en
+  compras_rollup_pendientes
+- refrescar_rollup() recalcula los pendientes y mueve la marca de agua
+  (cron o `python sql_rollup.py vigilar`)
+- mientras un mes está pendiente, las consultas que lo tocan van a
+  chatbot_raw (sql_core._sql_tabla_compras)
+
+Requiere la migración de sql_tipado completa.
+
+Ejecutar:  python sql_rollup.py            -> crea (si falta) y refresca
+           python sql_rollup.py vigilar 60 -> refresca cada 60 s
+"""
+
+import sys
+import time
+
+from sql_core import get_db_connection, invalidar_cache_rollup, invalidar_tablas
+
+MIGRACION_ROLLUP = "compras_rollup"
+ROLLUP_VERSION = 1
+
+# Mismo filtro de tipo que usan los query builders
+_FILTRO_COMPRAS = '("Tipo Comprobante" = \'Compra Contado\' OR "Tipo Comprobante" LIKE \'Compra%%\')'
+
+
+# =====================================================================
+# DDL
+# =====================================================================
+
+SQL_TABLAS = """
+    CREATE TABLE IF NOT EXISTS compras_rollup_mensual (
+        mes_key TEXT,
+        anio_int INT,
+        "Tipo Comprobante" TEXT,
+        "Cliente / Proveedor" TEXT,
+        proveedor_norm TEXT,
+        "Familia" TEXT,
+        "Articulo" TEXT,
+        articulo_norm TEXT,
+        moneda_norm TEXT,
+        "Fecha" DATE,
+        monto_num NUMERIC(18,2) NOT NULL DEFAULT 0,
+        lineas INT NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_rollup_mes_key ON compras_rollup_mensual (mes_key);
+    CREATE INDEX IF NOT EXISTS idx_rollup_anio_int ON compras_rollup_mensual (anio_int);
+
+    CREATE TABLE IF NOT EXISTS compras_rollup_pendientes (
+        mes_key TEXT PRIMARY KEY,
+        marcado_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+"""
+
+# Un trigger por evento (las tablas de transición no admiten varios eventos).
+# DO UPDATE (no DO NOTHING) para tomar el lock de la fila pendiente: si un
+# refresco la tiene tomada, el escritor espera y vuelve a marcar el mes
+# después; si el escritor la marcó primero, el refresco la saltea.
+SQL_TRIGGERS = """
+    CREATE OR REPLACE FUNCTION compras_rollup_marcar_nuevas()
+    RETURNS TRIGGER LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO compras_rollup_pendientes (mes_key, marcado_at)
+        SELECT m.mes_key, clock_timestamp()
+        FROM (SELECT DISTINCT COALESCE(mes_key, '') AS mes_key FROM nuevas) m
+        ON CONFLICT (mes_key) DO UPDATE SET marcado_at = clock_timestamp();
+        RETURN NULL;
+    END;
+    $$;
+
+    CREATE OR REPLACE FUNCTION compras_rollup_marcar_viejas()
+    RETURNS TRIGGER LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO compras_rollup_pendientes (mes_key, marcado_at)
+        SELECT m.mes_key, clock_timestamp()
+        FROM (SELECT DISTINCT COALESCE(mes_key, '') AS mes_key FROM viejas) m
+        ON CONFLICT (mes_key) DO UPDATE SET marcado_at = clock_timestamp();
+        RETURN NULL;
+    END;
+    $$;
+
+    DROP TRIGGER IF EXISTS trg_rollup_ins ON chatbot_raw;
+    CREATE TRIGGER trg_rollup_ins AFTER INSERT ON chatbot_raw
+        REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION compras_rollup_marcar_nuevas();
+
+    DROP TRIGGER IF EXISTS trg_rollup_upd_new ON chatbot_raw;
+    CREATE TRIGGER trg_rollup_upd_new AFTER UPDATE ON chatbot_raw
+        REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION compras_rollup_marcar_nuevas();
+
+    DROP TRIGGER IF EXISTS trg_rollup_upd_old ON chatbot_raw;
+    CREATE TRIGGER trg_rollup_upd_old AFTER UPDATE ON chatbot_raw
+        REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION compras_rollup_marcar_viejas();
+
+    DROP TRIGGER IF EXISTS trg_rollup_del ON chatbot_raw;
+    CREATE TRIGGER trg_rollup_del AFTER DELETE ON chatbot_raw
+        REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION compras_rollup_marcar_viejas();
+"""
+
+SQL_RECALCULAR_MESES = f"""
+    DELETE FROM compras_rollup_mensual WHERE COALESCE(mes_key, '') = ANY(%(meses)s);
+
+    INSERT INTO compras_rollup_mensual (
+        mes_key, anio_int, "Tipo Comprobante",
+        "Cliente / Proveedor", proveedor_norm, "Familia",
+        "Articulo", articulo_norm, moneda_norm,
+        "Fecha", monto_num, lineas
+    )
+    SELECT
+        mes_key,
+        anio_int,
+        "Tipo Comprobante",
+        TRIM("Cliente / Proveedor"),
+        MIN(proveedor_norm),
+        TRIM("Familia"),
+        TRIM("Articulo"),
+        MIN(articulo_norm),
+        moneda_norm,
+        MIN(fecha_date),
+        COALESCE(SUM(monto_num), 0),
+        COUNT(*)
+    FROM chatbot_raw
+    WHERE COALESCE(mes_key, '') = ANY(%(meses)s)
+      AND {_FILTRO_COMPRAS}
+    GROUP BY
+        mes_key, anio_int, "Tipo Comprobante",
+        TRIM("Cliente / Proveedor"), TRIM("Familia"), TRIM("Articulo"),
+        moneda_norm;
+"""
+
+
+def _set_estado(cur, estado: str) -> None:
+    cur.execute("""
+        INSERT INTO fertichat_migraciones (nombre, version, estado, actualizado_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (nombre) DO UPDATE
+            SET version = EXCLUDED.version,
+                estado = EXCLUDED.estado,
+                actualizado_at = NOW()
+    """, (MIGRACION_ROLLUP, ROLLUP_VERSION, estado))
+
+
+def asegurar_rollup() -> None:
+    """Crea tablas y triggers (idempotente). La primera vez marca todos los meses."""
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_TABLAS)
+            cur.execute(SQL_TRIGGERS)
+            cur.execute(
+                "SELECT version FROM fertichat_migraciones WHERE nombre = %s",
+                (MIGRACION_ROLLUP,)
+            )
+            row = cur.fetchone()
+            if not row or int(row[0]) < ROLLUP_VERSION:
+                cur.execute("""
+                    INSERT INTO compras_rollup_pendientes (mes_key)
+                    SELECT DISTINCT COALESCE(mes_key, '') FROM chatbot_raw
+                    ON CONFLICT (mes_key) DO NOTHING
+                """)
+                _set_estado(cur, "pendiente")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# =====================================================================
+# REFRESCO INCREMENTAL
+# =====================================================================
+
+def _recalcular(cur, meses: list, inicio) -> None:
+    """
+    Recalcula `meses` y los saca de pendientes, salvo los que se volvieron
+    a marcar después de `inicio` (cambios que este recálculo no vio).
+    """
+    cur.execute(SQL_RECALCULAR_MESES, {"meses": meses})
+    cur.execute(
+        "DELETE FROM compras_rollup_pendientes WHERE mes_key = ANY(%s) AND marcado_at <= %s",
+        (meses, inicio)
+    )
+
+
+def refrescar_rollup(meses_por_lote: int = 12) -> int:
+    """
+    Recalcula los meses pendientes (de a `meses_por_lote` por transacción).
+    Devuelve cuántos meses recalculó.
+    """
+    total = 0
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute("SELECT clock_timestamp()")
+                inicio = cur.fetchone()[0]
+                cur.execute("""
+                    SELECT mes_key FROM compras_rollup_pendientes
+                    ORDER BY mes_key
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """, (int(meses_por_lote),))
+                meses = [r[0] for r in cur.fetchall()]
+                if not meses:
+                    _set_estado(cur, "completo")
+                    conn.commit()
+                    break
+
+                _recalcular(cur, meses, inicio)
+            conn.commit()
+            total += len(meses)
+            print(f"✅ Rollup compras: {len(meses)} mes(es) recalculados ({', '.join(m or '—' for m in meses)})")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    invalidar_cache_rollup()
+    invalidar_tablas("compras_rollup_mensual")
+    return total
+
+
+if __name__ == "__main__":
+    asegurar_rollup()
+    n = refrescar_rollup()
+    print(f"🎉 Rollup de compras al día ({n} meses recalculados)")
+    if len(sys.argv) > 1 and sys.argv[1] == "vigilar":
+        cada = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+        while True:
+            time.sleep(cada)
+            try:
+                refrescar_rollup()
+            except Exception as e:
+                print(f"⚠️ Rollup: refresco falló ({e}), reintento en {cada} s")
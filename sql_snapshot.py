@@ -0,0 +1,644 @@
+# =========================
+# SQL SNAPSHOT - COPIA LOCAL (PARQUET) DE chatbot_raw
+# =========================
+"""
+Snapshot columnar de chatbot_raw para lecturas analíticas (dashboard,
+comparativas, totales, listas) sin depender de Supabase.
+
+Estructura en disco (SNAPSHOT_PATH, default ~/.fertichat/snapshot):
+
+    chatbot_raw/anio=2025/mes=2025-11.parquet
+    chatbot_raw/anio=sin/mes=sin_mes.parquet     <- filas sin mes_key
+    manifest.json                                <- filas por mes
+
+Refresco incremental:
+- triggers de sentencia en chatbot_raw anotan los meses tocados
+  (INSERT, UPDATE y DELETE, de cualquier fecha) en snapshot_pendientes
+- refrescar_snapshot() re-exporta solo esos meses (cada archivo de mes
+  se reemplaza atómico) y los saca de pendientes
+- una factura que llega tarde con fecha vieja marca su mes como
+  cualquier otra; --completo queda para reconstruir el snapshot entero
+
+Adaptador: funciones con el mismo nombre, firma y columnas de salida que
+las de sql_compras / sql_comparativas, resueltas con pandas sobre el
+snapshot. Si no hay snapshot o está vencido (SNAPSHOT_MAX_HORAS) llaman a
+la función SQL original. Los montos salen como float (en la BD NUMERIC ->
+Decimal).
+
+Requiere pyarrow y la migración de sql_tipado completa.
+
+Ejecutar:  python sql_snapshot.py              -> crea triggers (si faltan) y refresca
+           python sql_snapshot.py --completo   -> re-exporta todo
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+import sql_compras
+import sql_comparativas
+import sql_core
+from sql_core import (
+    get_db_connection, ejecutar_consulta, ejecutar_consulta_stream,
+    _columnas_tipadas_activas, _str_setting, _pool_setting,
+)
+
+SNAPSHOT_DIR = _str_setting("SNAPSHOT_PATH", "") or os.path.join(os.path.expanduser("~"), ".fertichat", "snapshot")
+SNAPSHOT_MAX_HORAS = _pool_setting("SNAPSHOT_MAX_HORAS", 26)
+
+_SIN_MES = "sin_mes"
+
+# Columnas exportadas (crudas que muestran los listados + tipadas para agregar)
+COLUMNAS = [
+    '"Tipo Comprobante"', '"Cliente / Proveedor"', '"Articulo"', '"Familia"',
+    '"Nro. Comprobante"', '"Fecha"', '"Cantidad"', '"Moneda"', '"Monto Neto"',
+    'monto_num', 'moneda_norm', 'anio_int', 'mes_key', 'fecha_date',
+    'proveedor_norm', 'articulo_norm',
+]
+_COLS_TEXTO = [
+    "Tipo Comprobante", "Cliente / Proveedor", "Articulo", "Familia",
+    "Nro. Comprobante", "Cantidad", "Moneda", "Monto Neto",
+    "moneda_norm", "mes_key", "proveedor_norm", "articulo_norm",
+]
+
+
+# =====================================================================
+# DDL - REGISTRO DE CAMBIOS
+# =====================================================================
+
+# Un registro por mes con el número de cambio (secuencia) de su última
+# modificación. No se borra al refrescar: cada snapshot (uno por máquina)
+# guarda en su manifiesto hasta qué cambio exportó.
+SQL_TABLA_CAMBIOS = """
+    CREATE SEQUENCE IF NOT EXISTS snapshot_cambios_seq;
+    CREATE TABLE IF NOT EXISTS snapshot_cambios (
+        mes_key TEXT PRIMARY KEY,
+        cambio BIGINT NOT NULL
+    );
+"""
+
+# Un trigger por evento (las tablas de transición no admiten varios eventos)
+SQL_TRIGGERS = """
+    CREATE OR REPLACE FUNCTION snapshot_marcar_nuevas()
+    RETURNS TRIGGER LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO snapshot_cambios (mes_key, cambio)
+        SELECT m.mes_key, nextval('snapshot_cambios_seq')
+        FROM (SELECT DISTINCT COALESCE(mes_key, '') AS mes_key FROM nuevas) m
+        ON CONFLICT (mes_key) DO UPDATE SET cambio = EXCLUDED.cambio;
+        RETURN NULL;
+    END;
+    $$;
+
+    CREATE OR REPLACE FUNCTION snapshot_marcar_viejas()
+    RETURNS TRIGGER LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO snapshot_cambios (mes_key, cambio)
+        SELECT m.mes_key, nextval('snapshot_cambios_seq')
+        FROM (SELECT DISTINCT COALESCE(mes_key, '') AS mes_key FROM viejas) m
+        ON CONFLICT (mes_key) DO UPDATE SET cambio = EXCLUDED.cambio;
+        RETURN NULL;
+    END;
+    $$;
+
+    DROP TRIGGER IF EXISTS trg_snapshot_ins ON chatbot_raw;
+    CREATE TRIGGER trg_snapshot_ins AFTER INSERT ON chatbot_raw
+        REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION snapshot_marcar_nuevas();
+
+    DROP TRIGGER IF EXISTS trg_snapshot_upd_new ON chatbot_raw;
+    CREATE TRIGGER trg_snapshot_upd_new AFTER UPDATE ON chatbot_raw
+        REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION snapshot_marcar_nuevas();
+
+    DROP TRIGGER IF EXISTS trg_snapshot_upd_old ON chatbot_raw;
+    CREATE TRIGGER trg_snapshot_upd_old AFTER UPDATE ON chatbot_raw
+        REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION snapshot_marcar_viejas();
+
+    DROP TRIGGER IF EXISTS trg_snapshot_del ON chatbot_raw;
+    CREATE TRIGGER trg_snapshot_del AFTER DELETE ON chatbot_raw
+        REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION snapshot_marcar_viejas();
+"""
+
+
+def asegurar_snapshot() -> None:
+    """Crea el registro de cambios y sus triggers (idempotente)."""
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_TABLA_CAMBIOS)
+            cur.execute(SQL_TRIGGERS)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _cambios_desde(desde: Optional[int]):
+    """
+    (meses, hasta): meses con cambios posteriores a `desde` y el último
+    número de cambio ya confirmado.
+
+    El LOCK en modo SHARE espera a que terminen las transacciones que están
+    marcando meses: un cambio con número menor a `hasta` que todavía no
+    confirmó no puede quedar afuera (nextval no es transaccional).
+    """
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE snapshot_cambios IN SHARE MODE")
+            cur.execute("SELECT mes_key, cambio FROM snapshot_cambios")
+            filas = cur.fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    hasta = max((int(c) for _, c in filas), default=int(desde or 0))
+    meses = sorted(m for m, c in filas if desde is None or int(c) > desde)
+    return meses, hasta
+
+
+# =====================================================================
+# RUTAS / MANIFIESTO
+# =====================================================================
+
+def _ruta_manifest() -> str:
+    return os.path.join(SNAPSHOT_DIR, "manifest.json")
+
+
+def _ruta_mes(mes_key: str) -> str:
+    mes = mes_key or _SIN_MES
+    anio = mes[:4] if mes != _SIN_MES else "sin"
+    return os.path.join(SNAPSHOT_DIR, "chatbot_raw", f"anio={anio}", f"mes={mes}.parquet")
+
+
+def leer_manifest() -> Optional[dict]:
+    try:
+        with open(_ruta_manifest(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _guardar_manifest(manifest: dict) -> None:
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp = _ruta_manifest() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, _ruta_manifest())
+
+
+# =====================================================================
+# EXPORTACIÓN
+# =====================================================================
+
+def _tabla_arrow(df: pd.DataFrame):
+    df = df.copy()
+    for c in _COLS_TEXTO:
+        if c in df.columns:
+            df[c] = df[c].astype("string")
+    df["monto_num"] = pd.to_numeric(df["monto_num"], errors="coerce").astype("float64")
+    df["anio_int"] = pd.to_numeric(df["anio_int"], errors="coerce").astype("Int64")
+    df["fecha_date"] = pd.to_datetime(df["fecha_date"], errors="coerce")
+    df["Fecha"] = pd.to_datetime(df["Fecha"], errors="coerce")
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _exportar_mes(mes_key: str) -> int:
+    sql = f"""
+        SELECT {", ".join(COLUMNAS)}
+        FROM chatbot_raw
+        WHERE COALESCE(mes_key, '') = %s
+    """
+    bloques = list(ejecutar_consulta_stream(sql, (mes_key or "",)))
+    ruta = _ruta_mes(mes_key)
+    if not bloques:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        return 0
+
+    df = pd.concat(bloques, ignore_index=True)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = ruta + ".tmp"
+    pq.write_table(_tabla_arrow(df), tmp, compression="zstd")
+    os.replace(tmp, ruta)
+    return len(df)
+
+
+def refrescar_snapshot(completo: bool = False) -> int:
+    """
+    Exporta a Parquet los meses modificados desde el refresco anterior
+    (todos si completo=True o si el snapshot todavía no tiene registro de
+    cambios). Devuelve cuántos meses re-exportó.
+    """
+    if pa is None:
+        raise ImportError("pyarrow no instalado: el snapshot necesita pyarrow")
+    if not _columnas_tipadas_activas():
+        raise RuntimeError("Falta completar la migración de sql_tipado (columnas tipadas).")
+
+    manifest = leer_manifest() or {}
+    desde = manifest.get("cambio")
+    completo = completo or desde is None
+
+    # El corte se toma antes de exportar: lo que cambie durante la
+    # exportación queda con número mayor y entra en el próximo refresco.
+    meses, hasta = _cambios_desde(None if completo else int(desde))
+    if completo:
+        meses_df = ejecutar_consulta(
+            "SELECT DISTINCT COALESCE(mes_key, '') AS mes_key FROM chatbot_raw",
+            usar_cache=False,
+        )
+        meses = sorted(meses_df["mes_key"].tolist()) if not meses_df.empty else []
+
+    filas_por_mes: Dict[str, int] = {} if completo else dict(manifest.get("meses") or {})
+    for mes in meses:
+        n = _exportar_mes(mes)
+        clave = mes or _SIN_MES
+        if n:
+            filas_por_mes[clave] = n
+        else:
+            filas_por_mes.pop(clave, None)
+        print(f"✅ Snapshot: {clave} -> {n} filas")
+
+    _guardar_manifest({
+        "cambio": hasta,
+        "actualizado": datetime.now().isoformat(timespec="seconds"),
+        "filas": int(sum(filas_por_mes.values())),
+        "meses": filas_por_mes,
+    })
+    invalidar_snapshot_memoria()
+    return len(meses)
+
+
+# =====================================================================
+# LECTURA (CACHÉ EN MEMORIA POR ARCHIVO)
+# =====================================================================
+
+_MESES_CARGADOS: Dict[str, tuple] = {}
+_LOCK = threading.Lock()
+
+
+def invalidar_snapshot_memoria() -> None:
+    with _LOCK:
+        _MESES_CARGADOS.clear()
+
+
+def snapshot_disponible() -> bool:
+    """Hay snapshot, pyarrow y no está vencido."""
+    if pa is None:
+        return False
+    manifest = leer_manifest()
+    if not manifest or not manifest.get("meses"):
+        return False
+    try:
+        edad = time.time() - os.path.getmtime(_ruta_manifest())
+    except OSError:
+        return False
+    return edad < SNAPSHOT_MAX_HORAS * 3600
+
+
+def snapshot_actualizado() -> Optional[datetime]:
+    """Cuándo se exportó el snapshot que se está usando (None si no está disponible)."""
+    if not snapshot_disponible():
+        return None
+    try:
+        return datetime.fromisoformat((leer_manifest() or {}).get("actualizado") or "")
+    except ValueError:
+        return None
+
+
+def _cargar_mes(mes: str) -> pd.DataFrame:
+    ruta = _ruta_mes(mes if mes != _SIN_MES else "")
+    try:
+        mtime = os.path.getmtime(ruta)
+    except OSError:
+        return pd.DataFrame()
+    with _LOCK:
+        e = _MESES_CARGADOS.get(mes)
+        if e is not None and e[0] == mtime:
+            return e[1]
+    df = pq.read_table(ruta).to_pandas()
+    for c in _COLS_TEXTO:
+        if c in df.columns:
+            df[c] = df[c].astype(object).where(df[c].notna(), None)
+    with _LOCK:
+        _MESES_CARGADOS[mes] = (mtime, df)
+    return df
+
+
+def _compras(anios: List[int] = None, meses: List[str] = None, solo_compras: bool = True) -> pd.DataFrame:
+    """Filas del snapshot de los períodos pedidos (solo compras por defecto)."""
+    manifest = leer_manifest() or {}
+    disponibles = list((manifest.get("meses") or {}).keys())
+    if meses:
+        pedidos = [m for m in disponibles if m in set(meses)]
+    elif anios:
+        prefijos = tuple(f"{int(a)}-" for a in anios)
+        pedidos = [m for m in disponibles if m.startswith(prefijos)]
+        # anio_int puede no coincidir con mes_key en filas raras: sin_mes también
+        if _SIN_MES in disponibles:
+            pedidos.append(_SIN_MES)
+    else:
+        pedidos = disponibles
+
+    partes = [_cargar_mes(m) for m in pedidos]
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame(columns=[c.strip('"') for c in COLUMNAS])
+    df = pd.concat(partes, ignore_index=True)
+
+    if anios:
+        df = df[df["anio_int"].isin([int(a) for a in anios])]
+    if solo_compras:
+        tipo = df["Tipo Comprobante"].fillna("")
+        df = df[(tipo == "Compra Contado") | tipo.str.startswith("Compra")]
+    return df
+
+
+# =====================================================================
+# HELPERS DE AGREGACIÓN (MISMA SEMÁNTICA QUE EL SQL)
+# =====================================================================
+
+def _trim(s: pd.Series) -> pd.Series:
+    # TRIM de Postgres: solo espacios
+    return s.where(s.isna(), s.astype(str).str.strip(" "))
+
+
+def _es_pesos(df: pd.DataFrame) -> pd.Series:
+    return df["moneda_norm"] == "$"
+
+
+def _es_usd(df: pd.DataFrame) -> pd.Series:
+    return df["moneda_norm"].isin(["U$S", "U$$"])
+
+
+def _monto_si(df: pd.DataFrame, mascara: pd.Series) -> pd.Series:
+    return df["monto_num"].where(mascara, 0.0).fillna(0.0)
+
+
+def _like(s: pd.Series, patron: str) -> pd.Series:
+    return s.fillna("").str.contains(patron, regex=False) & s.notna()
+
+
+def _ordenar_fecha_desc(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values("Fecha", ascending=False, na_position="last", kind="stable")
+
+
+def _detalle(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "proveedor": _trim(df["Cliente / Proveedor"]),
+        "articulo": _trim(df["Articulo"]),
+        "nro_factura": _trim(df["Nro. Comprobante"]),
+        "Fecha": df["Fecha"],
+        "Cantidad": df["Cantidad"],
+        "Moneda": df["Moneda"],
+        "total": _trim(df["Monto Neto"]),
+    }).reset_index(drop=True)
+
+
+def _con_respaldo(funcion_db):
+    """Usa el snapshot si está disponible; si no, la función SQL original."""
+    def deco(funcion_snapshot):
+        @wraps(funcion_db)
+        def wrapper(*args, **kwargs):
+            if snapshot_disponible():
+                try:
+                    return funcion_snapshot(*args, **kwargs)
+                except Exception as e:
+                    print(f"⚠️ Snapshot: {funcion_db.__name__} falló ({e}), uso la BD")
+            return funcion_db(*args, **kwargs)
+        wrapper.desde_snapshot = funcion_snapshot
+        return wrapper
+    return deco
+
+
+# =====================================================================
+# ADAPTADOR: sql_compras
+# =====================================================================
+
+@_con_respaldo(sql_compras.get_total_compras_anio)
+def get_total_compras_anio(anio: int) -> dict:
+    df = _compras(anios=[anio])
+    return {
+        "registros": int(len(df)),
+        "total_pesos": float(_monto_si(df, _es_pesos(df)).sum()),
+        "total_usd": float(_monto_si(df, _es_usd(df)).sum()),
+        "proveedores": int(_trim(df["Cliente / Proveedor"]).nunique()),
+        "articulos": int(_trim(df["Articulo"]).nunique()),
+    }
+
+
+@_con_respaldo(sql_compras.get_compras_anio)
+def get_compras_anio(anio: int, limite: Optional[int] = 5000) -> pd.DataFrame:
+    df = _ordenar_fecha_desc(_compras(anios=[anio]))
+    if limite is not None:
+        df = df.head(int(limite))
+    return _detalle(df)
+
+
+@_con_respaldo(sql_compras.get_detalle_compras_proveedor_mes)
+def get_detalle_compras_proveedor_mes(proveedor_like: str, mes_key: str, anio: Optional[int] = None) -> pd.DataFrame:
+    proveedor_like = (proveedor_like or "").strip().lower()
+    df = _compras(meses=[mes_key])
+    if anio:
+        df = df[df["anio_int"] == int(anio)]
+    df = df[_like(df["proveedor_norm"], proveedor_like)]
+    if df.empty:
+        # Mismo fallback de mes que la versión SQL
+        return sql_compras.get_detalle_compras_proveedor_mes(proveedor_like, mes_key, anio)
+    return _detalle(_ordenar_fecha_desc(df))
+
+
+@_con_respaldo(sql_compras.get_total_compras_por_moneda_anio)
+def get_total_compras_por_moneda_anio(anio: int) -> pd.DataFrame:
+    df = _compras(anios=[anio])
+    out = (
+        df.assign(monto=df["monto_num"])
+        .groupby("moneda_norm", dropna=False)["monto"].sum(min_count=0)
+        .reset_index()
+        .rename(columns={"moneda_norm": "moneda", "monto": "total_compras"})
+    )
+    return out.sort_values("total_compras", ascending=False, kind="stable").reset_index(drop=True)
+
+
+@_con_respaldo(sql_compras.get_total_compras_por_moneda_todos_anios)
+def get_total_compras_por_moneda_todos_anios() -> pd.DataFrame:
+    df = _compras()
+    out = (
+        df.groupby(["anio_int", "moneda_norm"], dropna=False)["monto_num"].sum()
+        .reset_index()
+        .rename(columns={"anio_int": "anio", "moneda_norm": "moneda", "monto_num": "total_compras"})
+    )
+    return out.sort_values(["anio", "total_compras"], ascending=[True, False], kind="stable").reset_index(drop=True)
+
+
+@_con_respaldo(sql_compras.get_dashboard_totales)
+def get_dashboard_totales(anio: int) -> dict:
+    df = _compras(anios=[anio])
+    return {
+        "total_pesos": float(_monto_si(df, _es_pesos(df)).sum()),
+        "total_usd": float(_monto_si(df, _es_usd(df)).sum()),
+        "proveedores": int(_trim(df["Cliente / Proveedor"]).nunique()),
+        "facturas": int(_trim(df["Nro. Comprobante"]).nunique()),
+    }
+
+
+@_con_respaldo(sql_compras.get_dashboard_compras_por_mes)
+def get_dashboard_compras_por_mes(anio: int) -> pd.DataFrame:
+    df = _compras(anios=[anio])
+    g = df.groupby("mes_key", dropna=False).agg(total=("monto_num", "sum"), _orden=("Fecha", "min"))
+    g = g.sort_values("_orden", na_position="last", kind="stable").reset_index()
+    return g.rename(columns={"mes_key": "mes"})[["mes", "total"]]
+
+
+@_con_respaldo(sql_compras.get_dashboard_top_proveedores)
+def get_dashboard_top_proveedores(anio: int, top_n: int = 10, moneda: str = "$") -> pd.DataFrame:
+    df = _compras(anios=[anio])
+    df = df[_es_pesos(df) if moneda == "$" else _es_usd(df)]
+    prov = _trim(df["Cliente / Proveedor"])
+    df = df[prov.notna() & (prov != "")].assign(proveedor=prov)
+    out = df.groupby("proveedor")["monto_num"].sum().reset_index().rename(columns={"monto_num": "total"})
+    return out.sort_values("total", ascending=False, kind="stable").head(int(top_n)).reset_index(drop=True)
+
+
+@_con_respaldo(sql_compras.get_dashboard_gastos_familia)
+def get_dashboard_gastos_familia(anio: int) -> pd.DataFrame:
+    df = _compras(anios=[anio])
+    df = df.assign(familia=_trim(df["Familia"]).fillna("Sin Clasificar"))
+    out = df.groupby("familia")["monto_num"].sum().reset_index().rename(columns={"monto_num": "total"})
+    return out.sort_values("total", ascending=False, kind="stable").reset_index(drop=True)
+
+
+@_con_respaldo(sql_compras.get_dashboard_ultimas_compras)
+def get_dashboard_ultimas_compras(limite: int = 5) -> pd.DataFrame:
+    manifest = leer_manifest() or {}
+    # Los meses más nuevos alcanzan para las últimas N (mes_key ordena como fecha)
+    meses = sorted((m for m in (manifest.get("meses") or {}) if m != _SIN_MES), reverse=True)[:2]
+    df = _ordenar_fecha_desc(_compras(meses=meses or None)).head(int(limite))
+    return pd.DataFrame({
+        "proveedor": _trim(df["Cliente / Proveedor"]),
+        "articulo": _trim(df["Articulo"]),
+        "Fecha": df["Fecha"],
+        "total": df["monto_num"],
+    }).reset_index(drop=True)
+
+
+# =====================================================================
+# ADAPTADOR: sql_comparativas
+# =====================================================================
+
+def _pivot_anios_monedas(df: pd.DataFrame, clave: pd.Series, nombre: str, anios: List[int]) -> pd.DataFrame:
+    base = pd.DataFrame({nombre: clave})
+    for y in anios:
+        en_anio = df["anio_int"] == y
+        base[f"{y}_$"] = _monto_si(df, en_anio & _es_pesos(df))
+        base[f"{y}_USD"] = _monto_si(df, en_anio & _es_usd(df))
+    out = base.groupby(nombre, dropna=False).sum().reset_index()
+    y_last = anios[-1]
+    out = out.sort_values([f"{y_last}_$", f"{y_last}_USD"], ascending=False, kind="stable")
+    return out.head(300).reset_index(drop=True)
+
+
+@_con_respaldo(sql_comparativas.get_comparacion_proveedor_anios_monedas)
+def get_comparacion_proveedor_anios_monedas(anios: List[int], proveedores: List[str] = None) -> pd.DataFrame:
+    anios = sorted(anios)
+    df = _compras(anios=anios)
+    if proveedores:
+        mascara = pd.Series(False, index=df.index)
+        for p in proveedores:
+            mascara |= _like(df["proveedor_norm"], p.lower())
+        df = df[mascara]
+    return _pivot_anios_monedas(df, _trim(df["Cliente / Proveedor"]), "proveedor", anios)
+
+
+@_con_respaldo(sql_comparativas.get_comparacion_familia_anios_monedas)
+def get_comparacion_familia_anios_monedas(anios: List[int], familias: List[str] = None) -> pd.DataFrame:
+    anios = sorted(anios)
+    df = _compras(anios=anios)
+    if familias:
+        df = df[_trim(df["Familia"].fillna("")).isin(list(familias))]
+    return _pivot_anios_monedas(df, _trim(df["Familia"].fillna("SIN FAMILIA")), "familia", anios)
+
+
+@_con_respaldo(sql_comparativas.get_comparacion_articulo_anios)
+def get_comparacion_articulo_anios(anios: List[int], articulo_like: str) -> pd.DataFrame:
+    anios = sorted(anios)
+    df = _compras(anios=anios)
+    df = df[_like(df["articulo_norm"], articulo_like.lower())]
+    base = pd.DataFrame({"articulo": _trim(df["Articulo"])})
+    for y in anios:
+        base[str(y)] = _monto_si(df, df["anio_int"] == y)
+    out = base.groupby("articulo", dropna=False).sum().reset_index()
+    return out.sort_values("articulo", kind="stable").head(100).reset_index(drop=True)
+
+
+def _gastos_familias(df: pd.DataFrame) -> pd.DataFrame:
+    base = pd.DataFrame({
+        "familia": _trim(df["Familia"].fillna("SIN FAMILIA")),
+        "total_pesos": _monto_si(df, _es_pesos(df)),
+        "total_usd": _monto_si(df, _es_usd(df)),
+    })
+    out = base.groupby("familia", dropna=False).sum().reset_index()
+    return out.sort_values(["total_pesos", "total_usd"], ascending=False, kind="stable").reset_index(drop=True)
+
+
+@_con_respaldo(sql_comparativas.get_gastos_todas_familias_mes)
+def get_gastos_todas_familias_mes(mes_key: str) -> pd.DataFrame:
+    return _gastos_familias(_compras(meses=[mes_key]))
+
+
+@_con_respaldo(sql_comparativas.get_gastos_todas_familias_anio)
+def get_gastos_todas_familias_anio(anio: int) -> pd.DataFrame:
+    return _gastos_familias(_compras(anios=[anio]))
+
+
+# =====================================================================
+# ADAPTADOR: listas (sql_core)
+# =====================================================================
+
+@_con_respaldo(sql_core.get_lista_proveedores)
+def get_lista_proveedores() -> list:
+    df = _compras(solo_compras=False)
+    provs = _trim(df["Cliente / Proveedor"]).dropna()
+    provs = sorted(set(p for p in provs if p))[:500]
+    return ["Todos"] + provs
+
+
+@_con_respaldo(sql_core.get_lista_articulos)
+def get_lista_articulos() -> list:
+    df = _compras(solo_compras=False)
+    arts = _trim(df["Articulo"]).dropna()
+    arts = sorted(set(a for a in arts if a))[:500]
+    return ["Todos"] + arts
+
+
+if __name__ == "__main__":
+    asegurar_snapshot()
+    n = refrescar_snapshot(completo="--completo" in sys.argv)
+    m = leer_manifest() or {}
+    print(f"🎉 Snapshot al día: {n} mes(es) exportados, {m.get('filas', 0)} filas, cambio {m.get('cambio')}")
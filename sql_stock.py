@@ -2,10 +2,19 @@
 # SQL STOCK - INVENTARIO Y LOTES
 # =========================
 
+import hashlib
 import os
+import time
 import pandas as pd
 import streamlit as st
-from sql_core import ejecutar_consulta, _safe_ident
+from sql_core import (
+    ejecutar_consulta,
+    get_db_connection,
+    _safe_ident,
+    _stock_tipado_activo,
+    _pool_setting,
+)
+from sql_stock_escritura import instalar_funciones_si_faltan
 
 
 # =====================================================================
@@ -128,8 +137,23 @@ def _sql_num_expr_stock(col_expr: str) -> str:
     """
 
 
-def _stock_base_subquery() -> tuple:
-    """Construye un subquery estándar con aliases esperados."""
+# Con la migración de sql_stock_tipado hecha: columnas ya tipadas, sin parseo
+_STOCK_LOTES_SUBQUERY = """
+    SELECT
+        codigo AS "CODIGO",
+        articulo AS "ARTICULO",
+        familia AS "FAMILIA",
+        deposito AS "DEPOSITO",
+        lote AS "LOTE",
+        vencimiento_date AS "VENCIMIENTO",
+        stock AS "STOCK",
+        (vencimiento_date - CURRENT_DATE) AS "Dias_Para_Vencer"
+    FROM public.stock_lotes
+"""
+
+
+def _armar_stock_subquery() -> tuple:
+    """Descubre tabla/columnas (information_schema) y arma el subquery estándar."""
     schema, table = _get_stock_schema_table()
     schema_s = _safe_ident(schema) or "public"
     table_s = _safe_ident(table) or "stock_raw"
@@ -173,6 +197,116 @@ def _stock_base_subquery() -> tuple:
     return sub, schema_s, table_s
 
 
+# Resolución del esquema de stock (sin stock_lotes): tabla y columnas se
+# descubren una vez y el subquery queda compilado en la vista
+# fertichat_stock_base, así cada consulta de stock es un solo viaje a la
+# base. La vista se crea solo desde precalentar_stock() (arranque) o
+# `python sql_stock.py`, nunca al atender una consulta: lleva la firma del
+# subquery en su COMMENT y se recrea solo si la firma cambió. Al vencer
+# STOCK_ESQUEMA_TTL se redescubre el esquema y, si el subquery es el mismo,
+# se sigue usando la vista sin DDL; si cambió, se usa el subquery directo
+# hasta el próximo arranque. invalidar_cache_esquema_stock() fuerza
+# redescubrir (ej. después de cambiar STOCK_TABLE o las columnas).
+VISTA_STOCK_BASE = "fertichat_stock_base"
+
+_ESQUEMA_TTL_SEG = _pool_setting("STOCK_ESQUEMA_TTL", 3600)
+_ESQUEMA_STOCK = {"base": None, "sub": None, "schema": None, "table": None, "ts": None}
+
+
+def invalidar_cache_esquema_stock() -> None:
+    _ESQUEMA_STOCK["ts"] = None
+
+
+def _firma_subquery(sub: str) -> str:
+    return hashlib.sha1(" ".join(sub.split()).encode("utf-8")).hexdigest()
+
+
+def _firma_vista(cur):
+    cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (f"public.{VISTA_STOCK_BASE}",))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _asegurar_vista_stock_base(sub: str, crear: bool = False):
+    """
+    True si la vista corresponde a `sub` (con crear=True la recrea si hace
+    falta), False si está desactualizada o no hay permisos, None sin conexión.
+    """
+    firma = _firma_subquery(sub)
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        with conn.cursor() as cur:
+            vigente = _firma_vista(cur) == firma
+            if not vigente and crear:
+                # un solo proceso recrea la vista; los demás ven la firma nueva
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (VISTA_STOCK_BASE,))
+                if _firma_vista(cur) != firma:
+                    # DROP + CREATE: OR REPLACE no deja cambiar tipos de columnas
+                    cur.execute(f"DROP VIEW IF EXISTS public.{VISTA_STOCK_BASE}")
+                    cur.execute(f"CREATE VIEW public.{VISTA_STOCK_BASE} AS {sub}")
+                    cur.execute(f"COMMENT ON VIEW public.{VISTA_STOCK_BASE} IS %s", (firma,))
+                    print(f"✅ Vista {VISTA_STOCK_BASE} recreada")
+                vigente = True
+        conn.commit()
+        return vigente
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ No se pudo crear la vista {VISTA_STOCK_BASE} (uso el subquery): {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def _resolver_esquema_stock(crear_vista: bool = False) -> tuple:
+    ahora = time.monotonic()
+    sub, schema_s, table_s = _armar_stock_subquery()
+    if sub == _ESQUEMA_STOCK["sub"]:
+        # mismo esquema que la última vez: se reusa sin tocar la vista
+        _ESQUEMA_STOCK["ts"] = ahora
+        return _ESQUEMA_STOCK["base"], schema_s, table_s
+
+    vista = _asegurar_vista_stock_base(sub, crear=crear_vista)
+    if vista is None:
+        # sin base no se pudo descubrir nada: no se cachea
+        return sub, schema_s, table_s
+    if not vista and not crear_vista:
+        print(f"⚠️ Vista {VISTA_STOCK_BASE} desactualizada: uso el subquery "
+              f"(precalentar_stock / python sql_stock.py la recrea)")
+
+    base = f"SELECT * FROM public.{VISTA_STOCK_BASE}" if vista else sub
+    _ESQUEMA_STOCK.update(base=base, sub=sub, schema=schema_s, table=table_s, ts=ahora)
+    return base, schema_s, table_s
+
+
+def _stock_base_subquery() -> tuple:
+    """Subquery estándar con aliases esperados (resolución cacheada, sin DDL)."""
+    if _stock_tipado_activo():
+        return _STOCK_LOTES_SUBQUERY, "public", "stock_lotes"
+
+    ts = _ESQUEMA_STOCK["ts"]
+    if ts is not None and time.monotonic() - ts < _ESQUEMA_TTL_SEG:
+        return _ESQUEMA_STOCK["base"], _ESQUEMA_STOCK["schema"], _ESQUEMA_STOCK["table"]
+    return _resolver_esquema_stock()
+
+
+def precalentar_stock() -> None:
+    """
+    Resuelve el esquema de stock al arrancar, deja la vista al día e instala
+    las funciones de escritura si faltan (una vez por proceso).
+    """
+    if _ESQUEMA_STOCK["ts"] is not None:
+        return
+    try:
+        if not _stock_tipado_activo():
+            _resolver_esquema_stock(crear_vista=True)
+        if instalar_funciones_si_faltan():
+            print("✅ Funciones de escritura de stock instaladas")
+    except Exception as e:
+        print(f"⚠️ precalentar_stock: {e}")
+
+
 # =====================================================================
 # LISTADOS DE STOCK
 # =====================================================================
@@ -354,8 +488,36 @@ def get_stock_familia(familia: str) -> pd.DataFrame:
 # RESÚMENES Y AGREGACIONES
 # =====================================================================
 
+# Resúmenes sobre stock_totales (una fila por codigo + depósito, mantenida
+# por trigger). "lotes" cuenta filas con número de lote.
+def _stock_totales_resumen(grupo: str = None, alias: str = None, vacio: str = None) -> pd.DataFrame:
+    if grupo:
+        sql = f"""
+            SELECT
+                COALESCE(NULLIF(TRIM({grupo}), ''), '{vacio}') AS {alias},
+                COALESCE(SUM(registros), 0) AS registros,
+                COUNT(DISTINCT NULLIF(TRIM(articulo), '')) AS articulos,
+                COALESCE(SUM(stock), 0) AS stock_total
+            FROM stock_totales
+            GROUP BY COALESCE(NULLIF(TRIM({grupo}), ''), '{vacio}')
+            ORDER BY stock_total DESC
+        """
+    else:
+        sql = """
+            SELECT
+                COALESCE(SUM(registros), 0) AS registros,
+                COUNT(DISTINCT NULLIF(TRIM(articulo), '')) AS articulos,
+                COALESCE(SUM(lotes), 0) AS lotes,
+                COALESCE(SUM(stock), 0) AS stock_total
+            FROM stock_totales
+        """
+    return ejecutar_consulta(sql, ())
+
+
 def get_stock_total() -> pd.DataFrame:
     try:
+        if _stock_tipado_activo():
+            return _stock_totales_resumen()
         base, _, _ = _stock_base_subquery()
         sql = f"""
             SELECT
@@ -372,6 +534,8 @@ def get_stock_total() -> pd.DataFrame:
 
 def get_stock_por_familia() -> pd.DataFrame:
     try:
+        if _stock_tipado_activo():
+            return _stock_totales_resumen("familia", "familia", "SIN FAMILIA")
         base, _, _ = _stock_base_subquery()
         sql = f"""
             SELECT
@@ -390,6 +554,8 @@ def get_stock_por_familia() -> pd.DataFrame:
 
 def get_stock_por_deposito() -> pd.DataFrame:
     try:
+        if _stock_tipado_activo():
+            return _stock_totales_resumen("deposito", "deposito", "SIN DEPÓSITO")
         base, _, _ = _stock_base_subquery()
         sql = f"""
             SELECT
@@ -410,8 +576,61 @@ def get_stock_por_deposito() -> pd.DataFrame:
 # ALERTAS Y VENCIMIENTOS
 # =====================================================================
 
+# Con stock_lotes: vencimiento_date ya parseada + índice parcial FEFO
+# (idx_stock_lotes_fefo: vencimiento_date WHERE stock > 0). Los próximos
+# STOCK_VENCIMIENTOS_N lotes se leen de una vez y quedan en la caché de
+# consultas: cualquier escritura de stock (invalidar_tablas) los rearma.
+_VENCIMIENTOS_N = _pool_setting("STOCK_VENCIMIENTOS_N", 500)
+
+_SQL_LOTES_FEFO = """
+    SELECT
+        codigo AS "CODIGO", articulo AS "ARTICULO", familia AS "FAMILIA",
+        deposito AS "DEPOSITO", lote AS "LOTE", vencimiento_date AS "VENCIMIENTO",
+        (vencimiento_date - CURRENT_DATE) AS "Dias_Para_Vencer", stock AS "STOCK"
+    FROM public.stock_lotes
+    WHERE stock > 0
+"""
+
+
+def _proximos_vencimientos() -> pd.DataFrame:
+    """Próximos lotes con stock que vencen desde hoy, en orden FEFO."""
+    sql = _SQL_LOTES_FEFO + """
+          AND vencimiento_date >= CURRENT_DATE
+        ORDER BY vencimiento_date ASC, codigo, lote
+        LIMIT %s
+    """
+    return ejecutar_consulta(sql, (int(_VENCIMIENTOS_N),))
+
+
+def _por_vencer_desde_indice(dias: int):
+    """
+    Lotes que vencen en `dias` desde los próximos vencimientos precalculados.
+    None si la ventana se pasa de lo precalculado (hay que ir a la base).
+    """
+    df = _proximos_vencimientos()
+    if df is None:
+        return None
+    if df.empty:
+        return df
+    completo = len(df) < _VENCIMIENTOS_N or int(df["Dias_Para_Vencer"].iloc[-1]) > int(dias)
+    if not completo:
+        return None
+    return df[df["Dias_Para_Vencer"] <= int(dias)].reset_index(drop=True)
+
+
 def get_lotes_por_vencer(dias: int = 90) -> pd.DataFrame:
     try:
+        if _stock_tipado_activo():
+            df = _por_vencer_desde_indice(dias)
+            if df is not None:
+                return df
+            sql = _SQL_LOTES_FEFO + """
+                  AND vencimiento_date >= CURRENT_DATE
+                  AND vencimiento_date <= CURRENT_DATE + %s
+                ORDER BY vencimiento_date ASC, codigo, lote
+            """
+            return ejecutar_consulta(sql, (int(dias),))
+
         base, _, _ = _stock_base_subquery()
         sql = f"""
             SELECT
@@ -430,6 +649,13 @@ def get_lotes_por_vencer(dias: int = 90) -> pd.DataFrame:
 
 def get_lotes_vencidos() -> pd.DataFrame:
     try:
+        if _stock_tipado_activo():
+            sql = _SQL_LOTES_FEFO + """
+                  AND vencimiento_date < CURRENT_DATE
+                ORDER BY vencimiento_date DESC
+            """
+            return ejecutar_consulta(sql, ())
+
         base, _, _ = _stock_base_subquery()
         sql = f"""
             SELECT
@@ -465,13 +691,18 @@ def get_stock_bajo(minimo: int = 10) -> pd.DataFrame:
 def get_alertas_vencimiento_multiple(limite: int = 10) -> list:
     """Alertas rotativas de vencimiento para el módulo Stock IA."""
     try:
-        df = get_lotes_por_vencer(dias=90)
+        if _stock_tipado_activo():
+            # las primeras `limite` siempre están en los próximos vencimientos
+            df = _proximos_vencimientos()
+            if df is not None and not df.empty:
+                df = df[df["Dias_Para_Vencer"] <= 90]
+        else:
+            df = get_lotes_por_vencer(dias=90)
         if df is None or df.empty:
             return []
 
         if "VENCIMIENTO" in df.columns:
-            df = df.sort_values(by="VENCIMIENTO", ascending=True, na_position="last")
-
+            df = df.sort_values(by="VENCIMIENTO", ascending=True, na_position="last", kind="stable")
         df = df.head(int(limite))
 
         alertas = []
@@ -487,3 +718,8 @@ def get_alertas_vencimiento_multiple(limite: int = 10) -> list:
         return alertas
     except Exception:
         return []
+
+
+if __name__ == "__main__":
+    precalentar_stock()
+    print(f"✅ Esquema de stock: {_ESQUEMA_STOCK['schema']}.{_ESQUEMA_STOCK['table']}")
@@ -0,0 +1,453 @@
+# =========================
+# SQL STOCK ESCRITURA - APLICAR COMPROBANTES EN LOTE
+# =========================
+"""
+Aplica todas las líneas de un comprobante (alta / baja / movimiento) sobre
+la tabla stock en UNA transacción y UN round trip.
+
+La lógica vive en la función fertichat_aplicar_stock(lineas JSONB): recorre
+las líneas del lado del servidor (SELECT ... FOR UPDATE + UPDATE o INSERT
+por clave de lote) y devuelve stock antes/después por línea. Desde Python
+es un solo SELECT; desde PostgREST se puede llamar como RPC.
+
+    línea = {"deposito", "codigo", "lote", "vencimiento", "delta",
+             "familia" (opc.), "articulo" (opc.), "id" (opc., stock_lotes)}
+
+- clave de lote: TRIM(deposito, codigo) + COALESCE(TRIM(lote/vencimiento), '')
+- delta > 0 sobre un lote inexistente -> INSERT
+- delta <= 0 sobre un lote inexistente -> se ignora (antes/después NULL)
+- estricto=False: el stock resultante se recorta a 0 (alta de comprobantes)
+- estricto=True: faltante o stock insuficiente -> excepción y rollback de
+  todo el comprobante
+- los lotes se bloquean en orden de clave: dos comprobantes concurrentes no
+  se cruzan en deadlock
+
+Hay dos versiones de fertichat_aplicar_stock con la misma firma: sobre la
+tabla stock de texto (TRIM por clave) y, después de la migración de
+sql_stock_tipado, sobre stock_lotes (lock y UPDATE por id, alta con
+INSERT ... ON CONFLICT sobre la clave única). asegurar_funciones_stock
+instala la que corresponde al esquema; la corren la migración, este script
+y precalentar_stock (si faltan). aplicar_lineas_stock no corre DDL: si la
+función no existe, falla con un mensaje claro.
+
+Ejecutar:  python sql_stock_escritura.py   -> crea/actualiza la función
+"""
+
+from typing import Any, Dict, List
+
+from psycopg2.extras import Json
+
+from sql_core import get_db_connection, invalidar_tablas
+
+
+# =====================================================================
+# DDL
+# =====================================================================
+
+# Mismo criterio que bajastock._to_float: "1.234,5" / "1,234.5" / "12,5" / "12.5"
+SQL_FN_PARSE_STOCK = r"""
+    CREATE OR REPLACE FUNCTION fertichat_parse_stock(txt TEXT)
+    RETURNS NUMERIC
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE
+        s TEXT;
+    BEGIN
+        s := regexp_replace(COALESCE(txt, ''), '[^0-9,.-]', '', 'g');
+        IF s = '' OR s = '-' THEN
+            RETURN 0;
+        END IF;
+        IF POSITION(',' IN s) > 0 AND POSITION('.' IN s) > 0 THEN
+            s := REPLACE(s, ',', '');
+        ELSE
+            s := REPLACE(s, ',', '.');
+        END IF;
+        RETURN CAST(s AS NUMERIC);
+    EXCEPTION WHEN others THEN
+        RETURN 0;
+    END;
+    $$
+"""
+
+# Mismo formato que bajastock._fmt_num: entero sin decimales, si no hasta 2
+SQL_FN_FMT_STOCK = r"""
+    CREATE OR REPLACE FUNCTION fertichat_fmt_stock(v NUMERIC)
+    RETURNS TEXT
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN v IS NULL THEN '0'
+            WHEN v = TRUNC(v) THEN TRUNC(v)::bigint::text
+            ELSE RTRIM(RTRIM(ROUND(v, 2)::text, '0'), '.')
+        END
+    $$
+"""
+
+# Mismo criterio que sql_stock._sql_date_expr_stock
+SQL_FN_PARSE_VENCIMIENTO = r"""
+    CREATE OR REPLACE FUNCTION fertichat_parse_vencimiento(txt TEXT)
+    RETURNS DATE
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE
+        s TEXT;
+    BEGIN
+        s := TRIM(COALESCE(txt, ''));
+        IF s ~ '^\d{4}-\d{2}-\d{2}' THEN
+            RETURN CAST(SUBSTRING(s FROM 1 FOR 10) AS DATE);
+        ELSIF s ~ '^\d{2}/\d{2}/\d{4}$' THEN
+            RETURN TO_DATE(s, 'DD/MM/YYYY');
+        ELSIF s ~ '^\d{2}-\d{2}-\d{4}$' THEN
+            RETURN TO_DATE(s, 'DD-MM-YYYY');
+        END IF;
+        RETURN NULL;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $$
+"""
+
+SQL_FN_APLICAR_STOCK = r"""
+    CREATE OR REPLACE FUNCTION fertichat_aplicar_stock(lineas JSONB, estricto BOOLEAN DEFAULT FALSE)
+    RETURNS TABLE (
+        idx INT,
+        deposito TEXT,
+        codigo TEXT,
+        lote TEXT,
+        vencimiento TEXT,
+        stock_antes NUMERIC,
+        stock_despues NUMERIC
+    )
+    LANGUAGE plpgsql AS $$
+    #variable_conflict use_column
+    DECLARE
+        l RECORD;
+        v_antes NUMERIC;
+        v_despues NUMERIC;
+    BEGIN
+        FOR l IN
+            SELECT
+                (e.ord - 1)::int AS i,
+                TRIM(COALESCE(e.v->>'deposito', '')) AS dep,
+                TRIM(COALESCE(e.v->>'codigo', '')) AS cod,
+                TRIM(COALESCE(e.v->>'lote', '')) AS lot,
+                TRIM(COALESCE(e.v->>'vencimiento', '')) AS ven,
+                TRIM(COALESCE(e.v->>'familia', '')) AS fam,
+                TRIM(COALESCE(e.v->>'articulo', '')) AS art,
+                COALESCE((e.v->>'delta')::numeric, 0) AS delta
+            FROM jsonb_array_elements(lineas) WITH ORDINALITY AS e(v, ord)
+            ORDER BY dep, cod, lot, ven, i
+        LOOP
+            SELECT fertichat_parse_stock(s."STOCK"::text)
+            INTO v_antes
+            FROM stock s
+            WHERE TRIM(s."CODIGO") = l.cod
+              AND TRIM(s."DEPOSITO") = l.dep
+              AND COALESCE(TRIM(s."LOTE"), '') = l.lot
+              AND COALESCE(TRIM(s."VENCIMIENTO"), '') = l.ven
+            LIMIT 1
+            FOR UPDATE;
+
+            IF FOUND THEN
+                v_despues := v_antes + l.delta;
+                IF v_despues < 0 THEN
+                    IF estricto THEN
+                        RAISE EXCEPTION 'Stock insuficiente para % en % (lote %): stock %, pedido %',
+                            l.cod, l.dep, NULLIF(l.lot, ''), v_antes, -l.delta;
+                    END IF;
+                    v_despues := 0;
+                END IF;
+
+                UPDATE stock s
+                SET "STOCK" = fertichat_fmt_stock(v_despues),
+                    "FAMILIA" = COALESCE(NULLIF(l.fam, ''), s."FAMILIA"),
+                    "ARTICULO" = COALESCE(NULLIF(l.art, ''), s."ARTICULO")
+                WHERE TRIM(s."CODIGO") = l.cod
+                  AND TRIM(s."DEPOSITO") = l.dep
+                  AND COALESCE(TRIM(s."LOTE"), '') = l.lot
+                  AND COALESCE(TRIM(s."VENCIMIENTO"), '') = l.ven;
+
+            ELSIF l.delta > 0 THEN
+                v_antes := 0;
+                v_despues := l.delta;
+                INSERT INTO stock ("FAMILIA", "CODIGO", "ARTICULO", "DEPOSITO", "LOTE", "VENCIMIENTO", "STOCK")
+                VALUES (l.fam, l.cod, l.art, l.dep, l.lot, l.ven, fertichat_fmt_stock(v_despues));
+
+            ELSE
+                IF estricto AND l.delta < 0 THEN
+                    RAISE EXCEPTION 'No se encontró el lote % de % en %', NULLIF(l.lot, ''), l.cod, l.dep;
+                END IF;
+                v_antes := NULL;
+                v_despues := NULL;
+            END IF;
+
+            idx := l.i;
+            deposito := l.dep;
+            codigo := l.cod;
+            lote := l.lot;
+            vencimiento := l.ven;
+            stock_antes := v_antes;
+            stock_despues := v_despues;
+            RETURN NEXT;
+        END LOOP;
+    END;
+    $$
+"""
+
+# Versión sobre stock_lotes (clave única codigo, deposito, lote, vencimiento_date)
+SQL_FN_APLICAR_STOCK_LOTES = r"""
+    CREATE OR REPLACE FUNCTION fertichat_aplicar_stock(lineas JSONB, estricto BOOLEAN DEFAULT FALSE)
+    RETURNS TABLE (
+        idx INT,
+        deposito TEXT,
+        codigo TEXT,
+        lote TEXT,
+        vencimiento TEXT,
+        stock_antes NUMERIC,
+        stock_despues NUMERIC
+    )
+    LANGUAGE plpgsql AS $$
+    #variable_conflict use_column
+    DECLARE
+        l RECORD;
+        v_id BIGINT;
+        v_antes NUMERIC;
+        v_despues NUMERIC;
+    BEGIN
+        FOR l IN
+            SELECT
+                (e.ord - 1)::int AS i,
+                NULLIF(e.v->>'id', '')::bigint AS lid,
+                TRIM(COALESCE(e.v->>'deposito', '')) AS dep,
+                TRIM(COALESCE(e.v->>'codigo', '')) AS cod,
+                TRIM(COALESCE(e.v->>'lote', '')) AS lot,
+                TRIM(COALESCE(e.v->>'vencimiento', '')) AS ven,
+                fertichat_parse_vencimiento(e.v->>'vencimiento') AS vdate,
+                TRIM(COALESCE(e.v->>'familia', '')) AS fam,
+                TRIM(COALESCE(e.v->>'articulo', '')) AS art,
+                COALESCE((e.v->>'delta')::numeric, 0) AS delta
+            FROM jsonb_array_elements(lineas) WITH ORDINALITY AS e(v, ord)
+            ORDER BY dep, cod, lot, vdate NULLS FIRST, i
+        LOOP
+            v_id := NULL;
+            IF l.lid IS NOT NULL THEN
+                SELECT s.id, s.stock INTO v_id, v_antes
+                FROM stock_lotes s
+                WHERE s.id = l.lid
+                FOR UPDATE;
+            END IF;
+            IF v_id IS NULL THEN
+                SELECT s.id, s.stock INTO v_id, v_antes
+                FROM stock_lotes s
+                WHERE s.codigo = l.cod
+                  AND s.deposito = l.dep
+                  AND s.lote = l.lot
+                  AND COALESCE(s.vencimiento_date, 'infinity'::date) = COALESCE(l.vdate, 'infinity'::date)
+                FOR UPDATE;
+            END IF;
+
+            IF v_id IS NOT NULL THEN
+                v_despues := v_antes + l.delta;
+                IF v_despues < 0 THEN
+                    IF estricto THEN
+                        RAISE EXCEPTION 'Stock insuficiente para % en % (lote %): stock %, pedido %',
+                            l.cod, l.dep, NULLIF(l.lot, ''), v_antes, -l.delta;
+                    END IF;
+                    v_despues := 0;
+                END IF;
+
+                UPDATE stock_lotes s
+                SET stock = v_despues,
+                    familia = COALESCE(NULLIF(l.fam, ''), s.familia),
+                    articulo = COALESCE(NULLIF(l.art, ''), s.articulo),
+                    updated_at = NOW()
+                WHERE s.id = v_id;
+
+            ELSIF l.delta > 0 THEN
+                -- ON CONFLICT: otro comprobante pudo crear el lote entre el SELECT y el INSERT
+                INSERT INTO stock_lotes AS s (codigo, articulo, familia, deposito, lote, vencimiento, stock)
+                VALUES (l.cod, l.art, l.fam, l.dep, l.lot, l.ven, l.delta)
+                ON CONFLICT (codigo, deposito, lote, (COALESCE(vencimiento_date, 'infinity'::date)))
+                DO UPDATE SET stock = s.stock + EXCLUDED.stock, updated_at = NOW()
+                RETURNING s.stock INTO v_despues;
+                v_antes := v_despues - l.delta;
+
+            ELSE
+                IF estricto AND l.delta < 0 THEN
+                    RAISE EXCEPTION 'No se encontró el lote % de % en %', NULLIF(l.lot, ''), l.cod, l.dep;
+                END IF;
+                v_antes := NULL;
+                v_despues := NULL;
+            END IF;
+
+            idx := l.i;
+            deposito := l.dep;
+            codigo := l.cod;
+            lote := l.lot;
+            vencimiento := l.ven;
+            stock_antes := v_antes;
+            stock_despues := v_despues;
+            RETURN NEXT;
+        END LOOP;
+    END;
+    $$
+"""
+
+# Tablas a invalidar en la caché de consultas después de escribir stock
+# (sql_stock lee stock_lotes / stock_totales directo cuando la migración está
+# hecha, y la vista fertichat_stock_base mientras no)
+TABLAS_STOCK = ("stock", "stock_lotes", "stock_totales", "fertichat_stock_base")
+
+_SQL_APLICAR = "SELECT * FROM fertichat_aplicar_stock(%s::jsonb, %s) ORDER BY idx"
+
+
+def asegurar_funciones_stock(conn=None) -> None:
+    """
+    Crea / actualiza las funciones de escritura de stock (idempotente).
+    Instala la versión de fertichat_aplicar_stock que corresponde: si existe
+    stock_lotes (migración de sql_stock_tipado hecha) la versión por clave.
+    """
+    propia = conn is None
+    if propia:
+        conn = get_db_connection()
+        if conn is None:
+            raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_FN_PARSE_STOCK)
+            cur.execute(SQL_FN_FMT_STOCK)
+            cur.execute(SQL_FN_PARSE_VENCIMIENTO)
+            cur.execute("SELECT to_regclass('stock_lotes') IS NOT NULL")
+            tipado = bool(cur.fetchone()[0])
+            cur.execute(SQL_FN_APLICAR_STOCK_LOTES if tipado else SQL_FN_APLICAR_STOCK)
+        if propia:
+            conn.commit()
+    finally:
+        if propia:
+            conn.close()
+
+
+# =====================================================================
+# API
+# =====================================================================
+
+def _linea_payload(linea: Dict[str, Any]) -> Dict[str, Any]:
+    out = {
+        "deposito": str(linea.get("deposito") or "").strip(),
+        "codigo": str(linea.get("codigo") or "").strip(),
+        "lote": str(linea.get("lote") or "").strip(),
+        "vencimiento": str(linea.get("vencimiento") or "").strip(),
+        "familia": str(linea.get("familia") or "").strip(),
+        "articulo": str(linea.get("articulo") or "").strip(),
+        "delta": float(linea.get("delta") or 0),
+    }
+    if linea.get("id") not in (None, ""):
+        out["id"] = str(linea["id"]).strip()
+    return out
+
+
+def funciones_instaladas(cur) -> bool:
+    """Sin DDL: fertichat_aplicar_stock existe en la base."""
+    cur.execute("SELECT to_regprocedure('fertichat_aplicar_stock(jsonb, boolean)') IS NOT NULL")
+    return bool(cur.fetchone()[0])
+
+
+def instalar_funciones_si_faltan() -> bool:
+    """Para el arranque (precalentar_stock): instala las funciones solo si faltan."""
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            if funciones_instaladas(cur):
+                return False
+        asegurar_funciones_stock(conn)
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+_FUNCIONES_OK = False
+
+
+def _verificar_funciones(cur) -> None:
+    """
+    En el camino de la request no se corre DDL: solo se verifica (una vez
+    por proceso) que la función exista. Se instala con la migración de
+    sql_stock_tipado, `python sql_stock_escritura.py` o precalentar_stock.
+    """
+    global _FUNCIONES_OK
+    if _FUNCIONES_OK:
+        return
+    if not funciones_instaladas(cur):
+        raise RuntimeError(
+            "Falta la función fertichat_aplicar_stock en la base: "
+            "correr `python sql_stock_escritura.py` (o la migración de sql_stock_tipado)."
+        )
+    _FUNCIONES_OK = True
+
+
+def aplicar_lineas_stock(lineas: List[Dict[str, Any]], estricto: bool = False, conn=None) -> List[Dict[str, Any]]:
+    """
+    Aplica los deltas de todas las líneas en una transacción.
+    Devuelve una lista paralela a `lineas` con stock_antes / stock_despues
+    (None si la línea no tocó ninguna fila).
+
+    Con `conn` corre dentro de la transacción del llamador (sin commit ni
+    invalidación: la hace el llamador). Errores de stock (estricto) salen
+    como ValueError.
+    """
+    payload = [_linea_payload(l) for l in (lineas or [])]
+    if not payload:
+        return []
+
+    propia = conn is None
+    if propia:
+        conn = get_db_connection()
+        if conn is None:
+            raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+
+    try:
+        with conn.cursor() as cur:
+            _verificar_funciones(cur)
+            try:
+                cur.execute(_SQL_APLICAR, (Json(payload), bool(estricto)))
+                rows = cur.fetchall()
+            except Exception as e:
+                if getattr(e, "pgcode", None) == "P0001":
+                    raise ValueError(e.diag.message_primary) from e
+                raise
+        if propia:
+            conn.commit()
+    except Exception:
+        if propia:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        raise
+    finally:
+        if propia:
+            conn.close()
+
+    if propia:
+        invalidar_tablas(*TABLAS_STOCK)
+
+    out = []
+    for (idx, deposito, codigo, lote, vencimiento, antes, despues), linea in zip(rows, payload):
+        out.append({
+            "deposito": deposito,
+            "codigo": codigo,
+            "lote": lote,
+            "vencimiento": vencimiento,
+            "delta": linea["delta"],
+            "stock_antes": float(antes) if antes is not None else None,
+            "stock_despues": float(despues) if despues is not None else None,
+        })
+    return out
+
+
+if __name__ == "__main__":
+    asegurar_funciones_stock()
+    print("✅ Funciones de escritura de stock creadas/actualizadas")
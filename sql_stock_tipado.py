@@ -0,0 +1,337 @@
+# =========================
+# SQL STOCK TIPADO - TABLA stock_lotes CON CLAVE ÚNICA DE LOTE (MIGRACIÓN)
+# =========================
+"""
+Pasa la tabla stock (todo texto, sin clave) a una tabla normalizada:
+
+    stock_lotes
+        id                BIGSERIAL PK
+        codigo, articulo, familia, deposito, lote   TEXT (TRIM, '' en vez de NULL)
+        vencimiento       TEXT        <- texto original
+        vencimiento_date  DATE        <- generada desde vencimiento
+        stock             NUMERIC(14,4)
+        updated_at        TIMESTAMPTZ
+
+    UNIQUE (codigo, deposito, lote, COALESCE(vencimiento_date, 'infinity'))
+
+    stock_totales (v2)
+        PK (codigo, deposito): stock sumado, registros (filas de lote),
+        lotes (filas con número de lote), articulo/familia de la última escritura
+
+- stock_totales la mantiene un trigger AFTER en stock_lotes con deltas
+  (fila vieja -, fila nueva +): baja/movimiento leen los totales del
+  artículo por PK y sql_stock arma los resúmenes sin recorrer los lotes.
+
+- La tabla vieja queda como stock_legacy (no se borra).
+- "stock" pasa a ser una vista con las columnas de siempre ("CODIGO",
+  "STOCK" como texto, ...) + id y updated_at: bajastock, pedidos,
+  comprobantes y PostgREST siguen leyendo igual. Un trigger INSTEAD OF
+  redirige INSERT/UPDATE/DELETE sobre la vista a stock_lotes.
+- Filas viejas con la misma clave se suman en una sola (un vencimiento
+  que no parsea como fecha cuenta como "sin vencimiento").
+- fertichat_aplicar_stock se reinstala en su versión por id / clave única.
+- Todo en una transacción; al terminar se marca en fertichat_migraciones
+  y sql_stock lee stock_lotes directo (columnas tipadas).
+
+Ejecutar:  python sql_stock_tipado.py
+"""
+
+from sql_core import (
+    get_db_connection,
+    invalidar_tablas,
+    invalidar_cache_stock_tipado,
+    STOCK_TIPADO_VERSION,
+)
+from sql_tipado import SQL_TABLA_MIGRACIONES
+from sql_stock_escritura import (
+    SQL_FN_PARSE_STOCK,
+    SQL_FN_FMT_STOCK,
+    SQL_FN_PARSE_VENCIMIENTO,
+    TABLAS_STOCK,
+    asegurar_funciones_stock,
+)
+
+MIGRACION_STOCK = "stock_lotes"
+STOCK_VERSION = STOCK_TIPADO_VERSION
+
+
+# =====================================================================
+# DDL
+# =====================================================================
+
+SQL_TABLA = """
+    CREATE TABLE IF NOT EXISTS stock_lotes (
+        id BIGSERIAL PRIMARY KEY,
+        codigo TEXT NOT NULL,
+        articulo TEXT NOT NULL DEFAULT '',
+        familia TEXT NOT NULL DEFAULT '',
+        deposito TEXT NOT NULL,
+        lote TEXT NOT NULL DEFAULT '',
+        vencimiento TEXT NOT NULL DEFAULT '',
+        vencimiento_date DATE GENERATED ALWAYS AS (fertichat_parse_vencimiento(vencimiento)) STORED,
+        stock NUMERIC(14,4) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+"""
+
+SQL_CLAVE = """
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_stock_lotes_clave
+        ON stock_lotes (codigo, deposito, lote, (COALESCE(vencimiento_date, 'infinity'::date)))
+"""
+
+# Una fila por clave: stock sumado, descripción/familia/texto de vencimiento de cualquiera
+SQL_COPIAR = """
+    INSERT INTO stock_lotes (codigo, articulo, familia, deposito, lote, vencimiento, stock)
+    SELECT cod, MAX(art), MAX(fam), dep, lot, MAX(ven), SUM(stk)
+    FROM (
+        SELECT
+            TRIM(COALESCE("CODIGO"::text, '')) AS cod,
+            TRIM(COALESCE("ARTICULO"::text, '')) AS art,
+            TRIM(COALESCE("FAMILIA"::text, '')) AS fam,
+            TRIM(COALESCE("DEPOSITO"::text, '')) AS dep,
+            TRIM(COALESCE("LOTE"::text, '')) AS lot,
+            TRIM(COALESCE("VENCIMIENTO"::text, '')) AS ven,
+            fertichat_parse_vencimiento("VENCIMIENTO"::text) AS vdate,
+            fertichat_parse_stock("STOCK"::text) AS stk
+        FROM stock_legacy
+    ) s
+    GROUP BY cod, dep, lot, vdate
+"""
+
+SQL_VISTA = """
+    CREATE OR REPLACE VIEW stock AS
+    SELECT
+        id,
+        familia AS "FAMILIA",
+        codigo AS "CODIGO",
+        articulo AS "ARTICULO",
+        deposito AS "DEPOSITO",
+        lote AS "LOTE",
+        vencimiento AS "VENCIMIENTO",
+        fertichat_fmt_stock(stock) AS "STOCK",
+        updated_at
+    FROM stock_lotes
+"""
+
+SQL_FN_VISTA = """
+    CREATE OR REPLACE FUNCTION stock_vista_escribir()
+    RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO stock_lotes AS s (codigo, articulo, familia, deposito, lote, vencimiento, stock)
+            VALUES (
+                TRIM(COALESCE(NEW."CODIGO", '')), TRIM(COALESCE(NEW."ARTICULO", '')),
+                TRIM(COALESCE(NEW."FAMILIA", '')), TRIM(COALESCE(NEW."DEPOSITO", '')),
+                TRIM(COALESCE(NEW."LOTE", '')), TRIM(COALESCE(NEW."VENCIMIENTO", '')),
+                fertichat_parse_stock(NEW."STOCK")
+            )
+            ON CONFLICT (codigo, deposito, lote, (COALESCE(vencimiento_date, 'infinity'::date)))
+            DO UPDATE SET stock = s.stock + EXCLUDED.stock, updated_at = NOW()
+            RETURNING s.id INTO NEW.id;
+            RETURN NEW;
+        ELSIF TG_OP = 'UPDATE' THEN
+            UPDATE stock_lotes
+            SET codigo = TRIM(COALESCE(NEW."CODIGO", '')),
+                articulo = TRIM(COALESCE(NEW."ARTICULO", '')),
+                familia = TRIM(COALESCE(NEW."FAMILIA", '')),
+                deposito = TRIM(COALESCE(NEW."DEPOSITO", '')),
+                lote = TRIM(COALESCE(NEW."LOTE", '')),
+                vencimiento = TRIM(COALESCE(NEW."VENCIMIENTO", '')),
+                stock = fertichat_parse_stock(NEW."STOCK"),
+                updated_at = NOW()
+            WHERE id = OLD.id;
+            RETURN NEW;
+        END IF;
+        DELETE FROM stock_lotes WHERE id = OLD.id;
+        RETURN OLD;
+    END;
+    $$
+"""
+
+SQL_TRIGGER_VISTA = """
+    DROP TRIGGER IF EXISTS trg_stock_vista_escribir ON stock;
+    CREATE TRIGGER trg_stock_vista_escribir
+        INSTEAD OF INSERT OR UPDATE OR DELETE ON stock
+        FOR EACH ROW EXECUTE FUNCTION stock_vista_escribir()
+"""
+
+SQL_TOTALES = """
+    CREATE TABLE IF NOT EXISTS stock_totales (
+        codigo TEXT NOT NULL,
+        deposito TEXT NOT NULL,
+        articulo TEXT NOT NULL DEFAULT '',
+        familia TEXT NOT NULL DEFAULT '',
+        stock NUMERIC(16,4) NOT NULL DEFAULT 0,
+        registros INT NOT NULL DEFAULT 0,
+        lotes INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (codigo, deposito)
+    )
+"""
+
+SQL_FN_TOTALES = """
+    CREATE OR REPLACE FUNCTION stock_totales_aplicar()
+    RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        -- caso común (baja / alta sobre un lote existente): misma clave, un solo UPDATE
+        IF TG_OP = 'UPDATE' AND NEW.codigo = OLD.codigo AND NEW.deposito = OLD.deposito THEN
+            UPDATE stock_totales t
+            SET stock = t.stock + NEW.stock - OLD.stock,
+                lotes = t.lotes + (NEW.lote <> '')::int - (OLD.lote <> '')::int,
+                articulo = NEW.articulo,
+                familia = NEW.familia,
+                updated_at = NOW()
+            WHERE t.codigo = NEW.codigo AND t.deposito = NEW.deposito;
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE stock_totales t
+            SET stock = t.stock - OLD.stock,
+                registros = t.registros - 1,
+                lotes = t.lotes - (OLD.lote <> '')::int,
+                updated_at = NOW()
+            WHERE t.codigo = OLD.codigo AND t.deposito = OLD.deposito;
+            DELETE FROM stock_totales t
+            WHERE t.codigo = OLD.codigo AND t.deposito = OLD.deposito AND t.registros <= 0;
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO stock_totales AS t (codigo, deposito, articulo, familia, stock, registros, lotes)
+            VALUES (NEW.codigo, NEW.deposito, NEW.articulo, NEW.familia, NEW.stock, 1, (NEW.lote <> '')::int)
+            ON CONFLICT (codigo, deposito) DO UPDATE
+            SET stock = t.stock + EXCLUDED.stock,
+                registros = t.registros + 1,
+                lotes = t.lotes + EXCLUDED.lotes,
+                articulo = EXCLUDED.articulo,
+                familia = EXCLUDED.familia,
+                updated_at = NOW();
+        END IF;
+        RETURN NULL;
+    END;
+    $$
+"""
+
+SQL_TRIGGER_TOTALES = """
+    DROP TRIGGER IF EXISTS trg_stock_totales ON stock_lotes;
+    CREATE TRIGGER trg_stock_totales
+        AFTER INSERT OR UPDATE OR DELETE ON stock_lotes
+        FOR EACH ROW EXECUTE FUNCTION stock_totales_aplicar()
+"""
+
+# Reconstrucción completa (migración y recalcular_stock_totales)
+SQL_RECALCULAR_TOTALES = """
+    DELETE FROM stock_totales;
+    INSERT INTO stock_totales (codigo, deposito, articulo, familia, stock, registros, lotes)
+    SELECT codigo, deposito, MAX(articulo), MAX(familia), SUM(stock),
+           COUNT(*), COUNT(*) FILTER (WHERE lote <> '')
+    FROM stock_lotes
+    GROUP BY codigo, deposito
+"""
+
+
+def _set_estado(cur, estado: str) -> None:
+    cur.execute("""
+        INSERT INTO fertichat_migraciones (nombre, version, estado, actualizado_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (nombre) DO UPDATE
+            SET version = EXCLUDED.version,
+                estado = EXCLUDED.estado,
+                actualizado_at = NOW()
+    """, (MIGRACION_STOCK, STOCK_VERSION, estado))
+
+
+def _tipo_relacion_stock(cur) -> str:
+    """'r' tabla, 'v' vista, '' si no existe."""
+    cur.execute("""
+        SELECT c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = 'stock'
+    """)
+    row = cur.fetchone()
+    return str(row[0]) if row else ""
+
+
+# =====================================================================
+# MIGRACIÓN
+# =====================================================================
+
+def migrar_stock_tipado() -> int:
+    """
+    Migra stock -> stock_lotes + vista (idempotente: si "stock" ya es la
+    vista solo reasegura funciones, vista y trigger).
+    Devuelve la cantidad de lotes en stock_lotes.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE stock IN ACCESS EXCLUSIVE MODE")
+            cur.execute(SQL_TABLA_MIGRACIONES)
+            cur.execute(SQL_FN_PARSE_STOCK)
+            cur.execute(SQL_FN_FMT_STOCK)
+            cur.execute(SQL_FN_PARSE_VENCIMIENTO)
+
+            if _tipo_relacion_stock(cur) == "r":
+                # la vista de sql_stock (modo texto) quedaría apuntando a stock_legacy
+                cur.execute("DROP VIEW IF EXISTS fertichat_stock_base")
+                cur.execute("ALTER TABLE stock RENAME TO stock_legacy")
+                cur.execute(SQL_TABLA)
+                cur.execute(SQL_CLAVE)
+                cur.execute(SQL_COPIAR)
+                print(f"✅ stock_lotes: {cur.rowcount} lotes copiados desde stock_legacy")
+            else:
+                cur.execute(SQL_TABLA)
+                cur.execute(SQL_CLAVE)
+
+            cur.execute(SQL_VISTA)
+            cur.execute(SQL_FN_VISTA)
+            cur.execute(SQL_TRIGGER_VISTA)
+            cur.execute(SQL_TOTALES)
+            cur.execute(SQL_FN_TOTALES)
+            cur.execute(SQL_TRIGGER_TOTALES)
+            cur.execute(SQL_RECALCULAR_TOTALES)
+            asegurar_funciones_stock(conn)
+            _set_estado(cur, "completo")
+
+            cur.execute("SELECT COUNT(*) FROM stock_lotes")
+            total = int(cur.fetchone()[0] or 0)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    invalidar_cache_stock_tipado()
+    invalidar_tablas(*TABLAS_STOCK)
+    return total
+
+
+def recalcular_stock_totales() -> int:
+    """Rearma stock_totales desde stock_lotes (por si se editó con el trigger apagado)."""
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE stock_lotes IN SHARE MODE")
+            cur.execute(SQL_RECALCULAR_TOTALES)
+            n = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    invalidar_tablas("stock_totales")
+    return n
+
+
+if __name__ == "__main__":
+    n = migrar_stock_tipado()
+    print(f"🎉 stock tipado: {n} lotes en stock_lotes")
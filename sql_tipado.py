@@ -0,0 +1,247 @@
+# =========================
+# SQL TIPADO - COLUMNAS TIPADAS EN chatbot_raw (MIGRACIÓN + BACKFILL)
+# =========================
+"""
+Mantiene columnas "sombra" tipadas en chatbot_raw para no re-parsear texto
+en cada consulta:
+
+    monto_num       NUMERIC(15,2)  <- "Monto Neto" (LATAM, $, U$S, paréntesis)
+    moneda_norm     TEXT           <- TRIM("Moneda")
+    anio_int        INT            <- "Año"
+    mes_key         TEXT           <- TRIM("Mes")            (YYYY-MM)
+    fecha_date      DATE           <- "Fecha"
+    proveedor_norm  TEXT           <- LOWER(TRIM("Cliente / Proveedor"))
+    articulo_norm   TEXT           <- LOWER(TRIM("Articulo"))
+
+- Un trigger BEFORE INSERT/UPDATE las mantiene al día en cada alta.
+- El backfill recorre filas viejas en lotes (commit por lote).
+- Cuando el backfill termina se marca en fertichat_migraciones y sql_core
+  pasa a usar las columnas tipadas en todos los query builders.
+
+Ejecutar:  python sql_tipado.py
+"""
+
+from sql_core import get_db_connection, invalidar_cache_tipado
+
+MIGRACION_TIPADO = "chatbot_raw_tipado"
+TIPADO_VERSION = 1
+
+
+# =====================================================================
+# DDL
+# =====================================================================
+
+SQL_TABLA_MIGRACIONES = """
+    CREATE TABLE IF NOT EXISTS fertichat_migraciones (
+        nombre TEXT PRIMARY KEY,
+        version INT NOT NULL,
+        estado TEXT NOT NULL,
+        actualizado_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+"""
+
+SQL_COLUMNAS = """
+    ALTER TABLE chatbot_raw
+        ADD COLUMN IF NOT EXISTS monto_num NUMERIC(15,2),
+        ADD COLUMN IF NOT EXISTS moneda_norm TEXT,
+        ADD COLUMN IF NOT EXISTS anio_int INT,
+        ADD COLUMN IF NOT EXISTS mes_key TEXT,
+        ADD COLUMN IF NOT EXISTS fecha_date DATE,
+        ADD COLUMN IF NOT EXISTS proveedor_norm TEXT,
+        ADD COLUMN IF NOT EXISTS articulo_norm TEXT,
+        ADD COLUMN IF NOT EXISTS tipado_version SMALLINT
+"""
+
+# Mismo criterio que _sql_total_num_expr_general (quita $, U$S, espacios,
+# paréntesis = negativo, coma decimal). Además: sin coma y con puntos de miles
+# ("1.234.567") se toman como miles; "1234.56" queda como decimal.
+# Un texto que no parsea da NULL en vez de romper la consulta.
+SQL_FN_MONTO = r"""
+    CREATE OR REPLACE FUNCTION fertichat_parse_monto(txt TEXT)
+    RETURNS NUMERIC
+    LANGUAGE plpgsql IMMUTABLE AS $fn$
+    DECLARE
+        s TEXT;
+    BEGIN
+        s := TRIM(COALESCE(txt, ''));
+        s := REPLACE(REPLACE(REPLACE(s, 'U$S', ''), 'U$$', ''), '$', '');
+        s := REPLACE(REPLACE(REPLACE(s, ' ', ''), '(', '-'), ')', '');
+        IF s = '' OR s = '-' THEN
+            RETURN NULL;
+        END IF;
+        IF POSITION(',' IN s) > 0 THEN
+            s := REPLACE(REPLACE(s, '.', ''), ',', '.');
+        ELSIF s ~ '^-?\d{1,3}(\.\d{3})+$' THEN
+            s := REPLACE(s, '.', '');
+        END IF;
+        RETURN CAST(s AS NUMERIC(15,2));
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $fn$
+"""
+
+SQL_FN_FECHA = r"""
+    CREATE OR REPLACE FUNCTION fertichat_parse_fecha(txt TEXT)
+    RETURNS DATE
+    LANGUAGE plpgsql IMMUTABLE AS $fn$
+    DECLARE
+        s TEXT;
+    BEGIN
+        s := TRIM(COALESCE(txt, ''));
+        IF s = '' THEN
+            RETURN NULL;
+        END IF;
+        IF s ~ '^\d{1,2}/\d{1,2}/\d{4}' THEN
+            RETURN TO_DATE(SUBSTRING(s FROM '^\d{1,2}/\d{1,2}/\d{4}'), 'DD/MM/YYYY');
+        END IF;
+        RETURN CAST(s AS DATE);
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $fn$
+"""
+
+SQL_FN_TRIGGER = f"""
+    CREATE OR REPLACE FUNCTION chatbot_raw_tipar()
+    RETURNS TRIGGER
+    LANGUAGE plpgsql AS $fn$
+    BEGIN
+        NEW.monto_num := fertichat_parse_monto(NEW."Monto Neto"::text);
+        NEW.moneda_norm := TRIM(COALESCE(NEW."Moneda"::text, ''));
+        NEW.anio_int := CAST(SUBSTRING(TRIM(COALESCE(NEW."Año"::text, '')) FROM '^\\d{{4}}') AS INT);
+        NEW.mes_key := NULLIF(TRIM(COALESCE(NEW."Mes"::text, '')), '');
+        NEW.fecha_date := fertichat_parse_fecha(NEW."Fecha"::text);
+        NEW.proveedor_norm := LOWER(TRIM(NEW."Cliente / Proveedor"::text));
+        NEW.articulo_norm := LOWER(TRIM(NEW."Articulo"::text));
+        NEW.tipado_version := {TIPADO_VERSION};
+        RETURN NEW;
+    END;
+    $fn$
+"""
+
+SQL_TRIGGER = """
+    DROP TRIGGER IF EXISTS trg_chatbot_raw_tipar ON chatbot_raw;
+    CREATE TRIGGER trg_chatbot_raw_tipar
+        BEFORE INSERT OR UPDATE ON chatbot_raw
+        FOR EACH ROW EXECUTE FUNCTION chatbot_raw_tipar()
+"""
+
+SQL_INDICE_PENDIENTES = """
+    CREATE INDEX IF NOT EXISTS ix_chatbot_raw_tipado_version
+        ON chatbot_raw (tipado_version)
+"""
+
+
+def _set_estado(cur, estado: str) -> None:
+    cur.execute("""
+        INSERT INTO fertichat_migraciones (nombre, version, estado, actualizado_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (nombre) DO UPDATE
+            SET version = EXCLUDED.version,
+                estado = EXCLUDED.estado,
+                actualizado_at = NOW()
+    """, (MIGRACION_TIPADO, TIPADO_VERSION, estado))
+
+
+def asegurar_columnas_tipadas() -> None:
+    """Crea columnas, funciones, trigger e índice (idempotente)."""
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_TABLA_MIGRACIONES)
+            cur.execute(SQL_COLUMNAS)
+            cur.execute(SQL_FN_MONTO)
+            cur.execute(SQL_FN_FECHA)
+            cur.execute(SQL_FN_TRIGGER)
+            cur.execute(SQL_TRIGGER)
+            cur.execute(SQL_INDICE_PENDIENTES)
+
+            # Si la versión registrada es vieja (o no hay), queda en backfill
+            cur.execute(
+                "SELECT version, estado FROM fertichat_migraciones WHERE nombre = %s",
+                (MIGRACION_TIPADO,)
+            )
+            row = cur.fetchone()
+            if not row or int(row[0]) < TIPADO_VERSION:
+                _set_estado(cur, "backfill")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# =====================================================================
+# BACKFILL POR LOTES
+# =====================================================================
+
+def contar_pendientes() -> int:
+    conn = get_db_connection()
+    if conn is None:
+        return -1
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*) FROM chatbot_raw
+                WHERE tipado_version IS NULL OR tipado_version < %s
+            """, (TIPADO_VERSION,))
+            return int(cur.fetchone()[0] or 0)
+    finally:
+        conn.close()
+
+
+def backfill_columnas_tipadas(lote: int = 5000, max_lotes: int = None) -> int:
+    """
+    Recalcula las columnas tipadas de filas viejas, `lote` filas por transacción.
+    El UPDATE dispara el trigger, que es quien calcula los valores.
+    Devuelve la cantidad de filas procesadas.
+    """
+    total = 0
+    n_lotes = 0
+    conn = get_db_connection()
+    if conn is None:
+        raise ConnectionError("No se pudo obtener conexión a la base de datos.")
+    try:
+        while max_lotes is None or n_lotes < max_lotes:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE chatbot_raw
+                    SET tipado_version = NULL
+                    WHERE ctid = ANY(ARRAY(
+                        SELECT ctid FROM chatbot_raw
+                        WHERE tipado_version IS NULL OR tipado_version < %s
+                        LIMIT %s
+                    ))
+                """, (TIPADO_VERSION, int(lote)))
+                n = cur.rowcount or 0
+            conn.commit()
+
+            total += n
+            n_lotes += 1
+            print(f"✅ Backfill tipado: lote {n_lotes} ({n} filas, {total} acumuladas)")
+            if n < lote:
+                with conn.cursor() as cur:
+                    _set_estado(cur, "completo")
+                conn.commit()
+                invalidar_cache_tipado()
+                break
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return total
+
+
+def migrar_chatbot_raw_tipado(lote: int = 5000) -> int:
+    asegurar_columnas_tipadas()
+    return backfill_columnas_tipadas(lote=lote)
+
+
+if __name__ == "__main__":
+    n = migrar_chatbot_raw_tipado()
+    print(f"🎉 chatbot_raw tipado: {n} filas procesadas")
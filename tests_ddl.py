@@ -0,0 +1,176 @@
+# =========================
+# TESTS - DDL de migraciones (funciones plpgsql, triggers)
+# =========================
+"""
+Chequea el DDL que corren las migraciones:
+
+- siempre: cada cuerpo entre comillas dólar ($$ / $fn$) cierra donde
+  termina la función (un '$$' dentro del cuerpo lo corta antes y el
+  CREATE FUNCTION falla en Postgres)
+- con credenciales de base: corre el DDL de verdad dentro de una
+  transacción y hace rollback (no deja nada creado)
+
+    python tests_ddl.py
+"""
+
+import re
+
+import kardex
+import sql_rollup
+import sql_snapshot
+import sql_stock_escritura
+import sql_stock_tipado
+import sql_tipado
+from sql_core import get_db_connection
+
+_TAG = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)?\$")
+
+
+def _sentencias_con_funciones():
+    """(nombre, sql) de cada constante SQL_* que define funciones."""
+    out = []
+    for mod in (sql_tipado, sql_rollup, sql_snapshot, kardex, sql_stock_escritura, sql_stock_tipado):
+        for nombre, valor in vars(mod).items():
+            if nombre.startswith("SQL_") and isinstance(valor, str) and "FUNCTION" in valor.upper() and "$" in valor:
+                out.append((f"{mod.__name__}.{nombre}", valor))
+    return out
+
+
+def cuerpos_dolar(sql: str):
+    """
+    Recorre `sql` como el lexer de Postgres (comillas simples y dólar).
+    Devuelve (cuerpos, terminado): los textos entre $tag$ ... $tag$ y si
+    el SQL termina fuera de toda comilla.
+    """
+    cuerpos = []
+    i = 0
+    n = len(sql)
+    while i < n:
+        c = sql[i]
+        if c == "'":
+            j = i + 1
+            while True:
+                j = sql.find("'", j)
+                if j < 0:
+                    return cuerpos, False
+                if sql[j + 1:j + 2] == "'":
+                    j += 2
+                    continue
+                break
+            i = j + 1
+        elif c == "$" and (i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] == "_")):
+            m = _TAG.match(sql, i)
+            if not m:
+                i += 1
+                continue
+            tag = m.group(0)
+            fin = sql.find(tag, m.end())
+            if fin < 0:
+                return cuerpos, False
+            cuerpos.append(sql[m.end():fin])
+            i = fin + len(tag)
+        else:
+            i += 1
+    return cuerpos, True
+
+
+# =====================================================================
+# CASOS
+# =====================================================================
+
+def caso_cuerpos_completos() -> bool:
+    ok = True
+    for nombre, sql in _sentencias_con_funciones():
+        cuerpos, terminado = cuerpos_dolar(sql)
+        if not terminado or not cuerpos:
+            print(f"   {nombre}: comillas sin cerrar")
+            ok = False
+            continue
+        for cuerpo in cuerpos:
+            final = cuerpo.strip().rstrip(";").strip().upper()
+            # plpgsql cierra con END; las funciones LANGUAGE sql son una expresión
+            if "BEGIN" in cuerpo.upper() and not final.endswith("END"):
+                print(f"   {nombre}: el cuerpo se corta en ...{cuerpo.strip()[-40:]!r}")
+                ok = False
+    return ok
+
+
+def caso_detecta_dolar_en_cuerpo() -> bool:
+    roto = """
+        CREATE FUNCTION f(s TEXT) RETURNS TEXT LANGUAGE plpgsql AS $$
+        BEGIN
+            RETURN REPLACE(s, 'U$$', '');
+        END;
+        $$
+"""
+    sano = roto.replace("$$\n", "$fn$\n")
+    cuerpos, terminado = cuerpos_dolar(roto)
+    cortado = not terminado or not cuerpos[0].strip().upper().endswith("END;")
+    cuerpos, terminado = cuerpos_dolar(sano)
+    return cortado and terminado and cuerpos[0].strip().upper().endswith("END;")
+
+
+def caso_ddl_en_base():
+    """Corre el DDL en la base y hace rollback. Sin credenciales se saltea."""
+    conn = get_db_connection()
+    if conn is None:
+        print("   (sin conexión a la base: se saltea)")
+        return True
+    sentencias = [
+        sql_tipado.SQL_TABLA_MIGRACIONES,
+        sql_tipado.SQL_COLUMNAS,
+        sql_tipado.SQL_FN_MONTO,
+        sql_tipado.SQL_FN_FECHA,
+        sql_tipado.SQL_FN_TRIGGER,
+        sql_tipado.SQL_TRIGGER,
+        sql_tipado.SQL_INDICE_PENDIENTES,
+    ]
+    sentencias += [sql for nombre, sql in _sentencias_con_funciones() if not nombre.startswith("sql_tipado.")]
+    try:
+        with conn.cursor() as cur:
+            for sql in sentencias:
+                cur.execute(sql)
+            cur.execute("SELECT fertichat_parse_monto(%s), fertichat_parse_monto(%s), fertichat_parse_monto(%s)",
+                        ("U$S 1.234,50", "(1.234.567)", "abc"))
+            r = cur.fetchone()
+        return [None if v is None else float(v) for v in r] == [1234.5, -1234567.0, None]
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+CASOS = [
+    ("cuerpos $$ completos", caso_cuerpos_completos),
+    ("detecta '$$' dentro del cuerpo", caso_detecta_dolar_en_cuerpo),
+    ("DDL en la base (rollback)", caso_ddl_en_base),
+]
+
+
+def run_tests():
+    print("=" * 70)
+    print("🧪 EJECUTANDO TESTS DE DDL")
+    print("=" * 70)
+
+    passed = 0
+    failed = 0
+    for nombre, caso in CASOS:
+        try:
+            ok = caso()
+        except Exception as e:
+            print(f"❌ FAIL: {nombre} ({e})")
+            failed += 1
+            continue
+        if ok:
+            print(f"✅ PASS: {nombre}")
+            passed += 1
+        else:
+            print(f"❌ FAIL: {nombre}")
+            failed += 1
+
+    print("=" * 70)
+    print(f"📊 RESULTADOS: {passed} passed, {failed} failed")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    run_tests()
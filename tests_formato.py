@@ -0,0 +1,288 @@
+# =========================
+# TESTS - Códec LATAM (utils_format)
+# =========================
+"""
+Propiedades del códec vectorizado contra las versiones escalares:
+
+    python tests_formato.py            # 3000 valores por caso
+    python tests_formato.py 20000
+
+- fmt_latam_serie(s)  == s.apply(_fmt_num_latam)
+- latam_a_float(s)    == s.apply(_latam_to_float)
+- ida y vuelta: latam_a_float(fmt_latam_serie(x)) == round(x, 2)
+- ResultadoConsulta: mostrarlo (formateado / estilo) == formatear_dataframe
+- df_to_excel en bloques (write-only) se lee igual que el DataFrame completo
+- exportar a parquet en bloques con una columna toda NULL en el primero
+"""
+
+import io
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from utils_format import (
+    _fmt_num_latam,
+    _latam_to_float,
+    fmt_latam_serie,
+    latam_a_float,
+    formatear_dataframe,
+    ResultadoConsulta,
+    df_to_excel,
+)
+
+RAROS = [
+    None, "", "   ", "abc", "nan", "inf", "-inf", "1_000", "(1.234,50)", "$ (12,5)",
+    "U$S 1,234.56", "USD 99", "$1.234.567,89", "1,5", "1.5", "1.234", "1,234",
+    "--5", "5-", "1e3", "1E-2", " 7 ", "12,", ",5", ".5", "0,00", "-0", "U$S", "$",
+    True, False, 0, 1, -3, 2.5, float("nan"), float("inf"), Decimal("12.345"), Decimal("-0.5"),
+]
+
+
+def _numero(rnd: random.Random) -> float:
+    e = rnd.choice([0, 1, 2, 3, 4, 6, 9, 12])
+    x = rnd.uniform(-1, 1) * (10 ** e)
+    return round(x, rnd.choice([0, 1, 2, 3, 5]))
+
+
+def _texto_numero(rnd: random.Random, x: float) -> str:
+    """El mismo número escrito como aparece en planillas / SQL formateado."""
+    estilo = rnd.randint(0, 6)
+    if estilo == 0:
+        s = f"{x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")   # 1.234,56
+    elif estilo == 1:
+        s = f"{x:,.2f}"                                                        # 1,234.56
+    elif estilo == 2:
+        s = repr(x)
+    elif estilo == 3:
+        s = f"({abs(x):,.2f})".replace(",", "X").replace(".", ",").replace("X", ".")
+    elif estilo == 4:
+        s = str(x).replace(".", ",")
+    elif estilo == 5:
+        s = f"{x:.3e}"
+    else:
+        s = f"{x:.0f}"
+    pref = rnd.choice(["", "", "$ ", "$", "U$S ", "USD ", " "])
+    return pref + s + rnd.choice(["", "", " "])
+
+
+def generar(n: int, semilla: int) -> pd.Series:
+    rnd = random.Random(semilla)
+    vals = []
+    for _ in range(n):
+        r = rnd.random()
+        if r < 0.1:
+            vals.append(rnd.choice(RAROS))
+        elif r < 0.4:
+            vals.append(_numero(rnd))
+        else:
+            vals.append(_texto_numero(rnd, _numero(rnd)))
+    return pd.Series(vals, dtype=object)
+
+
+def _iguales_float(a: pd.Series, b: pd.Series) -> bool:
+    return np.array_equal(a.to_numpy(dtype=float), b.to_numpy(dtype=float), equal_nan=True)
+
+
+def _primer_diferencia(a: pd.Series, b: pd.Series, origen: pd.Series) -> str:
+    for x, y, o in zip(a.tolist(), b.tolist(), origen.tolist()):
+        if x != y and not (isinstance(x, float) and isinstance(y, float) and math.isnan(x) and math.isnan(y)):
+            return f"{o!r}: {x!r} != {y!r}"
+    return ""
+
+
+# =====================================================================
+# CASOS
+# =====================================================================
+
+def caso_formato_igual_escalar(n: int):
+    s = generar(n, 1)
+    esperado = s.apply(_fmt_num_latam)
+    obtenido = fmt_latam_serie(s)
+    return esperado.tolist() == obtenido.tolist(), _primer_diferencia(esperado, obtenido, s)
+
+
+def caso_formato_numerico(n: int):
+    rnd = random.Random(2)
+    s = pd.Series([_numero(rnd) for _ in range(n)] + [float("nan"), -0.0], dtype=float)
+    esperado = s.apply(_fmt_num_latam)
+    obtenido = fmt_latam_serie(s)
+    return esperado.tolist() == obtenido.tolist(), _primer_diferencia(esperado, obtenido, s)
+
+
+def caso_parseo_igual_escalar(n: int):
+    s = generar(n, 3)
+    esperado = s.apply(_latam_to_float)
+    obtenido = latam_a_float(s)
+    return _iguales_float(esperado, obtenido), _primer_diferencia(esperado, obtenido, s)
+
+
+def caso_ida_y_vuelta(n: int):
+    rnd = random.Random(4)
+    x = pd.Series([_numero(rnd) for _ in range(n)], dtype=float)
+    vuelta = latam_a_float(fmt_latam_serie(x))
+    esperado = x.map(lambda v: float(f"{v:.2f}"))
+    return _iguales_float(esperado, vuelta), _primer_diferencia(esperado, vuelta, x)
+
+
+def caso_indice_duplicado(n: int):
+    s = generar(50, 5)
+    s.index = [0] * len(s)
+    ok = fmt_latam_serie(s).tolist() == [_fmt_num_latam(v) for v in s] \
+        and _iguales_float(latam_a_float(s).reset_index(drop=True), s.reset_index(drop=True).apply(_latam_to_float))
+    return ok, ""
+
+
+def caso_dataframe(n: int):
+    df = pd.DataFrame({
+        "Total": generar(200, 6),
+        "Cantidad": range(200),
+        "Variación %": [None if i % 7 == 0 else i / 3 for i in range(200)],
+    })
+    d = formatear_dataframe(df)
+    ok = (
+        d["Total"].tolist() == df["Total"].apply(_fmt_num_latam).tolist()
+        and d["Cantidad"].tolist() == df["Cantidad"].tolist()
+        and d["Variación %"].tolist() == [f"{x:.2f}%" if pd.notna(x) else "" for x in df["Variación %"]]
+    )
+    return ok, ""
+
+
+def _textos_sin_prefijo(n: int, semilla: int) -> pd.Series:
+    """Importes como los devuelve el SQL: texto LATAM/US sin moneda, con algún nulo."""
+    rnd = random.Random(semilla)
+    vals = []
+    for _ in range(n):
+        if rnd.random() < 0.05:
+            vals.append(None)
+        else:
+            vals.append(_texto_numero(rnd, _numero(rnd)).replace("U$S", "").replace("USD", "").replace("$", ""))
+    return pd.Series(vals, dtype=object)
+
+
+def _valores_mostrados(sty) -> list:
+    if isinstance(sty, pd.DataFrame):
+        return sty.astype(str).values.tolist()
+    sty._compute()
+    cuerpo = sty._translate(False, False)["body"]
+    return [[c["display_value"] for c in fila[1:]] for fila in cuerpo]
+
+
+def caso_resultado_tipado(n: int):
+    m = min(n, 2000)
+    df = pd.DataFrame({
+        "Total": _textos_sin_prefijo(m, 7),                      # texto -> número
+        "Monto": generar(m, 8),                                  # con $ / basura -> queda texto
+        "importe_usd": [Decimal(str(_numero(random.Random(i)))) for i in range(m)],
+        "Cantidad": range(m),
+        "Variación %": [None if i % 7 == 0 else i / 3 for i in range(m)],
+    })
+    r = ResultadoConsulta(df)
+    esperado = formatear_dataframe(df)
+    if not pd.api.types.is_float_dtype(r.df["Total"]) or r.df["Monto"].dtype != object:
+        return False, f"tipos: {r.df.dtypes.to_dict()}"
+    if not r.formateado.equals(esperado):
+        return False, "formateado != formatear_dataframe"
+    if _valores_mostrados(r.estilo()) != esperado.astype(str).values.tolist():
+        return False, "estilo() != formatear_dataframe"
+    ok = _iguales_float(r.numerico("Total"), latam_a_float(df["Total"]))
+    return ok, "numerico('Total') != latam_a_float"
+
+
+def caso_excel_bloques(n: int):
+    m = min(n, 3000)
+    rnd = random.Random(9)
+    df = pd.DataFrame({
+        "Fecha": pd.date_range("2025-01-01", periods=m, freq="h"),
+        "Articulo": [f"art {i % 17}" for i in range(m)],
+        "Total": [None if i % 11 == 0 else _numero(rnd) for i in range(m)],
+    })
+    bloques = (df.iloc[i:i + 700] for i in range(0, m, 700))
+    leido = pd.read_excel(io.BytesIO(df_to_excel(bloques)))
+    ok = (
+        len(leido) == m
+        and leido["Articulo"].tolist() == df["Articulo"].tolist()
+        # Excel guarda 15 dígitos significativos
+        and np.allclose(leido["Total"].to_numpy(dtype=float), df["Total"].to_numpy(dtype=float),
+                        rtol=1e-14, atol=0, equal_nan=True)
+        and (pd.to_datetime(leido["Fecha"]) == df["Fecha"]).all()
+    )
+    return ok, ""
+
+
+def caso_parquet_columna_null(n: int):
+    import exportar
+    if exportar.pq is None:
+        return True, "sin pyarrow"
+    m = min(n, 3000)
+    rnd = random.Random(5)
+    # NULL en todo el primer bloque: Arrow tipa la columna `null`
+    filas = [
+        (f"art {i % 17}", None if i < 1000 else f"obs {i}", None if i < 1000 else _numero(rnd))
+        for i in range(m)
+    ]
+    columnas = ["Articulo", "Obs", "Total"]
+    ruta = os.path.join(tempfile.mkdtemp(), "bloques.parquet")
+    # cada bloque es un DataFrame aparte, como los arma ejecutar_consulta_stream
+    bloques = (pd.DataFrame(filas[i:i + 700], columns=columnas) for i in range(0, m, 700))
+    res = exportar.exportar_bloques(bloques, formato="parquet", ruta=ruta)
+    leido = exportar.pq.read_table(ruta).to_pandas()
+    os.remove(ruta)
+    esperado = pd.DataFrame(filas, columns=columnas)
+    ok = (
+        res["filas"] == m
+        and leido["Obs"].where(leido["Obs"].notna(), None).tolist() == esperado["Obs"].tolist()
+        and np.allclose(leido["Total"].to_numpy(dtype=float), esperado["Total"].to_numpy(dtype=float),
+                        equal_nan=True)
+    )
+    return ok, ""
+
+
+CASOS = [
+    ("formato == _fmt_num_latam (mixto)", caso_formato_igual_escalar),
+    ("formato == _fmt_num_latam (float)", caso_formato_numerico),
+    ("parseo == _latam_to_float", caso_parseo_igual_escalar),
+    ("ida y vuelta formato -> parseo", caso_ida_y_vuelta),
+    ("índice duplicado", caso_indice_duplicado),
+    ("formatear_dataframe", caso_dataframe),
+    ("ResultadoConsulta (formato al renderizar)", caso_resultado_tipado),
+    ("df_to_excel en bloques", caso_excel_bloques),
+    ("parquet en bloques (columna NULL al principio)", caso_parquet_columna_null),
+]
+
+
+def run_tests(n: int = 3000):
+    print("=" * 70)
+    print(f"🧪 EJECUTANDO TESTS DEL CÓDEC LATAM ({n} valores)")
+    print("=" * 70)
+
+    passed = 0
+    failed = 0
+    for nombre, caso in CASOS:
+        t0 = time.perf_counter()
+        try:
+            ok, detalle = caso(n)
+        except Exception as e:
+            ok, detalle = False, repr(e)
+        ms = (time.perf_counter() - t0) * 1000
+        if ok:
+            print(f"✅ PASS: {nombre} ({ms:.0f} ms)")
+            passed += 1
+        else:
+            print(f"❌ FAIL: {nombre}")
+            print(f"   {detalle}")
+            failed += 1
+
+    print("=" * 70)
+    print(f"📊 RESULTADOS: {passed} passed, {failed} failed")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    run_tests(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
@@ -0,0 +1,203 @@
+# =========================
+# TESTS - Motor de kardex (promedio móvil)
+# =========================
+"""
+Equivalencia entre el motor vectorizado de kardex.py y la versión
+original fila por fila (iterrows), y valuación por bloques:
+
+    python tests_kardex.py
+"""
+
+import random
+
+import numpy as np
+import pandas as pd
+
+import kardex
+from kardex import (
+    _kardex_referencia_iterrows,
+    calcular_kardex_promedio_movil,
+    calcular_kardex_por_articulo,
+    resumen_por_articulo,
+)
+
+COLUMNAS = ["qty_in", "qty_out", "costo_unit_aplicado", "valor_mov",
+            "saldo_qty", "saldo_valor", "costo_promedio", "qty_base", "precio_unit_aplicado"]
+
+
+# =====================================================================
+# DATOS
+# =====================================================================
+
+def _valor_sucio(rnd: random.Random, x: float):
+    """El mismo número como llega de la base / Supabase, a veces roto."""
+    r = rnd.random()
+    if r < 0.04:
+        return None
+    if r < 0.06:
+        return ""
+    if r < 0.08:
+        return "abc"
+    if r < 0.25:
+        return str(x)
+    return x
+
+
+def generar_movimientos(n_articulos: int, n_movs: int, semilla: int = 7, sucio: bool = True) -> pd.DataFrame:
+    rnd = random.Random(semilla)
+    filas = []
+    for i in range(n_movs):
+        art = rnd.randint(1, n_articulos)
+        r = rnd.random()
+        if r < 0.45:
+            qty = float(rnd.randint(1, 50))
+        elif r < 0.9:
+            qty = -float(rnd.randint(1, 40))  # puede dejar saldo negativo
+        else:
+            qty = 0.0
+        precio = round(rnd.uniform(0.5, 300), 2)
+        filas.append({
+            "id": i + 1,
+            "articulo_id": art,
+            "fecha_hora": f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}T10:00:00",
+            "tipo_mov": "ingreso" if qty > 0 else "baja",
+            "qty_base": _valor_sucio(rnd, qty) if sucio else qty,
+            "precio_unit_aplicado": _valor_sucio(rnd, precio) if sucio else precio,
+        })
+    return pd.DataFrame(filas)
+
+
+def _iguales(a: pd.Series, b: pd.Series) -> bool:
+    return np.array_equal(a.to_numpy(dtype=float), b.to_numpy(dtype=float), equal_nan=True)
+
+
+# =====================================================================
+# CASOS
+# =====================================================================
+
+def caso_un_articulo() -> bool:
+    df = generar_movimientos(1, 400, semilla=1)
+    ref = _kardex_referencia_iterrows(df)
+    vec = calcular_kardex_promedio_movil(df)
+    return all(_iguales(ref[c], vec[c]) for c in COLUMNAS)
+
+
+def caso_estado_inicial() -> bool:
+    df = generar_movimientos(1, 200, semilla=2, sucio=False)
+    ini = {"saldo_qty": 120.0, "saldo_valor": 4321.5, "costo_promedio": 36.0125}
+    ref = _kardex_referencia_iterrows(df, inicial=ini)
+    vec = calcular_kardex_promedio_movil(df, inicial=ini)
+    return all(_iguales(ref[c], vec[c]) for c in COLUMNAS)
+
+
+def caso_muchos_articulos() -> bool:
+    df = generar_movimientos(40, 3000, semilla=3)
+    iniciales = {5: {"saldo_qty": 10.0, "saldo_valor": 100.0, "costo_promedio": 10.0}}
+    vec = calcular_kardex_por_articulo(df, iniciales=iniciales)
+    for art, sub in df.groupby("articulo_id", sort=False):
+        ref = _kardex_referencia_iterrows(sub, inicial=iniciales.get(art))
+        got = vec[vec["articulo_id"] == art]
+        if list(got["id"]) != list(sub["id"]):
+            return False  # el agrupado no respetó el orden dentro del artículo
+        if not all(_iguales(ref[c], got[c]) for c in COLUMNAS):
+            return False
+    return True
+
+
+def caso_resumen() -> bool:
+    df = generar_movimientos(15, 800, semilla=4, sucio=False)
+    res = resumen_por_articulo(calcular_kardex_por_articulo(df)).set_index("articulo_id")
+    for art, sub in df.groupby("articulo_id"):
+        u = _kardex_referencia_iterrows(sub).iloc[-1]
+        r = res.loc[art]
+        if (r["saldo_qty"], r["saldo_valor"], r["costo_promedio"]) != (u["saldo_qty"], u["saldo_valor"], u["costo_promedio"]):
+            return False
+        if r["movimientos"] != len(sub):
+            return False
+    return True
+
+
+def caso_reseteo_en_cero() -> bool:
+    df = pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "fecha_hora": ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"],
+        "qty_base": [10, -10, 5, -8],
+        "precio_unit_aplicado": [3, 0, 7, 0],
+    })
+    vec = calcular_kardex_promedio_movil(df)
+    esperado_costo = [3.0, 0.0, 7.0, 0.0]
+    esperado_valor = [30.0, 0.0, 35.0, 0.0]
+    return list(vec["costo_promedio"]) == esperado_costo and list(vec["saldo_valor"]) == esperado_valor \
+        and list(vec["costo_unit_aplicado"]) == [0.0, 3.0, 0.0, 7.0]
+
+
+def caso_vacio() -> bool:
+    return calcular_kardex_por_articulo(pd.DataFrame()).empty
+
+
+def caso_valuacion_en_bloques() -> bool:
+    """Bloques chicos del cursor dan lo mismo que todo junto."""
+    df = generar_movimientos(25, 1500, semilla=5, sucio=False)
+    df["deposito_id"] = [(i % 3) or None for i in range(len(df))]
+    df = df.sort_values(["articulo_id", "fecha_hora", "id"]).reset_index(drop=True)
+
+    def stream_falso(sql, params, itersize=None):
+        for i in range(0, len(df), 37):
+            yield df.iloc[i:i + 37].copy()
+
+    original = kardex.ejecutar_consulta_stream
+    kardex.ejecutar_consulta_stream = stream_falso
+    try:
+        val = kardex.valuacion_inventario(solo_con_stock=False)
+    finally:
+        kardex.ejecutar_consulta_stream = original
+
+    res = resumen_por_articulo(calcular_kardex_por_articulo(df)).set_index("articulo_id")
+    por_art = val.groupby("articulo_id")[["saldo_qty"]].sum().join(
+        val.groupby("articulo_id")[["costo_promedio"]].first())
+    return (
+        len(val) == len(df.groupby(["articulo_id", "deposito_id"], dropna=False))
+        and np.allclose(por_art["saldo_qty"], res.loc[por_art.index, "saldo_qty"])
+        and np.allclose(por_art["costo_promedio"], res.loc[por_art.index, "costo_promedio"])
+    )
+
+
+CASOS = [
+    ("un artículo, datos sucios", caso_un_articulo),
+    ("estado inicial (snapshot)", caso_estado_inicial),
+    ("40 artículos en una pasada", caso_muchos_articulos),
+    ("resumen por artículo", caso_resumen),
+    ("reseteo con saldo cero", caso_reseteo_en_cero),
+    ("df vacío", caso_vacio),
+    ("valuación en bloques", caso_valuacion_en_bloques),
+]
+
+
+def run_tests():
+    print("=" * 70)
+    print("🧪 EJECUTANDO TESTS DEL MOTOR DE KARDEX")
+    print("=" * 70)
+
+    passed = 0
+    failed = 0
+    for nombre, caso in CASOS:
+        try:
+            ok = caso()
+        except Exception as e:
+            print(f"❌ FAIL: {nombre} ({e})")
+            failed += 1
+            continue
+        if ok:
+            print(f"✅ PASS: {nombre}")
+            passed += 1
+        else:
+            print(f"❌ FAIL: {nombre}")
+            failed += 1
+
+    print("=" * 70)
+    print(f"📊 RESULTADOS: {passed} passed, {failed} failed")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    run_tests()
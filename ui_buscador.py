@@ -7,7 +7,7 @@ import pandas as pd
 from datetime import datetime
 from typing import Tuple, Optional
 
-from utils_format import formatear_dataframe, df_to_excel
+from utils_format import como_resultado, df_to_excel
 from sql_core import (
     ejecutar_consulta,
     get_lista_proveedores,
@@ -423,9 +423,10 @@ def mostrar_buscador_ia():
 
                     render_orquestador_output(pregunta_completa, respuesta, df)
 
-                    if df is not None and not df.empty:
+                    res = como_resultado(df)
+                    if res is not None and not res.empty:
                         st.dataframe(
-                            formatear_dataframe(df),
+                            res.estilo(),
                             use_container_width=True,
                             hide_index=True
                         )
@@ -445,18 +446,16 @@ def mostrar_buscador_ia():
                     if df is not None and not df.empty:
                         st.success(f"✅ Se encontraron **{len(df)}** comprobantes")
 
+                        res = como_resultado(df)
                         if 'Monto' in df.columns:
                             try:
-                                montos = df['Monto'].apply(lambda x: float(
-                                    str(x).replace('.', '').replace(',', '.').replace('$', '').replace(' ', '')
-                                ) if pd.notna(x) else 0)
-                                total = montos.sum()
+                                total = res.numerico('Monto').sum()
                                 st.info(f"💰 **Total:** ${total:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
                             except:
                                 pass
 
                         st.dataframe(
-                            formatear_dataframe(df),
+                            res.estilo(),
                             use_container_width=True,
                             hide_index=True
                         )
@@ -12,6 +12,7 @@ from utils_openai import responder_con_openai
 import sql_compras as sqlq_compras
 import sql_comparativas as sqlq_comparativas
 import sql_facturas as sqlq_facturas
+from utils_format import como_resultado, latam_a_float
 
 
 # =========================
@@ -97,32 +98,18 @@ def calcular_totales_por_moneda(df: pd.DataFrame) -> dict:
         return None
 
     try:
-        df_calc = df.copy()
-
-        df_calc[col_total] = (
-            df_calc[col_total]
-            .astype(str)
-            .str.replace(".", "", regex=False)
-            .str.replace(",", ".", regex=False)
-            .str.replace("$", "", regex=False)
-            .str.strip()
-        )
-        df_calc[col_total] = pd.to_numeric(df_calc[col_total], errors="coerce").fillna(0)
+        # Si el total ya es numérico se suma tal cual (sin ida y vuelta por texto)
+        montos = latam_a_float(df[col_total])
+        monedas = df[col_moneda].astype(str)
 
         totales = {}
-        pesos_df = df_calc[
-            df_calc[col_moneda].astype(str).str.contains(
-                r"\$|peso|ARS|ars", case=False, na=False
-            )
-        ]
-        totales["Pesos"] = pesos_df[col_total].sum()
-
-        usd_df = df_calc[
-            df_calc[col_moneda].astype(str).str.contains(
-                r"USD|US|dolar|dólar", case=False, na=False
-            )
-        ]
-        totales["USD"] = usd_df[col_total].sum()
+        totales["Pesos"] = montos[
+            monedas.str.contains(r"\$|peso|ARS|ars", case=False, na=False)
+        ].sum()
+
+        totales["USD"] = montos[
+            monedas.str.contains(r"USD|US|dolar|dólar", case=False, na=False)
+        ].sum()
 
         return totales
 
@@ -346,7 +333,7 @@ def Compras_IA():
                         )
 
                 st.markdown("---")
-                st.dataframe(df, use_container_width=True, height=400)
+                st.dataframe(como_resultado(df).estilo(), use_container_width=True, height=400)
 
     # Input
     pregunta = st.chat_input("Escribí tu consulta sobre compras o facturas...")
@@ -13,19 +13,197 @@ from utils_format import _fmt_num_latam, _safe_float
 from sql_compras import (
     ejecutar_consulta,
     _sql_total_num_expr_general,
+)
+# Snapshot Parquet local si está al día; si no, las mismas funciones contra la BD
+from sql_snapshot import (
     get_dashboard_totales,
     get_dashboard_compras_por_mes,
     get_dashboard_top_proveedores,
     get_dashboard_gastos_familia,
     get_dashboard_ultimas_compras,
+    snapshot_actualizado,
 )
+from sql_core import _sql_anio_expr, _sql_mes_expr, _sql_moneda_expr, get_rollup_watermark, ejecutar_en_paralelo
 
 # =========================
 # 📊 DASHBOARD
 # =========================
 
+def _fuente_datos() -> tuple:
+    """
+    De dónde salen los paneles de compras y hasta cuándo: el snapshot local
+    si está disponible (lo usan las funciones de sql_snapshot), si no la
+    base con la marca de agua del rollup.
+    """
+    actualizado = snapshot_actualizado()
+    if actualizado is not None:
+        return "snapshot", actualizado
+    return "rollup", get_rollup_watermark()
+
+
+def _tareas_dashboard(anio: int) -> dict:
+    """Datasets del dashboard (nombre -> función). Se piden todos juntos."""
+    return {
+        "watermark": _fuente_datos,
+        "totales": lambda: get_dashboard_totales(anio),
+        "meses": lambda: get_dashboard_compras_por_mes(anio),
+        "provs_pesos": lambda: get_dashboard_top_proveedores(anio, 10, moneda="$"),
+        "provs_usd": lambda: get_dashboard_top_proveedores(anio, 10, moneda="U$S"),
+        "familias": lambda: get_dashboard_gastos_familia(anio),
+        "alertas": lambda: get_alertas_vencimiento_multiple(5),
+        "ultimas": lambda: get_dashboard_ultimas_compras(5),
+    }
+
+
+def _render_watermark(fuente: tuple):
+    origen, momento = fuente
+    if not momento:
+        return
+    if origen == "snapshot":
+        st.caption(f"🕒 Datos del snapshot local del {momento:%d/%m/%Y %H:%M}")
+    else:
+        st.caption(f"🕒 Agregados actualizados al {momento:%d/%m/%Y %H:%M}")
+
+
+def _render_metricas(totales: dict):
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        total_fmt = f"${totales['total_pesos']:,.0f}".replace(',', '.')
+        st.metric("💰 Total Compras $", total_fmt)
+
+    with col2:
+        usd_fmt = f"U$S {totales['total_usd']:,.0f}".replace(',', '.')
+        st.metric("💵 Total USD", usd_fmt)
+
+    with col3:
+        st.metric("🏭 Proveedores", totales['proveedores'])
+
+    with col4:
+        st.metric("📄 Facturas", totales['facturas'])
+
+
+def _render_compras_por_mes(df_meses: pd.DataFrame):
+    if df_meses is not None and not df_meses.empty:
+        fig_meses = px.bar(
+            df_meses,
+            x='Mes',
+            y='Total',
+            color='Total',
+            color_continuous_scale='Blues',
+            labels={'Total': 'Monto ($)', 'Mes': ''}
+        )
+        fig_meses.update_layout(
+            showlegend=False,
+            coloraxis_showscale=False,
+            height=350,
+            margin=dict(l=20, r=20, t=30, b=20)
+        )
+        fig_meses.update_traces(
+            texttemplate='%{y:,.0f}',
+            textposition='outside',
+            textfont_size=10
+        )
+        st.plotly_chart(fig_meses, use_container_width=True)
+    else:
+        st.info("No hay datos para este año")
+
+
+def _render_top_proveedores(df_provs: pd.DataFrame, moneda: str):
+    etiqueta = "$" if moneda == "$" else "U$S"
+    if df_provs is not None and not df_provs.empty:
+        fig_provs = px.bar(
+            df_provs,
+            x='Total',
+            y='Proveedor',
+            orientation='h',
+            color='Total',
+            color_continuous_scale='Oranges',
+            labels={'Total': f'Monto ({etiqueta})', 'Proveedor': ''}
+        )
+        fig_provs.update_layout(
+            showlegend=False,
+            coloraxis_showscale=False,
+            height=350,
+            margin=dict(l=20, r=20, t=30, b=20)
+        )
+        st.plotly_chart(fig_provs, use_container_width=True)
+    else:
+        st.info(f"No hay datos en {etiqueta} para este año")
+
+
+def _render_gastos_familia(df_familias: pd.DataFrame):
+    if df_familias is not None and not df_familias.empty:
+        fig_torta = px.pie(
+            df_familias,
+            values='Total',
+            names='Familia',
+            color_discrete_sequence=px.colors.qualitative.Set3,
+            hole=0.4  # Donut chart
+        )
+        fig_torta.update_layout(
+            height=350,
+            margin=dict(l=20, r=20, t=30, b=20),
+            showlegend=True,
+            legend=dict(
+                orientation="v",
+                yanchor="middle",
+                y=0.5,
+                xanchor="left",
+                x=1.02
+            )
+        )
+        fig_torta.update_traces(
+            textposition='inside',
+            textinfo='percent',
+            textfont_size=11
+        )
+        st.plotly_chart(fig_torta, use_container_width=True)
+    else:
+        st.info("No hay datos para este año")
+
+
+def _render_alertas(alertas: list):
+    if alertas:
+        st.markdown("**⚠️ Próximos vencimientos:**")
+        for alerta in alertas[:3]:
+            # ✅ FIX mínimo: soportar ambos nombres de clave (dias_restantes / dias)
+            dias = alerta.get('dias_restantes', alerta.get('dias', None))
+            try:
+                dias = int(dias) if dias is not None else 999999
+            except:
+                dias = 999999
+
+            if dias <= 7:
+                color = "🔴"
+            elif dias <= 30:
+                color = "🟠"
+            else:
+                color = "🟡"
+
+            st.markdown(f"{color} **{alerta['articulo'][:30]}** - {alerta['vencimiento']} ({dias} días)")
+    else:
+        st.success("✅ No hay vencimientos próximos")
+
+
+def _render_ultimas_compras(df_ultimas: pd.DataFrame):
+    if df_ultimas is not None and not df_ultimas.empty:
+        for _, row in df_ultimas.iterrows():
+            total_fmt = f"${row['Total']:,.0f}".replace(',', '.') if pd.notna(row['Total']) else "$0"
+            articulo = str(row['Articulo'])[:25] + "..." if len(str(row['Articulo'])) > 25 else str(row['Articulo'])
+            proveedor = str(row['Proveedor'])[:15] if pd.notna(row['Proveedor']) else ""
+            st.markdown(f"• {row['Fecha']} - **{articulo}** - {proveedor} - {total_fmt}")
+    else:
+        st.info("No hay compras recientes")
+
+
 def mostrar_dashboard():
-    """Dashboard con gráficos de compras y stock"""
+    """
+    Dashboard con gráficos de compras y stock.
+    Primero se arma el layout con un lugar vacío por panel; después las
+    consultas corren todas a la vez (ejecutar_en_paralelo) y cada panel
+    se dibuja apenas llega su dataset.
+    """
 
     st.title("📊 Dashboard")
 
@@ -34,32 +212,15 @@ def mostrar_dashboard():
     col_filtro, col_espacio = st.columns([1, 3])
     with col_filtro:
         anio = st.selectbox("Año:", [anio_actual, anio_actual - 1, anio_actual - 2], index=0)
+    with col_espacio:
+        ph_watermark = st.empty()
 
     st.markdown("---")
 
     # =====================
     # MÉTRICAS PRINCIPALES
     # =====================
-    try:
-        totales = get_dashboard_totales(anio)
-
-        col1, col2, col3, col4 = st.columns(4)
-
-        with col1:
-            total_fmt = f"${totales['total_pesos']:,.0f}".replace(',', '.')
-            st.metric("💰 Total Compras $", total_fmt)
-
-        with col2:
-            usd_fmt = f"U$S {totales['total_usd']:,.0f}".replace(',', '.')
-            st.metric("💵 Total USD", usd_fmt)
-
-        with col3:
-            st.metric("🏭 Proveedores", totales['proveedores'])
-
-        with col4:
-            st.metric("📄 Facturas", totales['facturas'])
-    except Exception as e:
-        st.error(f"Error cargando métricas: {e}")
+    ph_metricas = st.empty()
 
     st.markdown("---")
 
@@ -71,86 +232,16 @@ def mostrar_dashboard():
     # GRÁFICO 1: Compras por Mes (Barras)
     with col_izq:
         st.subheader("📈 Compras por Mes")
-        try:
-            df_meses = get_dashboard_compras_por_mes(anio)
-            if df_meses is not None and not df_meses.empty:
-                fig_meses = px.bar(
-                    df_meses,
-                    x='Mes',
-                    y='Total',
-                    color='Total',
-                    color_continuous_scale='Blues',
-                    labels={'Total': 'Monto ($)', 'Mes': ''}
-                )
-                fig_meses.update_layout(
-                    showlegend=False,
-                    coloraxis_showscale=False,
-                    height=350,
-                    margin=dict(l=20, r=20, t=30, b=20)
-                )
-                fig_meses.update_traces(
-                    texttemplate='%{y:,.0f}',
-                    textposition='outside',
-                    textfont_size=10
-                )
-                st.plotly_chart(fig_meses, use_container_width=True)
-            else:
-                st.info("No hay datos para este año")
-        except Exception as e:
-            st.error(f"Error: {e}")
+        ph_meses = st.empty()
 
     # GRÁFICO 2: Top Proveedores (por moneda)
     with col_der:
         st.subheader("🏆 Top Proveedores (por moneda)")
-        try:
-            tabs = st.tabs(["$ Pesos", "U$S USD"])
-
-            with tabs[0]:
-                df_provs = get_dashboard_top_proveedores(anio, 10, moneda="$")
-                if df_provs is not None and not df_provs.empty:
-                    fig_provs = px.bar(
-                        df_provs,
-                        x='Total',
-                        y='Proveedor',
-                        orientation='h',
-                        color='Total',
-                        color_continuous_scale='Oranges',
-                        labels={'Total': 'Monto ($)', 'Proveedor': ''}
-                    )
-                    fig_provs.update_layout(
-                        showlegend=False,
-                        coloraxis_showscale=False,
-                        height=350,
-                        margin=dict(l=20, r=20, t=30, b=20)
-                    )
-                    st.plotly_chart(fig_provs, use_container_width=True)
-                else:
-                    st.info("No hay datos en $ para este año")
-
-            with tabs[1]:
-                df_provs_usd = get_dashboard_top_proveedores(anio, 10, moneda="U$S")
-                if df_provs_usd is not None and not df_provs_usd.empty:
-                    fig_provs_usd = px.bar(
-                        df_provs_usd,
-                        x='Total',
-                        y='Proveedor',
-                        orientation='h',
-                        color='Total',
-                        color_continuous_scale='Oranges',
-                        labels={'Total': 'Monto (U$S)', 'Proveedor': ''}
-                    )
-                    fig_provs_usd.update_layout(
-                        showlegend=False,
-                        coloraxis_showscale=False,
-                        height=350,
-                        margin=dict(l=20, r=20, t=30, b=20)
-                    )
-                    st.plotly_chart(fig_provs_usd, use_container_width=True)
-                else:
-                    st.info("No hay datos en U$S para este año")
-
-        except Exception as e:
-            st.error(f"Error: {e}")
+        tabs = st.tabs(["$ Pesos", "U$S USD"])
+        with tabs[0]:
+            ph_provs = st.empty()
+        with tabs[1]:
+            ph_provs_usd = st.empty()
 
     # SEGUNDA FILA DE GRÁFICOS
     col_izq2, col_der2 = st.columns(2)
@@ -158,85 +249,41 @@ def mostrar_dashboard():
     # GRÁFICO 3: Gastos por Familia (Torta)
     with col_izq2:
         st.subheader("🥧 Gastos por Familia")
-        try:
-            df_familias = get_dashboard_gastos_familia(anio)
-            if df_familias is not None and not df_familias.empty:
-                fig_torta = px.pie(
-                    df_familias,
-                    values='Total',
-                    names='Familia',
-                    color_discrete_sequence=px.colors.qualitative.Set3,
-                    hole=0.4  # Donut chart
-                )
-                fig_torta.update_layout(
-                    height=350,
-                    margin=dict(l=20, r=20, t=30, b=20),
-                    showlegend=True,
-                    legend=dict(
-                        orientation="v",
-                        yanchor="middle",
-                        y=0.5,
-                        xanchor="left",
-                        x=1.02
-                    )
-                )
-                fig_torta.update_traces(
-                    textposition='inside',
-                    textinfo='percent',
-                    textfont_size=11
-                )
-                st.plotly_chart(fig_torta, use_container_width=True)
-            else:
-                st.info("No hay datos para este año")
-        except Exception as e:
-            st.error(f"Error: {e}")
+        ph_familias = st.empty()
 
     # GRÁFICO 4: Alertas y Últimas Compras
     with col_der2:
         st.subheader("🚨 Alertas y Actividad")
-
-        # Alertas de vencimiento
-        try:
-            alertas = get_alertas_vencimiento_multiple(5)
-            if alertas:
-                st.markdown("**⚠️ Próximos vencimientos:**")
-                for alerta in alertas[:3]:
-                    # ✅ FIX mínimo: soportar ambos nombres de clave (dias_restantes / dias)
-                    dias = alerta.get('dias_restantes', alerta.get('dias', None))
-                    try:
-                        dias = int(dias) if dias is not None else 999999
-                    except:
-                        dias = 999999
-
-                    if dias <= 7:
-                        color = "🔴"
-                    elif dias <= 30:
-                        color = "🟠"
-                    else:
-                        color = "🟡"
-
-                    st.markdown(f"{color} **{alerta['articulo'][:30]}** - {alerta['vencimiento']} ({dias} días)")
-            else:
-                st.success("✅ No hay vencimientos próximos")
-        except Exception as e:
-            st.error(f"Error cargando alertas: {e}")
-
+        ph_alertas = st.empty()
         st.markdown("---")
-
-        # Últimos artículos comprados
-        try:
-            st.markdown("**🛒 Últimos artículos comprados:**")
-            df_ultimas = get_dashboard_ultimas_compras(5)
-            if df_ultimas is not None and not df_ultimas.empty:
-                for _, row in df_ultimas.iterrows():
-                    total_fmt = f"${row['Total']:,.0f}".replace(',', '.') if pd.notna(row['Total']) else "$0"
-                    articulo = str(row['Articulo'])[:25] + "..." if len(str(row['Articulo'])) > 25 else str(row['Articulo'])
-                    proveedor = str(row['Proveedor'])[:15] if pd.notna(row['Proveedor']) else ""
-                    st.markdown(f"• {row['Fecha']} - **{articulo}** - {proveedor} - {total_fmt}")
-            else:
-                st.info("No hay compras recientes")
-        except Exception as e:
-            st.error(f"Error cargando últimas compras: {e}")
+        st.markdown("**🛒 Últimos artículos comprados:**")
+        ph_ultimas = st.empty()
+
+    # nombre -> (lugar, render, prefijo del mensaje de error)
+    paneles = {
+        "watermark": (ph_watermark, _render_watermark, None),
+        "totales": (ph_metricas, _render_metricas, "Error cargando métricas"),
+        "meses": (ph_meses, _render_compras_por_mes, "Error"),
+        "provs_pesos": (ph_provs, lambda df: _render_top_proveedores(df, "$"), "Error"),
+        "provs_usd": (ph_provs_usd, lambda df: _render_top_proveedores(df, "U$S"), "Error"),
+        "familias": (ph_familias, _render_gastos_familia, "Error"),
+        "alertas": (ph_alertas, _render_alertas, "Error cargando alertas"),
+        "ultimas": (ph_ultimas, _render_ultimas_compras, "Error cargando últimas compras"),
+    }
+    for nombre, (lugar, _, _) in paneles.items():
+        if nombre != "watermark":
+            lugar.caption("⏳ Cargando...")
+
+    for nombre, datos, error in ejecutar_en_paralelo(_tareas_dashboard(anio)):
+        lugar, render, msg_error = paneles[nombre]
+        with lugar.container():
+            try:
+                if error is not None:
+                    raise error
+                render(datos)
+            except Exception as e:
+                if msg_error:
+                    st.error(f"{msg_error}: {e}")
 
 
 # =========================
@@ -295,14 +342,14 @@ def _get_totales_anio(anio: int) -> dict:
 
     query = f"""
         SELECT
-            SUM(CASE WHEN TRIM(COALESCE("Moneda",'')) = '$'
+            SUM(CASE WHEN {_sql_moneda_expr()} = '$'
                      THEN {total_expr} ELSE 0 END) AS total_pesos,
-            SUM(CASE WHEN TRIM(COALESCE("Moneda",'')) IN ('U$S','U$$')
+            SUM(CASE WHEN {_sql_moneda_expr()} IN ('U$S','U$$')
                      THEN {total_expr} ELSE 0 END) AS total_usd
         FROM chatbot_raw
         WHERE
             ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-            AND "Año"::int = %s
+            AND {_sql_anio_expr()} = %s
     """
 
     params = (anio,)
@@ -335,14 +382,14 @@ def _get_totales_mes(mes_key: str) -> dict:
 
     query = f"""
         SELECT
-            SUM(CASE WHEN TRIM(COALESCE("Moneda",'')) = '$'
+            SUM(CASE WHEN {_sql_moneda_expr()} = '$'
                      THEN {total_expr} ELSE 0 END) AS total_pesos,
-            SUM(CASE WHEN TRIM(COALESCE("Moneda",'')) IN ('U$S','U$$')
+            SUM(CASE WHEN {_sql_moneda_expr()} IN ('U$S','U$$')
                      THEN {total_expr} ELSE 0 END) AS total_usd
         FROM chatbot_raw
         WHERE
             ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-            AND TRIM("Mes") = %s
+            AND {_sql_mes_expr()} = %s
     """
     df = ejecutar_consulta(query, (mes_key,))
     if df is None or df.empty:
@@ -361,14 +408,14 @@ def _get_top_proveedores_anio(anio: int, top_n: int = 20) -> pd.DataFrame:
     query = f"""
         SELECT
             TRIM("Cliente / Proveedor") AS "Proveedor",
-            SUM(CASE WHEN TRIM(COALESCE("Moneda",'')) = '$'
+            SUM(CASE WHEN {_sql_moneda_expr()} = '$'
                      THEN {total_expr} ELSE 0 END) AS "Total_$",
-            SUM(CASE WHEN TRIM(COALESCE("Moneda",'')) IN ('U$S','U$$')
+            SUM(CASE WHEN {_sql_moneda_expr()} IN ('U$S','U$$')
                      THEN {total_expr} ELSE 0 END) AS "Total_USD"
         FROM chatbot_raw
         WHERE
             ("Tipo Comprobante" = 'Compra Contado' OR "Tipo Comprobante" LIKE 'Compra%%')
-            AND "Año"::int = %s
+            AND {_sql_anio_expr()} = %s
             AND "Cliente / Proveedor" IS NOT NULL
             AND TRIM("Cliente / Proveedor") <> ''
         GROUP BY TRIM("Cliente / Proveedor")
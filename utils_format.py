@@ -2,11 +2,19 @@
 # UTILS_FORMAT.PY - FORMATEO DE DATOS
 # =========================
 
+import numpy as np
 import pandas as pd
-from typing import Optional
+from functools import cached_property, lru_cache
+from typing import Callable, Iterable, Optional, Union
 import io
 import re
 
+try:
+    import pyarrow  # noqa: F401  (strings Arrow: métodos .str nativos)
+    _DTYPE_TEXTO = "string[pyarrow]"
+except ImportError:
+    _DTYPE_TEXTO = object
+
 # Importar normalizar_texto del intent_detector original
 from intent_detector import normalizar_texto
 
@@ -60,8 +68,9 @@ def _fmt_num_latam(valor, decimales: int = 2) -> str:
     return f"{prefijo}{latam}".strip()
 
 
+@lru_cache(maxsize=4096)
 def _es_col_importe_latam(nombre_col: str) -> bool:
-    """Detecta si una columna es un importe"""
+    """Detecta si una columna es un importe (cacheado por nombre)"""
     n = normalizar_texto(nombre_col or "")
 
     if "cantidad" in n:
@@ -77,6 +86,203 @@ def _es_col_importe_latam(nombre_col: str) -> bool:
     return False
 
 
+@lru_cache(maxsize=4096)
+def _tipo_columna(nombre_col) -> str:
+    """'importe' | 'porcentaje' | '' según el nombre de la columna (cacheado)."""
+    if _es_col_importe_latam(nombre_col):
+        return "importe"
+    if "variacion" in normalizar_texto(nombre_col) or "%" in nombre_col:
+        return "porcentaje"
+    return ""
+
+
+# =====================================================================
+# CÓDEC LATAM VECTORIZADO (Series completas)
+# =====================================================================
+# Mismos resultados que _fmt_num_latam / _latam_to_float celda por celda
+# (ver tests_formato.py), pero el trabajo de texto se hace con los
+# métodos .str de pandas sobre toda la columna (con pyarrow, en C++).
+# Solo los valores raros (que no tienen forma de número simple) vuelven
+# al camino escalar.
+
+_RE_NUMERO_SIMPLE = r"^[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?$"
+_SWAP_SEPARADORES = str.maketrans({",": ".", ".": ","})
+
+
+def _a_texto(s: pd.Series) -> pd.Series:
+    return s.astype(_DTYPE_TEXTO)
+
+
+def _mascara(m: pd.Series) -> pd.Series:
+    return m.fillna(False).astype(bool)
+
+
+def _normalizar_separadores(s: pd.Series) -> pd.Series:
+    """Paréntesis -> signo, sin espacios y separadores LATAM/US -> float de Python."""
+    s = s.str.replace("(", "-", regex=False).str.replace(")", "", regex=False).str.replace(" ", "", regex=False)
+
+    # 1.234,56 / 1234,5 -> la última coma va después del último punto (o no hay punto)
+    latam = _mascara(s.str.contains(r",[^.]*$", regex=True))
+    # 1,234.56 -> hay coma y el último separador es un punto
+    us = _mascara(s.str.contains(",", regex=False)) & ~latam
+
+    if latam.any():
+        s = s.where(~latam, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    if us.any():
+        s = s.where(~us, s.str.replace(",", "", regex=False))
+    return s
+
+
+def _float_o_none(x) -> Optional[float]:
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+
+def _a_float(s: pd.Series) -> pd.Series:
+    """
+    float() de Python sobre una Series de texto: NaN donde no parsea.
+    Los textos con forma de número simple se convierten en bloque.
+    """
+    out = pd.Series(float("nan"), index=s.index, dtype=float)
+    simple = _mascara(s.str.match(_RE_NUMERO_SIMPLE))
+    if simple.any():
+        try:
+            out[simple] = s[simple].astype(float).to_numpy(dtype=float)
+        except (TypeError, ValueError):
+            out[simple] = pd.to_numeric(s[simple], errors="coerce").to_numpy(dtype=float)
+    resto = ~simple
+    if resto.any():
+        # inf, 1_000, basura...: celda por celda (son pocos)
+        vals = [_float_o_none(x) for x in s[resto].tolist()]
+        out[resto] = [float("nan") if v is None else v for v in vals]
+    return out
+
+
+def _no_parsea(s: pd.Series) -> pd.Series:
+    """True donde float() falla (un texto 'nan' sí parsea: da NaN, como el escalar)."""
+    return pd.Series([_float_o_none(x) is None for x in s.tolist()], index=s.index, dtype=bool)
+
+
+def latam_a_float(ser: pd.Series) -> pd.Series:
+    """_latam_to_float sobre una Series completa (nulos y basura -> 0.0)."""
+    if ser is None:
+        return pd.Series(dtype=float)
+    if pd.api.types.is_numeric_dtype(ser) or pd.api.types.is_bool_dtype(ser):
+        return ser.astype(float).fillna(0.0)
+
+    indice = ser.index
+    ser = ser.reset_index(drop=True)
+    out = pd.Series(0.0, index=ser.index, dtype=float)
+
+    nulos = _mascara(ser.isna())
+    # bool / int / float sueltos en una columna object: float() directo
+    numeros = ~nulos & _mascara(ser.isin([True, False]))
+    if numeros.any():
+        out[numeros] = ser[numeros].astype(float)
+
+    textos = ~nulos & ~numeros
+    if textos.any():
+        s = _a_texto(ser[textos]).str.strip()
+        s = (
+            s.str.replace("U$S", "", regex=False)
+             .str.replace("USD", "", regex=False)
+             .str.replace("$", "", regex=False)
+             .str.strip()
+        )
+        s = _normalizar_separadores(s)
+        nums = _a_float(s)
+        vacios = _mascara(s == "")
+        dudosos = nums.isna() & ~vacios
+        if dudosos.any():
+            nums[dudosos] = nums[dudosos].where(~_no_parsea(s[dudosos]), 0.0)
+        nums[vacios] = 0.0
+        out[textos] = nums
+
+    out.index = indice
+    return out
+
+
+def _fmt_latam_floats(nums: list, decimales: int) -> list:
+    # Precios/cantidades se repiten mucho: se formatea cada valor distinto una sola vez
+    # (por bits, para no confundir -0.0 con 0.0 ni perder NaN)
+    arr = np.asarray(nums, dtype=float)
+    codigos, unicos = pd.factorize(arr.view(np.int64))
+    txt = [f"{x:,.{decimales}f}".translate(_SWAP_SEPARADORES) for x in unicos.view(float).tolist()]
+    return pd.Series(txt, dtype=object).take(codigos).tolist() if txt else []
+
+
+def _parsear_importes_texto(v0: pd.Series):
+    """(prefijo de moneda, número, no parsea) de una Series de textos ya strip."""
+    prefijo = pd.Series("", index=v0.index, dtype=object)
+    prefijo[_mascara(v0.str.contains("$", regex=False))] = "$ "
+    prefijo[_mascara(v0.str.contains("U$S", regex=False))] = "U$S "
+
+    s = v0.str.replace("U$S", "", regex=False).str.replace("$", "", regex=False).str.strip()
+    s = _normalizar_separadores(s)
+    nums = _a_float(s)
+
+    falla = pd.Series(False, index=s.index)
+    if nums.isna().any():
+        falla[nums.isna()] = _no_parsea(s[nums.isna()])
+    return prefijo, nums, falla
+
+
+def fmt_latam_serie(ser: pd.Series, decimales: int = 2) -> pd.Series:
+    """_fmt_num_latam sobre una Series completa."""
+    indice = ser.index
+    ser = ser.reset_index(drop=True)
+    out = pd.Series("", index=ser.index, dtype=object)
+
+    nulos = _mascara(ser.isna())
+    if pd.api.types.is_numeric_dtype(ser) or pd.api.types.is_bool_dtype(ser):
+        out[~nulos] = _fmt_latam_floats(ser[~nulos].astype(float).tolist(), decimales)
+        out.index = indice
+        return out
+
+    if pd.api.types.is_string_dtype(ser) and ser.dtype != object:
+        es_str = ~nulos
+    else:
+        es_str = pd.Series([isinstance(x, str) for x in ser.tolist()], index=ser.index, dtype=bool)
+
+    # No texto (Decimal, int, float en columna object): float() o str()
+    otros = ~nulos & ~es_str
+    if otros.any():
+        vals = ser[otros]
+        try:
+            out[otros] = _fmt_latam_floats(vals.astype(float).tolist(), decimales)
+        except (TypeError, ValueError):
+            out[otros] = [_fmt_num_latam(v, decimales) for v in vals]
+
+    textos = ~nulos & es_str
+    if textos.any():
+        v0 = _a_texto(ser[textos]).str.strip()
+        prefijo, nums, falla = _parsear_importes_texto(v0)
+
+        # si no parsea: el texto original (strip)
+        txt = pd.Series(v0.tolist(), index=v0.index, dtype=object)
+        ok = ~falla
+        if ok.any():
+            txt[ok] = [
+                p + n for p, n in zip(prefijo[ok].tolist(), _fmt_latam_floats(nums[ok].tolist(), decimales))
+            ]
+        out[textos] = txt
+
+    out.index = indice
+    return out
+
+
+def fmt_pct_serie(ser: pd.Series) -> pd.Series:
+    """Variación: 12.34% (vacío si es nulo)."""
+    ok = ser.notna().to_numpy()
+    vals = ser.tolist()
+    return pd.Series(
+        [f"{float(x):.2f}%" if o else "" for x, o in zip(vals, ok)],
+        index=ser.index, dtype=object,
+    )
+
+
 def formatear_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """Formatea DataFrame con números en formato LATAM"""
     if df is None or df.empty:
@@ -84,23 +290,236 @@ def formatear_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 
     d = df.copy()
     for c in d.columns:
-        if _es_col_importe_latam(c):
-            d[c] = d[c].apply(_fmt_num_latam)
-        elif "variacion" in normalizar_texto(c) or "%" in c:
-            d[c] = d[c].apply(lambda x: (f"{float(x):.2f}%" if pd.notna(x) else ""))
+        tipo = _tipo_columna(c)
+        if tipo == "importe":
+            d[c] = fmt_latam_serie(d[c])
+        elif tipo == "porcentaje":
+            d[c] = fmt_pct_serie(d[c])
     return d
 
 
+# =====================================================================
+# RESULTADO TIPADO (FORMATO RECIÉN AL RENDERIZAR)
+# =====================================================================
+
+def _importe_numerico(ser: pd.Series) -> Optional[pd.Series]:
+    """
+    Columna de importe como float (NaN en nulos), o None si pasarla a
+    número perdería algo que formatear_dataframe muestra: prefijo de
+    moneda ($ / U$S) o textos que no son números.
+    """
+    if pd.api.types.is_numeric_dtype(ser) or pd.api.types.is_bool_dtype(ser):
+        return ser
+    indice = ser.index
+    ser = ser.reset_index(drop=True)
+    out = pd.Series(float("nan"), index=ser.index, dtype=float)
+
+    nulos = _mascara(ser.isna())
+    if pd.api.types.is_string_dtype(ser) and ser.dtype != object:
+        es_str = ~nulos
+    else:
+        es_str = pd.Series([isinstance(x, str) for x in ser.tolist()], index=ser.index, dtype=bool)
+
+    # Decimal / int / float sueltos (numeric de psycopg2 llega como Decimal)
+    otros = ~nulos & ~es_str
+    if otros.any():
+        try:
+            out[otros] = ser[otros].astype(float)
+        except (TypeError, ValueError):
+            return None
+
+    textos = ~nulos & es_str
+    if textos.any():
+        prefijo, nums, falla = _parsear_importes_texto(_a_texto(ser[textos]).str.strip())
+        if falla.any() or (prefijo != "").any():
+            return None
+        out[textos] = nums
+
+    out.index = indice
+    return out
+
+
+class ResultadoConsulta:
+    """
+    Resultado de una consulta para mostrar: el DataFrame crudo (importes
+    como números, listos para sumar o graficar) más los roles de cada
+    columna. El formato LATAM se aplica recién al renderizar, con
+    estilo() en Streamlit o formateado en Chainlit/texto.
+
+    `bloques` (opcional): función que devuelve el resultado completo en
+    bloques desde un cursor del servidor, para exportar sin el LIMIT de
+    la consulta mostrada (ej. lambda: iter_compras_anio(2025)).
+    """
+
+    def __init__(
+        self,
+        df: Optional[pd.DataFrame],
+        moneda: Optional[str] = None,
+        bloques: Optional[Callable[[], Iterable[pd.DataFrame]]] = None,
+    ):
+        df = pd.DataFrame() if df is None else df
+        self.roles = {}
+        for c in df.columns:
+            tipo = _tipo_columna(c)
+            if tipo:
+                self.roles[c] = tipo
+
+        # Importes que llegan como texto/Decimal: se convierten una sola vez
+        convertidas = {}
+        for c, tipo in self.roles.items():
+            if tipo == "importe" and not pd.api.types.is_numeric_dtype(df[c]):
+                num = _importe_numerico(df[c])
+                if num is not None:
+                    convertidas[c] = num
+        if convertidas:
+            df = df.copy()
+            for c, num in convertidas.items():
+                df[c] = num
+        self.df = df
+
+        self.moneda = moneda
+        self.bloques = bloques
+        self.col_moneda = _pick_col(self.df, ["moneda", "currency"])
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @property
+    def empty(self) -> bool:
+        return self.df.empty
+
+    @property
+    def columns(self):
+        return self.df.columns
+
+    def numerico(self, col: str) -> pd.Series:
+        """Columna como float (nulos y basura -> 0.0), sin pasar por texto si ya es número."""
+        if col is None or col not in self.df.columns:
+            return pd.Series(0.0, index=self.df.index)
+        return latam_a_float(self.df[col])
+
+    def totales_por_moneda(self, col_total: str) -> dict:
+        """{moneda: suma de col_total} (todo junto bajo '' si no hay columna de moneda)."""
+        nums = self.numerico(col_total)
+        if not self.col_moneda:
+            return {self.moneda or "": float(nums.sum())}
+        monedas = self.df[self.col_moneda].astype(str).str.strip()
+        return {str(m): float(v) for m, v in nums.groupby(monedas, sort=False).sum().items()}
+
+    @cached_property
+    def formateado(self) -> pd.DataFrame:
+        """Mismo resultado que formatear_dataframe sobre el DataFrame original."""
+        return formatear_dataframe(self.df)
+
+    def estilo(self):
+        """
+        Styler con formato LATAM para st.dataframe. Los números no se tocan:
+        el formato se calcula al dibujar. Si la tabla supera el máximo de
+        celdas del Styler, devuelve la versión formateada.
+        """
+        d = self.df
+        if d.empty or not self.roles:
+            return d
+        if d.size > pd.get_option("styler.render.max_elements"):
+            return self.formateado
+
+        sty = d.style
+        for c, tipo in self.roles.items():
+            numerica = pd.api.types.is_numeric_dtype(d[c])
+            if tipo == "importe" and numerica:
+                sty = sty.format("{:,.2f}", subset=[c], thousands=".", decimal=",", na_rep="")
+            elif tipo == "importe":
+                sty = sty.format(_fmt_num_latam, subset=[c])
+            elif numerica:
+                sty = sty.format("{:.2f}%", subset=[c], na_rep="")
+            else:
+                sty = sty.format(lambda x: "" if pd.isna(x) else f"{float(x):.2f}%", subset=[c])
+        return sty
+
+
+def como_resultado(x) -> Optional[ResultadoConsulta]:
+    """DataFrame -> ResultadoConsulta (None y ResultadoConsulta pasan igual)."""
+    if x is None or isinstance(x, ResultadoConsulta):
+        return x
+    return ResultadoConsulta(x)
+
+
 # =====================================================================
 # HELPER PARA EXPORTAR A EXCEL
 # =====================================================================
 
-def df_to_excel(df: pd.DataFrame) -> bytes:
-    """Convierte un DataFrame a bytes de Excel (.xlsx)"""
+_EXCEL_MAX_FILAS = 1_048_575  # sin contar el encabezado
+
+
+def _filas_excel(bloque: pd.DataFrame):
+    """Filas como tuplas de valores que openpyxl acepta (nulos -> celda vacía)."""
+    b = bloque
+    tz = [c for c in b.columns if isinstance(b[c].dtype, pd.DatetimeTZDtype)]
+    if tz:
+        b = b.copy()
+        for c in tz:
+            b[c] = b[c].dt.tz_localize(None)
+    b = b.astype(object).where(b.notna(), None)
+    return b.itertuples(index=False, name=None)
+
+
+def escribir_xlsx(bloques: Iterable[pd.DataFrame], destino, progreso=None) -> int:
+    """
+    Escribe bloques en un .xlsx con openpyxl en modo write-only: cada fila
+    se vuelca al archivo al agregarla, así la memoria no crece con el
+    resultado. `destino` es una ruta o un archivo binario. Si se pasa del
+    máximo de filas de Excel sigue en otra hoja (Datos_2, ...).
+    progreso(filas) se llama después de cada bloque. Devuelve las filas escritas.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws, fila, n_hoja, encabezado = None, 0, 0, None
+    total = 0
+
+    def _hoja_nueva():
+        nonlocal ws, fila, n_hoja
+        n_hoja += 1
+        ws = wb.create_sheet('Datos' if n_hoja == 1 else f'Datos_{n_hoja}')
+        celdas = []
+        for c in encabezado:
+            celda = WriteOnlyCell(ws, value=str(c))
+            celda.font = Font(bold=True)
+            celdas.append(celda)
+        ws.append(celdas)
+        fila = 0
+
+    for bloque in bloques:
+        if encabezado is None:
+            encabezado = list(bloque.columns)
+            _hoja_nueva()
+        for valores in _filas_excel(bloque):
+            if fila >= _EXCEL_MAX_FILAS:
+                _hoja_nueva()
+            ws.append(valores)
+            fila += 1
+        total += len(bloque)
+        if progreso:
+            progreso(total)
+
+    if ws is None:
+        wb.create_sheet('Datos')
+    wb.save(destino)
+    return total
+
+
+def df_to_excel(df: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> bytes:
+    """
+    Convierte un DataFrame a bytes de Excel (.xlsx).
+    También acepta bloques (ej. iter_compras_anio / ejecutar_consulta_stream):
+    se escriben uno tras otro sin armar el DataFrame completo. Para
+    resultados grandes conviene exportar.exportar_bloques, que escribe a
+    un archivo temporal en vez de a memoria.
+    """
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Datos')
-    output.seek(0)
+    escribir_xlsx([df] if isinstance(df, pd.DataFrame) else df, output)
     return output.getvalue()
 
 
@@ -9,7 +9,12 @@ import plotly.graph_objects as go
 from typing import Optional
 
 from intent_detector import normalizar_texto
-from utils_format import _fmt_num_latam, _latam_to_float, _fmt_money_latam, _pick_col
+from utils_format import _fmt_num_latam, _fmt_money_latam, _pick_col, latam_a_float, ResultadoConsulta
+
+def _df_crudo(df):
+    """Los gráficos trabajan sobre los números crudos del ResultadoConsulta."""
+    return df.df if isinstance(df, ResultadoConsulta) else df
+
 
 def _df_get_numeric(df: pd.DataFrame, col: str) -> pd.Series:
     if col is None or df is None or df.empty or col not in df.columns:
@@ -18,8 +23,8 @@ def _df_get_numeric(df: pd.DataFrame, col: str) -> pd.Series:
     # si ya es numérico, usarlo
     if pd.api.types.is_numeric_dtype(ser):
         return pd.to_numeric(ser, errors="coerce").fillna(0.0)
-    # si es string (por formatear_dataframe), parsear LATAM
-    return ser.apply(_latam_to_float).fillna(0.0)
+    # si es string (texto del SQL o DataFrame ya formateado), parsear LATAM (vectorizado)
+    return latam_a_float(ser).fillna(0.0)
 
 
 def _df_get_datetime(df: pd.DataFrame, col: str) -> Optional[pd.Series]:
@@ -34,6 +39,7 @@ def _df_get_datetime(df: pd.DataFrame, col: str) -> Optional[pd.Series]:
 
 def _es_df_compras(df: pd.DataFrame) -> bool:
     """Heurística: si parece detalle de compras (artículo/proveedor/total/fecha)."""
+    df = _df_crudo(df)
     if df is None or df.empty:
         return False
     c_art = _pick_col(df, ["articulo", "Artículo", "Articulo"])
@@ -55,6 +61,7 @@ def _fmt_money_latam(valor: float, moneda: str = "$", dec: int = 2) -> str:
 
 def _build_resumen_compras(df: pd.DataFrame) -> dict:
     """Devuelve métricas + top artículos."""
+    df = _df_crudo(df)
     if df is None or df.empty:
         return {}
 
@@ -170,6 +177,7 @@ def _render_graficos_compras(df: pd.DataFrame, key_base: str = "detalle_df"):
     Arregla el error típico de Plotly:
     cuando 'serie' queda como Series o DF sin reset_index().
     """
+    df = _df_crudo(df)
     if df is None:
         return
 
@@ -212,9 +220,10 @@ def _render_graficos_compras(df: pd.DataFrame, key_base: str = "detalle_df"):
         except Exception:
             return None
 
-    # Total a numérico
+    # Total a numérico (si ya es número, como en ResultadoConsulta, no se toca)
     try:
-        dfg[col_total] = dfg[col_total].apply(_to_number_uy)
+        if not pd.api.types.is_numeric_dtype(dfg[col_total]):
+            dfg[col_total] = dfg[col_total].apply(_to_number_uy)
         dfg[col_total] = pd.to_numeric(dfg[col_total], errors="coerce")
     except Exception:
         pass